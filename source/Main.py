@@ -5,7 +5,7 @@ import traceback
 from PySide6.QtWidgets import QApplication, QMessageBox
 from main_window import MainWindow
 from core.managers.privacy_manager import PrivacyManager
-from utils.logger import setup_logger, cleanup_old_logs, log_uncaught_exceptions
+from utils.logger import setup_logger, start_log_retention, log_uncaught_exceptions
 from config.config import LOG_FILE, APP_NAME, LOG_RETENTION_DAYS
 from utils import load_config
 
@@ -49,9 +49,9 @@ if __name__ == "__main__":
     config = load_config()
     debug_mode = config.get("debug_mode", False)
     
-    # 在应用启动时清理过期的日志文件
-    cleanup_old_logs(LOG_RETENTION_DAYS)
-    logger.debug(f"已执行日志清理，保留最近{LOG_RETENTION_DAYS}天的日志")
+    # 在后台压缩和清理历史日志，不阻塞启动
+    start_log_retention()
+    logger.debug(f"已开始后台日志整理，保留最近{LOG_RETENTION_DAYS}天的日志")
     
     # 如果调试模式已启用，确保立即创建主日志文件
     if debug_mode:
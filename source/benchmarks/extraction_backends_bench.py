@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+解压后端基准测试
+
+生成合成的补丁文件（不可压缩的随机数据，以及可压缩的文本数据），分别用py7zr和7-Zip
+（如果可用，7-Zip多线程压缩时会生成可并行解压的多个LZMA2数据块）打包成.7z，
+然后在同样的压缩包上依次运行各解压后端的extract_members，校验解压结果的SHA256，
+以JSON格式输出每种组合的耗时中位数、吞吐量以及7-Zip相对py7zr的加速比。
+
+用法示例：
+    python benchmarks/extraction_backends_bench.py --size-mb 256 --runs 3 --output extract.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import py7zr
+
+from utils.extraction_backends import Native7zBackend, Py7zrBackend, find_7z_executable
+
+# 合成补丁在压缩包中的路径，与真实补丁的目录结构一致
+MEMBER_NAME = "vol.1/adultsonly.xp3"
+# 生成数据时每次写入的字节数
+CHUNK_SIZE = 4 * 1024 * 1024
+WORDS = (
+    "neko", "para", "chocola", "vanilla", "azuki", "coconut", "maple", "cinnamon",
+    "shigure", "kashou", "patisserie", "soleil", "bell", "tail", "ribbon", "cream",
+)
+
+
+def write_synthetic_file(path, size, kind, seed=0):
+    """生成合成的补丁文件
+
+    Args:
+        path: 输出路径
+        size: 文件大小（字节）
+        kind: "random"为不可压缩数据（接近真实的xp3补丁），"text"为可压缩的文本数据
+        seed: 随机种子
+
+    Returns:
+        str: 文件的SHA256
+    """
+    rng = random.Random(seed)
+    base = None
+    if kind == "text":
+        base = " ".join(rng.choice(WORDS) for _ in range(CHUNK_SIZE // 5)).encode("ascii")[:CHUNK_SIZE]
+
+    hash_obj = hashlib.sha256()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        written = 0
+        while written < size:
+            length = min(CHUNK_SIZE, size - written)
+            if kind == "random":
+                chunk = os.urandom(length)
+            else:
+                # 每块从不同位置开始并混入少量随机数据，避免整块重复被压缩成极小的数据
+                offset = rng.randrange(len(base))
+                chunk = (base[offset:] + base[:offset])[:length]
+                noise = os.urandom(length // 64)
+                chunk = chunk[:length - len(noise)] + noise
+            hash_obj.update(chunk)
+            f.write(chunk)
+            written += length
+    return hash_obj.hexdigest()
+
+
+def build_archive(source_dir, archive_path, creator, executable=None):
+    """将合成补丁打包为.7z
+
+    Args:
+        source_dir: 包含MEMBER_NAME的目录
+        archive_path: 输出的压缩包路径
+        creator: "py7zr"或"7z"
+        executable: 7-Zip可执行文件路径
+    """
+    if creator == "py7zr":
+        with py7zr.SevenZipFile(archive_path, "w") as archive:
+            archive.write(os.path.join(source_dir, MEMBER_NAME), MEMBER_NAME)
+    else:
+        subprocess.run(
+            [executable, "a", "-t7z", "-m0=lzma2", "-mx5", "-mmt=on", "-bso0", "-bsp0",
+             archive_path, MEMBER_NAME],
+            cwd=source_dir, check=True
+        )
+
+
+def run_backend(backend, archive_path, output_dir, expected_hash):
+    """运行一次解压并校验结果
+
+    Returns:
+        tuple: (耗时秒数, 结果是否正确)
+    """
+    target = os.path.join(output_dir, os.path.basename(MEMBER_NAME))
+    if os.path.exists(target):
+        os.remove(target)
+    started = time.perf_counter()
+    backend.extract_members(archive_path, {MEMBER_NAME: target})
+    elapsed = time.perf_counter() - started
+
+    hash_obj = hashlib.sha256()
+    with open(target, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hash_obj.update(chunk)
+    return elapsed, hash_obj.hexdigest() == expected_hash
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="解压后端基准测试")
+    parser.add_argument("--size-mb", type=int, default=128, help="合成补丁的大小（MB）")
+    parser.add_argument("--kinds", nargs="*", default=["random", "text"], choices=["random", "text"],
+                        help="合成数据类型")
+    parser.add_argument("--runs", type=int, default=3, help="每种组合的运行次数，取耗时中位数")
+    parser.add_argument("--threads", type=int, default=0, help="7-Zip解压线程数，0表示自动")
+    parser.add_argument("--output", help="报告输出路径，默认输出到标准输出")
+    parser.add_argument("--keep", action="store_true", help="保留临时工作目录")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    executable = find_7z_executable()
+    backends = [Py7zrBackend()]
+    creators = ["py7zr"]
+    if executable:
+        backends.append(Native7zBackend(executable, threads=args.threads))
+        creators.append("7z")
+    else:
+        print("[bench] 未找到7-Zip命令行程序，只测试py7zr", file=sys.stderr)
+
+    work_dir = tempfile.mkdtemp(prefix="extract_bench_")
+    size = args.size_mb * 1024 * 1024
+    results = []
+    try:
+        for kind in args.kinds:
+            source_dir = os.path.join(work_dir, f"source-{kind}")
+            expected_hash = write_synthetic_file(os.path.join(source_dir, MEMBER_NAME), size, kind)
+            for creator in creators:
+                archive_path = os.path.join(work_dir, f"{kind}-{creator}.7z")
+                build_archive(source_dir, archive_path, creator, executable)
+                for backend in backends:
+                    output_dir = os.path.join(work_dir, f"out-{backend.name}")
+                    os.makedirs(output_dir, exist_ok=True)
+                    timings = []
+                    ok = True
+                    for index in range(max(1, args.runs)):
+                        elapsed, correct = run_backend(backend, archive_path, output_dir, expected_hash)
+                        timings.append(round(elapsed, 4))
+                        ok = ok and correct
+                        print(f"[bench] {kind}/{creator} {backend.name} run {index + 1}: {elapsed:.2f} s",
+                              file=sys.stderr)
+                    median_s = statistics.median(timings)
+                    results.append({
+                        "kind": kind,
+                        "archive_creator": creator,
+                        "archive_bytes": os.path.getsize(archive_path),
+                        "backend": backend.name,
+                        "median_s": median_s,
+                        "mb_per_s": round(args.size_mb / median_s, 2) if median_s else None,
+                        "runs": timings,
+                        "ok": ok,
+                    })
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    # 同一压缩包上7-Zip相对py7zr的加速比
+    speedups = {}
+    for result in results:
+        if result["backend"] != "7z":
+            continue
+        baseline = next(
+            r for r in results
+            if r["backend"] == "py7zr" and r["kind"] == result["kind"]
+            and r["archive_creator"] == result["archive_creator"]
+        )
+        speedups[f"{result['kind']}/{result['archive_creator']}"] = round(
+            baseline["median_s"] / result["median_s"], 2
+        )
+
+    report = {
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "cpu_count": os.cpu_count(),
+        "py7zr": py7zr.__version__,
+        "7z_executable": executable,
+        "params": {"size_mb": args.size_mb, "kinds": args.kinds, "runs": args.runs, "threads": args.threads},
+        "results": results,
+        "speedup_7z_over_py7zr": speedups,
+    }
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0 if all(result["ok"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
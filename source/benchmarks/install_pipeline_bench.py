@@ -0,0 +1,409 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+安装流程端到端基准测试
+
+在本地启动一个模拟CDN（提供云端配置JSON和合成的.7z补丁，可限制带宽和延迟），
+生成合成的游戏库目录，然后以无界面方式（QT_QPA_PLATFORM=offscreen）依次运行真实的
+ConfigFetchThread、GameDetector、HashThread（预检查）、DownloadThread、ExtractionThread
+和HashThread（安装后检查），以JSON格式输出各阶段耗时、数据量和峰值内存，便于跨版本对比。
+
+用法示例：
+    python benchmarks/install_pipeline_bench.py --patch-size-mb 256 --bandwidth-mbps 200 --latency-ms 30 --output bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psutil
+import py7zr
+import requests
+from PySide6.QtCore import QCoreApplication, QEventLoop
+
+from config.config import APP_VERSION, GAME_INFO, PLUGIN, PLUGIN_HASH, UA
+from core.managers.game_detector import GameDetector
+from utils import resource_path
+from workers.config_fetch_thread import ConfigFetchThread
+from workers.download import DownloadThread
+from workers.extraction_thread import ExtractionThread
+from workers.hash_thread import HashThread
+
+# 云端配置中各游戏对应的键和压缩包名称
+CONFIG_KEYS = {
+    "NEKOPARA Vol.1": ("vol.1.data", "vol.1.7z"),
+    "NEKOPARA Vol.2": ("vol.2.data", "vol.2.7z"),
+    "NEKOPARA Vol.3": ("vol.3.data", "vol.3.7z"),
+    "NEKOPARA Vol.4": ("vol.4.data", "vol.4.7z"),
+    "NEKOPARA After": ("after.data", "after.7z"),
+}
+
+
+class BandwidthLimiter:
+    """所有连接共享的令牌桶限速器，模拟CDN出口带宽"""
+
+    def __init__(self, bytes_per_second):
+        self.rate = bytes_per_second
+        self.lock = threading.Lock()
+        self.next_time = time.perf_counter()
+
+    def consume(self, size):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.perf_counter()
+            start = max(now, self.next_time)
+            self.next_time = start + size / self.rate
+            delay = self.next_time - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class FakeCDNHandler(BaseHTTPRequestHandler):
+    """模拟CDN请求处理器，支持HEAD和Range请求"""
+
+    root = ""
+    latency = 0.0
+    limiter = None
+    bytes_sent = 0
+    bytes_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _resolve(self):
+        path = os.path.normpath(os.path.join(self.root, self.path.split("?", 1)[0].lstrip("/")))
+        if not path.startswith(self.root) or not os.path.isfile(path):
+            self.send_error(404)
+            return None
+        return path
+
+    def _send_headers(self, path):
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        range_header = self.headers.get("Range")
+        if range_header and range_header.startswith("bytes="):
+            first, _, last = range_header[6:].split(",")[0].partition("-")
+            start = int(first) if first else max(0, size - int(last))
+            end = int(last) if first and last else size - 1
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        content_type = "application/json" if path.endswith(".json") else "application/octet-stream"
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        return start, end
+
+    def do_HEAD(self):
+        time.sleep(self.latency)
+        path = self._resolve()
+        if path:
+            self._send_headers(path)
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        path = self._resolve()
+        if not path:
+            return
+        start, end = self._send_headers(path)
+        remaining = end - start + 1
+        try:
+            with open(path, "rb") as f:
+                f.seek(start)
+                while remaining > 0:
+                    chunk = f.read(min(64 * 1024, remaining))
+                    if not chunk:
+                        break
+                    self.limiter.consume(len(chunk))
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+                    with FakeCDNHandler.bytes_lock:
+                        FakeCDNHandler.bytes_sent += len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class PeakRSSSampler:
+    """在后台线程中周期采样进程RSS，记录阶段内的峰值"""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = self.process.memory_info().rss
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+        return False
+
+
+class PipelineBenchmark:
+    """安装流程基准测试"""
+
+    def __init__(self, args):
+        self.args = args
+        self.work_dir = tempfile.mkdtemp(prefix="fraisemoe-bench-")
+        self.cdn_dir = os.path.join(self.work_dir, "cdn")
+        self.library_dir = os.path.join(self.work_dir, "library")
+        self.download_dir = os.path.join(self.work_dir, "downloads")
+        self.games = [g for g in GAME_INFO if not args.games or g in args.games]
+        self.stages = []
+        self.server = None
+        self.base_url = ""
+
+    def _run_thread(self, thread, signal):
+        """启动QThread并在事件循环中等待指定信号
+
+        Args:
+            thread: 要运行的线程
+            signal: 线程完成时发出的信号
+
+        Returns:
+            tuple: 信号参数
+        """
+        loop = QEventLoop()
+        result = []
+
+        def on_finished(*values):
+            result.extend(values)
+            loop.quit()
+
+        signal.connect(on_finished)
+        thread.start()
+        loop.exec()
+        thread.wait()
+        return tuple(result)
+
+    def _record(self, stage, game, started, sampler, bytes_moved, **extra):
+        entry = {
+            "stage": stage,
+            "game": game,
+            "wall_s": round(time.perf_counter() - started, 4),
+            "bytes": bytes_moved,
+            "peak_rss": sampler.peak,
+        }
+        entry.update(extra)
+        self.stages.append(entry)
+        print(f"[bench] {stage:<12} {game or '-':<16} {entry['wall_s']:>8.3f}s", file=sys.stderr)
+        return entry
+
+    def start_cdn(self):
+        """启动本地模拟CDN"""
+        FakeCDNHandler.root = os.path.abspath(self.cdn_dir)
+        FakeCDNHandler.latency = self.args.latency_ms / 1000.0
+        FakeCDNHandler.limiter = BandwidthLimiter(self.args.bandwidth_mbps * 1024 * 1024 / 8)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeCDNHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def build_fixtures(self):
+        """生成合成的补丁压缩包、云端配置和游戏库目录"""
+        os.makedirs(self.cdn_dir, exist_ok=True)
+        os.makedirs(self.download_dir, exist_ok=True)
+        config_data = {}
+        patch_size = self.args.patch_size_mb * 1024 * 1024
+
+        for game in self.games:
+            info = GAME_INFO[game]
+            game_dir = os.path.join(self.library_dir, info["install_path"].split("/")[0])
+            os.makedirs(game_dir, exist_ok=True)
+            with open(os.path.join(game_dir, info["exe"]), "wb") as f:
+                f.write(b"MZ")
+
+            # 随机数据不可压缩，与真实的xp3补丁接近
+            staging = os.path.join(self.work_dir, "staging", os.path.dirname(info["plugin_path"]))
+            os.makedirs(staging, exist_ok=True)
+            plugin_file = os.path.join(staging, os.path.basename(info["plugin_path"]))
+            hash_obj = hashlib.sha256()
+            with open(plugin_file, "wb") as f:
+                written = 0
+                while written < patch_size:
+                    chunk = os.urandom(min(16 * 1024 * 1024, patch_size - written))
+                    hash_obj.update(chunk)
+                    f.write(chunk)
+                    written += len(chunk)
+            # 基准测试使用合成补丁，需要以合成文件的哈希值作为预期值
+            PLUGIN_HASH[game] = hash_obj.hexdigest()
+
+            config_key, archive_name = CONFIG_KEYS[game]
+            with py7zr.SevenZipFile(os.path.join(self.cdn_dir, archive_name), "w") as archive:
+                archive.write(plugin_file, os.path.basename(plugin_file))
+                if "sig_path" in info:
+                    sig_file = plugin_file + ".sig"
+                    with open(sig_file, "wb") as f:
+                        f.write(os.urandom(256))
+                    archive.write(sig_file, os.path.basename(sig_file))
+            config_data[config_key] = {"url": f"{self.base_url}/{archive_name}"}
+
+        # ConfigFetchThread要求所有键都存在
+        for config_key, archive_name in CONFIG_KEYS.values():
+            config_data.setdefault(config_key, {"url": f"{self.base_url}/{archive_name}"})
+
+        with open(os.path.join(self.cdn_dir, "config.json"), "w", encoding="utf-8") as f:
+            json.dump(config_data, f, indent=4)
+
+    def _download(self, game, url, _7z_path):
+        """下载补丁，aria2c不可用时使用requests作为替代
+
+        Returns:
+            str: 实际使用的下载器
+        """
+        if os.path.exists(resource_path("aria2c-fast_x64.exe")) and not self.args.no_aria2c:
+            thread = DownloadThread(url, _7z_path, game)
+            success, error = self._run_thread(thread, thread.finished)
+            if not success:
+                raise RuntimeError(error)
+            return "aria2c"
+
+        with requests.get(url, headers={"User-Agent": UA}, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            with open(_7z_path, "wb") as f:
+                for chunk in response.iter_content(1024 * 1024):
+                    f.write(chunk)
+        return "requests"
+
+    def run(self):
+        """依次运行各阶段并返回报告"""
+        app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+        self.start_cdn()
+        self.build_fixtures()
+        total_start = time.perf_counter()
+
+        # 1. 云端配置获取
+        with PeakRSSSampler() as sampler:
+            started = time.perf_counter()
+            thread = ConfigFetchThread(f"{self.base_url}/config.json", {"User-Agent": UA})
+            config_data, error = self._run_thread(thread, thread.finished)
+            if error:
+                raise RuntimeError(f"配置获取失败: {error}")
+            self._record("config_fetch", None, started, sampler,
+                         os.path.getsize(os.path.join(self.cdn_dir, "config.json")))
+
+        # 2. 游戏目录识别
+        with PeakRSSSampler() as sampler:
+            started = time.perf_counter()
+            game_dirs = GameDetector(GAME_INFO).identify_game_directories_improved(self.library_dir)
+            self._record("game_detect", None, started, sampler, 0, found=len(game_dirs))
+
+        install_paths = {
+            game: os.path.join(game_dirs[game], os.path.basename(GAME_INFO[game]["install_path"]))
+            for game in self.games if game in game_dirs
+        }
+        installed_status = {game: False for game in GAME_INFO}
+
+        # 3. 安装前哈希预检查（此时补丁尚未安装）
+        with PeakRSSSampler() as sampler:
+            started = time.perf_counter()
+            thread = HashThread("pre", install_paths, PLUGIN_HASH, installed_status)
+            self._run_thread(thread, thread.pre_finished)
+            self._record("pre_hash", None, started, sampler, 0)
+
+        # 4/5. 逐个游戏下载并解压
+        for game in install_paths:
+            config_key, archive_name = CONFIG_KEYS[game]
+            _7z_path = os.path.join(self.download_dir, archive_name)
+
+            with PeakRSSSampler() as sampler:
+                FakeCDNHandler.bytes_sent = 0
+                started = time.perf_counter()
+                downloader = self._download(game, config_data[config_key]["url"], _7z_path)
+                self._record("download", game, started, sampler, FakeCDNHandler.bytes_sent, downloader=downloader)
+
+            with PeakRSSSampler() as sampler:
+                started = time.perf_counter()
+                plugin_path = os.path.join(PLUGIN, GAME_INFO[game]["plugin_path"])
+                thread = ExtractionThread(_7z_path, game_dirs[game], plugin_path, game)
+                success, error, _ = self._run_thread(thread, thread.finished)
+                if not success:
+                    raise RuntimeError(error)
+                self._record("extraction", game, started, sampler, os.path.getsize(install_paths[game]))
+
+        # 6. 安装后哈希校验
+        with PeakRSSSampler() as sampler:
+            started = time.perf_counter()
+            thread = HashThread("after", install_paths, PLUGIN_HASH, installed_status)
+            (result,) = self._run_thread(thread, thread.after_finished)
+            hashed = sum(os.path.getsize(p) for p in install_paths.values())
+            self._record("after_hash", None, started, sampler, hashed, passed=result["passed"])
+
+        self.server.shutdown()
+        app.processEvents()
+
+        return {
+            "app_version": APP_VERSION,
+            "platform": sys.platform,
+            "params": {
+                "games": list(install_paths),
+                "patch_size_mb": self.args.patch_size_mb,
+                "bandwidth_mbps": self.args.bandwidth_mbps,
+                "latency_ms": self.args.latency_ms,
+            },
+            "total_wall_s": round(time.perf_counter() - total_start, 4),
+            "peak_rss": max(stage["peak_rss"] for stage in self.stages),
+            "stages": self.stages,
+        }
+
+    def cleanup(self):
+        if not self.args.keep:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="安装流程端到端基准测试")
+    parser.add_argument("--games", nargs="*", help="参与测试的游戏版本，默认全部")
+    parser.add_argument("--patch-size-mb", type=int, default=64, help="每个合成补丁的大小（MB）")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0, help="模拟CDN带宽（Mbps），0表示不限速")
+    parser.add_argument("--latency-ms", type=float, default=0, help="模拟CDN每个请求的延迟（毫秒）")
+    parser.add_argument("--no-aria2c", action="store_true", help="不使用aria2c，改用requests下载")
+    parser.add_argument("--output", help="报告输出路径，默认输出到标准输出")
+    parser.add_argument("--keep", action="store_true", help="保留临时工作目录")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    benchmark = PipelineBenchmark(args)
+    try:
+        report = benchmark.run()
+    finally:
+        benchmark.cleanup()
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+启动导入耗时基准测试
+
+在子进程中以 python -X importtime 导入主窗口模块（QT_QPA_PLATFORM=offscreen），
+解析标准错误中的"import time:"记录，以JSON格式输出总导入耗时以及自身耗时、
+累计耗时最高的模块，便于对比冷启动时首帧之前的导入开销。
+多次运行取总耗时的中位数，以减小磁盘缓存和系统负载带来的波动。
+
+用法示例：
+    python benchmarks/startup_importtime.py --module main_window --runs 5 --top 20 --output startup.json
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 启动时不应被导入的重量级第三方模块
+HEAVY_MODULES = ("py7zr", "requests", "psutil")
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 的输出
+
+    Args:
+        stderr: 子进程的标准错误输出
+
+    Returns:
+        list: 每个模块的记录，包含module、self_us、cumulative_us和depth
+    """
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            # 表头行
+            continue
+        name = parts[2].rstrip()
+        module = name.lstrip()
+        records.append({
+            "module": module,
+            "self_us": self_us,
+            "cumulative_us": cumulative_us,
+            "depth": (len(name) - len(module)) // 2,
+        })
+    return records
+
+
+def run_once(module):
+    """在新的解释器中导入指定模块一次
+
+    Args:
+        module: 要导入的模块名
+
+    Returns:
+        tuple: (导入记录列表, 子进程墙钟耗时秒数)
+    """
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    code = (
+        "import time; _t = time.perf_counter(); "
+        f"import {module}; "
+        "print(time.perf_counter() - _t)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=SOURCE_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        tail = "\n".join(result.stderr.splitlines()[-20:])
+        raise RuntimeError(f"导入 {module} 失败:\n{tail}")
+    return parse_importtime(result.stderr), float(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(records, top):
+    """汇总一次运行的导入记录
+
+    Args:
+        records: 导入记录列表
+        top: 输出耗时最高的模块数
+
+    Returns:
+        dict: 汇总结果
+    """
+    loaded = {record["module"] for record in records}
+    by_self = sorted(records, key=lambda r: r["self_us"], reverse=True)[:top]
+    by_cumulative = sorted(
+        (r for r in records if r["depth"] == 0), key=lambda r: r["cumulative_us"], reverse=True
+    )[:top]
+    return {
+        "total_self_ms": round(sum(r["self_us"] for r in records) / 1000, 2),
+        "module_count": len(records),
+        "heavy_modules_loaded": [m for m in HEAVY_MODULES if m in loaded],
+        "top_self": [{"module": r["module"], "ms": round(r["self_us"] / 1000, 2)} for r in by_self],
+        "top_cumulative": [{"module": r["module"], "ms": round(r["cumulative_us"] / 1000, 2)} for r in by_cumulative],
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="启动导入耗时基准测试")
+    parser.add_argument("--module", default="main_window", help="要导入的模块，默认main_window")
+    parser.add_argument("--runs", type=int, default=3, help="运行次数，取总耗时中位数的那次作为报告")
+    parser.add_argument("--top", type=int, default=15, help="输出耗时最高的模块数")
+    parser.add_argument("--output", help="报告输出路径，默认输出到标准输出")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    runs = []
+    for index in range(max(1, args.runs)):
+        records, wall_s = run_once(args.module)
+        summary = summarize(records, args.top)
+        summary["wall_s"] = round(wall_s, 4)
+        runs.append(summary)
+        print(f"[bench] run {index + 1}: {summary['total_self_ms']:.1f} ms, {summary['module_count']} modules",
+              file=sys.stderr)
+
+    runs.sort(key=lambda run: run["total_self_ms"])
+    report = {
+        "module": args.module,
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "runs": len(runs),
+        "median_total_self_ms": statistics.median(run["total_self_ms"] for run in runs),
+        "median_wall_s": statistics.median(run["wall_s"] for run in runs),
+        "median_run": runs[len(runs) // 2],
+    }
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -64,6 +64,7 @@ APP_VERSION = app_data["APP_VERSION"]  # 从app_data中获取，不再重复定
 TEMP = os.getenv(app_data["TEMP"]) or app_data["TEMP"]
 CACHE = os.path.join(TEMP, app_data["CACHE"])
 CONFIG_FILE = os.path.join(CACHE, "config.json")
+CONFIG_SAVE_DEBOUNCE = 0.5  # 配置修改后延迟写入磁盘的时间（秒），期间的多次修改合并为一次写入
 
 # 日志配置
 LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "log")
@@ -73,6 +74,12 @@ LOG_LEVEL = "DEBUG"  # 可选值: DEBUG, INFO, WARNING, ERROR, CRITICAL
 LOG_MAX_SIZE = 10 * 1024 * 1024  # 10MB
 LOG_BACKUP_COUNT = 3  # 保留3个备份文件
 LOG_RETENTION_DAYS = 7  # 日志保留7天
+LOG_MAX_TOTAL_SIZE = 50 * 1024 * 1024  # 历史日志（压缩后）总大小上限50MB，超出时从最旧的开始删除
+
+# 异步日志配置：所有logger经由有界队列交给唯一的写入线程
+LOG_QUEUE_SIZE = 10000  # 日志队列容量，队列满时丢弃DEBUG/INFO日志，WARNING及以上挤出最旧的记录
+LOG_FLUSH_INTERVAL = 1.0  # 日志文件最长刷新间隔（秒）
+LOG_FLUSH_BATCH = 200  # 累计写入多少条日志后立即刷新
 
 # 将log文件放在程序根目录下的log文件夹中，使用日期+时间戳格式命名
 root_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
@@ -81,6 +88,10 @@ os.makedirs(log_dir, exist_ok=True)
 current_datetime = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
 LOG_FILE = os.path.join(log_dir, f"log-{current_datetime}.txt")
 
+# 安装流程各阶段的计时记录（JSONL），可通过调试菜单导出为Chrome trace / Perfetto格式
+TRACE_ENABLED = True
+TRACE_FILE = os.path.join(log_dir, f"log-{current_datetime}.trace.jsonl")
+
 PLUGIN = os.path.join(CACHE, app_data["PLUGIN"])
 CONFIG_URL = decode_base64(app_data["CONFIG_URL"])
 UA = app_data["UA_TEMPLATE"].format(APP_VERSION)
@@ -110,4 +121,110 @@ DOWNLOAD_THREADS = {
 }
 
 # 默认下载线程档位
-DEFAULT_DOWNLOAD_THREAD_LEVEL = "high"
\ No newline at end of file
+DEFAULT_DOWNLOAD_THREAD_LEVEL = "high"
+
+# 文件预分配模式（对应aria2c的--file-allocation参数）
+FILE_ALLOCATION_MODES = {
+    "none": "不预分配（启动最快）",
+    "prealloc": "完整预分配（写入零填充，适合机械硬盘）",
+    "falloc": "快速预分配（需NTFS/ext4等文件系统支持）"
+}
+
+# 默认文件预分配模式
+DEFAULT_FILE_ALLOCATION = "none"
+
+# 磁盘空间预检设置
+DISK_SPACE_SAFETY_MARGIN = 512 * 1024 * 1024  # 每个磁盘卷额外预留512MB
+EXTRACT_SIZE_RATIO = 1.1  # 无法读取压缩包目录时，按压缩包大小估算解压后大小的倍数
+EXTRACT_DIRECT_TO_TARGET = True  # 直接解压到游戏目录中的.partial文件再重命名，不经过系统临时目录
+EXTRACT_BACKEND = "auto"  # 解压后端: auto（有7-Zip时使用7-Zip，否则使用py7zr）、7z、py7zr
+EXTRACT_7Z_PATH = ""  # 7-Zip命令行程序路径，为空时在PATH和默认安装目录中查找7zz/7z/7za
+EXTRACT_THREADS = 0  # 7-Zip解压线程数（-mmt），0表示按CPU核心数自动决定
+ARCHIVE_INDEX_CACHE_SIZE = 16  # 内存中缓存的压缩包目录索引个数（按路径、大小和修改时间区分）
+DELTA_MAX_BASE_SIZE = 2 * 1024 * 1024 * 1024  # zstd增量补丁的基准文件大小上限，基准文件需整体载入内存作为字典，超出时改为下载完整补丁
+
+# 离线安装并发设置
+OFFLINE_VERIFY_WORKERS = 3  # 安装前并行校验离线补丁压缩包完整性的最大线程数
+OFFLINE_INSTALL_WORKERS = 2  # 同时解压安装的游戏数上限（CPU预算），为1时按原流程逐个安装
+OFFLINE_INSTALL_PER_DISK = 2  # 同一磁盘卷上同时解压安装的游戏数上限（磁盘预算），机械硬盘建议设为1
+
+# Cloudflare IP优选探测设置
+CF_PROBE_CONCURRENCY = 128  # 同时进行的探测连接数
+CF_PROBE_TIMEOUT = 1.0  # 单次TCP连接/TLS握手超时（秒）
+CF_PROBE_ATTEMPTS = 3  # 每个候选IP的探测次数
+CF_PROBE_SAMPLES_PER_RANGE = 4  # 首轮每个CIDR段随机抽取的候选IP数量，之后每轮加倍
+CF_PROBE_BUDGET = 600  # 分阶段搜索的总探测次数预算（含复测）
+CF_PROBE_FINALISTS = 10  # 进入复测的候选IP数量
+CF_PROBE_FINAL_ATTEMPTS = 5  # 复测时每个候选IP的探测次数
+
+# IP优选结果缓存设置
+IP_CACHE_FILE = os.path.join(CACHE, "ip_cache.json")
+IP_CACHE_TTL = 24 * 60 * 60  # 缓存有效期（秒）
+IP_CACHE_RUNNERS_UP = 2  # 除最优IP外额外缓存的备选IP数量
+IP_CACHE_DEGRADE_FACTOR = 1.5  # 复测中位延迟超过缓存值的倍数时视为劣化
+IP_CACHE_MAX_LOSS = 0.34  # 复测丢包率超过该值时视为劣化
+IP_CACHE_USE_PUBLIC_PREFIX = False  # 网络指纹是否包含公网出口网段（需要一次网络请求，每次启动每个本机网段只查询一次）
+CF_THROUGHPUT_CANDIDATES = 3  # 延迟最低的前几个IP参与下载测速
+CF_THROUGHPUT_BYTES = 8 * 1024 * 1024  # 每个IP下载测速的最大字节数（Range请求）
+CF_THROUGHPUT_TIME_BUDGET = 15.0  # 下载测速总时间预算（秒）
+
+# 多IP分段下载设置
+SEGMENT_DOWNLOAD_IPS = 3  # 分段下载时同时使用的优选IP数量（不足2个时回退为aria2c单IP下载）
+SEGMENT_SIZE = 8 * 1024 * 1024  # 每个下载分段的大小
+SEGMENT_CONNECTIONS_PER_IP = 8  # 每个IP的并发连接数
+SEGMENT_TIMEOUT = 15  # 分段请求的连接/读取超时（秒）
+SEGMENT_IP_MAX_FAILURES = 3  # 单个IP连续失败次数达到该值时停止使用
+SEGMENT_IP_SLOW_RATIO = 0.2  # IP速度低于其他IP中位速度的该比例时视为劣化
+
+# 优选IP的固定方式
+PINNING_MODES = {
+    "dns": "本地DNS解析（无需修改hosts，推荐）",
+    "hosts": "修改系统hosts文件（需要管理员权限）"
+}
+
+# 默认优选IP固定方式
+DEFAULT_PINNING_MODE = "dns"
+
+# 本地DNS解析器设置（aria2c通过--async-dns-server使用）
+DNS_STUB_ADDRESS = "127.84.77.53"  # 使用不常见的回环地址，避免与系统或其他软件的DNS服务冲突
+DNS_STUB_TTL = 60  # 固定记录的TTL（秒）
+DNS_STUB_WORKERS = 4  # 通过系统解析器处理未固定域名查询的线程数
+DNS_STUB_MAX_PENDING = 64  # 等待系统解析的查询数上限，超出时直接返回SERVFAIL
+
+# IP优选提前结束与地址族竞速设置
+CF_GOOD_ENOUGH_RTT_MS = 100  # 探测到中位延迟不高于该值的IP时提前结束搜索（毫秒，0表示不提前结束）
+HAPPY_EYEBALLS_DELAY_MS = 3000  # 一个地址族先得到结果后，等待另一个地址族的最长时间（毫秒）
+
+# 网络连通性检测设置
+CONNECTIVITY_TTL = 10 * 60  # 检测结果的有效期（秒）
+CONNECTIVITY_TIMEOUT = 5  # 单项检测的超时时间（秒）
+CONNECTIVITY_WATCH_INTERVAL = 30  # 检查网络环境是否变化的间隔（秒）
+IPV4_TEST_ENDPOINTS = [("223.5.5.5", 443), ("1.1.1.1", 443)]  # IPv4连通性检测的TCP端点
+IPV6_TEST_URL = "https://ipv6.testipv6.cn/images-nc/knob_green.png?&testdomain=www.test-ipv6.com&testname=sites"
+IPV6_ADDRESS_URL = "https://6.ipw.cn"  # 获取公网IPv6地址（该域名只有AAAA记录）
+
+# 启动任务设置
+STARTUP_WORKERS = 4  # 并行执行启动任务（进程检查、离线补丁扫描、hosts备份等）的最大线程数
+
+# 界面图片缓存设置
+ASSET_CACHE_DIR = os.path.join(CACHE, "assets")  # 按显示尺寸预缩放的图片缓存目录
+ASSET_MEMORY_CACHE_SIZE = 64 * 1024 * 1024  # 内存中已解码图片的最大总大小（字节）
+
+# 界面卡顿检测设置（仅调试模式）
+STALL_HEARTBEAT_INTERVAL = 50  # 心跳定时器间隔（毫秒），用于测量事件循环延迟
+STALL_THRESHOLD = 250  # 事件循环超过该时长（毫秒）未响应时记录主线程调用栈
+STALL_SAMPLE_INTERVAL = 1000  # 卡顿持续期间再次采样调用栈的间隔（毫秒）
+STALL_REPORT_INTERVAL = 5 * 60  # 输出延迟分布和卡顿排行的间隔（秒）
+
+# 调试菜单中的性能分析设置
+PROFILE_SAMPLE_INTERVAL = 0.005  # 采样间隔（秒），每次采样记录所有线程的Python调用栈
+PROFILE_MAX_DURATION = 30 * 60  # 单次分析的最长时间（秒），超时后自动停止并写出结果
+PROFILE_TARGETS = ("install", "game_detect", "hash_pre", "hash_after")  # 可被分析的阶段（安装、目录识别、校验）
+
+# 内存统计设置（默认关闭，可在Debug菜单中开启）
+MEMORY_PROFILE_ENABLED = False  # 为True时每次启动都开启内存统计
+MEMORY_STAGES = ("hash_pre", "hash_after", "hash_file", "hash_offline", "extract")  # 统计内存的阶段
+MEMORY_SAMPLE_INTERVAL = 0.1  # 采样间隔（秒），记录Python分配峰值和进程RSS
+MEMORY_SNAPSHOT_STEP = 16 * 1024 * 1024  # Python分配比上次快照增长超过该值（字节）时重新抓取分配快照
+MEMORY_TRACE_FRAMES = 1  # tracemalloc为每次分配记录的调用栈深度
+MEMORY_TOP_SITES = 10  # 每个阶段输出的分配位置条数
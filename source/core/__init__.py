@@ -1,16 +1,21 @@
-from .managers.ui_manager import UIManager
-from .managers.download_managers import DownloadManager
-from .managers.debug_manager import DebugManager
-from .managers.window_manager import WindowManager
-from .managers.game_detector import GameDetector
-from .managers.patch_manager import PatchManager
-from .managers.config_manager import ConfigManager
-from .managers.privacy_manager import PrivacyManager
-from .managers.cloudflare_optimizer import CloudflareOptimizer
-from .managers.download_managers import DownloadTaskManager
-from .managers.patch_detector import PatchDetector
-from .managers.animations import MultiStageAnimations
-from .handlers.extraction_handler import ExtractionHandler
+# 按需导入：访问某个名称时才加载对应模块，启动时不会连带导入全部子模块及其第三方依赖
+import importlib
+
+_EXPORTS = {
+    'MultiStageAnimations': '.managers.animations',
+    'UIManager': '.managers.ui_manager',
+    'DownloadManager': '.managers.download_managers',
+    'DebugManager': '.managers.debug_manager',
+    'WindowManager': '.managers.window_manager',
+    'GameDetector': '.managers.game_detector',
+    'PatchManager': '.managers.patch_manager',
+    'ConfigManager': '.managers.config_manager',
+    'PrivacyManager': '.managers.privacy_manager',
+    'CloudflareOptimizer': '.managers.cloudflare_optimizer',
+    'DownloadTaskManager': '.managers.download_managers',
+    'PatchDetector': '.managers.patch_detector',
+    'ExtractionHandler': '.handlers.extraction_handler',
+}
 
 __all__ = [
     'MultiStageAnimations',
@@ -25,4 +30,14 @@ __all__ = [
     'CloudflareOptimizer',
     'DownloadTaskManager',
     'PatchDetector',
-] 
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    # 首次访问时才导入对应模块，之后缓存在包的命名空间中
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
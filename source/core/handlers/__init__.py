@@ -1,10 +1,25 @@
 # Handlers package initialization
-from .extraction_handler import ExtractionHandler
-from .patch_toggle_handler import PatchToggleHandler
-from .uninstall_handler import UninstallHandler
+# 按需导入：访问某个名称时才加载对应模块，启动时不会连带导入全部子模块及其第三方依赖
+import importlib
+
+_EXPORTS = {
+    'ExtractionHandler': '.extraction_handler',
+    'PatchToggleHandler': '.patch_toggle_handler',
+    'UninstallHandler': '.uninstall_handler',
+}
 
 __all__ = [
     'ExtractionHandler',
     'PatchToggleHandler',
     'UninstallHandler',
-] 
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    # 首次访问时才导入对应模块，之后缓存在包的命名空间中
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
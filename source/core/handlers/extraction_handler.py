@@ -6,6 +6,7 @@ from PySide6.QtCore import QTimer, QCoreApplication
 
 from utils.logger import setup_logger
 from workers.extraction_thread import ExtractionThread
+from workers.delta_patch_thread import DeltaPatchThread
 
 # 初始化logger
 logger = setup_logger("extraction_handler")
@@ -59,6 +60,53 @@ class ExtractionHandler:
         # 启动线程
         self.main_window.extraction_thread.start()
         
+    def start_delta_patch(self, delta_path, game_folder, plugin_path, game_version, delta_task):
+        """开始应用增量补丁，完成后与普通解压共用哈希校验流程
+        
+        Args:
+            delta_path: 已下载的增量文件路径
+            game_folder: 游戏文件夹路径
+            plugin_path: 插件路径
+            game_version: 游戏版本名称
+            delta_task: 增量任务信息，包含format和to（目标哈希值）
+        """
+        from config.config import GAME_INFO
+        
+        self.extraction_progress_window = self.main_window.create_extraction_progress_window()
+        self.extraction_progress_window.show()
+        
+        # 确保UI更新
+        QCoreApplication.processEvents()
+        
+        installed_file = os.path.join(game_folder, os.path.basename(GAME_INFO[game_version]["install_path"]))
+        
+        # 复用extraction_thread引用，便于退出时统一停止线程
+        self.main_window.extraction_thread = DeltaPatchThread(
+            delta_path, installed_file, delta_task["format"], delta_task["to"], game_version, self.main_window
+        )
+        self.main_window.extraction_thread.progress.connect(self.update_extraction_progress)
+        self.main_window.extraction_thread.finished.connect(self._on_delta_patch_finished)
+        self.main_window.extraction_thread.start()
+        
+    def _on_delta_patch_finished(self, success, error_message, game_version):
+        """增量补丁应用完成后的回调，失败时回退为完整下载
+        
+        Args:
+            success: 是否应用成功
+            error_message: 错误信息
+            game_version: 游戏版本
+        """
+        if success:
+            self.on_extraction_finished_with_hash_check(True, "", game_version)
+            return
+        
+        if self.extraction_progress_window:
+            self.extraction_progress_window.close()
+            self.extraction_progress_window = None
+        
+        logger.warning(f"{game_version} 增量补丁应用失败，回退为完整下载: {error_message.strip()}")
+        self.main_window.download_manager.fallback_to_full_download(game_version)
+        
     def update_extraction_progress(self, progress, status_text):
         """更新解压进度
         
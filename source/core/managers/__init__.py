@@ -1,16 +1,21 @@
 # Managers package initialization
-from .ui_manager import UIManager
-from .download_managers import DownloadManager
-from .debug_manager import DebugManager
-from .window_manager import WindowManager
-from .game_detector import GameDetector
-from .patch_manager import PatchManager
-from .config_manager import ConfigManager
-from .privacy_manager import PrivacyManager
-from .cloudflare_optimizer import CloudflareOptimizer
-from .download_managers import DownloadTaskManager
-from .patch_detector import PatchDetector
-from .animations import MultiStageAnimations
+# 按需导入：访问某个名称时才加载对应模块，启动时不会连带导入全部子模块及其第三方依赖
+import importlib
+
+_EXPORTS = {
+    'UIManager': '.ui_manager',
+    'DownloadManager': '.download_managers',
+    'DebugManager': '.debug_manager',
+    'WindowManager': '.window_manager',
+    'GameDetector': '.game_detector',
+    'PatchManager': '.patch_manager',
+    'ConfigManager': '.config_manager',
+    'PrivacyManager': '.privacy_manager',
+    'CloudflareOptimizer': '.cloudflare_optimizer',
+    'DownloadTaskManager': '.download_managers',
+    'PatchDetector': '.patch_detector',
+    'MultiStageAnimations': '.animations',
+}
 
 __all__ = [
     'UIManager',
@@ -25,4 +30,14 @@ __all__ = [
     'DownloadTaskManager',
     'PatchDetector',
     'MultiStageAnimations',
-] 
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    # 首次访问时才导入对应模块，之后缓存在包的命名空间中
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
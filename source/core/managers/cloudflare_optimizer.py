@@ -1,12 +1,14 @@
 import os
 from urllib.parse import urlparse
 from PySide6 import QtWidgets
+import math
 from PySide6.QtCore import Qt, QTimer
-from PySide6.QtGui import QIcon, QPixmap
 
-from utils import msgbox_frame, resource_path
+from config.config import SEGMENT_DOWNLOAD_IPS, CF_GOOD_ENOUGH_RTT_MS, HAPPY_EYEBALLS_DELAY_MS
+from utils import msgbox_frame, get_asset_service
 from workers import IpOptimizerThread
 from utils.logger import setup_logger
+from utils.tracing import start_span
 
 # 初始化logger
 logger = setup_logger("cloudflare_optimizer")
@@ -15,15 +17,17 @@ logger = setup_logger("cloudflare_optimizer")
 class CloudflareOptimizer:
     """Cloudflare IP优化器，负责处理IP优化和Cloudflare加速相关功能"""
     
-    def __init__(self, main_window, hosts_manager):
+    def __init__(self, main_window, hosts_manager, dns_resolver=None):
         """初始化Cloudflare优化器
         
         Args:
             main_window: 主窗口实例，用于访问UI和状态
             hosts_manager: Hosts文件管理器实例
+            dns_resolver: 本地DNS解析器实例，为None时只能通过hosts文件固定IP
         """
         self.main_window = main_window
         self.hosts_manager = hosts_manager
+        self.dns_resolver = dns_resolver
         self.optimized_ip = None
         self.optimized_ipv6 = None
         self.optimization_done = False  # 标记是否已执行过优选
@@ -33,6 +37,15 @@ class CloudflareOptimizer:
         self.ip_optimizer_thread = None
         self.ipv6_optimizer_thread = None
         self.has_optimized_in_session = False  # 本次启动是否已执行过优选
+        self.candidate_ips = []  # 供多IP分段下载使用的优选IP列表
+        self.candidate_hostname = None
+        self.pending_families = set()  # 尚未结束优选的地址族
+        self.race_decided = False  # 地址族竞速是否已有结果
+        self.preferred_family = None  # 竞速胜出的地址族，另一地址族的结果保留为备用
+        self.race_timer = None
+        self.optimizing_text = ""
+        self.best_candidates = {}  # 搜索过程中各地址族当前最优的IP和延迟
+        self.optimization_span = None  # 本次优选的计时记录
         
     def is_optimization_done(self):
         """检查是否已完成优化
@@ -66,6 +79,58 @@ class CloudflareOptimizer:
         """
         return self.optimized_ipv6
 
+    def get_candidate_ips(self, hostname):
+        """获取供多IP分段下载使用的优选IP列表
+
+        Args:
+            hostname: 下载地址的域名
+
+        Returns:
+            list: 优选IP列表，未对该域名执行过优选时为空
+        """
+        if not hostname or hostname != self.candidate_hostname:
+            return []
+        return list(self.candidate_ips)
+
+    def _collect_candidate_ips(self, hostname):
+        """从各地址族的优选结果中收集前几名IP，两个地址族都有结果时交替排列，胜出的地址族在前"""
+        threads = [
+            ("IPv4", self.ip_optimizer_thread if self.optimized_ip else None),
+            ("IPv6", self.ipv6_optimizer_thread if self.optimized_ipv6 else None),
+        ]
+        threads.sort(key=lambda item: item[0] != self.preferred_family)
+        families = []
+        for _, thread in threads:
+            if thread is not None:
+                families.append([stats.ip for stats in thread.optimizer.last_results[:SEGMENT_DOWNLOAD_IPS]])
+
+        ips = []
+        for index in range(SEGMENT_DOWNLOAD_IPS):
+            ips.extend(family[index] for family in families if index < len(family))
+
+        self.candidate_ips = ips[:SEGMENT_DOWNLOAD_IPS]
+        self.candidate_hostname = hostname
+        logger.info(f"多IP分段下载候选: {self.candidate_ips}")
+
+    def _pin_with_dns(self, hostname, ips):
+        """通过本地DNS解析器固定优选IP
+
+        Args:
+            hostname: 下载域名
+            ips: 优选IP列表
+
+        Returns:
+            bool: 是否固定成功，失败时应回退为修改hosts文件
+        """
+        download_manager = getattr(self.main_window, 'download_manager', None)
+        if self.dns_resolver is None or download_manager is None or download_manager.get_pinning_mode() != "dns":
+            return False
+        if not self.dns_resolver.start():
+            logger.warning("本地DNS解析器启动失败，改为修改hosts文件固定优选IP")
+            return False
+        self.dns_resolver.pin(hostname, ips)
+        return True
+
     def start_ip_optimization(self, url):
         """开始IP优化过程
         
@@ -108,15 +173,13 @@ class CloudflareOptimizer:
         if use_ipv6:
             ipv6_warning = QtWidgets.QMessageBox(self.main_window)
             ipv6_warning.setWindowTitle(f"IPv6优选警告 - {self.main_window.APP_NAME}")
-            ipv6_warning.setText("\nIPv6优选比IPv4耗时更长且感知不强（预计耗时10分钟以上），不建议使用。\n\n确定要同时执行IPv6优选吗？\n")
+            ipv6_warning.setText("\nIPv6优选比IPv4耗时更长且感知不强，不建议使用。\n\n确定要同时执行IPv6优选吗？\n")
             ipv6_warning.setIcon(QtWidgets.QMessageBox.Icon.Warning)
             
             # 设置图标
-            icon_path = resource_path(os.path.join("assets", "images", "ICO", "icon.png"))
-            if os.path.exists(icon_path):
-                pixmap = QPixmap(icon_path)
-                if not pixmap.isNull():
-                    ipv6_warning.setWindowIcon(QIcon(pixmap))
+            icon = get_asset_service().icon(os.path.join("assets", "images", "ICO", "icon.png"))
+            if not icon.isNull():
+                ipv6_warning.setWindowIcon(icon)
             
             yes_button = ipv6_warning.addButton("是", QtWidgets.QMessageBox.ButtonRole.YesRole)
             no_button = ipv6_warning.addButton("否，仅使用IPv4", QtWidgets.QMessageBox.ButtonRole.NoRole)
@@ -137,44 +200,59 @@ class CloudflareOptimizer:
                 if hasattr(self.main_window, 'config'):
                     self.main_window.config["ipv6_enabled"] = False
         
+        # 初始化地址族竞速状态
+        self.pending_families = {"IPv4", "IPv6"} if use_ipv6 else {"IPv4"}
+        self.race_decided = False
+        self.preferred_family = None
+        self.best_candidates = {}
+        self.optimized_ip = None
+        self.optimized_ipv6 = None
+
         # 准备提示信息
         optimization_msg = "\n正在优选Cloudflare IP，请稍候...\n\n"
         if use_ipv6:
-            optimization_msg += "已启用IPv6支持，同时进行IPv4和IPv6优选。\n这可能需要10分钟以上，请耐心等待喵~\n"
+            optimization_msg += "已启用IPv6支持，同时进行IPv4和IPv6优选。\n这可能需要1-2分钟，请耐心等待喵~\n"
         else:
-            optimization_msg += "这可能需要5-10分钟，请耐心等待喵~\n"
+            optimization_msg += "这通常只需要不到1分钟，请耐心等待喵~\n"
             
         # 使用Cloudflare图标创建消息框
+        self.optimizing_text = optimization_msg
         self.optimizing_msg_box = msgbox_frame(
             f"通知 - {self.main_window.APP_NAME}",
             optimization_msg
         )
         # 设置Cloudflare图标
-        cf_icon_path = resource_path("assets/images/ICO/cloudflare_logo_icon.ico")
-        if os.path.exists(cf_icon_path):
-            cf_pixmap = QPixmap(cf_icon_path)
-            if not cf_pixmap.isNull():
-                self.optimizing_msg_box.setWindowIcon(QIcon(cf_pixmap))
-                self.optimizing_msg_box.setIconPixmap(cf_pixmap.scaled(64, 64, Qt.AspectRatioMode.KeepAspectRatio, 
-                                                             Qt.TransformationMode.SmoothTransformation))
+        get_asset_service().apply_dialog_icon(self.optimizing_msg_box, "assets/images/ICO/cloudflare_logo_icon.ico")
         
         # 添加取消按钮
         self.optimizing_msg_box.setStandardButtons(QtWidgets.QMessageBox.StandardButton.Cancel)
         self.optimizing_msg_box.buttonClicked.connect(self._on_optimization_dialog_clicked)
         self.optimizing_msg_box.setWindowModality(Qt.WindowModality.ApplicationModal)
         
+        # 延迟达到该阈值的IP出现后提前结束搜索
+        good_enough_ms = CF_GOOD_ENOUGH_RTT_MS
+        if hasattr(self.main_window, 'config'):
+            good_enough_ms = self.main_window.config.get("good_enough_rtt_ms", CF_GOOD_ENOUGH_RTT_MS)
+
         # 创建并启动优化线程
-        self.ip_optimizer_thread = IpOptimizerThread(url)
+        self.ip_optimizer_thread = IpOptimizerThread(url, good_enough_ms=good_enough_ms)
         self.ip_optimizer_thread.finished.connect(self.on_ipv4_optimization_finished)
+        self.ip_optimizer_thread.candidate_found.connect(
+            lambda ip, median: self._on_candidate_found("IPv4", ip, median)
+        )
         
         # 如果启用IPv6，同时启动IPv6优化线程
         if use_ipv6:
             logger.info("IPv6已启用，将同时优选IPv6地址")
-            self.ipv6_optimizer_thread = IpOptimizerThread(url, use_ipv6=True)
+            self.ipv6_optimizer_thread = IpOptimizerThread(url, use_ipv6=True, good_enough_ms=good_enough_ms)
             self.ipv6_optimizer_thread.finished.connect(self.on_ipv6_optimization_finished)
+            self.ipv6_optimizer_thread.candidate_found.connect(
+                lambda ip, median: self._on_candidate_found("IPv6", ip, median)
+            )
             self.ipv6_optimizer_thread.start()
             
         # 启动IPv4优化线程
+        self.optimization_span = start_span("ip_optimization", families=sorted(self.pending_families))
         self.ip_optimizer_thread.start()
         
         # 显示消息框（非模态，不阻塞）
@@ -189,6 +267,7 @@ class CloudflareOptimizer:
         if button.text() == "Cancel":  # 如果是取消按钮
             # 标记已取消
             self.optimization_cancelled = True
+            self._end_optimization_span(cancelled=True)
             
             # 停止优化线程
             if hasattr(self, 'ip_optimizer_thread') and self.ip_optimizer_thread and self.ip_optimizer_thread.isRunning():
@@ -209,36 +288,28 @@ class CloudflareOptimizer:
                 "\n已取消IP优选和安装过程。\n"
             )
             
+    def _on_candidate_found(self, family, ip, median):
+        """搜索过程中当前最优IP刷新时，在提示框中显示
+
+        Args:
+            family: 地址族名称
+            ip: 当前最优IP
+            median: 中位延迟（毫秒）
+        """
+        if self.race_decided or not self.optimizing_msg_box:
+            return
+        self.best_candidates[family] = (ip, median)
+        lines = [f"当前最优 {name}: {best_ip} ({best_median:.0f}ms)"
+                 for name, (best_ip, best_median) in sorted(self.best_candidates.items())]
+        self.optimizing_msg_box.setText(self.optimizing_text + "\n" + "\n".join(lines) + "\n")
+
     def on_ipv4_optimization_finished(self, ip):
         """IPv4优化完成后的处理
         
         Args:
             ip: 优选的IP地址，如果失败则为空字符串
         """
-        # 如果已经取消，则不继续处理
-        if hasattr(self, 'optimization_cancelled') and self.optimization_cancelled:
-            return
-            
-        self.optimized_ip = ip
-        logger.info(f"IPv4优选完成，结果: {ip if ip else '未找到合适的IP'}")
-        
-        # 检查是否还有IPv6优化正在运行
-        if hasattr(self, 'ipv6_optimizer_thread') and self.ipv6_optimizer_thread and self.ipv6_optimizer_thread.isRunning():
-            logger.info("等待IPv6优选完成...")
-            return
-        
-        # 所有优选都已完成，继续处理
-        self.optimization_done = True
-        self.countdown_finished = False  # 确保倒计时标志重置
-        
-        # 关闭提示框
-        if hasattr(self, 'optimizing_msg_box') and self.optimizing_msg_box:
-            if self.optimizing_msg_box.isVisible():
-                self.optimizing_msg_box.accept()
-            self.optimizing_msg_box = None
-        
-        # 处理优选结果
-        self._process_optimization_results()
+        self._on_family_finished("IPv4", ip)
             
     def on_ipv6_optimization_finished(self, ipv6):
         """IPv6优化完成后的处理
@@ -246,18 +317,89 @@ class CloudflareOptimizer:
         Args:
             ipv6: 优选的IPv6地址，如果失败则为空字符串
         """
-        # 如果已经取消，则不继续处理
-        if hasattr(self, 'optimization_cancelled') and self.optimization_cancelled:
+        self._on_family_finished("IPv6", ipv6)
+
+    def _on_family_finished(self, family, ip):
+        """某个地址族优选结束后的处理（happy eyeballs式竞速）
+
+        先得到可用IP的地址族最多再等待另一个地址族HAPPY_EYEBALLS_DELAY_MS毫秒，
+        避免IPv4已经可用时还要等待较慢的IPv6搜索。
+
+        Args:
+            family: 地址族名称（IPv4/IPv6）
+            ip: 优选的IP地址，如果失败则为空字符串
+        """
+        # 如果已经取消或竞速已有结果（被停止的一方稍后才结束），则不继续处理
+        if self.optimization_cancelled or self.race_decided:
             return
-            
-        self.optimized_ipv6 = ipv6
-        logger.info(f"IPv6优选完成，结果: {ipv6 if ipv6 else '未找到合适的IPv6'}")
-        
-        # 检查IPv4优化是否已完成
-        if hasattr(self, 'ip_optimizer_thread') and self.ip_optimizer_thread and self.ip_optimizer_thread.isRunning():
-            logger.info("等待IPv4优选完成...")
+
+        if family == "IPv4":
+            self.optimized_ip = ip
+        else:
+            self.optimized_ipv6 = ip
+        self.pending_families.discard(family)
+        logger.info(f"{family}优选完成，结果: {ip if ip else '未找到合适的IP'}")
+
+        if not self.pending_families:
+            self._finish_race()
             return
-            
+
+        # 先到的地址族有结果时开始计时，超时后不再等待另一个地址族
+        if ip and self.race_timer is None:
+            waiting = "、".join(sorted(self.pending_families))
+            logger.info(f"{family}已找到可用地址，最多再等待{waiting}优选 {HAPPY_EYEBALLS_DELAY_MS}ms")
+            self.race_timer = QTimer(self.main_window)
+            self.race_timer.setSingleShot(True)
+            self.race_timer.timeout.connect(self._on_race_timeout)
+            self.race_timer.start(HAPPY_EYEBALLS_DELAY_MS)
+        else:
+            logger.info(f"等待{'、'.join(sorted(self.pending_families))}优选完成...")
+
+    def _on_race_timeout(self):
+        """等待时间结束，停止仍在进行的地址族优选，直接使用已有结果"""
+        if self.optimization_cancelled or self.race_decided:
+            return
+        threads = {"IPv4": self.ip_optimizer_thread, "IPv6": self.ipv6_optimizer_thread}
+        for family in self.pending_families:
+            thread = threads.get(family)
+            if thread and thread.isRunning():
+                logger.info(f"{family}优选未在等待时间内完成，停止搜索")
+                thread.stop()
+        self.pending_families.clear()
+        self._finish_race()
+
+    @staticmethod
+    def _best_median(thread):
+        """获取优选线程结果中最优IP的中位延迟"""
+        if thread is None or not thread.optimizer.last_results:
+            return math.inf
+        return thread.optimizer.last_results[0].median
+
+    def _finish_race(self):
+        """确定最终使用的地址族并继续处理优选结果"""
+        if self.race_timer is not None:
+            self.race_timer.stop()
+            self.race_timer = None
+        self.race_decided = True
+
+        # 两个地址族都有结果时优先使用延迟更低的一方（延迟相同时优先IPv6），
+        # 另一方的结果同样保留，作为胜出方不可用时的备用地址
+        if self.optimized_ip and self.optimized_ipv6:
+            ipv4_median = self._best_median(self.ip_optimizer_thread)
+            ipv6_median = self._best_median(self.ipv6_optimizer_thread)
+            if ipv6_median <= ipv4_median:
+                logger.info(f"地址族竞速: 优先IPv6（{ipv6_median:.1f}ms），IPv4（{ipv4_median:.1f}ms）作为备用")
+                self.preferred_family = "IPv6"
+            else:
+                logger.info(f"地址族竞速: 优先IPv4（{ipv4_median:.1f}ms），IPv6（{ipv6_median:.1f}ms）作为备用")
+                self.preferred_family = "IPv4"
+        elif self.optimized_ipv6:
+            self.preferred_family = "IPv6"
+        elif self.optimized_ip:
+            self.preferred_family = "IPv4"
+
+        self._end_optimization_span()
+
         # 所有优选都已完成，继续处理
         self.optimization_done = True
         self.countdown_finished = False  # 确保倒计时标志重置
@@ -271,6 +413,19 @@ class CloudflareOptimizer:
         # 处理优选结果
         self._process_optimization_results()
     
+    def _end_optimization_span(self, cancelled=False):
+        """结束本次优选的计时记录"""
+        span, self.optimization_span = self.optimization_span, None
+        if span is None:
+            return
+        if cancelled:
+            span.cancel()
+        else:
+            span.set(ipv4=self.optimized_ip or "", ipv6=self.optimized_ipv6 or "")
+            if not self.optimized_ip and not self.optimized_ipv6:
+                span.fail("未找到合适的IP")
+        span.end()
+
     def _process_optimization_results(self):
         """处理优选的IP结果，显示相应提示"""
         # 无论优选结果如何，都标记本次会话已执行过优选
@@ -288,6 +443,7 @@ class CloudflareOptimizer:
         self.main_window.setEnabled(True)
         
         hostname = urlparse(self.main_window.current_url).hostname if hasattr(self.main_window, 'current_url') else None
+        self._collect_candidate_ips(hostname)
         
         if not ipv4_success and (not use_ipv6 or not ipv6_success):
             # 两种IP都没有优选成功
@@ -352,29 +508,39 @@ class CloudflareOptimizer:
                 success_message += f"IPv6: {self.optimized_ipv6}\n"
                 
             if hostname:
-                # 先清理可能存在的旧记录（只清理一次）
-                self.hosts_manager.clean_hostname_entries(hostname)
-                
-                success = False
-                
-                # 应用优选IP到hosts文件
+                # 胜出的地址族排在前面，另一地址族作为备用
+                pinned_ips = []
                 if ipv4_success:
-                    success = self.hosts_manager.apply_ip(hostname, self.optimized_ip, clean=False) or success
-                    
-                # 如果启用IPv6并且找到了IPv6地址，也应用到hosts
+                    pinned_ips.append(self.optimized_ip)
                 if ipv6_success:
-                    success = self.hosts_manager.apply_ip(hostname, self.optimized_ipv6, clean=False) or success
-                
-                # 记录此次优选操作对hosts文件进行了更新
-                if hasattr(self.main_window, 'config'):
-                    self.main_window.config['last_hosts_optimized_hostname'] = hostname
-                    from utils import save_config
-                    save_config(self.main_window.config)
+                    pinned_ips.insert(0 if self.preferred_family == "IPv6" else len(pinned_ips), self.optimized_ipv6)
+
+                # 优先通过本地DNS解析器固定IP，即刻生效且无需修改hosts文件
+                if self._pin_with_dns(hostname, pinned_ips):
+                    success = True
+                    pin_target = "下载进程（本地DNS解析）"
+                else:
+                    pin_target = "hosts文件"
+
+                    # 先清理可能存在的旧记录（只清理一次）
+                    self.hosts_manager.clean_hostname_entries(hostname)
+
+                    success = False
+
+                    # 按优先顺序应用优选IP到hosts文件（启用IPv6并且找到了IPv6地址时同样写入）
+                    for pinned_ip in pinned_ips:
+                        success = self.hosts_manager.apply_ip(hostname, pinned_ip, clean=False) or success
+
+                    # 记录此次优选操作对hosts文件进行了更新
+                    if hasattr(self.main_window, 'config'):
+                        self.main_window.config['last_hosts_optimized_hostname'] = hostname
+                        from utils import save_config
+                        save_config(self.main_window.config)
                 
                 if success:
                     msg_box = QtWidgets.QMessageBox(self.main_window)
                     msg_box.setWindowTitle(f"成功 - {self.main_window.APP_NAME}")
-                    msg_box.setText(f"\n已将优选IP应用到hosts文件：\n{success_message}\n10秒后自动继续...")
+                    msg_box.setText(f"\n已将优选IP应用到{pin_target}：\n{success_message}\n10秒后自动继续...")
                     msg_box.setIcon(QtWidgets.QMessageBox.Icon.Information)
                     ok_button = msg_box.addButton("确定 (10)", QtWidgets.QMessageBox.ButtonRole.AcceptRole)
                     cancel_button = msg_box.addButton("取消安装", QtWidgets.QMessageBox.ButtonRole.RejectRole)
@@ -428,6 +594,11 @@ class CloudflareOptimizer:
             
     def stop_optimization(self):
         """停止正在进行的IP优化"""
+        self._end_optimization_span(cancelled=True)
+        if self.race_timer is not None:
+            self.race_timer.stop()
+            self.race_timer = None
+            
         if hasattr(self, 'ip_optimizer_thread') and self.ip_optimizer_thread and self.ip_optimizer_thread.isRunning():
             self.ip_optimizer_thread.stop()
             self.ip_optimizer_thread.wait()
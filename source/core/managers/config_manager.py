@@ -2,7 +2,7 @@ import json
 import webbrowser
 from PySide6.QtWidgets import QMessageBox
 
-from utils import load_config, save_config, msgbox_frame
+from utils import load_config, save_config, msgbox_frame, censor_config_urls
 
 class ConfigManager:
     """配置管理器，用于处理配置的加载、保存和获取云端配置"""
@@ -173,20 +173,7 @@ class ConfigManager:
         Returns:
             dict: 安全的配置数据副本
         """
-        if not config_data or not isinstance(config_data, dict):
-            return config_data
-            
-        # 创建深拷贝，避免修改原始数据
-        import copy
-        safe_config = copy.deepcopy(config_data)
-        
-        # 隐藏敏感URL
-        for key in safe_config:
-            if isinstance(safe_config[key], dict) and "url" in safe_config[key]:
-                # 完全隐藏URL
-                safe_config[key]["url"] = "***URL protection***"
-        
-        return safe_config
+        return censor_config_urls(config_data)
     
     def is_config_valid(self):
         """检查配置是否有效
@@ -0,0 +1,127 @@
+import time
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from config.config import CONNECTIVITY_TTL, CONNECTIVITY_WATCH_INTERVAL
+from workers.connectivity_thread import ConnectivityProbeThread, get_local_network_key
+from utils.logger import setup_logger
+
+# 初始化logger
+logger = setup_logger("connectivity_service")
+
+
+class ConnectivityService(QObject):
+    """网络连通性服务
+
+    启动时在后台并行检测IPv4和IPv6连通性，结果缓存CONNECTIVITY_TTL秒，过期后在下次请求时重新检测；
+    定期检查本机网段，网络环境变化时自动重新检测。
+    所有网络请求都在工作线程中进行，调用方通过信号或回调获取结果。
+    """
+    result_ready = Signal(dict)  # 每次检测完成时发出
+    ipv6_availability_changed = Signal(bool)  # IPv6可用性与上次检测结果不同时发出
+
+    def __init__(self, main_window):
+        """初始化连通性服务
+
+        Args:
+            main_window: 主窗口实例
+        """
+        super().__init__(main_window)
+        self.main_window = main_window
+        self.result = None
+        self.probe_thread = None
+        self._pending_probe = None  # 检测进行中时收到的新请求（是否需要详细信息）
+        self._network_key = None
+
+        self.watch_timer = QTimer(self)
+        self.watch_timer.timeout.connect(self._check_network_change)
+
+    def start(self):
+        """开始后台检测并定期检查网络环境变化"""
+        self.request_probe()
+        self.watch_timer.start(CONNECTIVITY_WATCH_INTERVAL * 1000)
+
+    def stop(self):
+        """停止网络环境检查，等待进行中的检测结束"""
+        self.watch_timer.stop()
+        if self.probe_thread and self.probe_thread.isRunning():
+            self.probe_thread.wait(1000)
+
+    def get_cached(self, detailed=False):
+        """获取未过期的检测结果
+
+        Args:
+            detailed: 是否要求包含公网IPv6地址等详细信息
+
+        Returns:
+            dict: 检测结果，没有可用的缓存时返回None
+        """
+        if not self.result or time.time() - self.result["timestamp"] > CONNECTIVITY_TTL:
+            return None
+        if detailed and not self.result.get("detailed"):
+            return None
+        return self.result
+
+    def is_probing(self):
+        return self.probe_thread is not None and self.probe_thread.isRunning()
+
+    def request_probe(self, force=False, detailed=False):
+        """请求检测连通性，有可用缓存且不强制时直接通过信号返回缓存结果
+
+        Args:
+            force: 是否忽略缓存重新检测
+            detailed: 是否获取公网IPv6地址等详细信息
+        """
+        cached = None if force else self.get_cached(detailed)
+        if cached:
+            # 与真正的检测保持一致，在事件循环中异步发出结果
+            QTimer.singleShot(0, lambda: self.result_ready.emit(cached))
+            return
+
+        if self.is_probing():
+            self._pending_probe = bool(self._pending_probe) or detailed
+            return
+
+        self.probe_thread = ConnectivityProbeThread(detailed=detailed, parent=self)
+        self.probe_thread.finished.connect(self._on_probe_finished)
+        self.probe_thread.start()
+
+    def request_ipv6_availability(self, callback, force=False):
+        """异步获取IPv6是否可用
+
+        Args:
+            callback: 结果回调，参数为(是否可用, 检测结果)
+            force: 是否忽略缓存重新检测
+        """
+        def on_result(result):
+            self.result_ready.disconnect(on_result)
+            callback(result["ipv6"]["available"], result)
+
+        self.result_ready.connect(on_result)
+        self.request_probe(force=force)
+
+    def _on_probe_finished(self, result):
+        previous = self.result
+        self.result = result
+        self._network_key = result["network_key"]
+        self.probe_thread = None
+
+        if previous is not None and previous["ipv6"]["available"] != result["ipv6"]["available"]:
+            self.ipv6_availability_changed.emit(result["ipv6"]["available"])
+        self.result_ready.emit(result)
+
+        if self._pending_probe is not None:
+            detailed = self._pending_probe
+            self._pending_probe = None
+            # 排队的请求只在需要更详细的信息时才重新检测
+            if detailed and not result.get("detailed"):
+                self.request_probe(force=True, detailed=True)
+
+    def _check_network_change(self):
+        """本机网段变化（切换网络、重新拨号等）时重新检测"""
+        if self.is_probing():
+            return
+        network_key = get_local_network_key()
+        if self._network_key is not None and network_key != self._network_key:
+            logger.info("检测到网络环境变化，重新检测连通性")
+            self.request_probe(force=True)
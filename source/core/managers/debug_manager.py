@@ -1,15 +1,23 @@
 import os
 import sys
 from PySide6 import QtWidgets
-from config.config import LOG_FILE
+from PySide6.QtCore import QObject, Signal
+from config.config import LOG_FILE, TRACE_FILE, MEMORY_PROFILE_ENABLED
 from utils.logger import setup_logger
 from utils import Logger
+from utils.tracing import export_chrome_trace
 import datetime
 from config.config import APP_NAME
 
 # 初始化logger
 logger = setup_logger("debug_manager")
 
+
+class _ProfileBridge(QObject):
+    """将性能分析结果从结束阶段所在的线程送回UI线程"""
+    finished = Signal(str, list)  # 阶段名称, 输出文件路径列表
+
+
 class DebugManager:
     def __init__(self, main_window):
         """初始化调试管理器
@@ -22,6 +30,10 @@ class DebugManager:
         self.original_stdout = None
         self.original_stderr = None
         self.ui_manager = None  # 添加ui_manager属性
+        self.stall_watchdog = None  # 调试模式下的界面卡顿检测器
+        self.profile_session = None  # 等待中或进行中的性能分析
+        self._profile_bridge = None
+        self.memory_monitor = None  # 哈希校验和解压阶段的内存统计
     
     def set_ui_manager(self, ui_manager):
         """设置UI管理器引用
@@ -115,21 +127,20 @@ class DebugManager:
                     os.makedirs(log_dir, exist_ok=True)
                     logger.debug(f"已创建日志目录: {log_dir}")
                 
-                # 创建新的日志文件，使用覆盖模式而不是追加模式
-                with open(LOG_FILE, 'w', encoding='utf-8') as f:
-                    current_time = datetime.datetime.now()
-                    formatted_date = current_time.strftime("%Y-%m-%d")
-                    formatted_time = current_time.strftime("%H:%M:%S")
-                    f.write(f"--- 新调试会话开始于 {os.path.basename(LOG_FILE)} ---\n")
-                    f.write(f"--- 应用版本: {APP_NAME} ---\n")
-                    f.write(f"--- 日期: {formatted_date} 时间: {formatted_time} ---\n\n")
-                    logger.debug(f"已创建日志文件: {os.path.abspath(LOG_FILE)}")
-                
                 # 保存原始的 stdout 并创建Logger实例
                 self.original_stdout = sys.stdout
                 self.logger = Logger(LOG_FILE, self.original_stdout)
                 
+                # 会话信息同样经由日志写入线程写入，不再单独打开日志文件
+                current_time = datetime.datetime.now()
+                formatted_date = current_time.strftime("%Y-%m-%d")
+                formatted_time = current_time.strftime("%H:%M:%S")
+                logger.debug(f"--- 新调试会话开始于 {os.path.basename(LOG_FILE)} ---")
+                logger.debug(f"--- 应用版本: {APP_NAME} ---")
+                logger.debug(f"--- 日期: {formatted_date} 时间: {formatted_time} ---")
+                
                 logger.debug(f"--- Debug mode enabled (log file: {os.path.abspath(LOG_FILE)}) ---")
+                self._start_stall_watchdog()
             except (IOError, OSError) as e:
                 QtWidgets.QMessageBox.critical(self.main_window, "错误", f"无法创建日志文件: {e}")
                 self.logger = None
@@ -137,6 +148,7 @@ class DebugManager:
     def stop_logging(self):
         """停止日志记录"""
         if self.logger:
+            self._stop_stall_watchdog()
             logger.debug("--- Debug mode disabled ---")
             # 恢复stdout到原始状态
             if hasattr(self, 'original_stdout') and self.original_stdout:
@@ -146,6 +158,47 @@ class DebugManager:
                 self.logger.close()
             self.logger = None
 
+    def _start_stall_watchdog(self):
+        """启动界面卡顿检测，卡顿时的主线程调用栈和统计结果写入日志"""
+        if self.stall_watchdog is None:
+            from utils.stall_watchdog import StallWatchdog
+            self.stall_watchdog = StallWatchdog(self.main_window)
+        self.stall_watchdog.start()
+
+    def _stop_stall_watchdog(self):
+        if self.stall_watchdog is not None:
+            self.stall_watchdog.stop()
+
+    def is_memory_profiling_enabled(self):
+        """检查是否开启了内存统计（配置常量或Debug菜单中的开关）"""
+        config = getattr(self.main_window, 'config', None)
+        return MEMORY_PROFILE_ENABLED or (isinstance(config, dict) and config.get("memory_profile", False))
+
+    def toggle_memory_profiling(self, checked):
+        """开启或关闭内存统计
+
+        Args:
+            checked: 是否开启
+        """
+        logger.info(f"Toggle memory profiling: {checked}")
+        self.main_window.config["memory_profile"] = checked
+        self.main_window.save_config(self.main_window.config)
+        if checked:
+            self.start_memory_monitor()
+        else:
+            self.stop_memory_monitor()
+
+    def start_memory_monitor(self):
+        """开启内存统计，各阶段的峰值和主要分配位置写入日志和计时记录"""
+        if self.memory_monitor is None:
+            from utils.memory_monitor import get_memory_monitor
+            self.memory_monitor = get_memory_monitor()
+        self.memory_monitor.start()
+
+    def stop_memory_monitor(self):
+        if self.memory_monitor is not None:
+            self.memory_monitor.stop()
+
     def open_log_file(self):
         """打开当前日志文件"""
         try:
@@ -273,4 +326,77 @@ class DebugManager:
                 f"\n处理日志文件时出错：\n\n{str(e)}\n\n文件位置：{os.path.abspath(LOG_FILE)}",
                 QtWidgets.QMessageBox.StandardButton.Ok
             )
-            msg_box.exec() 
\ No newline at end of file
+            msg_box.exec()
+
+    def export_trace(self):
+        """将本次运行的计时记录导出为Chrome trace格式，可在chrome://tracing或ui.perfetto.dev中打开"""
+        from utils import msgbox_frame
+        if not os.path.exists(TRACE_FILE):
+            msgbox_frame(
+                f"提示 - {APP_NAME}",
+                "\n本次运行还没有计时记录。\n\n请先执行一次安装、卸载等操作后再导出。\n",
+                QtWidgets.QMessageBox.StandardButton.Ok
+            ).exec()
+            return
+
+        try:
+            output_path = export_chrome_trace(TRACE_FILE)
+        except (IOError, OSError, ValueError) as e:
+            logger.error(f"导出计时记录失败: {e}")
+            msgbox_frame(
+                f"错误 - {APP_NAME}",
+                f"\n导出计时记录失败：\n\n{str(e)}\n",
+                QtWidgets.QMessageBox.StandardButton.Ok
+            ).exec()
+            return
+
+        logger.info(f"已导出计时记录: {output_path}")
+        msgbox_frame(
+            f"导出完成 - {APP_NAME}",
+            f"\n计时记录已导出到：\n{os.path.abspath(output_path)}\n\n"
+            f"可在Chrome浏览器的chrome://tracing或ui.perfetto.dev中打开查看各阶段耗时。\n",
+            QtWidgets.QMessageBox.StandardButton.Ok
+        ).exec()
+
+    def toggle_profiling(self, checked):
+        """开始或取消对下一次安装、校验或目录识别的性能分析
+
+        Args:
+            checked: 是否开始分析
+        """
+        if not checked:
+            if self.profile_session is not None:
+                self.profile_session.disarm()
+                self.profile_session = None
+            return
+
+        from utils.profiler import ProfileSession
+        if self._profile_bridge is None:
+            self._profile_bridge = _ProfileBridge(self.main_window)
+            self._profile_bridge.finished.connect(self._on_profile_finished)
+        # 结束回调在工作线程中调用，经由信号转到UI线程
+        self.profile_session = ProfileSession(on_finished=self._profile_bridge.finished.emit)
+        self.profile_session.arm()
+
+        from utils import msgbox_frame
+        msgbox_frame(
+            f"性能分析 - {APP_NAME}",
+            "\n已开始等待，将对下一次安装、哈希校验或游戏目录识别进行性能分析（包括所有工作线程）。\n\n"
+            "完成后结果保存在日志目录中，再次点击此菜单项可取消。\n",
+            QtWidgets.QMessageBox.StandardButton.Ok
+        ).exec()
+
+    def _on_profile_finished(self, span_name, paths):
+        self.profile_session = None
+        menu_builder = getattr(self.ui_manager, 'menu_builder', None)
+        if menu_builder is not None and getattr(menu_builder, 'profile_action', None):
+            menu_builder.profile_action.setChecked(False)
+
+        from utils import msgbox_frame
+        file_list = "\n".join(os.path.abspath(path) for path in paths)
+        msgbox_frame(
+            f"性能分析完成 - {APP_NAME}",
+            f"\n已完成对 {span_name} 的性能分析，结果已保存到：\n{file_list}\n\n"
+            f".prof文件可用snakeviz或python -m pstats查看，.collapsed文件可用speedscope或flamegraph.pl生成火焰图。\n",
+            QtWidgets.QMessageBox.StandardButton.Ok
+        ).exec()
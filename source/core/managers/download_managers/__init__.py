@@ -3,10 +3,27 @@
 包含下载相关的管理器类
 """
 
-from .download_manager import DownloadManager
-from .download_task_manager import DownloadTaskManager
+# 按需导入：访问某个名称时才加载对应模块，启动时不会连带导入全部子模块及其第三方依赖
+import importlib
+
+_EXPORTS = {
+    'DownloadManager': '.download_manager',
+    'DownloadTaskManager': '.download_task_manager',
+    'DiskSpacePlanner': '.disk_space_planner',
+}
 
 __all__ = [
     'DownloadManager',
     'DownloadTaskManager',
-]
\ No newline at end of file
+    'DiskSpacePlanner',
+]
+
+
+def __getattr__(name):
+    # 首次访问时才导入对应模块，之后缓存在包的命名空间中
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,344 @@
+import os
+import sys
+import shutil
+import tempfile
+
+import requests
+from PySide6.QtCore import QThread, Signal
+
+from config.config import UA, DISK_SPACE_SAFETY_MARGIN, EXTRACT_SIZE_RATIO, EXTRACT_DIRECT_TO_TARGET
+from utils.archive_index import get_archive_index
+from utils.logger import setup_logger
+
+# 初始化logger
+logger = setup_logger("disk_space_planner")
+
+
+class DiskSpacePreflightThread(QThread):
+    """在后台线程中执行磁盘空间预检，避免获取远程文件大小时阻塞UI"""
+    finished = Signal(object)
+
+    def __init__(self, planner, tasks, parent=None, delta_tasks=None):
+        super().__init__(parent)
+        self.planner = planner
+        self.tasks = list(tasks)
+        self.delta_tasks = dict(delta_tasks or {})
+
+    def run(self):
+        try:
+            result = self.planner.plan(self.tasks, self.delta_tasks)
+        except Exception as e:
+            logger.error(f"磁盘空间预检失败: {e}")
+            result = None
+        self.finished.emit(result)
+
+
+class DiskSpacePlanner:
+    """磁盘空间规划器，在开始下载前汇总整个队列在各磁盘卷上的空间需求
+
+    每个任务会占用三部分空间：
+    1. 压缩包本身（下载或复制到PLUGIN目录，安装完成后仍保留）
+    2. 解压时的临时空间（位于系统临时目录，单个任务结束后即释放）
+    3. 最终安装到游戏目录的补丁文件（覆盖已有文件时只计算增量）
+    """
+
+    def __init__(self, timeout=10):
+        """初始化磁盘空间规划器
+
+        Args:
+            timeout: 获取远程文件大小时的请求超时时间（秒）
+        """
+        self.timeout = timeout
+
+    def _existing_dir(self, path):
+        """向上查找路径中第一个实际存在的目录
+
+        Args:
+            path: 文件或目录路径
+
+        Returns:
+            str: 存在的目录路径
+        """
+        current = os.path.abspath(path)
+        while current and not os.path.isdir(current):
+            parent = os.path.dirname(current)
+            if parent == current:
+                break
+            current = parent
+        return current
+
+    def _volume_of(self, path):
+        """获取路径所在的磁盘卷标识
+
+        Args:
+            path: 文件或目录路径
+
+        Returns:
+            tuple: (卷标识, 用于查询剩余空间的目录)
+        """
+        existing = self._existing_dir(path)
+        if sys.platform == 'win32':
+            drive = os.path.splitdrive(existing)[0]
+            return (drive.upper() or existing), existing
+        try:
+            return os.stat(existing).st_dev, existing
+        except OSError:
+            return existing, existing
+
+    def _get_remote_size(self, url):
+        """通过HEAD请求（失败时回退为单字节Range请求）获取远程文件大小
+
+        Args:
+            url: 下载地址
+
+        Returns:
+            int: 文件大小（字节），无法获取时返回None
+        """
+        headers = {"User-Agent": UA}
+        try:
+            response = requests.head(url, headers=headers, timeout=self.timeout, allow_redirects=True)
+            length = response.headers.get("Content-Length")
+            if response.ok and length and int(length) > 0:
+                return int(length)
+        except (requests.RequestException, ValueError) as e:
+            logger.debug(f"HEAD请求获取文件大小失败: {e}")
+
+        try:
+            headers["Range"] = "bytes=0-0"
+            with requests.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+                content_range = response.headers.get("Content-Range", "")
+                if "/" in content_range:
+                    total = content_range.rsplit("/", 1)[1]
+                    if total.isdigit():
+                        return int(total)
+        except (requests.RequestException, ValueError) as e:
+            logger.debug(f"Range请求获取文件大小失败: {e}")
+        return None
+
+    def _get_uncompressed_sizes(self, archive_path, target_filename):
+        """读取本地压缩包目录，计算目标文件和全部文件的解压后大小
+
+        Args:
+            archive_path: 本地压缩包路径
+            target_filename: 主补丁文件名
+
+        Returns:
+            tuple: (目标文件大小, 全部文件大小)，读取失败时返回(None, None)
+        """
+        try:
+            index = get_archive_index(archive_path)
+        except Exception as e:
+            logger.debug(f"读取压缩包目录失败 {archive_path}: {e}")
+            return None, None
+
+        total = index.total_size
+        target = sum(member.size for member in index.files if member.basename.startswith(target_filename))
+        return (target or total), total
+
+    def _estimate_delta_target_size(self, delta_task):
+        """估算应用增量补丁后新版本补丁文件的大小
+
+        优先使用增量元数据中的size字段，其次按完整补丁包的大小估算。
+
+        Args:
+            delta_task: 增量任务信息，包含size（可选）和full_task
+
+        Returns:
+            int: 新文件大小（字节），无法估算时返回None
+        """
+        size = delta_task.get("size")
+        if isinstance(size, int) and size > 0:
+            return size
+
+        full_url, _, _, _, full_plugin_path = delta_task["full_task"]
+        if os.path.isfile(full_url):
+            target_size, _ = self._get_uncompressed_sizes(full_url, os.path.basename(full_plugin_path))
+            if target_size is not None:
+                return target_size
+            full_size = os.path.getsize(full_url)
+        else:
+            full_size = self._get_remote_size(full_url)
+        return int(full_size * EXTRACT_SIZE_RATIO) if full_size is not None else None
+
+    def estimate_task(self, url, game_folder, game_version, _7z_path, plugin_path, delta_task=None):
+        """估算单个下载任务的空间需求
+
+        Args:
+            url: 下载URL或本地文件路径
+            game_folder: 游戏文件夹路径
+            game_version: 游戏版本名称
+            _7z_path: 7z文件保存路径
+            plugin_path: 插件路径
+            delta_task: 增量任务信息，普通任务为None
+
+        Returns:
+            dict: 包含archive、scratch、install三项需求（字节）的字典，
+                  无法获取压缩包大小时返回None
+        """
+        target_filename = os.path.basename(plugin_path)
+        is_local = os.path.isfile(url)
+
+        if is_local:
+            archive_size = os.path.getsize(url)
+            install_size, scratch_size = self._get_uncompressed_sizes(url, target_filename)
+        else:
+            archive_size = self._get_remote_size(url)
+            install_size, scratch_size = None, None
+
+        if archive_size is None:
+            return None
+
+        if install_size is None:
+            install_size = int(archive_size * EXTRACT_SIZE_RATIO)
+            scratch_size = install_size
+
+        # 压缩包已存在时会被覆盖，只计算增量
+        archive_need = archive_size
+        if os.path.isfile(_7z_path):
+            if is_local and os.path.abspath(url) == os.path.abspath(_7z_path):
+                archive_need = 0
+            else:
+                archive_need = max(0, archive_size - os.path.getsize(_7z_path))
+
+        # 直接解压到游戏目录时不需要临时空间，但.partial文件会与旧补丁文件同时存在直到重命名
+        if EXTRACT_DIRECT_TO_TARGET:
+            scratch_size = 0
+
+        # 游戏目录中已有同名补丁文件时同样只计算增量
+        install_need = install_size
+        existing_target = os.path.join(game_folder, target_filename)
+        if delta_task is not None:
+            # 增量补丁会先在游戏目录生成完整的新文件（临时副本），校验后才替换旧文件，
+            # 因此峰值需求是整个新文件的大小，且不需要解压临时空间
+            target_size = self._estimate_delta_target_size(delta_task)
+            if target_size is None:
+                return None
+            install_need = target_size
+            scratch_size = 0
+        elif os.path.isfile(existing_target) and not EXTRACT_DIRECT_TO_TARGET:
+            install_need = max(0, install_size - os.path.getsize(existing_target))
+
+        return {
+            "game_version": game_version,
+            "archive_path": _7z_path,
+            "archive": archive_need,
+            "scratch_path": tempfile.gettempdir(),
+            "scratch": scratch_size,
+            "install_path": game_folder,
+            "install": install_need,
+        }
+
+    def plan(self, tasks, delta_tasks=None):
+        """汇总整个下载队列在各磁盘卷上的峰值空间需求
+
+        压缩包和安装文件会随队列推进不断累积，而解压临时空间在单个任务结束后释放，
+        因此同一卷上的峰值需求按 "全部压缩包 + 全部安装文件 + 最大单次解压空间" 计算。
+
+        Args:
+            tasks: 下载任务列表，元素为(url, game_folder, game_version, _7z_path, plugin_path)
+            delta_tasks: 游戏版本 -> 增量任务信息，用于估算增量任务生成的新文件大小
+
+        Returns:
+            dict: 规划结果，包含ok、volumes和unknown三个字段
+        """
+        volumes = {}
+        unknown = []
+
+        def _volume_entry(path):
+            key, probe_dir = self._volume_of(path)
+            if key not in volumes:
+                volumes[key] = {
+                    "path": probe_dir,
+                    "archive": 0,
+                    "install": 0,
+                    "scratch": 0,
+                    "games": [],
+                }
+            return volumes[key]
+
+        for task in tasks:
+            url, game_folder, game_version, _7z_path, plugin_path = task
+            delta_task = (delta_tasks or {}).get(game_version) if _7z_path.endswith(".delta") else None
+            estimate = self.estimate_task(url, game_folder, game_version, _7z_path, plugin_path, delta_task)
+            if estimate is None:
+                logger.warning(f"无法获取 {game_version} 的补丁大小，跳过该任务的空间预检")
+                unknown.append(game_version)
+                continue
+
+            logger.debug(
+                f"{game_version} 空间需求: 压缩包 {estimate['archive']} 字节, "
+                f"解压临时 {estimate['scratch']} 字节, 安装 {estimate['install']} 字节"
+            )
+
+            archive_volume = _volume_entry(estimate["archive_path"])
+            archive_volume["archive"] += estimate["archive"]
+            if game_version not in archive_volume["games"]:
+                archive_volume["games"].append(game_version)
+
+            scratch_volume = _volume_entry(estimate["scratch_path"])
+            scratch_volume["scratch"] = max(scratch_volume["scratch"], estimate["scratch"])
+            if game_version not in scratch_volume["games"]:
+                scratch_volume["games"].append(game_version)
+
+            install_volume = _volume_entry(estimate["install_path"])
+            install_volume["install"] += estimate["install"]
+            if game_version not in install_volume["games"]:
+                install_volume["games"].append(game_version)
+
+        ok = True
+        for key, volume in volumes.items():
+            required = volume["archive"] + volume["install"] + volume["scratch"]
+            volume["required"] = required + DISK_SPACE_SAFETY_MARGIN if required else 0
+            try:
+                volume["free"] = shutil.disk_usage(volume["path"]).free
+            except OSError as e:
+                logger.warning(f"无法获取 {volume['path']} 的剩余空间: {e}")
+                volume["free"] = None
+                continue
+
+            volume["sufficient"] = volume["free"] >= volume["required"]
+            if not volume["sufficient"]:
+                ok = False
+                logger.warning(
+                    f"磁盘空间不足: {volume['path']} 需要 {volume['required']} 字节, 可用 {volume['free']} 字节"
+                )
+
+        return {"ok": ok, "volumes": volumes, "unknown": unknown}
+
+    @staticmethod
+    def format_size(size):
+        """将字节数格式化为便于阅读的字符串
+
+        Args:
+            size: 字节数
+
+        Returns:
+            str: 格式化后的大小
+        """
+        for unit in ("B", "KB", "MB", "GB"):
+            if size < 1024 or unit == "GB":
+                return f"{size:.1f}{unit}" if unit != "B" else f"{size}B"
+            size /= 1024.0
+
+    def format_shortage(self, result):
+        """生成空间不足时展示给用户的说明文本
+
+        Args:
+            result: plan()的返回结果
+
+        Returns:
+            str: 说明文本
+        """
+        lines = []
+        for volume in result["volumes"].values():
+            if volume.get("sufficient", True):
+                continue
+            lines.append(
+                f"{volume['path']}\n"
+                f"  需要: {self.format_size(volume['required'])}  可用: {self.format_size(volume['free'])}\n"
+                f"  (压缩包 {self.format_size(volume['archive'])} / "
+                f"解压临时 {self.format_size(volume['scratch'])} / "
+                f"安装 {self.format_size(volume['install'])})\n"
+                f"  涉及: {', '.join(volume['games'])}"
+            )
+        return "\n\n".join(lines)
@@ -6,22 +6,27 @@ from urllib.parse import urlparse
 import re
 
 from PySide6 import QtWidgets, QtCore
-from PySide6.QtCore import Qt, QTimer
-from PySide6.QtGui import QIcon, QPixmap, QFont
+from PySide6.QtCore import QTimer
+from PySide6.QtGui import QFont
 from PySide6.QtWidgets import QPushButton, QDialog, QHBoxLayout
 
-from utils import msgbox_frame, HostsManager, resource_path
-from config.config import APP_NAME, PLUGIN, GAME_INFO, UA, CONFIG_URL, DOWNLOAD_THREADS, DEFAULT_DOWNLOAD_THREAD_LEVEL
+from utils import msgbox_frame, HostsManager, LocalDnsResolver, get_asset_service
+from config.config import (
+    APP_NAME, PLUGIN, GAME_INFO, PLUGIN_HASH, UA, CONFIG_URL, DOWNLOAD_THREADS, DEFAULT_DOWNLOAD_THREAD_LEVEL,
+    FILE_ALLOCATION_MODES, DEFAULT_FILE_ALLOCATION, PINNING_MODES, DEFAULT_PINNING_MODE, DELTA_MAX_BASE_SIZE
+)
 from workers import IpOptimizerThread
 from core.managers.cloudflare_optimizer import CloudflareOptimizer
 from .download_task_manager import DownloadTaskManager
+from .disk_space_planner import DiskSpacePlanner, DiskSpacePreflightThread
 from core.handlers.extraction_handler import ExtractionHandler
 from utils.logger import setup_logger
-from utils.url_censor import censor_url
+from utils.url_censor import censor_url, censor_config_urls
 from utils.helpers import (
-    HashManager, AdminPrivileges, msgbox_frame, HostsManager
+    HashManager, AdminPrivileges, msgbox_frame, HostsManager, stop_threads_gracefully
 )
 from workers.download import DownloadThread, ProgressWindow
+from workers.delta_patch_thread import DELTA_FORMATS
 
 # 初始化logger
 logger = setup_logger("download_manager")
@@ -38,13 +43,21 @@ class DownloadManager:
         self.selected_folder = ""
         self.download_queue = deque()
         self.current_download_thread = None
-        self.hosts_manager = HostsManager()
+        # 与主窗口共用hosts管理器，保留启动时备份的hosts内容
+        self.hosts_manager = getattr(main_window, 'hosts_manager', None) or HostsManager()
+        self.dns_resolver = LocalDnsResolver()
         
         self.download_thread_level = DEFAULT_DOWNLOAD_THREAD_LEVEL
         
-        self.cloudflare_optimizer = CloudflareOptimizer(main_window, self.hosts_manager)
+        self.cloudflare_optimizer = CloudflareOptimizer(main_window, self.hosts_manager, self.dns_resolver)
         self.download_task_manager = DownloadTaskManager(main_window, self.download_thread_level)
         self.extraction_handler = ExtractionHandler(main_window)
+        self.disk_space_planner = DiskSpacePlanner()
+        self.disk_space_thread = None
+        
+        # 预检查得到的已安装补丁哈希值，以及本轮使用增量补丁的任务
+        self.installed_file_hashes = {}
+        self.delta_tasks = {}
         
         self.extraction_thread = None
         self.progress_window = None
@@ -234,20 +247,7 @@ class DownloadManager:
         Returns:
             dict: 安全的配置数据副本
         """
-        if not config_data or not isinstance(config_data, dict):
-            return config_data
-            
-        # 创建深拷贝，避免修改原始数据
-        import copy
-        safe_config = copy.deepcopy(config_data)
-        
-        # 隐藏敏感URL
-        for key in safe_config:
-            if isinstance(safe_config[key], dict) and "url" in safe_config[key]:
-                # 完全隐藏URL
-                safe_config[key]["url"] = "***URL protection***"
-        
-        return safe_config
+        return censor_config_urls(config_data)
 
     def download_action(self):
         """下载操作的主入口点"""
@@ -269,6 +269,8 @@ class DownloadManager:
                 self.main_window.window_manager.change_window_state(self.main_window.window_manager.STATE_READY)
             return
         
+        self.main_window.patch_manager.begin_install_trace("online", game_dirs)
+        
         # 检查是否禁用了安装前哈希预检查
         config = getattr(self.main_window, 'config', {})
         disable_pre_hash = False
@@ -286,6 +288,9 @@ class DownloadManager:
             for game in game_dirs.keys():
                 updated_status[game] = False
             
+            # 未进行预检查时无法匹配增量补丁
+            self.installed_file_hashes = {}
+            
             # 直接调用预检查完成的处理方法
             self.on_pre_hash_finished_with_dirs(updated_status, game_dirs)
         else:
@@ -303,11 +308,25 @@ class DownloadManager:
             install_paths = self.get_install_paths()
             
             # 创建并启动哈希线程进行预检查
-            self.main_window.hash_thread = self.main_window.patch_detector.create_hash_thread("pre", install_paths)
-            self.main_window.hash_thread.pre_finished.connect(
-                lambda updated_status: self.on_pre_hash_finished_with_dirs(updated_status, game_dirs)
+            hash_thread = self.main_window.patch_detector.create_hash_thread("pre", install_paths)
+            self.main_window.hash_thread = hash_thread
+            hash_thread.pre_finished.connect(
+                lambda updated_status: self._on_pre_hash_finished_with_hashes(
+                    updated_status, game_dirs, hash_thread.file_hashes
+                )
             )
-            self.main_window.hash_thread.start()
+            hash_thread.start()
+
+    def _on_pre_hash_finished_with_hashes(self, updated_status, game_dirs, file_hashes):
+        """记录预检查得到的文件哈希值后继续安装流程
+        
+        Args:
+            updated_status: 更新后的安装状态
+            game_dirs: 识别到的游戏目录
+            file_hashes: 已安装补丁文件的实际哈希值
+        """
+        self.installed_file_hashes = dict(file_hashes)
+        self.on_pre_hash_finished_with_dirs(updated_status, game_dirs)
 
     def on_pre_hash_finished_with_dirs(self, updated_status, game_dirs):
         """优化的哈希预检查完成处理，带有游戏目录信息
@@ -548,6 +567,12 @@ class DownloadManager:
             self.main_window.patch_detector.after_hash_compare()
             return
         
+        self._run_disk_space_preflight(self._start_download_queue)
+
+    def _start_download_queue(self):
+        """磁盘空间预检通过后开始处理下载队列"""
+        debug_mode = self.is_debug_mode()
+        
         # 检查是否处于离线模式
         is_offline_mode = False
         if hasattr(self.main_window, 'offline_mode_manager'):
@@ -561,6 +586,66 @@ class DownloadManager:
         else:
             self._show_cloudflare_option()
 
+    def _run_disk_space_preflight(self, on_passed):
+        """在后台检查整个下载队列所需的磁盘空间，空间充足时执行回调
+        
+        Args:
+            on_passed: 预检通过（或用户选择忽略）后执行的回调
+        """
+        if not self.download_queue:
+            on_passed()
+            return
+            
+        logger.info(f"开始磁盘空间预检，共 {len(self.download_queue)} 个任务")
+        
+        def on_finished(result):
+            self.disk_space_thread = None
+            self._on_disk_space_preflight_finished(result, on_passed)
+            
+        self.disk_space_thread = DiskSpacePreflightThread(
+            self.disk_space_planner, self.download_queue, self.main_window, delta_tasks=self.delta_tasks
+        )
+        self.disk_space_thread.finished.connect(on_finished)
+        self.disk_space_thread.start()
+
+    def _on_disk_space_preflight_finished(self, result, on_passed):
+        """磁盘空间预检完成后的回调
+        
+        Args:
+            result: DiskSpacePlanner.plan()的返回结果，预检异常时为None
+            on_passed: 预检通过后执行的回调
+        """
+        if result is None or result["ok"]:
+            if result and result["unknown"]:
+                logger.info(f"以下任务无法预估大小，未纳入空间预检: {result['unknown']}")
+            on_passed()
+            return
+        
+        self.main_window.setEnabled(True)
+        
+        msg_box = msgbox_frame(
+            f"存储空间不足 - {APP_NAME}",
+            "\n以下磁盘的剩余空间不足以完成本次安装：\n\n"
+            f"{self.disk_space_planner.format_shortage(result)}\n\n"
+            "请清理磁盘空间后重试。\n",
+            QtWidgets.QMessageBox.StandardButton.NoButton
+        )
+        cancel_button = msg_box.addButton("取消安装", QtWidgets.QMessageBox.ButtonRole.RejectRole)
+        ignore_button = msg_box.addButton("忽略并继续", QtWidgets.QMessageBox.ButtonRole.AcceptRole)
+        msg_box.setDefaultButton(cancel_button)
+        msg_box.exec()
+        
+        if msg_box.clickedButton() == ignore_button:
+            logger.warning("用户忽略磁盘空间不足警告，继续安装")
+            self.main_window.setEnabled(False)
+            on_passed()
+            return
+        
+        logger.info("磁盘空间不足，用户取消安装")
+        self.download_queue.clear()
+        if hasattr(self.main_window, 'window_manager'):
+            self.main_window.window_manager.change_window_state(self.main_window.window_manager.STATE_READY)
+
     def _fill_download_queue(self, config, game_dirs):
         """填充下载队列
         
@@ -569,6 +654,7 @@ class DownloadManager:
             game_dirs: 包含游戏文件夹路径的字典
         """
         self.download_queue.clear()
+        self.delta_tasks.clear()
         
         if not hasattr(self.main_window, 'download_queue_history'):
             self.main_window.download_queue_history = []
@@ -589,7 +675,8 @@ class DownloadManager:
                 
                 _7z_path = os.path.join(PLUGIN, f"vol.{i}.7z")
                 plugin_path = os.path.join(PLUGIN, GAME_INFO[game_version]["plugin_path"])
-                self.download_queue.append((url, game_folder, game_version, _7z_path, plugin_path))
+                task = self._resolve_delta_task(f"vol.{i}.data", (url, game_folder, game_version, _7z_path, plugin_path))
+                self.download_queue.append(task)
                 self.main_window.download_queue_history.append(game_version)
 
         game_version = "NEKOPARA After"
@@ -602,8 +689,89 @@ class DownloadManager:
                 
                 _7z_path = os.path.join(PLUGIN, "after.7z")
                 plugin_path = os.path.join(PLUGIN, GAME_INFO[game_version]["plugin_path"])
-                self.download_queue.append((url, game_folder, game_version, _7z_path, plugin_path))
+                task = self._resolve_delta_task("after.data", (url, game_folder, game_version, _7z_path, plugin_path))
+                self.download_queue.append(task)
                 self.main_window.download_queue_history.append(game_version)
+
+    def _resolve_delta_task(self, config_key, task):
+        """根据云端配置中的增量补丁信息，决定使用增量补丁还是完整补丁
+        
+        云端配置格式示例：
+        "vol.1.data": {"url": "...", "delta": [{"from": "<旧哈希>", "to": "<新哈希>", "url": "...", "format": "zstd", "size": <新文件大小>}]}
+        
+        size为可选字段，供磁盘空间预检估算新版本补丁文件的大小。
+        
+        Args:
+            config_key: 云端配置中的游戏键，如"vol.1.data"
+            task: 完整补丁的下载任务(url, game_folder, game_version, _7z_path, plugin_path)
+            
+        Returns:
+            tuple: 实际加入下载队列的任务
+        """
+        url, game_folder, game_version, _7z_path, plugin_path = task
+        
+        # 带签名文件的补丁（NEKOPARA After）增量只更新主补丁文件，签名文件会与新补丁不匹配
+        if GAME_INFO.get(game_version, {}).get("sig_path"):
+            return task
+        
+        installed_hash = self.installed_file_hashes.get(game_version)
+        cloud_config = getattr(self.main_window, 'cloud_config', None) or {}
+        entry = cloud_config.get(config_key, {})
+        deltas = entry.get("delta", []) if isinstance(entry, dict) else []
+        if not installed_hash or not isinstance(deltas, list):
+            return task
+        
+        target_hash = PLUGIN_HASH.get(game_version)
+        for delta in deltas:
+            if not isinstance(delta, dict) or not delta.get("url"):
+                continue
+            delta_format = delta.get("format", "zstd")
+            if delta.get("from") == installed_hash and delta.get("to") == target_hash and delta_format in DELTA_FORMATS:
+                if delta_format == "zstd" and not self._delta_base_fits(game_folder, game_version):
+                    logger.info(f"{game_version} 已安装的补丁文件超过增量补丁基准大小上限，改为下载完整补丁")
+                    return task
+                logger.info(f"{game_version} 使用增量补丁更新，格式: {delta_format}")
+                self.delta_tasks[game_version] = {
+                    "full_task": task,
+                    "format": delta_format,
+                    "to": target_hash,
+                    "size": delta.get("size"),
+                }
+                delta_path = os.path.splitext(_7z_path)[0] + ".delta"
+                return (delta["url"], game_folder, game_version, delta_path, plugin_path)
+        
+        return task
+
+    def _delta_base_fits(self, game_folder, game_version):
+        """检查已安装的补丁文件能否作为zstd增量补丁的基准文件
+        
+        Args:
+            game_folder: 游戏文件夹路径
+            game_version: 游戏版本
+            
+        Returns:
+            bool: 文件大小未超过DELTA_MAX_BASE_SIZE时返回True
+        """
+        installed_file = os.path.join(game_folder, os.path.basename(GAME_INFO[game_version]["install_path"]))
+        try:
+            return os.path.getsize(installed_file) <= DELTA_MAX_BASE_SIZE
+        except OSError:
+            return False
+
+    def fallback_to_full_download(self, game_version):
+        """增量补丁应用失败时，改为下载完整补丁
+        
+        Args:
+            game_version: 游戏版本
+        """
+        delta_task = self.delta_tasks.pop(game_version, None)
+        if not delta_task:
+            self.on_extraction_finished(True)
+            return
+        
+        logger.info(f"{game_version} 改为下载完整补丁")
+        self.download_queue.appendleft(delta_task["full_task"])
+        self.next_download_task()
                 
     def _fill_offline_download_queue(self, game_dirs):
         """填充离线模式下的下载队列
@@ -687,16 +855,14 @@ class DownloadManager:
         
         msg_box = QtWidgets.QMessageBox(self.main_window)
         msg_box.setWindowTitle(f"下载优化 - {APP_NAME}")
-        msg_box.setText("是否愿意通过Cloudflare加速来优化下载速度？\n\n这将临时修改系统的hosts文件，并需要管理员权限。\n如您的杀毒软件提醒有软件正在修改hosts文件，请注意放行。")
-        
-        cf_icon_path = resource_path("assets/images/ICO/cloudflare_logo_icon.ico")
-        if os.path.exists(cf_icon_path):
-            cf_pixmap = QPixmap(cf_icon_path)
-            if not cf_pixmap.isNull():
-                msg_box.setWindowIcon(QIcon(cf_pixmap))
-                msg_box.setIconPixmap(cf_pixmap.scaled(64, 64, Qt.AspectRatioMode.KeepAspectRatio, 
-                                                    Qt.TransformationMode.SmoothTransformation))
+        if self.get_pinning_mode() == "dns":
+            # 通过本地DNS解析器固定IP，只影响下载进程；解析器无法启动时才会回退为修改hosts文件
+            pinning_notice = "优选IP仅通过本地DNS解析对下载进程生效，不会修改系统文件，也不需要管理员权限。"
         else:
+            pinning_notice = "这将临时修改系统的hosts文件，并需要管理员权限。\n如您的杀毒软件提醒有软件正在修改hosts文件，请注意放行。"
+        msg_box.setText(f"是否愿意通过Cloudflare加速来优化下载速度？\n\n{pinning_notice}")
+        
+        if not get_asset_service().apply_dialog_icon(msg_box, "assets/images/ICO/cloudflare_logo_icon.ico"):
             msg_box.setIcon(QtWidgets.QMessageBox.Icon.Question)
         
         yes_button = msg_box.addButton("是，开启加速", QtWidgets.QMessageBox.ButtonRole.YesRole)
@@ -933,6 +1099,13 @@ class DownloadManager:
         if debug_mode:
             logger.debug(f"DEBUG: 下载完成，直接进入解压阶段")
             
+        # 增量补丁直接应用到已安装的文件上
+        if game_version in self.delta_tasks:
+            self.extraction_handler.start_delta_patch(
+                _7z_path, game_folder, plugin_path, game_version, self.delta_tasks[game_version]
+            )
+            return
+            
         # 直接进入解压阶段
         self.extraction_handler.start_extraction(_7z_path, game_folder, plugin_path, game_version)
 
@@ -985,6 +1158,77 @@ class DownloadManager:
         """显示下载线程设置对话框"""
         return self.download_task_manager.show_download_thread_settings() 
 
+    def get_file_allocation_mode(self):
+        """获取下载文件预分配模式
+        
+        Returns:
+            str: aria2c的--file-allocation取值
+        """
+        config = getattr(self.main_window, 'config', {})
+        mode = config.get("file_allocation", DEFAULT_FILE_ALLOCATION) if isinstance(config, dict) else DEFAULT_FILE_ALLOCATION
+        return mode if mode in FILE_ALLOCATION_MODES else DEFAULT_FILE_ALLOCATION
+
+    def set_file_allocation_mode(self, mode):
+        """设置下载文件预分配模式并保存到配置
+        
+        Args:
+            mode: 预分配模式 (none, prealloc, falloc)
+            
+        Returns:
+            bool: 设置是否成功
+        """
+        if mode not in FILE_ALLOCATION_MODES:
+            return False
+        if hasattr(self.main_window, 'config'):
+            self.main_window.config["file_allocation"] = mode
+            self.main_window.save_config(self.main_window.config)
+        logger.info(f"下载文件预分配模式已设置为: {mode}")
+        return True
+
+    def get_pinning_mode(self):
+        """获取优选IP的固定方式
+        
+        Returns:
+            str: dns（本地DNS解析）或hosts（修改hosts文件）
+        """
+        config = getattr(self.main_window, 'config', {})
+        mode = config.get("pinning_mode", DEFAULT_PINNING_MODE) if isinstance(config, dict) else DEFAULT_PINNING_MODE
+        return mode if mode in PINNING_MODES else DEFAULT_PINNING_MODE
+
+    def set_pinning_mode(self, mode):
+        """设置优选IP的固定方式并保存到配置
+        
+        Args:
+            mode: 固定方式 (dns, hosts)
+            
+        Returns:
+            bool: 设置是否成功
+        """
+        if mode not in PINNING_MODES:
+            return False
+        if hasattr(self.main_window, 'config'):
+            self.main_window.config["pinning_mode"] = mode
+            self.main_window.save_config(self.main_window.config)
+        # 切换方式后清除旧的固定记录，下次下载时重新优选并应用到新的固定方式
+        self.dns_resolver.stop()
+        self.cloudflare_optimizer.has_optimized_in_session = False
+        self.cloudflare_optimizer.optimization_done = False
+        logger.info(f"优选IP固定方式已设置为: {mode}")
+        return True
+
+    def get_dns_server_for(self, hostname):
+        """获取下载指定域名时应使用的本地DNS服务器地址
+        
+        Args:
+            hostname: 下载域名
+            
+        Returns:
+            str: 本地DNS解析器地址，未通过本地DNS固定该域名时返回None
+        """
+        if self.dns_resolver.is_running and hostname and self.dns_resolver.get_pinned_ips(hostname):
+            return self.dns_resolver.address
+        return None
+
     def direct_download_action(self, games_to_download):
         """直接下载指定游戏的补丁，绕过补丁判断，用于从离线模式转接过来的任务
         
@@ -1025,6 +1269,7 @@ class DownloadManager:
                 self.main_window.window_manager.change_window_state(self.main_window.window_manager.STATE_READY)
             return
             
+        self.main_window.patch_manager.begin_install_trace("direct", selected_game_dirs)
         self.main_window.setEnabled(False)
         
         # 获取下载配置
@@ -1049,8 +1294,8 @@ class DownloadManager:
             self.main_window.patch_detector.after_hash_compare()
             return
             
-        # 显示Cloudflare优化选项
-        self._show_cloudflare_option()
+        # 检查磁盘空间后显示Cloudflare优化选项
+        self._run_disk_space_preflight(self._show_cloudflare_option)
         
     def _fill_direct_download_queue(self, config, game_dirs):
         """直接填充下载队列，不检查补丁是否已安装
@@ -1130,25 +1375,7 @@ class DownloadManager:
             threads_dict (dict): 线程名字和线程对象的字典.
             timeout_ms (int): 等待线程自然结束的超时时间.
         """
-        for name, thread_obj in threads_dict.items():
-            if not thread_obj or not hasattr(thread_obj, 'isRunning') or not thread_obj.isRunning():
-                continue
-
-            try:
-                if hasattr(thread_obj, 'requestInterruption'):
-                    thread_obj.requestInterruption()
-                
-                if thread_obj.wait(timeout_ms):
-                    if self.debug_manager:
-                        self.debug_manager.log_debug(f"线程 {name} 已优雅停止.")
-                else:
-                    if self.debug_manager:
-                        self.debug_manager.log_warning(f"线程 {name} 超时，强制终止.")
-                    thread_obj.terminate()
-                    thread_obj.wait(1000) # a short wait after termination
-            except Exception as e:
-                if self.debug_manager:
-                    self.debug_manager.log_error(f"停止线程 {name} 时发生错误: {e}")
+        stop_threads_gracefully(threads_dict, timeout_ms, self.debug_manager)
 
     def on_game_directories_identified(self, game_dirs):
         """当游戏目录识别完成后的回调.
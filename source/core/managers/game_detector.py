@@ -2,6 +2,7 @@ from PySide6.QtCore import QThread, Signal
 import os
 import re
 from utils.logger import setup_logger
+from utils.tracing import trace_span
 
 class GameDetectionThread(QThread):
     """用于在后台线程中执行游戏目录识别的线程"""
@@ -155,6 +156,20 @@ class GameDetector:
     def identify_game_directories_improved(self, selected_folder):
         """改进的游戏目录识别，支持大小写不敏感和特殊字符处理
         
+        Args:
+            selected_folder: 选择的上级目录
+            
+        Returns:
+            dict: 游戏版本到游戏目录的映射
+        """
+        with trace_span("game_detect", cached=selected_folder in self.directory_cache) as span:
+            game_paths = self._scan_game_directories(selected_folder)
+            span.set(found=len(game_paths))
+        return game_paths
+
+    def _scan_game_directories(self, selected_folder):
+        """在选择的目录中查找各游戏的目录，结果会被缓存
+        
         Args:
             selected_folder: 选择的上级目录
             
@@ -1,11 +1,3 @@
-import os
-import sys
-import time
-import subprocess
-import urllib.request
-import ssl
-import threading
-from PySide6.QtCore import QObject, Signal
 from PySide6.QtWidgets import QDialog, QVBoxLayout, QLabel, QPushButton, QTextEdit, QProgressBar, QMessageBox
 
 from config.config import APP_NAME
@@ -23,116 +15,40 @@ class IPv6Manager:
         """
         self.main_window = main_window
         self.config = getattr(main_window, 'config', {})
+        # 连通性检测全部由后台服务完成，这里只读取结果
+        self.connectivity_service = getattr(main_window, 'connectivity_service', None)
         
-    def check_ipv6_availability(self):
-        """检查IPv6是否可用
+    def check_ipv6_availability(self, callback, force=False):
+        """异步检查IPv6是否可用
         
-        通过访问IPv6专用图片URL测试IPv6连接
+        结果来自连通性服务的缓存或一次后台检测，不会阻塞UI线程
         
-        Returns:
-            bool: IPv6是否可用
-        """
-        import urllib.request
-        import time
-        
-        print("开始检测IPv6可用性...")
-        
-        try:
-            # 获取IPv6测试请求
-            ipv6_test_url, req, context = self._get_ipv6_test_request()
-            
-            # 设置3秒超时，避免长时间等待
-            start_time = time.time()
-            with urllib.request.urlopen(req, timeout=3, context=context) as response:
-                # 读取图片数据
-                image_data = response.read()
-                
-                # 检查是否成功
-                if response.status == 200 and len(image_data) > 0:
-                    elapsed = time.time() - start_time
-                    print(f"IPv6测试成功! 用时: {elapsed:.2f}秒")
-                    return True
-                else:
-                    print(f"IPv6测试失败: 状态码 {response.status}")
-                    return False
-        except Exception as e:
-            print(f"IPv6测试失败: {e}")
-            return False
-            
-    def _get_ipv6_test_request(self):
-        """获取IPv6测试请求
-        
-        Returns:
-            tuple: (测试URL, 请求对象, SSL上下文)
+        Args:
+            callback: 结果回调，参数为IPv6是否可用
+            force: 是否忽略缓存重新检测
         """
-        import urllib.request
-        import ssl
-        
-        # IPv6测试URL - 这是一个只能通过IPv6访问的资源
-        ipv6_test_url = "https://ipv6.testipv6.cn/images-nc/knob_green.png?&testdomain=www.test-ipv6.com&testname=sites"
-        
-        # 创建SSL上下文
-        context = ssl._create_unverified_context()
-        
-        # 创建请求并添加常见的HTTP头
-        req = urllib.request.Request(ipv6_test_url)
-        req.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)')
-        req.add_header('Accept', 'image/webp,image/apng,image/*,*/*;q=0.8')
-        
-        return ipv6_test_url, req, context
+        if self.connectivity_service is None:
+            callback(False)
+            return
+        self.connectivity_service.request_ipv6_availability(
+            lambda available, result: callback(available), force=force
+        )
         
     def get_ipv6_address(self):
-        """获取公网IPv6地址
+        """获取最近一次详细检测得到的公网IPv6地址
         
         Returns:
-            str: IPv6地址，如果失败则返回None
+            str: IPv6地址，如果尚未检测或获取失败则返回None
         """
-        try:
-            # 使用curl命令获取IPv6地址
-            process = subprocess.Popen(
-                ["curl", "-6", "6.ipw.cn"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding='utf-8',
-                errors='replace',
-                creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
-            )
-            
-            # 设置超时
-            timeout = 5  # 5秒超时
-            start_time = time.time()
-            while process.poll() is None and (time.time() - start_time) < timeout:
-                time.sleep(0.1)
-            
-            # 如果进程仍在运行，则强制终止
-            if process.poll() is None:
-                process.terminate()
-                print("获取IPv6地址超时")
-                return None
-                
-            stdout, stderr = process.communicate()
-            
-            if process.returncode == 0 and stdout.strip():
-                ipv6_address = stdout.strip()
-                print(f"获取到IPv6地址: {ipv6_address}")
-                return ipv6_address
-            else:
-                print("未能获取到IPv6地址")
-                if stderr:
-                    print(f"错误信息: {stderr}")
-                return None
-        
-        except Exception as e:
-            print(f"获取IPv6地址失败: {e}")
+        if self.connectivity_service is None:
+            return None
+        result = self.connectivity_service.get_cached(detailed=True)
+        if not result:
             return None
+        return result["ipv6"].get("address") or None
             
     def show_ipv6_details(self):
         """显示IPv6连接详情"""
-        class SignalEmitter(QObject):
-            update_signal = Signal(str)
-            complete_signal = Signal(bool, float)
-        
         # 创建对话框
         dialog = QDialog(self.main_window)
         dialog.setWindowTitle(f"IPv6连接测试 - {APP_NAME}")
@@ -161,124 +77,57 @@ class IPv6Manager:
         close_button.setEnabled(False)  # 测试完成前禁用
         layout.addWidget(close_button)
         
-        # 信号发射器
-        signal_emitter = SignalEmitter()
-        
-        # 连接信号
-        signal_emitter.update_signal.connect(
-            lambda text: result_text.append(text)
-        )
-        
-        def on_test_complete(success, elapsed_time):
+        def on_test_complete(result):
+            # 之前已在进行的普通检测结束时，服务会紧接着进行一次详细检测
+            if not result.get("detailed"):
+                return
+            disconnect()
+            ipv4 = result["ipv4"]
+            ipv6 = result["ipv6"]
+            
+            result_text.append(f"IPv4连接: {'✓ 可用' if ipv4['available'] else '✗ 不可用'}")
+            if ipv6["available"]:
+                result_text.append(f"✓ IPv6测试成功! 已下载 {ipv6.get('bytes', 0)} 字节")
+                result_text.append(f"✓ 响应时间: {ipv6['elapsed']:.2f}秒")
+                if ipv6.get("address"):
+                    result_text.append(f"✓ 获取到的IPv6地址: {ipv6['address']}")
+                else:
+                    result_text.append("✗ 未能获取到IPv6地址")
+                result_text.append("\n结论: 您的网络支持IPv6连接 ✓")
+            else:
+                result_text.append(f"✗ 连接失败: {ipv6.get('error', '')}")
+                result_text.append("\n结论: 您的网络不支持IPv6连接 ✗")
+            
             # 停止进度条动画
             progress.setRange(0, 100)
-            progress.setValue(100 if success else 0)
+            progress.setValue(100 if ipv6["available"] else 0)
             
             # 更新状态
-            if success:
-                status_label.setText(f"IPv6连接测试完成: 可用 (用时: {elapsed_time:.2f}秒)")
+            if ipv6["available"]:
+                status_label.setText(f"IPv6连接测试完成: 可用 (用时: {ipv6['elapsed']:.2f}秒)")
             else:
                 status_label.setText("IPv6连接测试完成: 不可用")
             
             # 启用关闭按钮
             close_button.setEnabled(True)
         
-        signal_emitter.complete_signal.connect(on_test_complete)
+        connected = []
         
-        # 测试函数
-        def test_ipv6():
-            try:
-                signal_emitter.update_signal.emit("正在测试IPv6连接，请稍候...")
-                
-                # 先进行标准的IPv6连接测试
-                signal_emitter.update_signal.emit("正在进行标准IPv6连接测试...")
-                
-                # 使用IPv6测试URL
-                ipv6_test_url, req, context = self._get_ipv6_test_request()
-                ipv6_connected = False
-                ipv6_test_elapsed_time = 0
-                
-                try:
-                    # 设置5秒超时
-                    start_time = time.time()
-                    signal_emitter.update_signal.emit(f"开始连接: {ipv6_test_url}")
-                    
-                    # 尝试下载图片
-                    with urllib.request.urlopen(req, timeout=5, context=context) as response:
-                        image_data = response.read()
-                        
-                        # 计算耗时
-                        elapsed_time = time.time() - start_time
-                        ipv6_test_elapsed_time = elapsed_time
-                        
-                        # 检查是否成功
-                        if response.status == 200 and len(image_data) > 0:
-                            ipv6_connected = True
-                            signal_emitter.update_signal.emit(f"✓ 成功! 已下载 {len(image_data)} 字节")
-                            signal_emitter.update_signal.emit(f"✓ 响应时间: {elapsed_time:.2f}秒")
-                        else:
-                            signal_emitter.update_signal.emit(f"✗ 失败: 状态码 {response.status}")
-                            signal_emitter.update_signal.emit("\n结论: 您的网络不支持IPv6连接 ✗")
-                            signal_emitter.complete_signal.emit(False, 0)
-                            return
-                            
-                except Exception as e:
-                    signal_emitter.update_signal.emit(f"✗ 连接失败: {e}")
-                    signal_emitter.update_signal.emit("\n结论: 您的网络不支持IPv6连接 ✗")
-                    signal_emitter.complete_signal.emit(False, 0)
-                    return
-                
-                # 如果IPv6连接测试成功，再尝试获取公网IPv6地址
-                if ipv6_connected:
-                    signal_emitter.update_signal.emit("\n正在获取您的公网IPv6地址...")
-                    
-                    try:
-                        # 使用curl命令获取IPv6地址
-                        process = subprocess.Popen(
-                            ["curl", "-6", "6.ipw.cn"],
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE,
-                            text=True,
-                            encoding='utf-8',
-                            errors='replace',
-                            creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
-                        )
-                        
-                        # 设置超时
-                        timeout = 5  # 5秒超时
-                        start_time = time.time()
-                        while process.poll() is None and (time.time() - start_time) < timeout:
-                            time.sleep(0.1)
-                        
-                        # 如果进程仍在运行，则强制终止
-                        if process.poll() is None:
-                            process.terminate()
-                            signal_emitter.update_signal.emit("✗ 获取IPv6地址超时")
-                        else:
-                            stdout, stderr = process.communicate()
-                            
-                            if process.returncode == 0 and stdout.strip():
-                                ipv6_address = stdout.strip()
-                                signal_emitter.update_signal.emit(f"✓ 获取到的IPv6地址: {ipv6_address}")
-                            else:
-                                signal_emitter.update_signal.emit("✗ 未能获取到IPv6地址")
-                                if stderr:
-                                    signal_emitter.update_signal.emit(f"错误信息: {stderr}")
-                    
-                    except Exception as e:
-                        signal_emitter.update_signal.emit(f"✗ 获取IPv6地址失败: {e}")
-                    
-                    # 输出最终结论
-                    signal_emitter.update_signal.emit("\n结论: 您的网络支持IPv6连接 ✓")
-                    signal_emitter.complete_signal.emit(True, ipv6_test_elapsed_time)
-                    return
-                
-            except Exception as e:
-                signal_emitter.update_signal.emit(f"测试过程中出错: {e}")
-                signal_emitter.complete_signal.emit(False, 0)
+        def disconnect():
+            if connected:
+                self.connectivity_service.result_ready.disconnect(on_test_complete)
+                connected.clear()
         
-        # 启动测试线程
-        threading.Thread(target=test_ipv6, daemon=True).start()
+        if self.connectivity_service is None:
+            result_text.append("连通性服务尚未初始化，请稍后再试。")
+            close_button.setEnabled(True)
+        else:
+            result_text.append("正在测试IPv6连接，请稍候...")
+            self.connectivity_service.result_ready.connect(on_test_complete)
+            connected.append(True)
+            dialog.finished.connect(disconnect)
+            # 用户主动测试时总是重新检测，并获取公网IPv6地址
+            self.connectivity_service.request_probe(force=True, detailed=True)
         
         # 显示对话框
         dialog.exec()
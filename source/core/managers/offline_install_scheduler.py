@@ -0,0 +1,369 @@
+import os
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from config.config import (
+    GAME_INFO, PLUGIN_HASH, EXTRACT_THREADS,
+    OFFLINE_VERIFY_WORKERS, OFFLINE_INSTALL_WORKERS, OFFLINE_INSTALL_PER_DISK
+)
+from utils.archive_index import get_archive_index
+from utils.extraction_backends import get_extraction_backend, run_with_fallback
+from utils.logger import setup_logger
+from utils.tracing import trace_span
+
+# 初始化logger
+logger = setup_logger("offline_install_scheduler")
+
+# 安装任务状态
+JOB_VERIFYING = "verifying"
+JOB_READY = "ready"
+JOB_EXTRACTING = "extracting"
+JOB_HASHING = "hashing"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# 占用CPU和磁盘预算的状态
+_RUNNING_STATES = (JOB_EXTRACTING, JOB_HASHING)
+# 各阶段在单个游戏总进度中所占的区间
+_VERIFY_RANGE = (0, 20)
+_EXTRACT_RANGE = (20, 90)
+# 汇总对话框中失败原因的最大长度
+_MAX_REASON_LENGTH = 120
+
+
+def _disk_key(path):
+    """获取路径所在磁盘卷的标识，用于按磁盘限制并发"""
+    drive = os.path.splitdrive(os.path.abspath(path))[0]
+    if drive:
+        return drive.upper()
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return path
+
+
+def _short_reason(reason):
+    """将多行的错误信息压缩为一行，用于汇总显示"""
+    text = " ".join(str(reason).split())
+    if len(text) > _MAX_REASON_LENGTH:
+        text = text[:_MAX_REASON_LENGTH - 3] + "..."
+    return text
+
+
+class _InstallJob:
+    """一个游戏的离线安装任务"""
+
+    def __init__(self, patch_file, game_folder, game_version, plugin_path):
+        self.patch_file = patch_file
+        self.game_folder = game_folder
+        self.game_version = game_version
+        self.plugin_path = plugin_path
+        self.install_path = os.path.join(
+            game_folder, os.path.basename(GAME_INFO[game_version]["install_path"])
+        )
+        self.disk = _disk_key(game_folder)
+        self.state = JOB_VERIFYING
+        self.percent = 0
+        self.status = "等待校验"
+        self.error = ""
+        self.extraction_thread = None
+        self.hash_thread = None
+
+
+class _VerifyRunnable(QRunnable):
+    """在线程池中校验补丁压缩包的完整性，结果通过调度器的信号送回UI线程"""
+
+    def __init__(self, scheduler, job, threads):
+        super().__init__()
+        self.scheduler = scheduler
+        self.job = job
+        self.backend = get_extraction_backend(threads=threads)
+
+    def run(self):
+        game_version = self.job.game_version
+        error = ""
+        if self.scheduler.is_cancelled:
+            error = "操作已取消"
+        else:
+            with trace_span("offline_verify", game=game_version) as span:
+                try:
+                    # 顺便读取压缩包目录索引，之后的解压和校验直接复用；
+                    # py7zr无法解析的压缩包仍交给7-Zip校验
+                    try:
+                        get_archive_index(self.job.patch_file)
+                    except Exception as e:
+                        logger.debug(f"读取 {game_version} 的压缩包目录索引失败: {e}")
+                    _, used_backend = run_with_fallback(
+                        self.backend, "test_archive", self.job.patch_file,
+                        progress=lambda percent: self.scheduler._verify_progress.emit(game_version, percent)
+                    )
+                    span.set(backend=used_backend.name)
+                except Exception as e:
+                    span.fail(e)
+                    error = str(e) or type(e).__name__
+        self.scheduler._verified.emit(game_version, error)
+
+
+class OfflineInstallScheduler(QObject):
+    """离线补丁并发安装调度器
+
+    先在线程池中并行校验所有补丁压缩包的完整性（只解压校验CRC，不写入磁盘），
+    损坏的压缩包在开始安装前即被排除；随后同时解压安装多个游戏，每个游戏解压完成后
+    立即进行安装后哈希校验。同时进行的游戏数受max_workers（CPU预算）限制，
+    同一磁盘卷上同时进行的游戏数受per_disk（磁盘预算）限制，7-Zip的解压线程数按并发数平分CPU核心。
+    各游戏的错误不再逐个弹窗，而是汇总后通过finished信号交给调用方统一显示。
+    """
+    finished = Signal(list, dict)  # 安装成功的游戏列表, 游戏 -> 失败原因
+
+    _verified = Signal(str, str)  # 内部使用：游戏版本, 错误信息（为空表示校验通过）
+    _verify_progress = Signal(str, int)  # 内部使用：游戏版本, 校验进度
+
+    def __init__(self, main_window, install_tasks, max_workers=OFFLINE_INSTALL_WORKERS,
+                 per_disk=OFFLINE_INSTALL_PER_DISK, verify_workers=OFFLINE_VERIFY_WORKERS):
+        """初始化并发安装调度器
+
+        Args:
+            main_window: 主窗口实例
+            install_tasks: 安装任务列表，每个任务是一个元组 (patch_file, game_folder, game_version, _7z_path, plugin_path)
+            max_workers: 同时解压安装的游戏数上限
+            per_disk: 同一磁盘卷上同时解压安装的游戏数上限
+            verify_workers: 并行校验压缩包的最大线程数
+        """
+        super().__init__(main_window)
+        self.main_window = main_window
+        self.jobs = {}
+        for patch_file, game_folder, game_version, _7z_path, plugin_path in install_tasks:
+            self.jobs[game_version] = _InstallJob(patch_file, game_folder, game_version, plugin_path)
+        self.max_workers = max(1, min(max_workers, len(self.jobs)))
+        self.per_disk = max(1, per_disk)
+        verify_workers = max(1, min(verify_workers, len(self.jobs)))
+        self.verify_threads = self._threads_per_job(verify_workers)
+        self.extract_threads = self._threads_per_job(self.max_workers)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(verify_workers)
+        self.installed = []
+        self.failures = {}
+        self.progress_window = None
+        self._runnables = []
+        self._cancelled = False
+        self._finished = False
+        self._verified.connect(self._on_verified)
+        self._verify_progress.connect(self._on_verify_progress)
+
+    @property
+    def is_cancelled(self):
+        return self._cancelled
+
+    @staticmethod
+    def _threads_per_job(workers):
+        if EXTRACT_THREADS:
+            return EXTRACT_THREADS
+        return max(1, (os.cpu_count() or 1) // workers)
+
+    def start(self):
+        """显示进度窗口并开始并行校验所有压缩包"""
+        logger.info(
+            f"开始并发离线安装: {', '.join(self.jobs)}，"
+            f"同时安装 {self.max_workers} 个，每个磁盘卷 {self.per_disk} 个"
+        )
+        self.progress_window = self.main_window.create_extraction_progress_window()
+        try:
+            self.progress_window.show()
+        except Exception:
+            pass
+        self._refresh_progress()
+
+        for job in self.jobs.values():
+            runnable = _VerifyRunnable(self, job, self.verify_threads)
+            # 由调度器持有引用，取消时可以终止正在运行的7-Zip进程
+            runnable.setAutoDelete(False)
+            self._runnables.append(runnable)
+            self.pool.start(runnable)
+
+    def cancel(self):
+        """取消尚未结束的校验和安装（退出程序时调用）"""
+        self._cancelled = True
+        for runnable in self._runnables:
+            runnable.backend.cancel()
+        for thread in self.running_threads().values():
+            thread.requestInterruption()
+
+    def running_threads(self):
+        """获取正在运行的解压和校验线程
+
+        Returns:
+            dict: 线程名称 -> 线程对象
+        """
+        threads = {}
+        for job in self.jobs.values():
+            if job.extraction_thread is not None:
+                threads[f"offline_extraction_{job.game_version}"] = job.extraction_thread
+            if job.hash_thread is not None:
+                threads[f"offline_hash_{job.game_version}"] = job.hash_thread
+        return threads
+
+    def wait(self, msecs=3000):
+        """等待线程池中的校验任务结束"""
+        return self.pool.waitForDone(msecs)
+
+    def _on_verify_progress(self, game_version, percent):
+        job = self.jobs[game_version]
+        if job.state != JOB_VERIFYING:
+            return
+        job.percent = _VERIFY_RANGE[0] + (_VERIFY_RANGE[1] - _VERIFY_RANGE[0]) * percent // 100
+        job.status = f"正在校验压缩包 {percent}%"
+        self._refresh_progress()
+
+    def _on_verified(self, game_version, error):
+        job = self.jobs[game_version]
+        if error:
+            self._fail(job, f"补丁压缩包校验失败: {error}")
+        else:
+            logger.debug(f"{game_version} 的补丁压缩包校验通过")
+            job.state = JOB_READY
+            job.percent = _VERIFY_RANGE[1]
+            job.status = "等待安装"
+
+        # 所有压缩包都校验完成后才开始安装，避免校验和解压争抢磁盘
+        if all(job.state != JOB_VERIFYING for job in self.jobs.values()):
+            self._schedule()
+        else:
+            self._refresh_progress()
+
+    def _schedule(self):
+        """在CPU和磁盘预算内启动等待中的安装任务，全部结束后汇总结果"""
+        if not self._cancelled:
+            running = [job for job in self.jobs.values() if job.state in _RUNNING_STATES]
+            for job in self.jobs.values():
+                if len(running) >= self.max_workers:
+                    break
+                if job.state != JOB_READY:
+                    continue
+                if sum(1 for other in running if other.disk == job.disk) >= self.per_disk:
+                    continue
+                if self._start_extraction(job):
+                    running.append(job)
+
+        self._refresh_progress()
+        if all(job.state not in _RUNNING_STATES for job in self.jobs.values()) and (
+            self._cancelled or all(job.state in (JOB_DONE, JOB_FAILED) for job in self.jobs.values())
+        ):
+            self._finish()
+
+    def _start_extraction(self, job):
+        from workers.extraction_thread import ExtractionThread
+
+        try:
+            os.makedirs(job.game_folder, exist_ok=True)
+            thread = ExtractionThread(
+                job.patch_file, job.game_folder, job.plugin_path, job.game_version, self.main_window,
+                threads=self.extract_threads
+            )
+            thread.progress.connect(lambda percent, status, job=job: self._on_extraction_progress(job, percent))
+            thread.finished.connect(
+                lambda success, error, game_version, job=job: self._on_extraction_finished(job, success, error)
+            )
+            job.extraction_thread = thread
+            job.state = JOB_EXTRACTING
+            job.status = "正在解压"
+            thread.start()
+            return True
+        except Exception as e:
+            logger.error(f"启动 {job.game_version} 的解压线程失败: {e}")
+            job.extraction_thread = None
+            self._fail(job, f"安装过程中发生错误: {e}")
+            return False
+
+    def _on_extraction_progress(self, job, percent):
+        if job.state != JOB_EXTRACTING:
+            return
+        job.percent = _EXTRACT_RANGE[0] + (_EXTRACT_RANGE[1] - _EXTRACT_RANGE[0]) * percent // 100
+        job.status = f"正在解压 {percent}%"
+        self._refresh_progress()
+
+    def _on_extraction_finished(self, job, success, error):
+        job.extraction_thread = None
+        if not success:
+            self._fail(job, error or "解压失败")
+            self._schedule()
+            return
+
+        # 解压完成后立即校验，校验期间继续占用该游戏的预算
+        from workers.hash_thread import HashThread
+
+        job.state = JOB_HASHING
+        job.percent = _EXTRACT_RANGE[1]
+        job.status = "正在校验安装文件"
+        job.hash_thread = HashThread(
+            "after", {job.game_version: job.install_path}, PLUGIN_HASH,
+            self.main_window.installed_status, self.main_window
+        )
+        job.hash_thread.after_finished.connect(lambda result, job=job: self._on_hash_finished(job, result))
+        job.hash_thread.start()
+        self._refresh_progress()
+
+    def _on_hash_finished(self, job, result):
+        job.hash_thread = None
+        if result["passed"]:
+            logger.info(f"===== {job.game_version} 哈希校验通过 =====")
+            job.state = JOB_DONE
+            job.percent = 100
+            job.status = "安装完成"
+            self.main_window.installed_status[job.game_version] = True
+            self.installed.append(job.game_version)
+        else:
+            logger.error(f"===== {job.game_version} 哈希校验失败 =====")
+            self._remove_failed_install(job)
+            self._fail(job, result.get("message") or "哈希校验失败")
+        self._schedule()
+
+    def _remove_failed_install(self, job):
+        """删除校验失败的补丁文件（NEKOPARA After同时删除签名文件）"""
+        paths = [job.install_path]
+        if job.game_version == "NEKOPARA After":
+            paths.append(f"{job.install_path}.sig")
+        for path in paths:
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+                    logger.debug(f"已删除校验失败的文件: {path}")
+            except OSError as e:
+                logger.error(f"删除文件失败: {e}")
+
+    def _fail(self, job, reason):
+        job.state = JOB_FAILED
+        job.percent = 100
+        job.status = "安装失败"
+        job.error = _short_reason(reason)
+        self.failures[job.game_version] = job.error
+        self.main_window.installed_status[job.game_version] = False
+        logger.error(f"{job.game_version} 离线安装失败: {job.error}")
+
+    def _refresh_progress(self):
+        """以所有游戏的平均进度更新进度窗口，并逐行显示各游戏的状态"""
+        window = self.progress_window
+        if window is None:
+            return
+        try:
+            window.progress_bar.setValue(sum(job.percent for job in self.jobs.values()) // len(self.jobs))
+            window.status_label.setText(
+                "\n".join(f"{job.game_version}: {job.status}" for job in self.jobs.values())
+            )
+        except Exception:
+            pass
+
+    def _finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        try:
+            if self.progress_window and self.progress_window.isVisible():
+                self.progress_window.close()
+        except Exception:
+            pass
+        self.progress_window = None
+        logger.info(
+            f"并发离线安装结束，成功: {', '.join(self.installed) or '无'}，"
+            f"失败: {', '.join(self.failures) or '无'}"
+        )
+        self.finished.emit(list(self.installed), dict(self.failures))
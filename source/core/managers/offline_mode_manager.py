@@ -1,14 +1,12 @@
 import os
 import hashlib
 import shutil
-import tempfile
-import py7zr
 import traceback
 from PySide6 import QtWidgets, QtCore
 from PySide6.QtCore import QTimer
 from PySide6.QtWidgets import QMessageBox
 
-from config.config import PLUGIN, PLUGIN_HASH, GAME_INFO
+from config.config import PLUGIN, PLUGIN_HASH, GAME_INFO, OFFLINE_INSTALL_WORKERS
 from utils import msgbox_frame
 from utils.logger import setup_logger
 
@@ -34,6 +32,9 @@ class OfflineModeManager:
         # 解压线程与进度窗口引用，避免运行中被销毁，且确保UI可更新
         self.extraction_thread = None
         self.extraction_progress_window = None
+        # 多个游戏同时安装时的调度器，以及各游戏的失败原因（显示在安装结果中）
+        self.install_scheduler = None
+        self.install_errors = {}
         
     def _is_debug_mode(self):
         """检查是否处于调试模式
@@ -303,7 +304,6 @@ class OfflineModeManager:
             
         # 创建进度对话框
         from utils.helpers import ProgressHashVerifyDialog
-        from config.config import PLUGIN_HASH
         from workers.hash_thread import OfflineHashVerifyThread
         
         # 创建并显示进度对话框
@@ -437,70 +437,37 @@ class OfflineModeManager:
                 raise ValueError(f"未知的游戏版本: {game_version}")
             
             # 直接解压文件到游戏目录
-            import py7zr
+            from utils.archive_index import get_archive_index
+            from utils.extraction_backends import get_extraction_backend, run_with_fallback
             
             if debug_mode:
                 logger.debug(f"DEBUG: 直接解压文件 {_7z_path} 到游戏目录 {game_folder}")
             
-            # 解压文件
-            with py7zr.SevenZipFile(_7z_path, mode="r") as archive:
-                # 获取压缩包内的文件列表
-                file_list = archive.getnames()
+            # 使用共享的压缩包目录索引（哈希验证时已读取过），不再重复解析文件头
+            index = get_archive_index(_7z_path)
+            if debug_mode:
+                logger.debug(f"DEBUG: 压缩包内文件列表: {index.names}")
+            
+            target_file_in_archive, sig_file_in_archive = index.find_patch(target_filename)
+            if not target_file_in_archive:
                 if debug_mode:
-                    logger.debug(f"DEBUG: 压缩包内文件列表: {file_list}")
-                
-                # 解析压缩包内的文件结构
-                target_file_in_archive = None
-                for file_path in file_list:
-                    if target_filename in file_path:
-                        target_file_in_archive = file_path
-                        break
-                
-                if not target_file_in_archive:
-                    if debug_mode:
-                        logger.warning(f"DEBUG: 在压缩包中未找到目标文件 {target_filename}")
-                    raise FileNotFoundError(f"在压缩包中未找到目标文件 {target_filename}")
-                
-                # 准备解压特定文件到游戏目录
-                target_path = os.path.join(game_folder, target_filename)
-                
-                # 创建一个临时目录用于解压单个文件
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    # 解压特定文件到临时目录
-                    archive.extract(path=temp_dir, targets=[target_file_in_archive])
-                    
-                    # 找到解压后的文件
-                    extracted_file_path = os.path.join(temp_dir, target_file_in_archive)
-                    
-                    # 复制到目标位置
-                    shutil.copy2(extracted_file_path, target_path)
-                    
-                    if debug_mode:
-                        logger.debug(f"DEBUG: 已解压并复制文件到 {target_path}")
-                    
-                    # 对于NEKOPARA After，还需要复制签名文件
-                    if game_version == "NEKOPARA After":
-                        sig_filename = f"{target_filename}.sig"
-                        sig_file_in_archive = None
-                        
-                        # 查找签名文件
-                        for file_path in file_list:
-                            if sig_filename in file_path:
-                                sig_file_in_archive = file_path
-                                break
-                        
-                        if sig_file_in_archive:
-                            # 解压签名文件
-                            archive.extract(path=temp_dir, targets=[sig_file_in_archive])
-                            extracted_sig_path = os.path.join(temp_dir, sig_file_in_archive)
-                            sig_target = os.path.join(game_folder, sig_filename)
-                            shutil.copy2(extracted_sig_path, sig_target)
-                            
-                            if debug_mode:
-                                logger.debug(f"DEBUG: 已解压并复制签名文件到 {sig_target}")
-                        else:
-                            if debug_mode:
-                                logger.warning(f"DEBUG: 未找到签名文件 {sig_filename}")
+                    logger.warning(f"DEBUG: 在压缩包中未找到目标文件 {target_filename}")
+                raise FileNotFoundError(f"在压缩包中未找到目标文件 {target_filename}")
+            
+            # 先写入游戏目录中的.partial文件，全部成功后再重命名为目标文件
+            destinations = {target_file_in_archive: os.path.join(game_folder, target_filename)}
+            
+            # 对于NEKOPARA After，还需要解压签名文件
+            if game_version == "NEKOPARA After":
+                sig_filename = f"{target_filename}.sig"
+                if sig_file_in_archive:
+                    destinations[sig_file_in_archive] = os.path.join(game_folder, sig_filename)
+                elif debug_mode:
+                    logger.warning(f"DEBUG: 未找到签名文件 {sig_filename}")
+            
+            run_with_fallback(get_extraction_backend(), "extract_members", _7z_path, destinations)
+            if debug_mode:
+                logger.debug(f"DEBUG: 已解压文件到 {', '.join(destinations.values())}")
             
             # 进行安装后的哈希校验
             self._perform_hash_check(game_version, install_tasks)
@@ -534,7 +501,6 @@ class OfflineModeManager:
         debug_mode = self._is_debug_mode()
         
         # 导入所需模块
-        from config.config import GAME_INFO, PLUGIN_HASH
         from workers.hash_thread import HashThread
         
         # 获取安装路径
@@ -781,10 +747,12 @@ class OfflineModeManager:
                 logger.warning("DEBUG: 未识别到任何游戏目录")
             return False
             
+        self.main_window.patch_manager.begin_install_trace("offline", selected_games)
         self.main_window.setEnabled(False)
         
         # 重置已安装游戏列表
         self.installed_games = []
+        self.install_errors = {}
         
         # 设置到主窗口，供结果显示使用
         self.main_window.download_queue_history = selected_games
@@ -835,11 +803,14 @@ class OfflineModeManager:
             # 添加到安装任务列表
             install_tasks.append((patch_file, game_folder, game_version, _7z_path, plugin_path))
         
-        # 开始执行第一个安装任务
+        # 开始执行安装任务：多个游戏时并行校验和安装，否则按顺序逐个安装
         if install_tasks:
             if debug_mode:
                 logger.debug(f"开始离线安装流程，安装游戏数量: {len(install_tasks)}")
-            self.process_next_offline_install_task(install_tasks)
+            if OFFLINE_INSTALL_WORKERS > 1 and len(install_tasks) > 1:
+                self._start_concurrent_install(install_tasks)
+            else:
+                self.process_next_offline_install_task(install_tasks)
             return True
         else:
             if debug_mode:
@@ -881,6 +852,67 @@ class OfflineModeManager:
                 QMessageBox.StandardButton.Ok
             ).exec()
             
+    def _start_concurrent_install(self, install_tasks):
+        """使用并发调度器同时校验和安装多个游戏
+        
+        Args:
+            install_tasks: 安装任务列表，每个任务是一个元组 (patch_file, game_folder, game_version, _7z_path, plugin_path)
+        """
+        from core.managers.offline_install_scheduler import OfflineInstallScheduler
+        
+        self.install_scheduler = OfflineInstallScheduler(self.main_window, install_tasks)
+        self.install_scheduler.finished.connect(self._on_concurrent_install_finished)
+        self.install_scheduler.start()
+        
+    def _on_concurrent_install_finished(self, installed_games, failures):
+        """并发安装结束后汇总结果，进入与顺序安装相同的后检查流程
+        
+        Args:
+            installed_games: 安装成功的游戏列表
+            failures: 游戏 -> 失败原因
+        """
+        scheduler = self.install_scheduler
+        self.install_scheduler = None
+        if scheduler is not None:
+            scheduler.deleteLater()
+            # 退出程序时取消的安装不再进行后检查
+            if scheduler.is_cancelled:
+                return
+            
+        for game_version in installed_games:
+            if game_version not in self.installed_games:
+                self.installed_games.append(game_version)
+        self.install_errors = failures
+        self._finish_offline_install()
+        
+    def _finish_offline_install(self):
+        """所有离线安装任务结束后进行安装后检查，并显示结果"""
+        debug_mode = self._is_debug_mode()
+        if debug_mode:
+            logger.debug("所有离线安装任务完成，进行后检查")
+            
+        # 使用patch_detector进行安装后哈希比较
+        self.main_window.patch_detector.after_hash_compare()
+        
+        # 检查是否有未找到离线补丁文件的游戏
+        if hasattr(self, 'missing_offline_patches') and self.missing_offline_patches:
+            if debug_mode:
+                logger.debug(f"DEBUG: 有未找到离线补丁文件的游戏: {self.missing_offline_patches}")
+            
+            # 先显示已安装的结果
+            if self.installed_games:
+                installed_msg = f"已成功安装以下补丁：\n\n{chr(10).join(self.installed_games)}\n\n"
+            else:
+                installed_msg = ""
+            
+            # 在安装完成后询问用户是否切换到在线模式
+            self._show_missing_patches_dialog(installed_msg)
+        else:
+            # 恢复UI状态
+            self.main_window.setEnabled(True)
+            if hasattr(self.main_window, 'window_manager'):
+                self.main_window.window_manager.change_window_state(self.main_window.window_manager.STATE_READY)
+            
     def process_next_offline_install_task(self, install_tasks):
         """处理下一个离线安装任务
         
@@ -891,31 +923,7 @@ class OfflineModeManager:
         
         if not install_tasks:
             # 所有任务完成，进行后检查
-            if debug_mode:
-                logger.debug("所有离线安装任务完成，进行后检查")
-                
-            # 使用patch_detector进行安装后哈希比较
-            self.main_window.patch_detector.after_hash_compare()
-            
-            # 检查是否有未找到离线补丁文件的游戏
-            if hasattr(self, 'missing_offline_patches') and self.missing_offline_patches:
-                if debug_mode:
-                    logger.debug(f"DEBUG: 有未找到离线补丁文件的游戏: {self.missing_offline_patches}")
-                
-                # 先显示已安装的结果
-                if self.installed_games:
-                    installed_msg = f"已成功安装以下补丁：\n\n{chr(10).join(self.installed_games)}\n\n"
-                else:
-                    installed_msg = ""
-                
-                # 在安装完成后询问用户是否切换到在线模式
-                self._show_missing_patches_dialog(installed_msg)
-            else:
-                # 恢复UI状态
-                self.main_window.setEnabled(True)
-                if hasattr(self.main_window, 'window_manager'):
-                    self.main_window.window_manager.change_window_state(self.main_window.window_manager.STATE_READY)
-                
+            self._finish_offline_install()
             return
             
         # 获取下一个任务
@@ -1,16 +1,21 @@
 import os
 import hashlib
 import tempfile
-import py7zr
 import traceback
 from utils.logger import setup_logger
 from PySide6.QtWidgets import QMessageBox
 from PySide6.QtCore import QTimer, QThread, Signal
-from config.config import PLUGIN_HASH, APP_NAME
+from config.config import PLUGIN_HASH, APP_NAME, GAME_INFO
+from utils.archive_index import get_archive_index
+from utils.extraction_backends import get_extraction_backend, run_with_fallback
+from utils.tracing import trace_span
 
 # 初始化logger
 logger = setup_logger("patch_detector")
 
+# 计算哈希时每次读取的字节数
+HASH_READ_CHUNK_SIZE = 1024 * 1024
+
 class PatchCheckThread(QThread):
     """用于在后台线程中执行补丁检查的线程"""
     finished = Signal(bool)  # (is_installed)
@@ -163,6 +168,12 @@ class PatchDetector:
         
     def verify_patch_hash(self, game_version, file_path):
         """验证补丁文件的哈希值"""
+        with trace_span("hash_offline", game=game_version) as span:
+            result = self._verify_patch_hash(game_version, file_path)
+            span.set(passed=result)
+            return result
+
+    def _verify_patch_hash(self, game_version, file_path):
         expected_hash = self.plugin_hash.get(game_version, "")
             
         if not expected_hash:
@@ -185,15 +196,23 @@ class PatchDetector:
                     logger.debug(f"DEBUG: 创建临时目录: {temp_dir}")
                     
                 try:
-                    with py7zr.SevenZipFile(file_path, mode="r") as archive:
-                        archive.extractall(path=temp_dir)
+                    # 通过共享的压缩包目录索引只解压补丁文件本身，找不到时才解压全部文件
+                    index = get_archive_index(file_path)
+                    member = None
+                    if game_version in GAME_INFO:
+                        member = index.find_member(os.path.basename(GAME_INFO[game_version]["plugin_path"]))
+                    backend = get_extraction_backend()
+                    if member:
+                        patch_file = os.path.join(temp_dir, member)
+                        run_with_fallback(backend, "extract_members", file_path, {member: patch_file})
+                    else:
+                        run_with_fallback(backend, "extract_all", file_path, temp_dir)
+                        patch_file = self._find_patch_file_in_temp_dir(temp_dir, game_version)
                 except Exception as e:
                     if debug_mode:
                         logger.error(f"DEBUG: 解压补丁文件失败: {e}")
                     return False
                 
-                patch_file = self._find_patch_file_in_temp_dir(temp_dir, game_version)
-                
                 if not patch_file or not os.path.exists(patch_file):
                     if debug_mode:
                         logger.warning(f"DEBUG: 未找到解压后的补丁文件")
@@ -203,8 +222,12 @@ class PatchDetector:
                     logger.debug(f"DEBUG: 找到解压后的补丁文件: {patch_file}")
                     
                 try:
+                    # 分块读取，避免将整个补丁文件读入内存
+                    hash_obj = hashlib.sha256()
                     with open(patch_file, "rb") as f:
-                        file_hash = hashlib.sha256(f.read()).hexdigest()
+                        for chunk in iter(lambda: f.read(HASH_READ_CHUNK_SIZE), b""):
+                            hash_obj.update(chunk)
+                    file_hash = hash_obj.hexdigest()
                     
                     result = file_hash.lower() == expected_hash.lower()
                     
@@ -5,6 +5,7 @@ from PySide6.QtWidgets import QMessageBox
 from utils.logger import setup_logger
 from config.config import APP_NAME
 from utils import msgbox_frame
+from utils.tracing import trace_span, start_span
 
 class PatchManager:
     """补丁管理器，用于处理补丁的安装和卸载"""
@@ -25,6 +26,7 @@ class PatchManager:
         self.installed_status = {}  # 游戏版本的安装状态
         self.logger = setup_logger("patch_manager")
         self.patch_detector = None  # 将在main_window初始化后设置
+        self.install_span = None  # 当前安装流程的计时记录
         
     def set_patch_detector(self, patch_detector):
         """设置补丁检测器实例
@@ -71,6 +73,40 @@ class PatchManager:
             return self.installed_status.get(game_version, False)
         return self.installed_status
     
+    def begin_install_trace(self, mode, games=None):
+        """开始记录一次安装流程的计时，各阶段的计时记录在追踪文件中按时间与其对应
+        
+        Args:
+            mode: 安装方式（online/direct/offline）
+            games: 本次涉及的游戏列表
+        """
+        # 上一次流程中途取消时没有走到结果展示，这里补记为取消
+        self.end_install_trace(cancelled=True)
+        self.install_span = start_span("install", mode=mode, games=list(games or []))
+
+    def end_install_trace(self, cancelled=False, **attrs):
+        """结束当前安装流程的计时记录
+        
+        Args:
+            cancelled: 流程是否被取消
+            **attrs: 附加的结果信息
+        """
+        span, self.install_span = self.install_span, None
+        if span is None:
+            return
+        span.set(**attrs)
+        if cancelled:
+            span.cancel()
+        span.end()
+
+    @staticmethod
+    def _trace_result(span, result):
+        """根据卸载或切换操作的返回值记录结束状态"""
+        success = result.get("success", False) if isinstance(result, dict) else bool(result)
+        if not success:
+            span.fail(result.get("message", "") if isinstance(result, dict) else "")
+        return result
+
     def uninstall_patch(self, game_dir, game_version, silent=False):
         """卸载补丁
         
@@ -83,6 +119,10 @@ class PatchManager:
             bool: 卸载成功返回True，失败返回False
             dict: 在silent=True时，返回包含卸载结果信息的字典
         """
+        with trace_span("uninstall", game=game_version) as span:
+            return self._trace_result(span, self._uninstall_patch(game_dir, game_version, silent))
+
+    def _uninstall_patch(self, game_dir, game_version, silent=False):
         debug_mode = self._is_debug_mode()
         
         if debug_mode:
@@ -632,6 +672,10 @@ class PatchManager:
         Returns:
             dict: 包含操作结果信息的字典
         """
+        with trace_span("toggle_patch", game=game_version, operation=operation) as span:
+            return self._trace_result(span, self._toggle_patch(game_dir, game_version, operation, silent))
+
+    def _toggle_patch(self, game_dir, game_version, operation=None, silent=False):
         debug_mode = self._is_debug_mode()
         
         if debug_mode:
@@ -927,6 +971,11 @@ class PatchManager:
         if is_offline_mode and hasattr(self.main_window.offline_mode_manager, 'installed_games'):
             installed_games = self.main_window.offline_mode_manager.installed_games
         
+        # 离线并发安装时记录的失败原因
+        install_errors = {}
+        if is_offline_mode:
+            install_errors = getattr(self.main_window.offline_mode_manager, 'install_errors', {}) or {}
+        
         debug_mode = self._is_debug_mode()
             
         if debug_mode:
@@ -965,12 +1014,18 @@ class PatchManager:
         
         result_text += f"安装成功：{total_installed} 个  安装失败：{total_failed} 个\n\n"
         
+        self.end_install_trace(installed=installed_versions, failed=failed_versions, skipped=skipped_versions)
+        
         # 详细列表
         if installed_versions:
             result_text += f"【成功安装】:\n{chr(10).join(installed_versions)}\n\n"
             
         if failed_versions:
-            result_text += f"【安装失败】:\n{chr(10).join(failed_versions)}\n\n"
+            failed_lines = [
+                f"{version}（{install_errors[version]}）" if version in install_errors else version
+                for version in failed_versions
+            ]
+            result_text += f"【安装失败】:\n{chr(10).join(failed_lines)}\n\n"
             
         if not_found_versions:
             # 只有在真正检测到了游戏但未安装补丁时才显示
@@ -0,0 +1,203 @@
+import traceback
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, QTimer, Signal
+
+from config.config import STARTUP_WORKERS
+from utils.logger import setup_logger
+from utils.tracing import trace_span
+
+# 初始化logger
+logger = setup_logger("startup_orchestrator")
+
+# 任务状态
+STATE_PENDING = "pending"
+STATE_RUNNING = "running"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+
+class _StartupTask:
+    """一个启动任务的定义和运行状态"""
+
+    def __init__(self, name, func, depends_on, ui_thread, on_error):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+        self.ui_thread = ui_thread
+        self.on_error = on_error
+        self.state = STATE_PENDING
+        self.result = None
+        self.error = ""
+
+
+class _TaskRunnable(QRunnable):
+    """在线程池中执行任务函数，结果通过编排器的信号送回UI线程"""
+
+    def __init__(self, orchestrator, task):
+        super().__init__()
+        self.orchestrator = orchestrator
+        self.task = task
+
+    def run(self):
+        result, error = None, ""
+        with trace_span("startup_task", task=self.task.name, ui_thread=False) as span:
+            try:
+                result = self.task.func()
+            except Exception as e:
+                span.fail(e)
+                error = str(e) or type(e).__name__
+                logger.error(f"启动任务 {self.task.name} 失败: {error}\n{traceback.format_exc()}")
+        self.orchestrator._task_done.emit(self.task.name, result, error)
+
+
+class StartupOrchestrator(QObject):
+    """启动任务编排器
+
+    互不依赖的启动任务（进程检查、离线补丁扫描、hosts备份、云端配置获取等）在线程池中并行执行，
+    窗口无需等待它们即可显示。任务之间的先后关系通过depends_on显式声明：
+    依赖只约束执行顺序，依赖任务失败时后续任务仍会执行，由各任务自行处理缺失的结果。
+    需要弹窗或修改界面的任务以ui_thread=True在UI线程中执行。
+    """
+    task_finished = Signal(str, object)  # 任务名称, 返回值
+    task_failed = Signal(str, str)  # 任务名称, 错误信息
+    all_finished = Signal()
+
+    _task_done = Signal(str, object, str)  # 内部使用：工作线程 -> UI线程
+
+    def __init__(self, main_window, max_workers=STARTUP_WORKERS):
+        """初始化启动任务编排器
+
+        Args:
+            main_window: 主窗口实例
+            max_workers: 线程池的最大线程数
+        """
+        super().__init__(main_window)
+        self.main_window = main_window
+        self.tasks = {}
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_workers)
+        self._started = False
+        self._task_done.connect(self._on_task_done)
+
+    def add_task(self, name, func=None, depends_on=(), ui_thread=False, on_error=None):
+        """添加启动任务
+
+        Args:
+            name: 任务名称
+            func: 任务函数，无参数，返回值可通过result()获取；
+                为None时表示任务在外部异步完成，需调用finish()标记
+            depends_on: 必须先完成的任务名称，只能引用已添加的任务
+            ui_thread: 是否在UI线程中执行（弹窗、修改界面等）
+            on_error: 任务失败时在UI线程中调用的函数，参数为错误信息
+
+        Returns:
+            StartupOrchestrator: 编排器本身，便于连续添加
+        """
+        if name in self.tasks:
+            raise ValueError(f"启动任务 {name} 已存在")
+        # 只允许依赖已添加的任务，从而保证不会出现循环依赖
+        for dependency in depends_on:
+            if dependency not in self.tasks:
+                raise ValueError(f"启动任务 {name} 依赖的任务 {dependency} 不存在")
+        self.tasks[name] = _StartupTask(name, func, depends_on, ui_thread, on_error)
+        if self._started:
+            self._schedule()
+        return self
+
+    def start(self):
+        """开始执行所有依赖已满足的任务"""
+        self._started = True
+        self._schedule()
+
+    def result(self, name, default=None):
+        """获取已完成任务的返回值
+
+        Args:
+            name: 任务名称
+            default: 任务未完成或失败时返回的值
+
+        Returns:
+            object: 任务返回值
+        """
+        task = self.tasks.get(name)
+        if task is None or task.state != STATE_DONE:
+            return default
+        return task.result
+
+    def is_finished(self, name=None):
+        """检查指定任务（为None时检查全部任务）是否已结束"""
+        names = [name] if name is not None else list(self.tasks)
+        return all(
+            name in self.tasks and self.tasks[name].state in (STATE_DONE, STATE_FAILED)
+            for name in names
+        )
+
+    def finish(self, name, result=None, error=""):
+        """标记外部异步任务完成
+
+        Args:
+            name: 任务名称
+            result: 任务结果
+            error: 错误信息，非空时视为失败
+        """
+        task = self.tasks.get(name)
+        if task is None or task.state in (STATE_DONE, STATE_FAILED):
+            return
+        self._on_task_done(name, result, error)
+
+    def wait(self, msecs=3000):
+        """等待线程池中的任务结束（退出程序前调用）"""
+        return self.pool.waitForDone(msecs)
+
+    def _schedule(self):
+        """启动所有依赖已结束的待执行任务"""
+        for task in self.tasks.values():
+            if task.state != STATE_PENDING or not self._is_ready(task):
+                continue
+            task.state = STATE_RUNNING
+            if task.func is None:
+                # 外部任务，等待finish()
+                continue
+            if task.ui_thread:
+                # 在事件循环中执行，避免在其他任务的回调中嵌套运行
+                QTimer.singleShot(0, lambda task=task: self._run_in_ui_thread(task))
+            else:
+                self.pool.start(_TaskRunnable(self, task))
+
+    def _is_ready(self, task):
+        return all(
+            self.tasks[dependency].state in (STATE_DONE, STATE_FAILED)
+            for dependency in task.depends_on
+        )
+
+    def _run_in_ui_thread(self, task):
+        result, error = None, ""
+        with trace_span("startup_task", task=task.name, ui_thread=True) as span:
+            try:
+                result = task.func()
+            except Exception as e:
+                span.fail(e)
+                error = str(e) or type(e).__name__
+                logger.error(f"启动任务 {task.name} 失败: {error}\n{traceback.format_exc()}")
+        self._on_task_done(task.name, result, error)
+
+    def _on_task_done(self, name, result, error):
+        task = self.tasks[name]
+        if error:
+            task.state = STATE_FAILED
+            task.error = error
+            if task.on_error is not None:
+                try:
+                    task.on_error(error)
+                except Exception as e:
+                    logger.error(f"启动任务 {name} 的错误处理失败: {e}")
+            self.task_failed.emit(name, error)
+        else:
+            task.state = STATE_DONE
+            task.result = result
+            self.task_finished.emit(name, result)
+
+        self._schedule()
+        if self.is_finished():
+            logger.debug("所有启动任务已完成")
+            self.all_finished.emit()
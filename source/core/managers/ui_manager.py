@@ -1,10 +1,9 @@
-from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import QMessageBox
 import os
 import logging
 import subprocess
 
-from utils import load_base64_image, resource_path
+from utils import load_base64_image, get_asset_service
 from config.config import APP_NAME, APP_VERSION
 from ui.components import FontStyleManager, DialogFactory, ExternalLinksHandler, MenuBuilder
 
@@ -38,9 +37,9 @@ class UIManager:
     def setup_ui(self):
         """设置UI元素，包括窗口图标、标题和菜单"""
         # 设置窗口图标
-        icon_path = resource_path(os.path.join("assets", "images", "ICO", "icon.png"))
-        if os.path.exists(icon_path):
-            self.main_window.setWindowIcon(QIcon(icon_path))
+        icon = get_asset_service().icon(os.path.join("assets", "images", "ICO", "icon.png"))
+        if not icon.isNull():
+            self.main_window.setWindowIcon(icon)
 
         # 获取当前离线模式状态
         is_offline_mode = False
@@ -164,27 +163,35 @@ class UIManager:
             msg_box = self._create_message_box("IPv6检测", "\n正在校验是否支持IPv6，请稍候...\n")
             msg_box.open()  # 使用open而不是exec，这样不会阻塞UI
             
-            # 处理消息队列，确保对话框显示
-            from PySide6.QtCore import QCoreApplication
-            QCoreApplication.processEvents()
-            
-            # 检查IPv6是否可用
-            ipv6_available = self.ipv6_manager.check_ipv6_availability()
-            
-            # 关闭提示对话框
-            msg_box.accept()
+            def on_ipv6_checked(ipv6_available):
+                # 关闭提示对话框
+                msg_box.accept()
+                
+                if not ipv6_available:
+                    # 显示IPv6不可用的提示
+                    error_msg_box = self._create_message_box(
+                        "IPv6不可用", 
+                        "\n未检测到可用的IPv6连接，无法启用IPv6支持。\n\n请确保您的网络环境支持IPv6且已正确配置。\n"
+                    )
+                    error_msg_box.exec()
+                    # 恢复复选框状态
+                    self.ipv6_action.setChecked(False)
+                    return
+                
+                self._apply_ipv6_toggle(True)
             
-            if not ipv6_available:
-                # 显示IPv6不可用的提示
-                error_msg_box = self._create_message_box(
-                    "IPv6不可用", 
-                    "\n未检测到可用的IPv6连接，无法启用IPv6支持。\n\n请确保您的网络环境支持IPv6且已正确配置。\n"
-                )
-                error_msg_box.exec()
-                # 恢复复选框状态
-                self.ipv6_action.setChecked(False)
-                return False
+            # 检查IPv6是否可用（使用连通性服务的缓存或后台检测结果）
+            self.ipv6_manager.check_ipv6_availability(on_ipv6_checked)
+            return
+        
+        self._apply_ipv6_toggle(enabled)
+        
+    def _apply_ipv6_toggle(self, enabled):
+        """保存IPv6支持设置
         
+        Args:
+            enabled: 是否启用IPv6支持
+        """
         # 使用IPv6Manager处理切换
         success = self.ipv6_manager.toggle_ipv6_support(enabled)
         # 如果切换失败，恢复复选框状态
@@ -19,18 +19,20 @@ from config.config import (
     DOWNLOAD_THREADS, DEFAULT_DOWNLOAD_THREAD_LEVEL, APP_VERSION
 )
 from utils import (
-    load_config, save_config, HashManager, AdminPrivileges, msgbox_frame, load_image_from_file
+    load_config, save_config, get_config_store, HashManager, AdminPrivileges, msgbox_frame, load_image_from_file,
+    stop_threads_gracefully
 )
 from workers import (
     IpOptimizerThread, 
     HashThread, ConfigFetchThread
 )
 from core import (
-    MultiStageAnimations, UIManager, DownloadManager, DebugManager,
+    MultiStageAnimations, UIManager, DebugManager,
     WindowManager, GameDetector, PatchManager, ConfigManager, PatchDetector
 )
 from core.managers.ipv6_manager import IPv6Manager
-from core.handlers import PatchToggleHandler, UninstallHandler
+from core.managers.connectivity_service import ConnectivityService
+from core.managers.startup_orchestrator import StartupOrchestrator
 from utils.logger import setup_logger
 
 
@@ -47,12 +49,10 @@ class MainWindow(QMainWindow):
         self._init_managers()
         self._connect_signals()
         self._setup_environment()
-        
-        self.download_manager.hosts_manager.backup()
         self._setup_debug_mode()
         
-        self.check_and_set_offline_mode()
-        self.fetch_cloud_config()
+        # 进程检查、离线补丁扫描、hosts备份和云端配置获取在后台并行进行，不阻塞首帧
+        self._start_startup_tasks()
         self.start_animations()
     
     def _setup_window_properties(self):
@@ -94,6 +94,9 @@ class MainWindow(QMainWindow):
         self.animator = MultiStageAnimations(self.ui, self)
         self.window_manager = WindowManager(self)
         self.debug_manager = DebugManager(self)
+        # 启动时在后台检测IPv4/IPv6连通性，供IPv6设置等功能直接读取结果
+        self.connectivity_service = ConnectivityService(self)
+        self.connectivity_service.start()
         self.ipv6_manager = IPv6Manager(self)
         self.ui_manager = UIManager(self)
         self.debug_manager.set_ui_manager(self.ui_manager)
@@ -101,15 +104,50 @@ class MainWindow(QMainWindow):
         self.game_detector = GameDetector(GAME_INFO, self.debug_manager)
         self.patch_manager = PatchManager(APP_NAME, GAME_INFO, self.debug_manager, self)
         self.patch_manager.set_patch_detector(self.patch_detector)
+        # 离线模式检测在首帧之前进行，离线模式管理器需要立即创建
         from core.managers.offline_mode_manager import OfflineModeManager
         self.offline_mode_manager = OfflineModeManager(self)
-        self.download_manager = DownloadManager(self)
-        self.uninstall_handler = UninstallHandler(self)
-        self.patch_toggle_handler = PatchToggleHandler(self)
-        
-        # Load user's download thread setting
-        if "download_thread_level" in self.config and self.config["download_thread_level"] in DOWNLOAD_THREADS:
-            self.download_manager.download_thread_level = self.config["download_thread_level"]
+        # 下载管理器和卸载、切换补丁处理器在首次使用时才创建，见下方的属性
+        self._download_manager = None
+        self._hosts_manager = None
+        self._uninstall_handler = None
+        self._patch_toggle_handler = None
+
+    @property
+    def download_manager(self):
+        """下载管理器，首次访问时创建并应用用户的下载线程设置"""
+        if self._download_manager is None:
+            from core.managers.download_managers import DownloadManager
+            self._download_manager = DownloadManager(self)
+            
+            # Load user's download thread setting
+            if "download_thread_level" in self.config and self.config["download_thread_level"] in DOWNLOAD_THREADS:
+                self._download_manager.download_thread_level = self.config["download_thread_level"]
+        return self._download_manager
+
+    @property
+    def hosts_manager(self):
+        """hosts文件管理器，首次访问时创建，启动时的hosts备份与下载管理器共用同一实例"""
+        if self._hosts_manager is None:
+            from utils import HostsManager
+            self._hosts_manager = HostsManager()
+        return self._hosts_manager
+
+    @property
+    def uninstall_handler(self):
+        """卸载处理器，首次访问时创建"""
+        if self._uninstall_handler is None:
+            from core.handlers.uninstall_handler import UninstallHandler
+            self._uninstall_handler = UninstallHandler(self)
+        return self._uninstall_handler
+
+    @property
+    def patch_toggle_handler(self):
+        """补丁启用/禁用处理器，首次访问时创建"""
+        if self._patch_toggle_handler is None:
+            from core.handlers.patch_toggle_handler import PatchToggleHandler
+            self._patch_toggle_handler = PatchToggleHandler(self)
+        return self._patch_toggle_handler
 
     def _connect_signals(self):
         """连接UI组件的信号到相应的槽函数."""
@@ -119,8 +157,9 @@ class MainWindow(QMainWindow):
             self.ui.minimize_btn.clicked.connect(self._on_minimize_clicked)
         
         self.ui.start_install_btn.clicked.connect(self.handle_install_button_click)
-        self.ui.uninstall_btn.clicked.connect(self.uninstall_handler.handle_uninstall_button_click)
-        self.ui.toggle_patch_btn.clicked.connect(self.patch_toggle_handler.handle_toggle_patch_button_click)
+        # 处理器在点击时才创建
+        self.ui.uninstall_btn.clicked.connect(lambda: self.uninstall_handler.handle_uninstall_button_click())
+        self.ui.toggle_patch_btn.clicked.connect(lambda: self.patch_toggle_handler.handle_toggle_patch_button_click())
         self.ui.exit_btn.clicked.connect(self.shutdown_app)
 
     def _setup_environment(self):
@@ -134,12 +173,68 @@ class MainWindow(QMainWindow):
         
         try:
             self.admin_privileges.request_admin_privileges()
-            self.admin_privileges.check_and_terminate_processes()
         except Exception as e:
             logger.error(f"权限或进程检查失败: {e}")
             QtWidgets.QMessageBox.critical(self, f"错误 - {APP_NAME}", f"权限检查失败: {e}")
             sys.exit(1)
 
+    def _start_startup_tasks(self):
+        """声明启动任务及其依赖关系并开始执行
+        
+        耗时的扫描和文件读写在线程池中执行，弹窗和界面状态的修改在UI线程中按依赖顺序执行。
+        """
+        self.startup = StartupOrchestrator(self)
+        
+        # 游戏进程检查：扫描进程较慢，放到后台；发现运行中的游戏时再在UI线程中询问是否终止
+        self.startup.add_task(
+            "process_scan", self.admin_privileges.find_running_games,
+            on_error=self._on_process_check_failed
+        )
+        self.startup.add_task(
+            "process_check",
+            lambda: self.admin_privileges.terminate_running_games(self.startup.result("process_scan", [])),
+            depends_on=["process_scan"], ui_thread=True, on_error=self._on_process_check_failed
+        )
+        
+        # hosts备份：只在UI线程中创建hosts管理器（下载管理器在首次使用时才创建），读写hosts文件在后台进行
+        self.startup.add_task("hosts_manager", lambda: self.hosts_manager, ui_thread=True)
+        self.startup.add_task(
+            "hosts_backup", lambda: self.startup.result("hosts_manager").backup(raise_errors=True),
+            depends_on=["hosts_manager"], on_error=self._on_hosts_backup_failed
+        )
+        
+        # 离线模式：后台扫描补丁文件，等进程检查的弹窗结束后再切换模式和提示
+        self.startup.add_task("offline_scan", self._scan_offline_patches)
+        self.startup.add_task(
+            "offline_mode", self._apply_offline_mode,
+            depends_on=["offline_scan", "process_check"], ui_thread=True
+        )
+        
+        # 云端配置：获取线程结束后标记完成，结果需要在离线模式确定之后处理
+        self.startup.add_task("cloud_config")
+        self.startup.add_task(
+            "cloud_config_apply",
+            lambda: self.on_config_fetched(*self.startup.result("cloud_config", (None, "network_error"))),
+            depends_on=["cloud_config", "offline_mode"], ui_thread=True
+        )
+        
+        self.startup.start()
+        self.fetch_cloud_config(
+            lambda data, error_message: self.startup.finish("cloud_config", (data, error_message))
+        )
+
+    def _on_process_check_failed(self, error):
+        QtWidgets.QMessageBox.critical(self, f"错误 - {APP_NAME}", f"权限检查失败: {error}")
+        sys.exit(1)
+
+    def _on_hosts_backup_failed(self, error):
+        msg_box = msgbox_frame(
+            f"错误 - {APP_NAME}",
+            f"\n无法备份hosts文件，请检查权限。\n\n【错误信息】：{error}\n",
+            QMessageBox.StandardButton.Ok
+        )
+        msg_box.exec()
+
     def _setup_debug_mode(self):
         """根据配置设置调试模式."""
         if self.config.get("debug_mode"):
@@ -151,6 +246,9 @@ class MainWindow(QMainWindow):
                 self.debug_manager.start_logging()
                 logger.debug("通过UI启动调试模式")
         
+        if self.debug_manager.is_memory_profiling_enabled():
+            self.debug_manager.start_memory_monitor()
+        
         self.ui_manager.setup_ui()
     
     # 窗口事件处理 - 委托给WindowManager
@@ -227,11 +325,15 @@ class MainWindow(QMainWindow):
         else:
             self.window_manager.change_window_state(self.window_manager.STATE_ERROR)
 
-    def fetch_cloud_config(self):
-        """获取云端配置（异步方式）"""
+    def fetch_cloud_config(self, callback=None):
+        """获取云端配置（异步方式）
+        
+        Args:
+            callback: 获取完成后的回调，参数为(data, error_message)，默认为on_config_fetched
+        """
         self.config_manager.fetch_cloud_config(
             lambda url, headers, debug_mode, parent=None: ConfigFetchThread(url, headers, debug_mode, self),
-            self.on_config_fetched
+            callback or self.on_config_fetched
         )
 
     def on_config_fetched(self, data, error_message):
@@ -314,11 +416,18 @@ class MainWindow(QMainWindow):
             'patch_check': getattr(self.patch_detector, 'patch_check_thread', None)
         }
         
-        # Add current download thread if it's running
-        if hasattr(self.download_manager, 'current_download_thread') and self.download_manager.current_download_thread:
-            threads_to_stop['download'] = self.download_manager.current_download_thread
+        # 并发离线安装中的解压和校验线程
+        install_scheduler = getattr(self.offline_mode_manager, 'install_scheduler', None)
+        if install_scheduler:
+            install_scheduler.cancel()
+            threads_to_stop.update(install_scheduler.running_threads())
+            install_scheduler.wait()
 
-        self.download_manager.graceful_stop_threads(threads_to_stop)
+        # 下载管理器在首次使用时才创建，退出时不为此创建
+        if self._download_manager is not None and self._download_manager.current_download_thread:
+            threads_to_stop['download'] = self._download_manager.current_download_thread
+
+        stop_threads_gracefully(threads_to_stop, debug_manager=self.debug_manager)
 
 
         self.debug_manager.stop_logging()
@@ -335,18 +444,27 @@ class MainWindow(QMainWindow):
                 return
             
             # 用户确认退出后，再执行hosts相关操作
-            self.download_manager.hosts_manager.restore()
-            self.download_manager.hosts_manager.check_and_clean_all_entries()
+            self._release_network_state()
         else:
             # 强制退出时，也需执行hosts相关操作
-            self.download_manager.hosts_manager.restore()
-            self.download_manager.hosts_manager.check_and_clean_all_entries()
+            self._release_network_state()
 
         if event:
             event.accept()
         else:
             sys.exit(0)
 
+    def _release_network_state(self):
+        """退出前停止后台服务并还原hosts文件，只处理已经创建的管理器"""
+        self.connectivity_service.stop()
+        self.startup.wait()
+        get_config_store().flush()
+        if self._download_manager is not None:
+            self._download_manager.dns_resolver.stop()
+        if self._hosts_manager is not None:
+            self._hosts_manager.restore()
+            self._hosts_manager.check_and_clean_all_entries()
+
     def handle_install_button_click(self):
         """处理安装按钮点击事件
         根据按钮当前状态决定是显示错误还是执行安装
@@ -484,37 +602,44 @@ class MainWindow(QMainWindow):
             bool: 是否成功切换到离线模式
         """
         try:
-            # 初始化离线模式管理器
-            if not hasattr(self, 'offline_mode_manager') or self.offline_mode_manager is None:
-                from core.managers.offline_mode_manager import OfflineModeManager
-                self.offline_mode_manager = OfflineModeManager(self)
+            self._scan_offline_patches()
+        except Exception as e:
+            logger.error(f"错误: 扫描离线补丁文件时发生异常: {e}")
+        return self._apply_offline_mode()
+
+    def _scan_offline_patches(self):
+        """扫描离线补丁文件，不涉及界面，启动时在工作线程中执行"""
+        # 在调试模式下记录当前执行路径
+        is_debug_mode = self.config.get('debug_mode', False) if hasattr(self, 'config') else False
+        if is_debug_mode:
+            current_dir = os.getcwd()
+            logger.debug(f"DEBUG: 当前工作目录: {current_dir}")
+            logger.debug(f"DEBUG: 是否为打包环境: {getattr(sys, 'frozen', False)}")
+            if getattr(sys, 'frozen', False):
+                logger.debug(f"DEBUG: 可执行文件路径: {sys.executable}")
             
-            # 在调试模式下记录当前执行路径
-            is_debug_mode = self.config.get('debug_mode', False) if hasattr(self, 'config') else False
-            if is_debug_mode:
-                import os
-                import sys
-                current_dir = os.getcwd()
-                logger.debug(f"DEBUG: 当前工作目录: {current_dir}")
-                logger.debug(f"DEBUG: 是否为打包环境: {getattr(sys, 'frozen', False)}")
-                if getattr(sys, 'frozen', False):
-                    logger.debug(f"DEBUG: 可执行文件路径: {sys.executable}")
+            # 尝试列出当前目录中的文件（调试用）
+            try:
+                files = os.listdir(current_dir)
+                logger.debug(f"DEBUG: 当前目录文件列表: {files}")
                 
-                # 尝试列出当前目录中的文件（调试用）
-                try:
-                    files = os.listdir(current_dir)
-                    logger.debug(f"DEBUG: 当前目录文件列表: {files}")
-                    
-                    # 检查上级目录
-                    parent_dir = os.path.dirname(current_dir)
-                    parent_files = os.listdir(parent_dir)
-                    logger.debug(f"DEBUG: 上级目录 {parent_dir} 文件列表: {parent_files}")
-                except Exception as e:
-                    logger.debug(f"DEBUG: 列出目录文件时出错: {str(e)}")
-            
-            # 扫描离线补丁文件
-            self.offline_mode_manager.scan_for_offline_patches()
-            
+                # 检查上级目录
+                parent_dir = os.path.dirname(current_dir)
+                parent_files = os.listdir(parent_dir)
+                logger.debug(f"DEBUG: 上级目录 {parent_dir} 文件列表: {parent_files}")
+            except Exception as e:
+                logger.debug(f"DEBUG: 列出目录文件时出错: {str(e)}")
+        
+        # 扫描离线补丁文件
+        self.offline_mode_manager.scan_for_offline_patches()
+
+    def _apply_offline_mode(self):
+        """根据扫描结果切换离线/在线模式，需要在UI线程中执行
+        
+        Returns:
+            bool: 是否成功切换到离线模式
+        """
+        try:
             # 如果找到离线补丁文件，启用离线模式
             if self.offline_mode_manager.has_offline_patches():
                 self.offline_mode_manager.set_offline_mode(True)
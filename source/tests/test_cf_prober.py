@@ -0,0 +1,215 @@
+import asyncio
+import ipaddress
+import os
+import ssl
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from workers.cf_prober import CandidateStats, CloudflareProber  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CERT_FILE = os.path.join(DATA_DIR, "cdn_test_cert.pem")
+KEY_FILE = os.path.join(DATA_DIR, "cdn_test_key.pem")
+HOSTNAME = "cdn.test"
+DELAY = 0.15  # 延迟端点在TLS握手前等待的时间（秒）
+
+# 每个端点使用不同的回环地址，共用同一端口；DEAD_IP上不监听，连接会被拒绝
+FAST_IP = "127.0.0.2"
+SLOW_IP = "127.0.0.3"
+DEAD_IP = "127.0.0.4"
+
+
+class _EndpointProtocol(asyncio.Protocol):
+    """单个连接：TLS端点等待指定的延迟后再完成握手，纯TCP端点只接受连接"""
+
+    def __init__(self, listeners, delay, tls):
+        self.listeners = listeners
+        self.delay = delay
+        self.tls = tls
+
+    def connection_made(self, transport):
+        if self.tls:
+            # 在收到ClientHello之前暂停读取，延迟结束后再交给TLS层
+            transport.pause_reading()
+            self.listeners.tasks.append(asyncio.ensure_future(self._handshake(transport)))
+
+    async def _handshake(self, transport):
+        try:
+            await asyncio.sleep(self.delay)
+            await self.listeners.loop.start_tls(transport, self, self.listeners.tls_context, server_side=True)
+        except (OSError, ssl.SSLError, ConnectionError):
+            transport.close()
+        except asyncio.CancelledError:
+            transport.close()
+            raise
+
+
+class _Listeners:
+    """在后台事件循环中运行的本地监听端点，模拟不同延迟的Cloudflare节点"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.servers = []
+        self.tasks = []
+        self.port = 0
+        self.tls_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.tls_context.load_cert_chain(CERT_FILE, KEY_FILE)
+
+    def add(self, ip, delay=0.0, tls=True):
+        """在ip上监听，首次调用时分配端口，之后的端点共用该端口"""
+        async def start():
+            return await self.loop.create_server(lambda: _EndpointProtocol(self, delay, tls), ip, self.port)
+
+        server = asyncio.run_coroutine_threadsafe(start(), self.loop).result(5)
+        self.port = server.sockets[0].getsockname()[1]
+        self.servers.append(server)
+
+    def close(self):
+        async def stop():
+            for server in self.servers:
+                server.close()
+            # 结束仍在等待握手的连接
+            for task in self.tasks:
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(stop(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        self.loop.close()
+
+
+class CandidateStatsTest(unittest.TestCase):
+
+    def _stats(self, ip, samples, failures=0):
+        stats = CandidateStats(ip)
+        stats.connect_rtts = list(samples)
+        stats.attempts = len(samples) + failures
+        stats.failures = failures
+        return stats
+
+    def test_median_p90_and_loss(self):
+        stats = self._stats("192.0.2.1", [10, 20, 30, 40, 50, 60, 70, 80, 90, 100], failures=2)
+        self.assertEqual(stats.median, 50)
+        self.assertEqual(stats.p90, 90)
+        self.assertAlmostEqual(stats.loss, 2 / 12)
+
+    def test_rank_prefers_loss_then_median_then_p90(self):
+        lossy_fast = self._stats("192.0.2.1", [5, 5, 5], failures=1)
+        steady = self._stats("192.0.2.2", [20, 20, 60])
+        steady_tail = self._stats("192.0.2.3", [20, 20, 90])
+        dead = self._stats("192.0.2.4", [], failures=3)
+
+        ranked = CloudflareProber.rank([lossy_fast, dead, steady_tail, steady])
+        self.assertEqual([stats.ip for stats in ranked], ["192.0.2.2", "192.0.2.3", "192.0.2.1"])
+
+
+class CloudflareProberTest(unittest.TestCase):
+
+    def setUp(self):
+        self.listeners = _Listeners()
+        try:
+            self.listeners.add(FAST_IP)
+            self.listeners.add(SLOW_IP, delay=DELAY)
+        except OSError as e:
+            self.listeners.close()
+            self.skipTest(f"无法监听回环地址: {e}")
+
+    def tearDown(self):
+        self.listeners.close()
+
+    def _prober(self, **kwargs):
+        kwargs.setdefault("good_enough_ms", 0)
+        kwargs.setdefault("timeout", 2)
+        return CloudflareProber(HOSTNAME, port=self.listeners.port, **kwargs)
+
+    def test_probe_ranks_by_tls_latency_and_drops_dead_ip(self):
+        prober = self._prober(attempts=3)
+        ranked = prober.run([DEAD_IP, SLOW_IP, FAST_IP])
+
+        self.assertEqual([stats.ip for stats in ranked], [FAST_IP, SLOW_IP])
+        fast, slow = ranked
+        self.assertEqual(fast.loss, 0)
+        self.assertEqual(len(fast.samples), 3)
+        self.assertGreaterEqual(slow.median, DELAY * 1000)
+        self.assertGreaterEqual(slow.p90, slow.median)
+        self.assertLess(fast.median, slow.median)
+        # 首次探测失败的IP不再继续探测
+        self.assertEqual(prober.probes_sent, 3 + 3 + 1)
+
+    def test_probe_plain_tcp_listeners(self):
+        tcp_ip = "127.0.0.5"
+        try:
+            self.listeners.add(tcp_ip, tls=False)
+        except OSError as e:
+            self.skipTest(f"无法监听回环地址: {e}")
+        prober = self._prober(use_tls=False, attempts=2)
+        ranked = prober.run([DEAD_IP, tcp_ip])
+
+        self.assertEqual([stats.ip for stats in ranked], [tcp_ip])
+        self.assertEqual(ranked[0].loss, 0)
+        self.assertEqual(ranked[0].tls_rtts, [])
+
+    def test_staged_search_halves_ranges(self):
+        # 每个/30段有两个可用地址：两个快速段、一个延迟段、一个无人监听的段
+        fast_a = ipaddress.ip_network("127.0.1.0/30")
+        fast_b = ipaddress.ip_network("127.0.2.0/30")
+        slow = ipaddress.ip_network("127.0.3.0/30")
+        dead = ipaddress.ip_network("127.0.4.0/30")
+        try:
+            for network, delay in ((fast_a, 0), (fast_b, 0), (slow, DELAY)):
+                for host in network.hosts():
+                    self.listeners.add(str(host), delay=delay)
+        except OSError as e:
+            self.skipTest(f"无法监听回环地址: {e}")
+
+        prober = self._prober()
+        ranked = prober._run_sync(prober.staged_search(
+            [dead, slow, fast_a, fast_b], initial_samples=2, budget=100, finalists=2, final_attempts=2
+        ))
+
+        rounds = prober.report["rounds"]
+        self.assertEqual([item["ranges"] for item in rounds], [4, 2, 1])
+        self.assertEqual([item["alive_ranges"] for item in rounds], [3, 2, 1])
+        self.assertEqual([item["per_range"] for item in rounds[:2]], [2, 4])
+        self.assertEqual(len(ranked), 2)
+        fast_hosts = {str(host) for network in (fast_a, fast_b) for host in network.hosts()}
+        for stats in ranked:
+            self.assertIn(stats.ip, fast_hosts)
+            self.assertEqual(stats.attempts, 2)
+
+    def test_stop_before_run_is_not_cleared(self):
+        prober = self._prober(attempts=3)
+        prober.stop()
+        self.assertEqual(prober.run([FAST_IP, SLOW_IP]), [])
+        self.assertEqual(prober.probes_sent, 0)
+        self.assertTrue(prober.is_stopped)
+
+        prober.reset()
+        self.assertFalse(prober.is_stopped)
+        self.assertEqual([stats.ip for stats in prober.run([FAST_IP])], [FAST_IP])
+
+    def test_stop_during_run(self):
+        hung_ip = "127.0.0.6"
+        try:
+            self.listeners.add(hung_ip, delay=30)
+        except OSError as e:
+            self.skipTest(f"无法监听回环地址: {e}")
+        prober = self._prober(attempts=3, timeout=20)
+        threading.Timer(0.3, prober.stop).start()
+
+        start = time.perf_counter()
+        ranked = prober.run([hung_ip])
+        self.assertLess(time.perf_counter() - start, 5)
+        self.assertTrue(prober.is_stopped)
+        self.assertEqual(ranked, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import random
+import shutil
+import ssl
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from workers.segment_downloader import SegmentDownloader  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CERT_FILE = os.path.join(DATA_DIR, "cdn_test_cert.pem")
+KEY_FILE = os.path.join(DATA_DIR, "cdn_test_key.pem")
+HOSTNAME = "cdn.test"
+# 每个端点使用不同的回环地址，模拟同一域名解析出的多个优选IP
+ENDPOINT_IPS = ["127.0.0.2", "127.0.0.3", "127.0.0.4"]
+PAYLOAD = random.Random(20261019).randbytes(3 * 1024 * 1024 + 12345)
+
+
+class _RangeHandler(BaseHTTPRequestHandler):
+    """支持单段Range请求的CDN替身，flaky端点在分段传输到一半时断开连接"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers.items()))
+        unit, _, spec = self.headers.get("Range", "").partition("=")
+        start, _, end = spec.partition("-")
+        if unit != "bytes" or not start.isdigit():
+            self.send_error(416)
+            return
+        start = int(start)
+        end = min(int(end) if end.isdigit() else len(PAYLOAD) - 1, len(PAYLOAD) - 1)
+        body = PAYLOAD[start:end + 1]
+
+        self.send_response(206)
+        self.send_header("Content-Range", f"bytes {start}-{end}/{len(PAYLOAD)}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.server.flaky and len(body) > 1:
+            # 只发送一半数据后断开，模拟分段下载中途失败
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+class _TLSEndpoint(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, ip, port, flaky=False):
+        super().__init__((ip, port), _RangeHandler)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(CERT_FILE, KEY_FILE)
+        self.socket = context.wrap_socket(self.socket, server_side=True)
+        self.flaky = flaky
+        self.requests = []
+
+
+class SegmentDownloaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.endpoints = []
+        port = 0
+        try:
+            for number, ip in enumerate(ENDPOINT_IPS):
+                endpoint = _TLSEndpoint(ip, port, flaky=number == 0)
+                port = endpoint.server_address[1]
+                self.endpoints.append(endpoint)
+        except OSError as e:
+            self._shutdown_endpoints()
+            self.skipTest(f"无法监听回环地址: {e}")
+        for endpoint in self.endpoints:
+            threading.Thread(target=endpoint.serve_forever, daemon=True).start()
+        self.url = f"https://{HOSTNAME}:{port}/patch/vol.1.7z"
+        self.temp_dir = tempfile.mkdtemp()
+        self.output_path = os.path.join(self.temp_dir, "vol.1.7z")
+
+    def tearDown(self):
+        self._shutdown_endpoints()
+        shutil.rmtree(getattr(self, "temp_dir", ""), ignore_errors=True)
+
+    def _shutdown_endpoints(self):
+        for endpoint in self.endpoints:
+            endpoint.shutdown()
+            endpoint.server_close()
+
+    def test_download_survives_endpoint_failing_mid_segment(self):
+        downloader = SegmentDownloader(
+            self.url, self.output_path, ENDPOINT_IPS,
+            connections_per_ip=2, segment_size=256 * 1024, timeout=5,
+            verify_certificate=False
+        )
+        success, error = downloader.run()
+
+        self.assertTrue(success, error)
+        with open(self.output_path, "rb") as f:
+            self.assertEqual(f.read(), PAYLOAD)
+
+        reports = {ip["ip"]: ip for ip in downloader.report["ips"]}
+        self.assertTrue(reports[ENDPOINT_IPS[0]]["degraded"])
+        for ip in ENDPOINT_IPS[1:]:
+            self.assertFalse(reports[ip]["degraded"])
+            self.assertGreater(reports[ip]["bytes"], 0)
+
+    def test_requests_carry_download_headers(self):
+        downloader = SegmentDownloader(
+            self.url, self.output_path, ENDPOINT_IPS[1:],
+            connections_per_ip=1, segment_size=1024 * 1024, timeout=5,
+            verify_certificate=False
+        )
+        success, error = downloader.run()
+        self.assertTrue(success, error)
+
+        requests = [headers for endpoint in self.endpoints for headers in endpoint.requests]
+        self.assertTrue(requests)
+        origin = f"https://{HOSTNAME}:{self.endpoints[0].server_address[1]}"
+        for headers in requests:
+            self.assertEqual(headers["Host"], f"{HOSTNAME}:{self.endpoints[0].server_address[1]}")
+            self.assertEqual(headers["Referer"], origin + "/")
+            self.assertEqual(headers["Origin"], origin)
+            self.assertEqual(headers["Accept-Encoding"], "identity")
+
+
+if __name__ == "__main__":
+    unittest.main()
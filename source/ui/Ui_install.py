@@ -1,4 +1,3 @@
-from PySide6.QtGui import QPixmap
 import base64
 from PySide6.QtCore import (QCoreApplication, QDate, QDateTime, QLocale,
     QMetaObject, QObject, QPoint, QRect,
@@ -6,7 +5,7 @@ from PySide6.QtCore import (QCoreApplication, QDate, QDateTime, QLocale,
 from PySide6.QtGui import (QAction, QBrush, QColor, QConicalGradient,
     QCursor, QFont, QFontDatabase, QGradient,
     QIcon, QImage, QKeySequence, QLinearGradient,
-    QPainter, QPalette, QPixmap, QRadialGradient,
+    QPainter, QPalette, QRadialGradient,
     QTransform, QPainterPath, QRegion)
 from PySide6.QtWidgets import (QApplication, QLabel, QMainWindow, QMenu,
     QMenuBar, QPushButton, QSizePolicy, QWidget, QHBoxLayout)
@@ -18,7 +17,7 @@ logger = logging.getLogger(__name__)
 
 # 导入配置常量
 from config.config import APP_NAME, APP_VERSION
-from utils import load_image_from_file, resource_path
+from utils import load_image_from_file, resource_path, get_asset_service
 
 class Ui_MainWindows(object):
     def setupUi(self, MainWindows):
@@ -315,54 +314,53 @@ class Ui_MainWindows(object):
         self.loadbg = QLabel(self.inner_content)
         self.loadbg.setObjectName(u"loadbg")
         self.loadbg.setGeometry(QRect(0, 0, 1280, 655))
+        # 图片在后台按控件尺寸解码，解码完成后再设置，不阻塞首帧
+        assets = get_asset_service()
         # 加载背景图并允许拉伸
-        bg_path = resource_path(os.path.join("assets", "images", "BG", "bg1.jpg"))
+        bg_path = os.path.join("assets", "images", "BG", "bg1.jpg")
         logger.info(f"加载背景图: {bg_path}")
-        bg_pixmap = QPixmap(bg_path)
-        if bg_pixmap.isNull():
-            logger.error(f"背景图加载失败: {bg_path}")
-        self.loadbg.setPixmap(bg_pixmap)
+        assets.load_async(bg_path, self.loadbg.size(), self.loadbg.setPixmap)
         self.loadbg.setScaledContents(True)
         
         self.vol1bg = QLabel(self.inner_content)
         self.vol1bg.setObjectName(u"vol1bg")
         self.vol1bg.setGeometry(QRect(0, 150, 93, 64))
         # 直接加载图片文件
-        vol1_path = resource_path(os.path.join("assets", "images", "LOGO", "vo01_logo.png"))
+        vol1_path = os.path.join("assets", "images", "LOGO", "vo01_logo.png")
         logger.info(f"加载LOGO图: {vol1_path}")
-        self.vol1bg.setPixmap(QPixmap(vol1_path))
+        assets.load_async(vol1_path, self.vol1bg.size(), self.vol1bg.setPixmap)
         self.vol1bg.setScaledContents(True)
         
         self.vol2bg = QLabel(self.inner_content)
         self.vol2bg.setObjectName(u"vol2bg")
         self.vol2bg.setGeometry(QRect(0, 210, 93, 64))
         # 直接加载图片文件
-        vol2_path = resource_path(os.path.join("assets", "images", "LOGO", "vo02_logo.png"))
-        self.vol2bg.setPixmap(QPixmap(vol2_path))
+        vol2_path = os.path.join("assets", "images", "LOGO", "vo02_logo.png")
+        assets.load_async(vol2_path, self.vol2bg.size(), self.vol2bg.setPixmap)
         self.vol2bg.setScaledContents(True)
         
         self.vol3bg = QLabel(self.inner_content)
         self.vol3bg.setObjectName(u"vol3bg")
         self.vol3bg.setGeometry(QRect(0, 270, 93, 64))
         # 直接加载图片文件
-        vol3_path = resource_path(os.path.join("assets", "images", "LOGO", "vo03_logo.png"))
-        self.vol3bg.setPixmap(QPixmap(vol3_path))
+        vol3_path = os.path.join("assets", "images", "LOGO", "vo03_logo.png")
+        assets.load_async(vol3_path, self.vol3bg.size(), self.vol3bg.setPixmap)
         self.vol3bg.setScaledContents(True)
         
         self.vol4bg = QLabel(self.inner_content)
         self.vol4bg.setObjectName(u"vol4bg")
         self.vol4bg.setGeometry(QRect(0, 330, 93, 64))
         # 直接加载图片文件
-        vol4_path = resource_path(os.path.join("assets", "images", "LOGO", "vo04_logo.png"))
-        self.vol4bg.setPixmap(QPixmap(vol4_path))
+        vol4_path = os.path.join("assets", "images", "LOGO", "vo04_logo.png")
+        assets.load_async(vol4_path, self.vol4bg.size(), self.vol4bg.setPixmap)
         self.vol4bg.setScaledContents(True)
         
         self.afterbg = QLabel(self.inner_content)
         self.afterbg.setObjectName(u"afterbg")
         self.afterbg.setGeometry(QRect(0, 390, 93, 64))
         # 直接加载图片文件
-        after_path = resource_path(os.path.join("assets", "images", "LOGO", "voaf_logo.png"))
-        self.afterbg.setPixmap(QPixmap(after_path))
+        after_path = os.path.join("assets", "images", "LOGO", "voaf_logo.png")
+        assets.load_async(after_path, self.afterbg.size(), self.afterbg.setPixmap)
         self.afterbg.setScaledContents(True)
         
         # 修复Mainbg位置并使用title_bg1.png作为背景图片
@@ -370,24 +368,16 @@ class Ui_MainWindows(object):
         self.Mainbg.setObjectName(u"Mainbg")
         self.Mainbg.setGeometry(QRect(0, 0, 1280, 655))
         # 允许拉伸以填满整个区域
-        main_bg_path = resource_path(os.path.join("assets", "images", "BG", "title_bg1.png"))
+        main_bg_path = os.path.join("assets", "images", "BG", "title_bg1.png")
         logger.info(f"加载主背景图: {main_bg_path}")
-        main_bg_pixmap = QPixmap(main_bg_path)
-        if main_bg_pixmap.isNull():
-            logger.error(f"主背景图加载失败: {main_bg_path}")
-
-        # 如果加载的图片不是空的，则设置，并允许拉伸填满
-        if not main_bg_pixmap.isNull():
-            self.Mainbg.setPixmap(main_bg_pixmap)
-            self.Mainbg.setScaledContents(True)
+        # 加载失败时不会调用回调，保持为空
+        assets.load_async(main_bg_path, self.Mainbg.size(), self.Mainbg.setPixmap)
+        self.Mainbg.setScaledContents(True)
         self.Mainbg.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
         # 使用新的按钮图片
-        button_path = resource_path(os.path.join("assets", "images", "BTN", "Button.png"))
+        button_path = os.path.join("assets", "images", "BTN", "Button.png")
         logger.info(f"加载按钮图片: {button_path}")
-        button_pixmap = QPixmap(button_path)
-        if button_pixmap.isNull():
-            logger.error(f"按钮图片加载失败: {button_path}")
         
         # 创建文本标签布局的按钮
         # 开始安装按钮 - 基于背景图片和标签组合
@@ -401,7 +391,7 @@ class Ui_MainWindows(object):
         self.start_install_bg = QLabel(self.button_container)
         self.start_install_bg.setObjectName(u"start_install_bg")
         self.start_install_bg.setGeometry(QRect(10, 10, 191, 91))  # 居中放置在扩大的容器中
-        self.start_install_bg.setPixmap(button_pixmap)
+        assets.load_async(button_path, self.start_install_bg.size(), self.start_install_bg.setPixmap)
         self.start_install_bg.setScaledContents(True)
 
         self.start_install_text = QLabel(self.button_container)
@@ -435,7 +425,7 @@ class Ui_MainWindows(object):
         self.toggle_patch_bg = QLabel(self.toggle_patch_container)
         self.toggle_patch_bg.setObjectName(u"toggle_patch_bg")
         self.toggle_patch_bg.setGeometry(QRect(10, 10, 191, 91))  # 居中放置在扩大的容器中
-        self.toggle_patch_bg.setPixmap(button_pixmap)
+        assets.load_async(button_path, self.toggle_patch_bg.size(), self.toggle_patch_bg.setPixmap)
         self.toggle_patch_bg.setScaledContents(True)
 
         self.toggle_patch_text = QLabel(self.toggle_patch_container)
@@ -469,7 +459,7 @@ class Ui_MainWindows(object):
         self.uninstall_bg = QLabel(self.uninstall_container)
         self.uninstall_bg.setObjectName(u"uninstall_bg")
         self.uninstall_bg.setGeometry(QRect(10, 10, 191, 91))  # 居中放置在扩大的容器中
-        self.uninstall_bg.setPixmap(button_pixmap)
+        assets.load_async(button_path, self.uninstall_bg.size(), self.uninstall_bg.setPixmap)
         self.uninstall_bg.setScaledContents(True)
 
         self.uninstall_text = QLabel(self.uninstall_container)
@@ -504,7 +494,7 @@ class Ui_MainWindows(object):
         self.exit_bg = QLabel(self.exit_container)
         self.exit_bg.setObjectName(u"exit_bg")
         self.exit_bg.setGeometry(QRect(10, 10, 191, 91))  # 居中放置在扩大的容器中
-        self.exit_bg.setPixmap(button_pixmap)
+        assets.load_async(button_path, self.exit_bg.size(), self.exit_bg.setPixmap)
         self.exit_bg.setScaledContents(True)
 
         self.exit_text = QLabel(self.exit_container)
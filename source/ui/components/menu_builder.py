@@ -7,7 +7,9 @@ from PySide6.QtGui import QAction, QActionGroup, QCursor
 from PySide6.QtWidgets import QMenu, QPushButton
 from PySide6.QtCore import Qt, QRect
 
-from config.config import APP_NAME, APP_VERSION
+from config.config import (
+    APP_NAME, APP_VERSION, FILE_ALLOCATION_MODES, DEFAULT_FILE_ALLOCATION, PINNING_MODES, DEFAULT_PINNING_MODE
+)
 
 
 class MenuBuilder:
@@ -45,10 +47,14 @@ class MenuBuilder:
         self.ipv6_submenu = None
         self.hash_settings_menu = None
         self.download_settings_menu = None
+        self.file_allocation_menu = None
+        self.pinning_mode_menu = None
         
         # 各种action引用
         self.debug_action = None
         self.open_log_action = None
+        self.profile_action = None
+        self.memory_profile_action = None
         self.ipv6_action = None
         self.ipv6_test_action = None
         self.disable_auto_restore_action = None
@@ -268,9 +274,51 @@ class MenuBuilder:
         thread_settings_action.setFont(menu_font)
         thread_settings_action.triggered.connect(self._handle_download_thread_settings)
         
+        # 添加文件预分配模式子菜单
+        self.file_allocation_menu = QMenu("文件预分配模式", self.main_window)
+        self.file_allocation_menu.setFont(menu_font)
+        self.file_allocation_menu.setStyleSheet(menu_style)
+        
+        # 从配置中读取当前模式
+        config = getattr(self.main_window, 'config', {})
+        current_mode = DEFAULT_FILE_ALLOCATION
+        if isinstance(config, dict):
+            current_mode = config.get("file_allocation", DEFAULT_FILE_ALLOCATION)
+        
+        allocation_group = QActionGroup(self.main_window)
+        allocation_group.setExclusive(True)
+        for mode, text in FILE_ALLOCATION_MODES.items():
+            action = QAction(text, self.main_window, checkable=True)
+            action.setFont(menu_font)
+            action.setChecked(mode == current_mode)
+            action.triggered.connect(lambda checked, m=mode: self._handle_file_allocation_change(m))
+            allocation_group.addAction(action)
+            self.file_allocation_menu.addAction(action)
+        
+        # 添加优选IP固定方式子菜单
+        self.pinning_mode_menu = QMenu("优选IP固定方式", self.main_window)
+        self.pinning_mode_menu.setFont(menu_font)
+        self.pinning_mode_menu.setStyleSheet(menu_style)
+        
+        current_pinning = DEFAULT_PINNING_MODE
+        if isinstance(config, dict):
+            current_pinning = config.get("pinning_mode", DEFAULT_PINNING_MODE)
+        
+        pinning_group = QActionGroup(self.main_window)
+        pinning_group.setExclusive(True)
+        for mode, text in PINNING_MODES.items():
+            action = QAction(text, self.main_window, checkable=True)
+            action.setFont(menu_font)
+            action.setChecked(mode == current_pinning)
+            action.triggered.connect(lambda checked, m=mode: self._handle_pinning_mode_change(m))
+            pinning_group.addAction(action)
+            self.pinning_mode_menu.addAction(action)
+        
         # 添加到下载设置子菜单
         self.download_settings_menu.addAction(switch_source_action)
         self.download_settings_menu.addAction(thread_settings_action)
+        self.download_settings_menu.addMenu(self.file_allocation_menu)
+        self.download_settings_menu.addMenu(self.pinning_mode_menu)
 
     def _create_developer_options_menu(self, menu_font, menu_style):
         """创建开发者选项子菜单"""
@@ -325,9 +373,43 @@ class MenuBuilder:
                 lambda: self.dialog_factory.show_simple_message("错误", "\n调试管理器未初始化。\n", "error")
             )
         
+        # 创建导出计时记录选项
+        self.export_trace_action = QAction("导出性能追踪(Chrome trace)", self.main_window)
+        self.export_trace_action.setFont(menu_font)
+        if hasattr(self.main_window, 'debug_manager'):
+            self.export_trace_action.triggered.connect(self.main_window.debug_manager.export_trace)
+        else:
+            self.export_trace_action.triggered.connect(
+                lambda: self.dialog_factory.show_simple_message("错误", "\n调试管理器未初始化。\n", "error")
+            )
+        
+        # 创建性能分析选项，分析结束后自动取消勾选
+        self.profile_action = QAction("性能分析下一次操作", self.main_window, checkable=True)
+        self.profile_action.setFont(menu_font)
+        if hasattr(self.main_window, 'debug_manager'):
+            self.profile_action.triggered.connect(self.main_window.debug_manager.toggle_profiling)
+        else:
+            self.profile_action.triggered.connect(
+                lambda: self.dialog_factory.show_simple_message("错误", "\n调试管理器未初始化。\n", "error")
+            )
+        
+        # 创建内存统计选项
+        self.memory_profile_action = QAction("内存统计(哈希校验/解压)", self.main_window, checkable=True)
+        self.memory_profile_action.setFont(menu_font)
+        if hasattr(self.main_window, 'debug_manager'):
+            self.memory_profile_action.setChecked(self.main_window.debug_manager.is_memory_profiling_enabled())
+            self.memory_profile_action.triggered.connect(self.main_window.debug_manager.toggle_memory_profiling)
+        else:
+            self.memory_profile_action.triggered.connect(
+                lambda: self.dialog_factory.show_simple_message("错误", "\n调试管理器未初始化。\n", "error")
+            )
+        
         # 添加到Debug子菜单
         self.debug_submenu.addAction(self.debug_action)
         self.debug_submenu.addAction(self.open_log_action)
+        self.debug_submenu.addAction(self.export_trace_action)
+        self.debug_submenu.addAction(self.profile_action)
+        self.debug_submenu.addAction(self.memory_profile_action)
 
     def _create_hosts_submenu(self, menu_font, menu_style):
         """创建hosts文件选项子菜单"""
@@ -459,6 +541,20 @@ class MenuBuilder:
         else:
             self.dialog_factory.show_simple_message("错误", "\n下载管理器未初始化，无法修改下载线程设置。\n", "error")
 
+    def _handle_file_allocation_change(self, mode):
+        """处理文件预分配模式切换"""
+        if hasattr(self.main_window, 'download_manager'):
+            self.main_window.download_manager.set_file_allocation_mode(mode)
+        else:
+            self.dialog_factory.show_simple_message("错误", "\n下载管理器未初始化，无法修改文件预分配模式。\n", "error")
+
+    def _handle_pinning_mode_change(self, mode):
+        """处理优选IP固定方式切换"""
+        if hasattr(self.main_window, 'download_manager'):
+            self.main_window.download_manager.set_pinning_mode(mode)
+        else:
+            self.dialog_factory.show_simple_message("错误", "\n下载管理器未初始化，无法修改优选IP固定方式。\n", "error")
+
     def _handle_ipv6_toggle(self, enabled):
         """处理IPv6支持切换"""
         if hasattr(self.main_window, 'ui_manager') and hasattr(self.main_window.ui_manager, '_handle_ipv6_toggle'):
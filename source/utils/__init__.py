@@ -1,10 +1,39 @@
-from .logger import Logger
-from .url_censor import censor_url
-from .helpers import (
-    load_base64_image, HashManager, AdminPrivileges, msgbox_frame,
-    load_config, save_config, HostsManager, resource_path,
-    load_image_from_file
-)
+# 按需导入：访问某个名称时才加载对应模块，启动时不会连带导入全部子模块及其第三方依赖
+import importlib
+
+_EXPORTS = {
+    'Logger': '.logger',
+    'censor_url': '.url_censor',
+    'censor_config_urls': '.url_censor',
+    'IpResultCache': '.ip_cache',
+    'get_network_fingerprint': '.ip_cache',
+    'LocalDnsResolver': '.dns_stub',
+    'ConfigStore': '.config_store',
+    'get_config_store': '.config_store',
+    'trace_span': '.tracing',
+    'start_span': '.tracing',
+    'current_span': '.tracing',
+    'export_chrome_trace': '.tracing',
+    'AssetService': '.asset_service',
+    'get_asset_service': '.asset_service',
+    'StallWatchdog': '.stall_watchdog',
+    'SamplingProfiler': '.profiler',
+    'ProfileSession': '.profiler',
+    'MemoryMonitor': '.memory_monitor',
+    'get_memory_monitor': '.memory_monitor',
+    'ArchiveIndex': '.archive_index',
+    'get_archive_index': '.archive_index',
+    'load_base64_image': '.helpers',
+    'HashManager': '.helpers',
+    'AdminPrivileges': '.helpers',
+    'msgbox_frame': '.helpers',
+    'load_config': '.helpers',
+    'save_config': '.helpers',
+    'HostsManager': '.helpers',
+    'resource_path': '.helpers',
+    'stop_threads_gracefully': '.helpers',
+    'load_image_from_file': '.helpers',
+}
 
 __all__ = [
     'Logger',
@@ -17,5 +46,35 @@ __all__ = [
     'save_config',
     'HostsManager',
     'censor_url',
-    'resource_path'
-] 
\ No newline at end of file
+    'censor_config_urls',
+    'resource_path',
+    'stop_threads_gracefully',
+    'IpResultCache',
+    'get_network_fingerprint',
+    'LocalDnsResolver',
+    'ConfigStore',
+    'get_config_store',
+    'trace_span',
+    'start_span',
+    'current_span',
+    'export_chrome_trace',
+    'AssetService',
+    'get_asset_service',
+    'StallWatchdog',
+    'SamplingProfiler',
+    'ProfileSession',
+    'MemoryMonitor',
+    'get_memory_monitor',
+    'ArchiveIndex',
+    'get_archive_index',
+]
+
+
+def __getattr__(name):
+    # 首次访问时才导入对应模块，之后缓存在包的命名空间中
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
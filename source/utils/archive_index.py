@@ -0,0 +1,246 @@
+import os
+import threading
+from collections import OrderedDict
+
+from config.config import GAME_INFO, ARCHIVE_INDEX_CACHE_SIZE
+from utils.logger import setup_logger
+
+# 初始化logger
+logger = setup_logger("archive_index")
+
+# 找不到主补丁文件时可作为替代的补丁文件扩展名
+_PATCH_EXTENSIONS = (".xp3", ".int")
+_SIG_SUFFIX = ".sig"
+
+_cache = OrderedDict()  # (绝对路径, 大小, 修改时间) -> ArchiveIndex
+_cache_lock = threading.Lock()
+_build_locks = {}  # 缓存键 -> 正在解析该压缩包时持有的锁
+
+
+def _normalize_name(name):
+    return name.replace("\\", "/")
+
+
+class ArchiveMember:
+    """压缩包中的一个条目"""
+
+    def __init__(self, name, size, crc, is_dir, block):
+        """初始化条目
+
+        Args:
+            name: 压缩包内路径（统一使用/分隔）
+            size: 解压后大小（字节）
+            crc: CRC32，未记录时为None
+            is_dir: 是否为文件夹
+            block: 所在数据块的序号，文件夹和空文件为None
+        """
+        self.name = name
+        self.basename = os.path.basename(name)
+        self.size = size
+        self.crc = crc
+        self.is_dir = is_dir
+        self.block = block
+
+
+class ArchiveIndex:
+    """压缩包目录索引
+
+    记录条目名称、大小、CRC以及数据块（folder）布局，并预先计算各游戏补丁文件的匹配结果。
+    只在首次读取时解析一次.7z文件头，之后由完整性校验、解压、磁盘空间估算等流程共用，
+    不再各自打开压缩包并逐个比较文件名。
+    """
+
+    def __init__(self, path, size, mtime, members, solid, methods):
+        """初始化索引
+
+        Args:
+            path: 压缩包绝对路径
+            size: 压缩包大小（字节）
+            mtime: 压缩包修改时间（纳秒）
+            members: ArchiveMember列表，按压缩包内顺序
+            solid: 是否为固实压缩
+            methods: 压缩方法名称列表
+        """
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.members = members
+        self.solid = solid
+        self.methods = methods
+        self.files = [member for member in members if not member.is_dir]
+        self._by_name = {member.name: member for member in members}
+        self._by_basename = {}
+        for member in self.files:
+            # 同名文件以压缩包内第一个为准
+            self._by_basename.setdefault(member.basename, member)
+        self._matches = {}
+
+    @property
+    def names(self):
+        """压缩包内全部路径（含文件夹），与getnames()的顺序一致"""
+        return [member.name for member in self.members]
+
+    @property
+    def total_size(self):
+        """全部文件解压后的总大小"""
+        return sum(member.size for member in self.files)
+
+    @property
+    def block_count(self):
+        blocks = {member.block for member in self.files if member.block is not None}
+        return len(blocks)
+
+    def get(self, name):
+        """按压缩包内路径获取条目，不存在时返回None"""
+        return self._by_name.get(_normalize_name(name))
+
+    def sizes(self):
+        """获取全部文件的解压后大小
+
+        Returns:
+            dict: 压缩包内路径 -> 解压后大小（不含文件夹）
+        """
+        return {member.name: member.size for member in self.files}
+
+    def block_members(self, name):
+        """获取与指定文件位于同一数据块中的全部文件
+
+        固实压缩时解压其中一个文件需要先解压同一数据块中排在它之前的全部数据。
+
+        Returns:
+            list: ArchiveMember列表，按压缩包内顺序
+        """
+        member = self.get(name)
+        if member is None or member.block is None:
+            return [member] if member is not None else []
+        return [other for other in self.files if other.block == member.block]
+
+    def find_member(self, filename):
+        """按文件名查找压缩包内的文件
+
+        优先匹配文件名完全相同的文件，其次匹配路径中包含该文件名的文件
+        （查找非签名文件时跳过.sig文件）。结果会被缓存。
+
+        Args:
+            filename: 文件名，例如"adultsonly.xp3"
+
+        Returns:
+            str: 压缩包内路径，未找到时返回None
+        """
+        if filename in self._matches:
+            return self._matches[filename]
+
+        member = self._by_basename.get(filename)
+        if member is None:
+            want_sig = filename.endswith(_SIG_SUFFIX)
+            for candidate in self.files:
+                if filename in candidate.name and (want_sig or not candidate.name.endswith(_SIG_SUFFIX)):
+                    member = candidate
+                    break
+        name = member.name if member is not None else None
+        self._matches[filename] = name
+        return name
+
+    def find_patch(self, target_filename):
+        """查找主补丁文件及其签名文件
+
+        Args:
+            target_filename: 主补丁文件名，例如"afteradult.xp3"
+
+        Returns:
+            tuple: (主补丁文件路径, 签名文件路径)，未找到的项为None；
+                   没有同名签名文件时使用压缩包内的第一个.sig文件
+        """
+        main = self.find_member(target_filename)
+        signature = self.find_member(target_filename + _SIG_SUFFIX)
+        if signature is None:
+            signature = next(
+                (member.name for member in self.files if member.name.endswith(_SIG_SUFFIX)), None
+            )
+        return main, signature
+
+    def find_alternative_patch(self):
+        """找不到主补丁文件时，返回第一个扩展名为.xp3/.int的文件"""
+        return next(
+            (member.name for member in self.files if member.name.endswith(_PATCH_EXTENSIONS)), None
+        )
+
+
+def _build_index(path, stat):
+    import py7zr  # 按需导入，避免拖慢启动
+
+    with py7zr.SevenZipFile(path, mode="r") as archive:
+        main_streams = archive.header.main_streams
+        folders = main_streams.unpackinfo.folders if main_streams is not None else []
+        # 数据块对象 -> 序号
+        block_numbers = {id(folder): number for number, folder in enumerate(folders)}
+        members = []
+        for entry in archive.files:
+            folder = entry.folder
+            members.append(ArchiveMember(
+                _normalize_name(entry.filename),
+                entry.uncompressed or 0,
+                entry.crc32 if not entry.is_directory else None,
+                entry.is_directory,
+                block_numbers.get(id(folder)) if folder is not None else None,
+            ))
+        info = archive.archiveinfo()
+        index = ArchiveIndex(path, stat.st_size, stat.st_mtime_ns, members, info.solid, info.method_names)
+
+    # 预先计算各游戏补丁文件的匹配结果
+    for game_info in GAME_INFO.values():
+        index.find_patch(os.path.basename(game_info["plugin_path"]))
+    return index
+
+
+def get_archive_index(archive_path):
+    """获取压缩包的目录索引
+
+    以（路径, 大小, 修改时间）为键缓存，压缩包被替换或重新下载后会自动重新读取。
+
+    Args:
+        archive_path: 压缩包路径
+
+    Returns:
+        ArchiveIndex: 压缩包目录索引
+
+    Raises:
+        OSError: 无法读取压缩包
+        Exception: 压缩包文件头损坏或格式不受支持（由py7zr抛出）
+    """
+    path = os.path.abspath(archive_path)
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    with _cache_lock:
+        index = _cache.get(key)
+        if index is not None:
+            _cache.move_to_end(key)
+            return index
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+
+    # 每个压缩包各自加锁解析：同一压缩包只解析一次，不同压缩包可并行解析
+    with build_lock:
+        with _cache_lock:
+            index = _cache.get(key)
+        if index is not None:
+            return index
+        try:
+            index = _build_index(path, stat)
+        except Exception:
+            with _cache_lock:
+                _build_locks.pop(key, None)
+            raise
+        # 写入缓存与移除解析锁放在同一次加锁中，避免后来者在两者之间重复解析
+        with _cache_lock:
+            for stale_key in [cached for cached in _cache if cached[0] == path]:
+                del _cache[stale_key]
+            _cache[key] = index
+            while len(_cache) > ARCHIVE_INDEX_CACHE_SIZE:
+                _cache.popitem(last=False)
+            _build_locks.pop(key, None)
+
+    logger.debug(
+        f"已读取压缩包目录: {path}，{len(index.files)} 个文件，{index.block_count} 个数据块，"
+        f"{'固实' if index.solid else '非固实'}压缩"
+    )
+    return index
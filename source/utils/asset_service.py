@@ -0,0 +1,312 @@
+import os
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+
+from PySide6.QtCore import QObject, QRunnable, QSize, QThreadPool, Qt, Signal
+from PySide6.QtGui import QGuiApplication, QIcon, QImage, QImageReader, QPixmap
+
+from config.config import APP_VERSION, ASSET_CACHE_DIR, ASSET_MEMORY_CACHE_SIZE
+from utils.helpers import resource_path
+from utils.logger import setup_logger
+
+# 初始化logger
+logger = setup_logger("asset_service")
+
+# 磁盘缓存文件头：魔数、宽、高、每行字节数
+_CACHE_MAGIC = b"FMIC"
+_CACHE_HEADER = struct.Struct("<4sIII")
+# 磁盘缓存统一使用绘制最快的像素格式
+_CACHE_FORMAT = QImage.Format.Format_ARGB32_Premultiplied
+# 计算源文件指纹时读取的字节数
+_FINGERPRINT_BYTES = 64 * 1024
+
+
+def _source_fingerprint(source_path):
+    """计算源图片的指纹（文件大小和开头部分内容的哈希）
+
+    打包环境中资源每次启动都会解压到新的临时目录，修改时间不可靠，因此按内容判断。
+    """
+    hash_obj = hashlib.sha1()
+    with open(source_path, "rb") as f:
+        hash_obj.update(f.read(_FINGERPRINT_BYTES))
+    return f"{os.path.getsize(source_path)}-{hash_obj.hexdigest()}"
+
+
+def _cache_file_path(relative_path, source_path, size, keep_aspect):
+    key = "|".join([
+        APP_VERSION, relative_path.replace("\\", "/"), _source_fingerprint(source_path),
+        f"{size.width()}x{size.height()}", "keep" if keep_aspect else "fill",
+    ])
+    return os.path.join(ASSET_CACHE_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".img")
+
+
+def _read_cached_image(cache_path):
+    """读取预缩放的图片缓存，缓存不存在或损坏时返回None"""
+    try:
+        with open(cache_path, "rb") as f:
+            data = f.read()
+    except (IOError, OSError):
+        return None
+    if len(data) < _CACHE_HEADER.size:
+        return None
+    magic, width, height, bytes_per_line = _CACHE_HEADER.unpack_from(data)
+    if magic != _CACHE_MAGIC or len(data) != _CACHE_HEADER.size + bytes_per_line * height:
+        return None
+    # copy()让图片持有自己的数据，不再引用读取的缓冲区
+    return QImage(data[_CACHE_HEADER.size:], width, height, bytes_per_line, _CACHE_FORMAT).copy()
+
+
+def _write_cached_image(cache_path, image):
+    temp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+        with open(temp_path, "wb") as f:
+            f.write(_CACHE_HEADER.pack(_CACHE_MAGIC, image.width(), image.height(), image.bytesPerLine()))
+            f.write(bytes(image.constBits()))
+        os.replace(temp_path, cache_path)
+    except (IOError, OSError) as e:
+        logger.debug(f"写入图片缓存失败: {e}")
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+def load_scaled_image(relative_path, size=None, keep_aspect=False):
+    """按目标尺寸加载图片，可以在工作线程中调用
+
+    指定尺寸时优先读取磁盘上的预缩放缓存；未命中时用QImageReader按目标尺寸解码
+    （JPEG可直接以缩小的尺寸解码，无需先解出完整大图），并写入缓存供下次启动使用。
+
+    Args:
+        relative_path: 相对于资源目录的图片路径
+        size: 目标像素尺寸，为None时按原始尺寸解码且不使用磁盘缓存
+        keep_aspect: 是否保持宽高比缩放到size范围内，否则拉伸到size
+
+    Returns:
+        QImage: 加载的图片，失败时为空图片
+    """
+    source_path = resource_path(relative_path)
+    if not os.path.exists(source_path):
+        logger.error(f"图片文件不存在: {source_path}")
+        return QImage()
+
+    cache_path = None
+    if size is not None:
+        try:
+            cache_path = _cache_file_path(relative_path, source_path, size, keep_aspect)
+        except (IOError, OSError) as e:
+            logger.debug(f"计算图片缓存键失败: {e}")
+        if cache_path:
+            image = _read_cached_image(cache_path)
+            if image is not None:
+                return image
+
+    reader = QImageReader(source_path)
+    reader.setAutoTransform(True)
+    if size is not None:
+        target = size
+        if keep_aspect and reader.size().isValid():
+            target = reader.size().scaled(size, Qt.AspectRatioMode.KeepAspectRatio)
+        reader.setScaledSize(target)
+    image = reader.read()
+    if image.isNull():
+        logger.error(f"图片加载失败: {source_path} ({reader.errorString()})")
+        return image
+
+    image = image.convertToFormat(_CACHE_FORMAT)
+    if cache_path:
+        _write_cached_image(cache_path, image)
+    return image
+
+
+class _DecodeTask(QRunnable):
+    """在线程池中解码图片"""
+
+    def __init__(self, service, key, relative_path, size, keep_aspect):
+        super().__init__()
+        self.service = service
+        self.key = key
+        self.relative_path = relative_path
+        self.size = size
+        self.keep_aspect = keep_aspect
+
+    def run(self):
+        image = load_scaled_image(self.relative_path, self.size, self.keep_aspect)
+        self.service._decoded.emit(self.key, image)
+
+
+class AssetService(QObject):
+    """界面图片服务
+
+    图片在工作线程中按显示尺寸解码（QPixmap只能在UI线程中创建，工作线程只产出QImage），
+    解码结果按(路径, 尺寸, 缩放方式)缓存在内存LRU中，超过ASSET_MEMORY_CACHE_SIZE时淘汰最久未用的图片；
+    按尺寸预缩放的结果同时写入ASSET_CACHE_DIR，之后启动时直接读取，跳过解码。
+    内存缓存和回调只在UI线程中访问。
+    """
+    _decoded = Signal(object, QImage)  # 内部使用：工作线程 -> UI线程
+
+    def __init__(self, max_bytes=ASSET_MEMORY_CACHE_SIZE, parent=None):
+        """初始化图片服务
+
+        Args:
+            max_bytes: 内存缓存的最大总大小（字节）
+            parent: 父对象
+        """
+        super().__init__(parent)
+        self.max_bytes = max_bytes
+        self._pixmaps = OrderedDict()
+        self._cached_bytes = 0
+        self._icons = {}
+        self._pending = {}  # 正在解码的图片 -> 等待结果的回调列表
+        self.pool = QThreadPool(self)
+        self._decoded.connect(self._on_decoded)
+
+    def _device_pixel_ratio(self):
+        screen = QGuiApplication.primaryScreen()
+        return screen.devicePixelRatio() if screen is not None else 1.0
+
+    def _make_key(self, relative_path, size, keep_aspect):
+        """将逻辑尺寸换算为当前屏幕的像素尺寸，生成缓存键
+
+        Returns:
+            tuple: (缓存键, 像素尺寸)
+        """
+        # 统一路径分隔符，os.path.join拼出的路径与"assets/..."写法对应同一个缓存项
+        relative_path = relative_path.replace("\\", "/")
+        if size is None:
+            return (relative_path, None, keep_aspect, 1.0), None
+        ratio = self._device_pixel_ratio()
+        pixel_size = QSize(round(size.width() * ratio), round(size.height() * ratio))
+        return (relative_path, (pixel_size.width(), pixel_size.height()), keep_aspect, ratio), pixel_size
+
+    def _get_cached(self, key):
+        entry = self._pixmaps.get(key)
+        if entry is None:
+            return None
+        self._pixmaps.move_to_end(key)
+        return entry[0]
+
+    def _store(self, key, image):
+        pixmap = QPixmap.fromImage(image)
+        if pixmap.isNull():
+            return pixmap
+        pixmap.setDevicePixelRatio(key[3])
+        cost = image.sizeInBytes()
+        self._pixmaps[key] = (pixmap, cost)
+        self._cached_bytes += cost
+        # 至少保留刚加入的图片
+        while self._cached_bytes > self.max_bytes and len(self._pixmaps) > 1:
+            _, (_, evicted_cost) = self._pixmaps.popitem(last=False)
+            self._cached_bytes -= evicted_cost
+        return pixmap
+
+    def pixmap(self, relative_path, size=None, keep_aspect=False):
+        """同步获取图片，需要在UI线程中调用
+
+        适用于对话框图标等小图片；大图请使用load_async。
+
+        Args:
+            relative_path: 相对于资源目录的图片路径
+            size: 显示尺寸（逻辑像素），为None时使用原始尺寸
+            keep_aspect: 是否保持宽高比
+
+        Returns:
+            QPixmap: 图片，加载失败时为空图片
+        """
+        key, pixel_size = self._make_key(relative_path, size, keep_aspect)
+        pixmap = self._get_cached(key)
+        if pixmap is None:
+            pixmap = self._store(key, load_scaled_image(relative_path, pixel_size, keep_aspect))
+        return pixmap
+
+    def load_async(self, relative_path, size, callback, keep_aspect=False):
+        """在工作线程中解码图片，完成后在UI线程中调用callback(QPixmap)
+
+        内存中已有该图片时立即调用回调；同一图片同时被多次请求时只解码一次。
+
+        Args:
+            relative_path: 相对于资源目录的图片路径
+            size: 显示尺寸（逻辑像素），为None时使用原始尺寸
+            callback: 回调函数，参数为QPixmap，加载失败时不调用
+            keep_aspect: 是否保持宽高比
+        """
+        key, pixel_size = self._make_key(relative_path, size, keep_aspect)
+        pixmap = self._get_cached(key)
+        if pixmap is not None:
+            callback(pixmap)
+            return
+
+        callbacks = self._pending.get(key)
+        if callbacks is not None:
+            callbacks.append(callback)
+            return
+        self._pending[key] = [callback]
+        self.pool.start(_DecodeTask(self, key, relative_path, pixel_size, keep_aspect))
+
+    def _on_decoded(self, key, image):
+        callbacks = self._pending.pop(key, [])
+        if image.isNull():
+            return
+        pixmap = self._store(key, image)
+        for callback in callbacks:
+            try:
+                callback(pixmap)
+            except RuntimeError as e:
+                # 目标控件可能在解码期间已被销毁
+                logger.debug(f"图片回调失败: {e}")
+
+    def icon(self, relative_path):
+        """获取缓存的图标
+
+        Args:
+            relative_path: 相对于资源目录的图标路径
+
+        Returns:
+            QIcon: 图标，加载失败时为空图标
+        """
+        icon = self._icons.get(relative_path)
+        if icon is None:
+            pixmap = self.pixmap(relative_path)
+            icon = QIcon(pixmap) if not pixmap.isNull() else QIcon()
+            self._icons[relative_path] = icon
+        return icon
+
+    def apply_dialog_icon(self, dialog, relative_path, icon_size=64):
+        """为对话框设置窗口图标和内容图标
+
+        Args:
+            dialog: QMessageBox实例
+            relative_path: 相对于资源目录的图标路径
+            icon_size: 内容图标的显示尺寸
+
+        Returns:
+            bool: 是否设置成功
+        """
+        icon = self.icon(relative_path)
+        if icon.isNull():
+            return False
+        dialog.setWindowIcon(icon)
+        dialog.setIconPixmap(self.pixmap(relative_path, QSize(icon_size, icon_size), keep_aspect=True))
+        return True
+
+    def wait(self, msecs=1000):
+        """等待进行中的解码结束（退出程序前调用）"""
+        return self.pool.waitForDone(msecs)
+
+
+_service = None
+
+
+def get_asset_service():
+    """获取进程内唯一的图片服务，需要在UI线程中首次调用
+
+    Returns:
+        AssetService: 图片服务实例
+    """
+    global _service
+    if _service is None:
+        _service = AssetService()
+    return _service
@@ -0,0 +1,189 @@
+import os
+import copy
+import json
+import atexit
+import threading
+
+from config.config import CONFIG_FILE, CONFIG_SAVE_DEBOUNCE
+from utils.logger import setup_logger
+
+# 初始化logger
+logger = setup_logger("config_store")
+
+# 区分"键不存在"和"值为None"
+_MISSING = object()
+
+
+class ConfigStore:
+    """进程内唯一的配置存储
+
+    所有模块共享同一个内存中的配置字典，读取不访问磁盘。
+    提交修改时比较差异并通知订阅者，写入延迟CONFIG_SAVE_DEBOUNCE秒在后台线程中进行，
+    期间的多次修改合并为一次写入；写入时先写临时文件并fsync，再原子替换原文件，
+    程序崩溃也不会留下被截断的配置文件。
+    """
+
+    def __init__(self, path=CONFIG_FILE, debounce=CONFIG_SAVE_DEBOUNCE):
+        """初始化配置存储并从磁盘加载配置
+
+        Args:
+            path: 配置文件路径
+            debounce: 延迟写入时间（秒）
+        """
+        self.path = path
+        self.debounce = debounce
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._timer = None
+        self._pending = None  # 等待写入磁盘的配置快照
+        self._listeners = []
+        self._data = self._read()
+        self._committed = copy.deepcopy(self._data)
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+                return data if isinstance(data, dict) else {}
+        except (json.JSONDecodeError, IOError) as e:
+            logger.warning(f"读取配置文件失败，使用空配置: {e}")
+            return {}
+
+    @property
+    def data(self):
+        """共享的配置字典，直接修改后需调用commit()才会通知订阅者并写入磁盘"""
+        return self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._data.get(key, default)
+
+    def get_bool(self, key, default=False):
+        value = self.get(key, default)
+        return value if isinstance(value, bool) else default
+
+    def get_int(self, key, default=0):
+        value = self.get(key, default)
+        if isinstance(value, bool):
+            return default
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return default
+
+    def get_str(self, key, default=""):
+        value = self.get(key, default)
+        return value if isinstance(value, str) else default
+
+    def set(self, key, value):
+        """修改单个配置项并提交"""
+        with self._lock:
+            self._data[key] = value
+        self.commit()
+
+    def update(self, values):
+        """批量修改配置项并提交"""
+        with self._lock:
+            self._data.update(values)
+        self.commit()
+
+    def commit(self, config=None):
+        """提交配置修改：通知订阅者并安排延迟写入
+
+        Args:
+            config: 调用方持有的配置字典；不是共享字典时会合并进共享字典
+        """
+        with self._lock:
+            if config is not None and config is not self._data:
+                self._data.update(config)
+            changed = [
+                key for key in set(self._data) | set(self._committed)
+                if self._data.get(key, _MISSING) != self._committed.get(key, _MISSING)
+            ]
+            if not changed:
+                return
+            self._committed = copy.deepcopy(self._data)
+            self._pending = self._committed
+            self._schedule_write()
+            listeners = list(self._listeners)
+
+        for key in changed:
+            value = self._committed.get(key)
+            for callback, watched_key in listeners:
+                if watched_key is None or watched_key == key:
+                    try:
+                        callback(key, value)
+                    except Exception as e:
+                        logger.error(f"配置变更通知处理失败 ({key}): {e}")
+
+    def subscribe(self, callback, key=None):
+        """订阅配置变更
+
+        Args:
+            callback: 回调函数，参数为(key, value)，在提交修改的线程中调用
+            key: 只关注的配置项，为None时关注全部
+        """
+        with self._lock:
+            self._listeners.append((callback, key))
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._listeners = [item for item in self._listeners if item[0] is not callback]
+
+    def _schedule_write(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.debounce, self._write_pending)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _write_pending(self):
+        with self._lock:
+            data = self._pending
+            self._pending = None
+            self._timer = None
+        if data is None:
+            return
+
+        # 写入串行进行，避免flush()与定时写入同时替换文件
+        with self._write_lock:
+            temp_file = f"{self.path}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(temp_file, "w", encoding="utf-8") as f:
+                    json.dump(data, f, indent=4)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_file, self.path)
+            except (IOError, OSError) as e:
+                logger.error(f"Error saving config: {e}")
+
+    def flush(self):
+        """立即写入尚未保存的修改（退出程序前调用）"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self._write_pending()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_config_store():
+    """获取进程内唯一的配置存储
+
+    Returns:
+        ConfigStore: 配置存储实例
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ConfigStore()
+                # 正常退出时写入尚未保存的修改
+                atexit.register(_store.flush)
+    return _store
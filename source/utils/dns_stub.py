@@ -0,0 +1,251 @@
+import socket
+import struct
+import threading
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor
+
+from config.config import DNS_STUB_ADDRESS, DNS_STUB_TTL, DNS_STUB_WORKERS, DNS_STUB_MAX_PENDING
+from utils.logger import setup_logger
+
+# 初始化logger
+logger = setup_logger("dns_stub")
+
+# DNS记录类型
+QTYPE_A = 1
+QTYPE_AAAA = 28
+QCLASS_IN = 1
+
+# DNS响应码
+RCODE_NOERROR = 0
+RCODE_FORMERR = 1
+RCODE_SERVFAIL = 2
+RCODE_NXDOMAIN = 3
+
+# 不带EDNS的UDP响应报文长度上限
+UDP_MAX_SIZE = 512
+FLAG_TC = 0x0200
+
+
+def _parse_question(packet):
+    """解析DNS查询报文中的第一个问题
+
+    Args:
+        packet: 原始查询报文
+
+    Returns:
+        tuple: (事务ID, 标志位, 域名, 查询类型, 查询类别, 问题部分结束位置)
+    """
+    if len(packet) < 12:
+        raise ValueError("报文过短")
+    txid, flags, qdcount = struct.unpack("!HHH", packet[:6])
+    if qdcount < 1:
+        raise ValueError("报文中没有问题记录")
+
+    labels = []
+    offset = 12
+    while True:
+        length = packet[offset]
+        offset += 1
+        if length == 0:
+            break
+        if length & 0xC0:
+            raise ValueError("查询中不应出现域名压缩")
+        labels.append(packet[offset:offset + length].decode("ascii").lower())
+        offset += length
+    qtype, qclass = struct.unpack("!HH", packet[offset:offset + 4])
+    return txid, flags, ".".join(labels), qtype, qclass, offset + 4
+
+
+def _build_response(packet, question_end, rcode, qtype=None, addresses=()):
+    """根据查询报文构造响应报文
+
+    Args:
+        packet: 原始查询报文
+        question_end: 问题部分结束位置
+        rcode: 响应码
+        qtype: 回答记录的类型
+        addresses: 回答中的IP地址列表
+
+    Returns:
+        bytes: 响应报文，超过512字节时截断回答并置TC位
+    """
+    txid, flags = struct.unpack("!HH", packet[:4])
+    # QR=1，保留Opcode和RD，置RA=1
+    response_flags = 0x8000 | (flags & 0x7900) | 0x0080 | rcode
+    question = packet[12:question_end]
+
+    answers = []
+    size = 12 + len(question)
+    for address in addresses:
+        rdata = ipaddress.ip_address(address).packed
+        # 0xC00C指向报文头之后的问题域名
+        answer = struct.pack("!HHHIH", 0xC00C, qtype, QCLASS_IN, DNS_STUB_TTL, len(rdata)) + rdata
+        if size + len(answer) > UDP_MAX_SIZE:
+            response_flags |= FLAG_TC
+            break
+        answers.append(answer)
+        size += len(answer)
+
+    header = struct.pack("!HHHHHH", txid, response_flags, 1, len(answers), 0, 0)
+    return header + question + b"".join(answers)
+
+
+class LocalDnsResolver:
+    """仅供下载进程使用的本地DNS解析器
+
+    在回环地址上监听UDP 53端口，下载域名返回优选IP，其余域名交给系统解析器处理。
+    aria2c通过--async-dns-server指向该地址后，固定IP即刻生效，无需修改系统hosts文件，
+    也不需要管理员权限，停止解析器即完成清理。
+    """
+
+    def __init__(self, address=DNS_STUB_ADDRESS, port=53):
+        """初始化本地DNS解析器
+
+        Args:
+            address: 监听的回环地址
+            port: 监听端口（aria2c只能使用53端口的DNS服务器）
+        """
+        self.address = address
+        self.port = port
+        self._socket = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._pins = {}
+        self._executor = None
+        self._pending = 0  # 等待系统解析的查询数
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动解析器，已在运行时直接返回
+
+        Returns:
+            bool: 是否启动成功
+        """
+        if self.is_running:
+            return True
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((self.address, self.port))
+            sock.settimeout(0.5)
+        except OSError as e:
+            logger.warning(f"本地DNS解析器无法监听 {self.address}:{self.port}: {e}")
+            return False
+
+        self._socket = sock
+        self._stop_event.clear()
+        self._pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=DNS_STUB_WORKERS, thread_name_prefix="LocalDnsResolver")
+        self._thread = threading.Thread(target=self._serve, name="LocalDnsResolver", daemon=True)
+        self._thread.start()
+        logger.info(f"本地DNS解析器已启动: {self.address}:{self.port}")
+        return True
+
+    def stop(self):
+        """停止解析器并清除所有固定记录"""
+        with self._lock:
+            self._pins.clear()
+        if not self.is_running:
+            return
+        self._stop_event.set()
+        self._thread.join(2)
+        # 不等待仍在进行的系统解析，其响应会因套接字已关闭而被丢弃
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._socket.close()
+        self._socket = None
+        self._thread = None
+        logger.info("本地DNS解析器已停止")
+
+    def pin(self, hostname, ips):
+        """将域名固定到指定IP，IPv4和IPv6地址会分别用于A和AAAA查询
+
+        Args:
+            hostname: 域名
+            ips: IP地址列表
+        """
+        with self._lock:
+            self._pins[hostname.lower().rstrip(".")] = list(ips)
+        logger.info(f"已将 {hostname} 固定到: {', '.join(ips)}")
+
+    def unpin(self, hostname):
+        """取消域名的固定记录"""
+        with self._lock:
+            self._pins.pop(hostname.lower().rstrip("."), None)
+
+    def get_pinned_ips(self, hostname):
+        """获取域名当前固定的IP列表"""
+        with self._lock:
+            return list(self._pins.get(hostname.lower().rstrip("."), []))
+
+    def _serve(self):
+        while not self._stop_event.is_set():
+            try:
+                packet, client = self._socket.recvfrom(512)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+            try:
+                txid, flags, name, qtype, qclass, question_end = _parse_question(packet)
+            except (ValueError, IndexError, UnicodeDecodeError):
+                continue
+
+            with self._lock:
+                pinned = self._pins.get(name)
+            if pinned is not None and qclass == QCLASS_IN:
+                version = 6 if qtype == QTYPE_AAAA else 4
+                addresses = [ip for ip in pinned if ipaddress.ip_address(ip).version == version] \
+                    if qtype in (QTYPE_A, QTYPE_AAAA) else []
+                self._reply(_build_response(packet, question_end, RCODE_NOERROR, qtype, addresses), client)
+            else:
+                # 系统解析可能较慢，交给有限的线程池处理，避免阻塞固定域名的查询；
+                # 积压过多时直接返回SERVFAIL，由客户端稍后重试
+                with self._lock:
+                    overloaded = self._pending >= DNS_STUB_MAX_PENDING
+                    if not overloaded:
+                        self._pending += 1
+                if overloaded:
+                    self._reply(_build_response(packet, question_end, RCODE_SERVFAIL), client)
+                    continue
+                self._executor.submit(self._resolve_with_system, packet, question_end, name, qtype, client)
+
+    def _resolve_with_system(self, packet, question_end, name, qtype, client):
+        """通过系统解析器解析未固定的域名"""
+        try:
+            self._resolve_and_reply(packet, question_end, name, qtype, client)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _resolve_and_reply(self, packet, question_end, name, qtype, client):
+        if qtype not in (QTYPE_A, QTYPE_AAAA):
+            self._reply(_build_response(packet, question_end, RCODE_NOERROR), client)
+            return
+
+        family = socket.AF_INET6 if qtype == QTYPE_AAAA else socket.AF_INET
+        try:
+            infos = socket.getaddrinfo(name, None, family, socket.SOCK_STREAM)
+            addresses = list(dict.fromkeys(info[4][0].split("%")[0] for info in infos))
+            response = _build_response(packet, question_end, RCODE_NOERROR, qtype, addresses)
+        except socket.gaierror as e:
+            # 只有IPv4地址的域名查询AAAA时应返回空结果，而不是域名不存在
+            if qtype == QTYPE_AAAA:
+                rcode = RCODE_NOERROR
+            else:
+                rcode = RCODE_NXDOMAIN if e.errno == socket.EAI_NONAME else RCODE_SERVFAIL
+            response = _build_response(packet, question_end, rcode)
+        self._reply(response, client)
+
+    def _reply(self, response, client):
+        sock = self._socket
+        if sock is None:
+            return
+        try:
+            sock.sendto(response, client)
+        except OSError as e:
+            logger.debug(f"发送DNS响应失败: {e}")
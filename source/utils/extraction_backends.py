@@ -0,0 +1,448 @@
+import os
+import re
+import sys
+import uuid
+import shutil
+import threading
+import subprocess
+
+from config.config import EXTRACT_BACKEND, EXTRACT_7Z_PATH, EXTRACT_THREADS
+from utils.logger import setup_logger
+
+# 初始化logger
+logger = setup_logger("extraction_backends")
+
+# 解压过程中目标文件的临时后缀，成功后重命名为正式文件名
+PARTIAL_SUFFIX = ".partial"
+
+# 按优先顺序查找的7-Zip可执行文件：7zz为官方Linux/macOS版本，7z/7za来自p7zip
+_NATIVE_NAMES = ("7zz", "7z", "7za")
+# 7-Zip进度输出，例如" 45% 1 - vol.1/adultsonly.xp3"
+_PROGRESS_PATTERN = re.compile(r"(\d{1,3})%")
+# 从管道读取解压数据时每次读取的字节数
+_READ_CHUNK_SIZE = 1024 * 1024
+# 失败时保留的7-Zip错误输出长度
+_STDERR_TAIL = 4096
+
+_executable_cache = {}
+
+
+def partial_path_for(target):
+    """获取一次解压所用的临时文件路径
+
+    每次解压使用独立的文件名（"<目标>.<随机串>.partial"），超时后仍未结束的旧解压线程
+    不会与重试时的解压写入同一个文件。
+    """
+    return f"{target}.{uuid.uuid4().hex[:8]}{PARTIAL_SUFFIX}"
+
+
+def find_7z_executable():
+    """查找可用的7-Zip命令行程序
+
+    优先使用配置中指定的路径，其次在PATH中查找，Windows下再尝试默认安装目录。
+
+    Returns:
+        str: 可执行文件路径，未找到时返回None
+    """
+    if "path" in _executable_cache:
+        return _executable_cache["path"]
+
+    candidates = []
+    if EXTRACT_7Z_PATH:
+        candidates.append(EXTRACT_7Z_PATH)
+    candidates.extend(_NATIVE_NAMES)
+    if sys.platform == "win32":
+        for env_name in ("ProgramFiles", "ProgramW6432", "ProgramFiles(x86)"):
+            program_files = os.environ.get(env_name)
+            if program_files:
+                candidates.append(os.path.join(program_files, "7-Zip", "7z.exe"))
+
+    path = None
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            path = candidate
+        else:
+            path = shutil.which(candidate)
+        if path:
+            break
+    _executable_cache["path"] = path
+    return path
+
+
+class ExtractionBackend:
+    """解压后端接口
+
+    extract_members按压缩包内路径将指定文件解压到目标路径：数据先写入.partial文件，
+    全部成功后再重命名，失败时删除.partial文件；extract_all将全部文件解压到目录；
+    test_archive只解压校验CRC而不写入磁盘。
+    各方法都会阻塞直到完成，可以在工作线程中调用；cancel可以在其他线程中调用以尽快终止，
+    取消后不会再将.partial文件重命名为目标文件。
+    """
+
+    name = ""
+
+    def __init__(self):
+        self._cancelled = False
+        self._fallback = None  # 失败后改用的py7zr后端，取消时一并取消
+        # 重命名.partial文件与取消互斥，取消返回后不会再替换目标文件
+        self._commit_lock = threading.Lock()
+
+    def extract_members(self, archive_path, destinations, progress=None):
+        """解压指定文件到目标路径
+
+        Args:
+            archive_path: 压缩包路径
+            destinations: 压缩包内路径 -> 目标文件路径
+            progress: 进度回调，参数为0-100的整数，在解压线程中调用
+
+        Returns:
+            dict: 目标文件路径 -> 文件大小
+        """
+        raise NotImplementedError
+
+    def extract_all(self, archive_path, output_dir, progress=None):
+        """解压全部文件到目录
+
+        Args:
+            archive_path: 压缩包路径
+            output_dir: 输出目录
+            progress: 进度回调，参数为0-100的整数，在解压线程中调用
+        """
+        raise NotImplementedError
+
+    def test_archive(self, archive_path, progress=None):
+        """校验压缩包的完整性（解压全部数据并检查CRC，不写入磁盘）
+
+        Args:
+            archive_path: 压缩包路径
+            progress: 进度回调，参数为0-100的整数，在解压线程中调用
+
+        Raises:
+            RuntimeError: 压缩包损坏或无法读取
+        """
+        raise NotImplementedError
+
+    def cancel(self):
+        """请求终止正在进行的解压"""
+        with self._commit_lock:
+            self._cancelled = True
+        fallback = self._fallback
+        if fallback is not None:
+            fallback.cancel()
+
+    def _check_cancelled(self):
+        if self._cancelled:
+            raise RuntimeError("解压已取消")
+
+
+class Py7zrBackend(ExtractionBackend):
+    """纯Python的py7zr后端，单线程解压，始终可用"""
+
+    name = "py7zr"
+
+    def __init__(self):
+        super().__init__()
+        self._factory = None
+
+    def extract_members(self, archive_path, destinations, progress=None):
+        import py7zr  # 按需导入，避免拖慢启动
+        from utils.streaming_extract import PartialFileFactory, extract_to_targets
+
+        # py7zr无法从外部中断，由写入工厂在写入和重命名时检查取消标志
+        factory = PartialFileFactory(destinations)
+        self._factory = factory
+        if self._cancelled:
+            factory.cancel()
+        self._check_cancelled()
+        with py7zr.SevenZipFile(archive_path, mode="r") as archive:
+            sizes = extract_to_targets(archive, destinations, factory)
+        if progress is not None:
+            progress(100)
+        return sizes
+
+    def cancel(self):
+        super().cancel()
+        factory = self._factory
+        if factory is not None:
+            factory.cancel()
+
+    def extract_all(self, archive_path, output_dir, progress=None):
+        import py7zr  # 按需导入，避免拖慢启动
+
+        self._check_cancelled()
+
+        with py7zr.SevenZipFile(archive_path, mode="r") as archive:
+            archive.extractall(path=output_dir)
+        if progress is not None:
+            progress(100)
+
+    def test_archive(self, archive_path, progress=None):
+        import py7zr  # 按需导入，避免拖慢启动
+
+        self._check_cancelled()
+
+        with py7zr.SevenZipFile(archive_path, mode="r") as archive:
+            bad_file = archive.testzip()
+        if bad_file is not None:
+            raise RuntimeError(f"压缩包CRC校验失败: {bad_file}")
+        if progress is not None:
+            progress(100)
+
+
+class Native7zBackend(ExtractionBackend):
+    """调用7-Zip命令行程序的后端
+
+    以-mmt多线程解压（LZMA2等格式可同时使用多个CPU核心），通过-bsp2在标准错误中输出进度。
+    解压指定文件时使用-so将数据写到标准输出，由本进程直接写入目标目录中的.partial文件，
+    因此同样不需要临时目录。
+    """
+
+    name = "7z"
+
+    def __init__(self, executable=None, threads=EXTRACT_THREADS):
+        """初始化7-Zip后端
+
+        Args:
+            executable: 7-Zip可执行文件路径，为None时自动查找
+            threads: 解压线程数，0表示由7-Zip按CPU核心数决定
+        """
+        super().__init__()
+        self.executable = executable or find_7z_executable()
+        self.threads = threads
+        self._process = None
+
+    def _base_command(self, command):
+        return [
+            self.executable, command, "-y", "-bb0", "-bse2", "-bsp2",
+            f"-mmt{self.threads}" if self.threads else "-mmt=on",
+        ]
+
+    def _start(self, args, stdout):
+        self._check_cancelled()
+        creation_flags = subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
+        try:
+            # 加密压缩包会等待输入密码，关闭标准输入使其直接失败
+            self._process = subprocess.Popen(
+                args, stdin=subprocess.DEVNULL, stdout=stdout, stderr=subprocess.PIPE,
+                creationflags=creation_flags
+            )
+        except OSError as e:
+            raise RuntimeError(f"无法启动7-Zip: {e}")
+        return self._process
+
+    def _read_stderr(self, process, output, progress):
+        """读取7-Zip的标准错误：解析进度并保留最后一段输出用于报错"""
+        last_percent = -1
+        while True:
+            data = process.stderr.read1(4096)
+            if not data:
+                break
+            text = data.decode("utf-8", "replace")
+            output.append(text)
+            if len(output) > 64:
+                del output[:-64]
+            matches = _PROGRESS_PATTERN.findall(text)
+            if matches and progress is not None:
+                percent = min(100, int(matches[-1]))
+                if percent != last_percent:
+                    last_percent = percent
+                    progress(percent)
+
+    def _wait(self, process, stderr_thread, stderr_output):
+        return_code = process.wait()
+        stderr_thread.join()
+        self._process = None
+        if self._cancelled:
+            raise RuntimeError("解压已取消")
+        text = "".join(stderr_output)[-_STDERR_TAIL:].replace("\b", "").strip()
+        if return_code != 0:
+            raise RuntimeError(f"7-Zip退出码: {return_code}\n{text}")
+        return text
+
+    def list_sizes(self, archive_path):
+        """读取压缩包目录
+
+        Returns:
+            dict: 压缩包内路径 -> 解压后大小（不含文件夹）
+        """
+        process = self._start(
+            [self.executable, "l", "-slt", "-bb0", "-bse2", archive_path], subprocess.PIPE
+        )
+        try:
+            stdout, stderr = process.communicate()
+        finally:
+            self._process = None
+        if process.returncode != 0:
+            raise RuntimeError(
+                f"7-Zip退出码: {process.returncode}\n{stderr.decode('utf-8', 'replace')[-_STDERR_TAIL:]}"
+            )
+
+        sizes = {}
+        # 分隔线之前是压缩包本身的信息，之后每个空行分隔一个条目
+        listing = stdout.decode("utf-8", "replace").replace("\r\n", "\n").split("\n----------\n", 1)[-1]
+        for block in listing.split("\n\n"):
+            fields = dict(line.split(" = ", 1) for line in block.splitlines() if " = " in line)
+            if "Path" not in fields or "D" in fields.get("Attributes", "").split(" ")[0]:
+                continue
+            try:
+                sizes[fields["Path"].replace("\\", "/")] = int(fields.get("Size") or 0)
+            except ValueError:
+                continue
+        return sizes
+
+    def _member_sizes(self, archive_path):
+        """优先使用共享的压缩包目录索引，py7zr无法解析文件头时改用7-Zip读取目录"""
+        from utils.archive_index import get_archive_index
+
+        try:
+            return get_archive_index(archive_path).sizes()
+        except Exception as e:
+            logger.debug(f"读取压缩包目录索引失败，改用7-Zip读取: {e}")
+            return self.list_sizes(archive_path)
+
+    def extract_members(self, archive_path, destinations, progress=None):
+        sizes = {}
+        partial_paths = []
+        try:
+            # -so模式下找不到文件时7-Zip不会报错，需先确认文件存在并记录大小用于校验
+            expected_sizes = self._member_sizes(archive_path)
+            for member in destinations:
+                if member.replace("\\", "/") not in expected_sizes:
+                    raise FileNotFoundError(f"压缩包中未找到文件: {member}")
+
+            members = list(destinations.items())
+            for index, (member, target) in enumerate(members):
+                member_progress = None
+                if progress is not None:
+                    # 按文件个数折算总进度
+                    member_progress = lambda percent, index=index: progress(
+                        int((index + percent / 100) * 100 / len(members))
+                    )
+
+                os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+                partial_path = partial_path_for(target)
+                partial_paths.append(partial_path)
+                # -spd关闭通配符匹配，文件名中的[]等字符按原样处理
+                args = self._base_command("e") + ["-so", "-spd", archive_path, member]
+                process = self._start(args, subprocess.PIPE)
+                stderr_output = []
+                stderr_thread = threading.Thread(
+                    target=self._read_stderr, args=(process, stderr_output, member_progress), daemon=True
+                )
+                stderr_thread.start()
+
+                written = 0
+                with open(partial_path, "wb") as f:
+                    while True:
+                        chunk = process.stdout.read(_READ_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        written += len(chunk)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._wait(process, stderr_thread, stderr_output)
+                expected = expected_sizes[member.replace("\\", "/")]
+                if written != expected:
+                    raise RuntimeError(f"{member} 解压后大小不符: {written} 字节，应为 {expected} 字节")
+                sizes[target] = written
+
+            # 所有文件都解压成功后才替换目标文件；已取消（如超时）时不再替换
+            with self._commit_lock:
+                self._check_cancelled()
+                for (member, target), partial_path in zip(members, partial_paths):
+                    os.replace(partial_path, target)
+            partial_paths = []
+            if progress is not None:
+                progress(100)
+            return sizes
+        finally:
+            if self._process is not None:
+                self._process.kill()
+                self._process = None
+            for partial_path in partial_paths:
+                try:
+                    if os.path.exists(partial_path):
+                        os.remove(partial_path)
+                except OSError as e:
+                    logger.warning(f"删除未完成的解压文件失败: {partial_path} ({e})")
+
+    def extract_all(self, archive_path, output_dir, progress=None):
+        os.makedirs(output_dir, exist_ok=True)
+        self._run_command(self._base_command("x") + ["-bso0", f"-o{output_dir}", archive_path], progress)
+
+    def test_archive(self, archive_path, progress=None):
+        self._run_command(self._base_command("t") + ["-bso0", archive_path], progress)
+
+    def _run_command(self, args, progress):
+        """运行不需要读取标准输出的7-Zip命令，等待其结束"""
+        process = self._start(args, subprocess.DEVNULL)
+        stderr_output = []
+        stderr_thread = threading.Thread(
+            target=self._read_stderr, args=(process, stderr_output, progress), daemon=True
+        )
+        stderr_thread.start()
+        try:
+            self._wait(process, stderr_thread, stderr_output)
+        finally:
+            if self._process is not None:
+                self._process.kill()
+                self._process = None
+        if progress is not None:
+            progress(100)
+
+    def cancel(self):
+        super().cancel()
+        process = self._process
+        if process is not None:
+            try:
+                process.kill()
+            except OSError:
+                pass
+
+
+def get_extraction_backend(name=EXTRACT_BACKEND, threads=EXTRACT_THREADS):
+    """按名称获取解压后端
+
+    Args:
+        name: "auto"（有7-Zip时使用7-Zip，否则使用py7zr）、"7z"或"py7zr"
+        threads: 7-Zip的解压线程数，0表示由7-Zip按CPU核心数决定
+
+    Returns:
+        ExtractionBackend: 新的后端实例
+    """
+    if name in ("auto", "7z"):
+        executable = find_7z_executable()
+        if executable:
+            return Native7zBackend(executable, threads)
+        if name == "7z":
+            logger.warning("未找到7-Zip命令行程序，改用py7zr解压")
+    return Py7zrBackend()
+
+
+def run_with_fallback(backend, method, *args, **kwargs):
+    """使用指定后端解压，7-Zip失败时改用py7zr重试一次
+
+    Args:
+        backend: 解压后端
+        method: 方法名，"extract_members"、"extract_all"或"test_archive"
+        *args: 传给解压方法的参数
+        **kwargs: 传给解压方法的参数
+
+    Returns:
+        tuple: (解压方法的返回值, 实际使用的后端)
+    """
+    try:
+        return getattr(backend, method)(*args, **kwargs), backend
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        if isinstance(backend, Py7zrBackend) or backend._cancelled:
+            raise
+        logger.warning(f"{backend.name} 解压失败，改用py7zr重试: {e}")
+    fallback = Py7zrBackend()
+    backend._fallback = fallback
+    # 7-Zip失败后到创建py7zr后端之间可能已被取消
+    if backend._cancelled:
+        fallback.cancel()
+    return getattr(fallback, method)(*args, **kwargs), fallback
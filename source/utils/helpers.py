@@ -4,15 +4,14 @@ import base64
 import hashlib
 import concurrent.futures
 import ctypes
-import json
-import psutil
 from PySide6 import QtCore, QtWidgets
 import re
-from PySide6.QtGui import QIcon, QPixmap
+from PySide6.QtGui import QPixmap
 from PySide6.QtCore import Qt
 from PySide6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QProgressBar
-from config.config import APP_NAME, CONFIG_FILE
+from config.config import APP_NAME
 from utils.logger import setup_logger
+from utils.config_store import get_config_store
 import datetime
 import traceback
 import subprocess
@@ -215,36 +214,50 @@ def msgbox_frame(title, text, buttons=QtWidgets.QMessageBox.StandardButton.NoBut
     msg_box.setWindowTitle(title)
     msg_box.setWindowModality(QtCore.Qt.WindowModality.WindowModal)
     
-    # 直接加载图标文件
-    icon_path = resource_path(os.path.join("assets", "images", "ICO", "icon.png"))
-    if os.path.exists(icon_path):
-        pixmap = QPixmap(icon_path)
-        if not pixmap.isNull():
-            msg_box.setWindowIcon(QIcon(pixmap))
-            msg_box.setIconPixmap(pixmap.scaled(64, 64, QtCore.Qt.AspectRatioMode.KeepAspectRatio, QtCore.Qt.TransformationMode.SmoothTransformation))
-    else:
+    # 图标由图片服务缓存，不会在每次弹窗时重新读取和缩放
+    from utils.asset_service import get_asset_service
+    if not get_asset_service().apply_dialog_icon(msg_box, os.path.join("assets", "images", "ICO", "icon.png")):
         msg_box.setIcon(QtWidgets.QMessageBox.Icon.Information)
         
     msg_box.setText(text)
     msg_box.setStandardButtons(buttons)
     return msg_box
 
+def stop_threads_gracefully(threads_dict, timeout_ms=2000, debug_manager=None):
+    """优雅地停止一组线程，超时未结束的线程会被强制终止
+
+    Args:
+        threads_dict: 线程名字和线程对象的字典
+        timeout_ms: 等待线程自然结束的超时时间
+        debug_manager: 调试管理器，用于记录停止过程，可为None
+    """
+    for name, thread_obj in threads_dict.items():
+        if not thread_obj or not hasattr(thread_obj, 'isRunning') or not thread_obj.isRunning():
+            continue
+
+        try:
+            if hasattr(thread_obj, 'requestInterruption'):
+                thread_obj.requestInterruption()
+
+            if thread_obj.wait(timeout_ms):
+                if debug_manager:
+                    debug_manager.log_debug(f"线程 {name} 已优雅停止.")
+            else:
+                if debug_manager:
+                    debug_manager.log_warning(f"线程 {name} 超时，强制终止.")
+                thread_obj.terminate()
+                thread_obj.wait(1000) # a short wait after termination
+        except Exception as e:
+            if debug_manager:
+                debug_manager.log_error(f"停止线程 {name} 时发生错误: {e}")
+
 def load_config():
-    if not os.path.exists(CONFIG_FILE):
-        return {}
-    try:
-        with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, IOError):
-        return {}
+    """获取共享的配置字典（来自内存中的配置存储，不读取磁盘）"""
+    return get_config_store().data
 
 def save_config(config):
-    try:
-        os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
-        with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-            json.dump(config, f, indent=4)
-    except IOError as e:
-        logger.error(f"Error saving config: {e}")
+    """提交配置修改，实际写入由配置存储在后台延迟进行"""
+    get_config_store().commit(config)
 
 
 class HashManager:
@@ -500,56 +513,82 @@ class AdminPrivileges:
                 msg_box.exec()
                 sys.exit(1)
 
-    def check_and_terminate_processes(self):
+    def find_running_games(self):
+        """查找正在运行的游戏进程，不涉及界面，可以在工作线程中调用
+
+        Returns:
+            list: 匹配的进程列表 [(psutil.Process, 显示名称)]
+        """
+        import psutil  # 按需导入，避免拖慢启动
+
+        required = {exe.lower(): exe for exe in self.required_exes}
+        running = []
         try:
             for proc in psutil.process_iter(["pid", "name"]):
                 proc_name = proc.info["name"].lower() if proc.info["name"] else ""
                 
                 # 检查进程名是否匹配任何需要终止的游戏进程
-                for exe in self.required_exes:
-                    if exe.lower() == proc_name:
-                        # 获取不带.nocrack的游戏名称用于显示
-                        display_name = exe.replace(".nocrack", "")
-                        
+                exe = required.get(proc_name)
+                if exe:
+                    # 获取不带.nocrack的游戏名称用于显示
+                    running.append((proc, exe.replace(".nocrack", "")))
+        except Exception as e:
+            logger.error(f"进程检查时发生错误: {e}")
+            raise
+        return running
+
+    def terminate_running_games(self, running):
+        """询问用户并终止正在运行的游戏进程，需要在UI线程中调用
+
+        Args:
+            running: find_running_games返回的进程列表
+        """
+        import psutil  # 按需导入，避免拖慢启动
+
+        for proc, display_name in running:
+            msg_box = msgbox_frame(
+                f"进程检测 - {APP_NAME}",
+                f"\n检测到游戏正在运行： {display_name} \n\n是否终止？\n",
+                QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No,
+            )
+            try:
+                reply = msg_box.exec()
+                if reply == QtWidgets.QMessageBox.StandardButton.Yes:
+                    try:
+                        proc.terminate()
+                        proc.wait(timeout=3)
+                    except psutil.NoSuchProcess:
+                        # 扫描之后用户已自行关闭游戏
+                        pass
+                    except psutil.AccessDenied:
                         msg_box = msgbox_frame(
-                            f"进程检测 - {APP_NAME}",
-                            f"\n检测到游戏正在运行： {display_name} \n\n是否终止？\n",
-                            QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No,
+                            f"错误 - {APP_NAME}",
+                            f"\n无法关闭游戏： {display_name} \n\n请手动关闭后重启应用\n",
+                            QtWidgets.QMessageBox.StandardButton.Ok,
                         )
-                        try:
-                            reply = msg_box.exec()
-                            if reply == QtWidgets.QMessageBox.StandardButton.Yes:
-                                try:
-                                    proc.terminate()
-                                    proc.wait(timeout=3)
-                                except psutil.AccessDenied:
-                                    msg_box = msgbox_frame(
-                                        f"错误 - {APP_NAME}",
-                                        f"\n无法关闭游戏： {display_name} \n\n请手动关闭后重启应用\n",
-                                        QtWidgets.QMessageBox.StandardButton.Ok,
-                                    )
-                                    msg_box.exec()
-                                    sys.exit(1)
-                            else:
-                                msg_box = msgbox_frame(
-                                    f"进程检测 - {APP_NAME}",
-                                    f"\n未关闭的游戏： {display_name} \n\n请手动关闭后重启应用\n",
-                                    QtWidgets.QMessageBox.StandardButton.Ok,
-                                )
-                                msg_box.exec()
-                                sys.exit(1)
-                        except KeyboardInterrupt:
-                            logger.warning(f"进程 {display_name} 终止操作被用户中断")
-                            raise
-                        except Exception as e:
-                            logger.error(f"进程 {display_name} 终止操作时发生错误: {e}")
-                            raise
+                        msg_box.exec()
+                        sys.exit(1)
+                else:
+                    msg_box = msgbox_frame(
+                        f"进程检测 - {APP_NAME}",
+                        f"\n未关闭的游戏： {display_name} \n\n请手动关闭后重启应用\n",
+                        QtWidgets.QMessageBox.StandardButton.Ok,
+                    )
+                    msg_box.exec()
+                    sys.exit(1)
+            except KeyboardInterrupt:
+                logger.warning(f"进程 {display_name} 终止操作被用户中断")
+                raise
+            except Exception as e:
+                logger.error(f"进程 {display_name} 终止操作时发生错误: {e}")
+                raise
+
+    def check_and_terminate_processes(self):
+        try:
+            self.terminate_running_games(self.find_running_games())
         except KeyboardInterrupt:
             logger.warning("进程检查被用户中断")
             raise
-        except Exception as e:
-            logger.error(f"进程检查时发生错误: {e}")
-            raise
 
 class HostsManager:
     def __init__(self):
@@ -605,7 +644,15 @@ class HostsManager:
             logger.error(f"获取hosts记录失败: {e}")
             return []
             
-    def backup(self):
+    def backup(self, raise_errors=False):
+        """备份hosts文件
+
+        Args:
+            raise_errors: 失败时是否抛出IOError而不是弹窗（在工作线程中调用时使用）
+
+        Returns:
+            bool: 是否备份成功
+        """
         if not AdminPrivileges().is_admin():
             logger.warning("需要管理员权限来备份hosts文件。")
             return False
@@ -618,6 +665,8 @@ class HostsManager:
             return True
         except IOError as e:
             logger.error(f"备份hosts文件失败: {e}")
+            if raise_errors:
+                raise
             msg_box = msgbox_frame(f"错误 - {APP_NAME}", f"\n无法备份hosts文件，请检查权限。\n\n【错误信息】：{e}\n", QtWidgets.QMessageBox.StandardButton.Ok)
             msg_box.exec()
             return False
@@ -717,15 +766,8 @@ class HostsManager:
             # 更新状态
             self.auto_restore_disabled = disabled
             
-            # 从配置文件读取当前配置
-            from utils import load_config, save_config
-            config = load_config()
-            
             # 更新配置
-            config['disable_auto_restore_hosts'] = disabled
-            
-            # 保存配置
-            save_config(config)
+            get_config_store().set('disable_auto_restore_hosts', disabled)
             
             logger.info(f"已{'禁用' if disabled else '启用'}自动还原hosts")
             return True
@@ -739,9 +781,7 @@ class HostsManager:
         Returns:
             bool: 是否禁用自动还原hosts
         """
-        from utils import load_config
-        config = load_config()
-        auto_restore_disabled = config.get('disable_auto_restore_hosts', False)
+        auto_restore_disabled = get_config_store().get_bool('disable_auto_restore_hosts')
         self.auto_restore_disabled = auto_restore_disabled
         return auto_restore_disabled
 
@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+import socket
+import hashlib
+import ipaddress
+import subprocess
+import threading
+
+from config.config import IP_CACHE_FILE, IP_CACHE_TTL, IP_CACHE_USE_PUBLIC_PREFIX
+from utils.logger import setup_logger
+
+# 初始化logger
+logger = setup_logger("ip_cache")
+
+# 同一进程内IPv4和IPv6优选线程可能同时读写缓存文件
+_cache_lock = threading.Lock()
+
+# 本机出站网段 -> 公网出口网段，每次启动只查询一次，本机网段变化时重新查询
+_public_prefixes = {}
+
+
+def get_local_prefix(family):
+    """获取本机出站地址所在的网段（UDP connect不会实际发送数据包）"""
+    target = ("1.1.1.1", 80) if family == socket.AF_INET else ("2606:4700:4700::1111", 80)
+    prefix_len = 24 if family == socket.AF_INET else 64
+    try:
+        with socket.socket(family, socket.SOCK_DGRAM) as s:
+            s.connect(target)
+            local_ip = s.getsockname()[0]
+        return str(ipaddress.ip_network(f"{local_ip}/{prefix_len}", strict=False))
+    except OSError:
+        return ""
+
+
+def _get_public_prefix(local_prefix):
+    """通过Cloudflare trace获取公网出口地址所在的网段，结果按本机出站网段缓存到程序退出
+
+    Args:
+        local_prefix: 本机出站网段
+
+    Returns:
+        str: 公网出口网段，获取失败时为空字符串
+    """
+    if local_prefix in _public_prefixes:
+        return _public_prefixes[local_prefix]
+    _public_prefixes[local_prefix] = prefix = _fetch_public_prefix()
+    return prefix
+
+
+def _fetch_public_prefix():
+    import requests  # 按需导入，避免拖慢启动
+
+    try:
+        response = requests.get("https://1.1.1.1/cdn-cgi/trace", timeout=3)
+        for line in response.text.splitlines():
+            if line.startswith("ip="):
+                public_ip = ipaddress.ip_address(line[3:].strip())
+                prefix_len = 24 if public_ip.version == 4 else 48
+                return str(ipaddress.ip_network(f"{public_ip}/{prefix_len}", strict=False))
+    except (requests.RequestException, ValueError):
+        pass
+    return ""
+
+
+def _get_wifi_ssid():
+    """获取当前连接的无线网络SSID（仅Windows，有线网络返回空字符串）"""
+    if sys.platform != 'win32':
+        return ""
+    try:
+        output = subprocess.run(
+            ["netsh", "wlan", "show", "interfaces"],
+            capture_output=True, text=True, errors='replace', timeout=3,
+            creationflags=subprocess.CREATE_NO_WINDOW
+        ).stdout
+        for line in output.splitlines():
+            key, _, value = line.partition(":")
+            if key.strip() == "SSID":
+                return value.strip()
+    except (OSError, subprocess.SubprocessError):
+        pass
+    return ""
+
+
+def get_network_fingerprint(include_public=IP_CACHE_USE_PUBLIC_PREFIX):
+    """生成当前网络环境的指纹
+
+    由本机IPv4/IPv6出站网段和无线网络SSID组成，任一部分获取失败时忽略该部分。
+    这些信息都在本机获取，不会发出网络请求；include_public为True时再加入公网出口网段。
+    网络环境改变（换了Wi-Fi、路由器或出口）时指纹随之改变，缓存的优选结果不再复用。
+
+    Args:
+        include_public: 是否加入公网出口网段（每次启动每个本机网段只查询一次）
+
+    Returns:
+        str: 网络指纹
+    """
+    local_prefix = get_local_prefix(socket.AF_INET)
+    parts = [
+        local_prefix,
+        get_local_prefix(socket.AF_INET6),
+        _get_wifi_ssid(),
+    ]
+    if include_public:
+        parts.append(_get_public_prefix(local_prefix))
+    raw = "|".join(parts)
+    fingerprint = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16] if any(parts) else "unknown"
+    logger.debug(f"网络指纹: {fingerprint}")
+    return fingerprint
+
+
+class IpResultCache:
+    """IP优选结果的持久化缓存，按主机名、地址族和网络指纹区分，带有效期"""
+
+    def __init__(self, cache_file=IP_CACHE_FILE, ttl=IP_CACHE_TTL):
+        """初始化缓存
+
+        Args:
+            cache_file: 缓存文件路径
+            ttl: 缓存有效期（秒）
+        """
+        self.cache_file = cache_file
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(hostname, family, fingerprint):
+        return f"{hostname}|{family}|{fingerprint}"
+
+    def _read(self):
+        if not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+                return data if isinstance(data, dict) else {}
+        except (json.JSONDecodeError, IOError) as e:
+            logger.warning(f"读取IP优选缓存失败: {e}")
+            return {}
+
+    def _write(self, data):
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        temp_file = self.cache_file + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+        os.replace(temp_file, self.cache_file)
+
+    def get(self, hostname, family, fingerprint):
+        """获取未过期的缓存结果
+
+        Args:
+            hostname: 主机名
+            family: 地址族（IPv4/IPv6）
+            fingerprint: 网络指纹
+
+        Returns:
+            dict: 缓存条目，包含ips、median_ms、medians和timestamp；不存在或已过期时返回None
+        """
+        with _cache_lock:
+            entry = self._read().get(self._key(hostname, family, fingerprint))
+        if not entry or not entry.get("ips"):
+            return None
+        if time.time() - entry.get("timestamp", 0) > self.ttl:
+            logger.debug(f"{hostname} 的{family}优选缓存已过期")
+            return None
+        return entry
+
+    def put(self, hostname, family, fingerprint, ips, median_ms, medians=None):
+        """保存优选结果，同时清理已过期的条目
+
+        Args:
+            hostname: 主机名
+            family: 地址族（IPv4/IPv6）
+            fingerprint: 网络指纹
+            ips: 按优先顺序排列的最优IP和备选IP列表
+            median_ms: 最优IP的中位延迟（毫秒）
+            medians: 各IP的中位延迟（毫秒），用于复测时逐个判断是否劣化
+        """
+        now = time.time()
+        with _cache_lock:
+            data = {
+                key: entry for key, entry in self._read().items()
+                if isinstance(entry, dict) and now - entry.get("timestamp", 0) <= self.ttl
+            }
+            data[self._key(hostname, family, fingerprint)] = {
+                "ips": list(ips),
+                "median_ms": median_ms,
+                "medians": dict(medians or {}),
+                "timestamp": now,
+            }
+            try:
+                self._write(data)
+            except IOError as e:
+                logger.warning(f"保存IP优选缓存失败: {e}")
+
+    def invalidate(self, hostname, family, fingerprint):
+        """删除指定的缓存条目"""
+        with _cache_lock:
+            data = self._read()
+            if data.pop(self._key(hostname, family, fingerprint), None) is not None:
+                try:
+                    self._write(data)
+                except IOError as e:
+                    logger.warning(f"保存IP优选缓存失败: {e}")
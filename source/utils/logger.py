@@ -2,11 +2,18 @@ import os
 import logging
 import datetime
 import sys
-import glob
+import gzip
+import shutil
 import time
 import traceback
-from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
-from config.config import LOG_DIR, LOG_FILE, LOG_LEVEL, LOG_MAX_SIZE, LOG_BACKUP_COUNT, LOG_RETENTION_DAYS
+import queue
+import atexit
+import threading
+from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler, QueueHandler, QueueListener
+from config.config import (
+    LOG_DIR, LOG_FILE, LOG_LEVEL, LOG_MAX_SIZE, LOG_BACKUP_COUNT, LOG_RETENTION_DAYS, LOG_MAX_TOTAL_SIZE,
+    LOG_QUEUE_SIZE, LOG_FLUSH_INTERVAL, LOG_FLUSH_BATCH
+)
 
 from .url_censor import censor_url
 
@@ -14,6 +21,9 @@ class URLCensorFormatter(logging.Formatter):
     """自定义的日志格式化器，用于隐藏日志消息中的URL"""
     
     def format(self, record):
+        # 标准输出镜像的原始文本不添加日志格式
+        if getattr(record, "raw", False):
+            return record.getMessage()
         # 先使用原始的format方法格式化日志
         formatted_message = super().format(record)
         # 临时禁用URL隐藏，直接返回原始消息
@@ -21,6 +31,211 @@ class URLCensorFormatter(logging.Formatter):
         # 然后对格式化后的消息进行URL审查（已禁用）
         # return censor_url(formatted_message)
 
+class _BatchingRotatingFileHandler(RotatingFileHandler):
+    """批量刷新的日志轮转处理器
+
+    只在日志写入线程中使用。每条日志写入后不立即刷新，累计LOG_FLUSH_BATCH条、
+    距上次刷新超过LOG_FLUSH_INTERVAL秒或遇到WARNING及以上级别时才刷新到磁盘。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def emit(self, record):
+        self._unflushed += 1
+        if getattr(record, "raw", False):
+            self._emit_raw(record)
+        else:
+            super().emit(record)
+        if record.levelno >= logging.WARNING:
+            self.flush_now()
+
+    def _emit_raw(self, record):
+        """原样写入标准输出镜像的文本，不追加terminator（文本自带换行）"""
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record))
+            self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        # StreamHandler.emit每条日志都会调用flush，这里只在达到批量条件时真正刷新
+        if self._unflushed >= LOG_FLUSH_BATCH or time.monotonic() - self._last_flush >= LOG_FLUSH_INTERVAL:
+            self.flush_now()
+
+    def flush_now(self):
+        """立即把缓冲区写入磁盘"""
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+        super().flush()
+
+    def close(self):
+        self.flush_now()
+        super().close()
+
+
+class _BoundedQueueHandler(QueueHandler):
+    """写入有界队列的日志处理器，调用线程永远不会因日志I/O阻塞
+
+    队列满时丢弃DEBUG/INFO日志；WARNING及以上级别挤出队列中最旧的一条，
+    丢弃的数量由写入线程汇总记录。
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self._dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+
+        if record.levelno >= logging.WARNING:
+            try:
+                self.queue.get_nowait()
+                self._count_dropped()
+                self.queue.put_nowait(record)
+                return
+            except (queue.Empty, queue.Full):
+                pass
+        self._count_dropped()
+
+    def _count_dropped(self):
+        with self._dropped_lock:
+            self._dropped += 1
+
+    def take_dropped(self):
+        """取出并清零丢弃的日志数量"""
+        with self._dropped_lock:
+            dropped, self._dropped = self._dropped, 0
+        return dropped
+
+
+class _LogPipeline(QueueListener):
+    """唯一的日志写入线程
+
+    所有logger共用一个队列处理器、一个文件处理器和一个控制台处理器，
+    文件只被打开一次，日志轮转也只发生在这一个线程中。
+    """
+
+    def __init__(self, log_level):
+        self.queue_handler = _BoundedQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        formatter = URLCensorFormatter('%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s')
+
+        self.file_handler = None
+        try:
+            # 确保主日志文件目录存在
+            log_file_dir = os.path.dirname(LOG_FILE)
+            if log_file_dir and not os.path.exists(log_file_dir):
+                os.makedirs(log_file_dir, exist_ok=True)
+                print(f"已创建主日志目录: {log_file_dir}")
+
+            # 使用RotatingFileHandler实现日志轮转
+            self.file_handler = _BatchingRotatingFileHandler(
+                LOG_FILE,
+                maxBytes=LOG_MAX_SIZE,
+                backupCount=LOG_BACKUP_COUNT,
+                encoding="utf-8"
+            )
+            self.file_handler.setLevel(log_level)
+            self.file_handler.setFormatter(formatter)
+        except (IOError, OSError) as e:
+            print(f"无法创建主日志文件处理器: {e}")
+
+        # 控制台只显示INFO以上级别，标准输出镜像已由Logger直接写到终端
+        self.console_handler = logging.StreamHandler()
+        self.console_handler.setLevel(logging.INFO)
+        self.console_handler.setFormatter(formatter)
+        self.console_handler.addFilter(lambda record: not getattr(record, "raw", False))
+
+        handlers = [self.console_handler]
+        if self.file_handler:
+            handlers.append(self.file_handler)
+        super().__init__(self.queue_handler.queue, *handlers, respect_handler_level=True)
+        self._last_drop_report = 0.0
+
+    def dequeue(self, block):
+        # 队列空闲时按时刷新文件，避免最后几条日志长时间停留在缓冲区
+        while True:
+            try:
+                return self.queue.get(timeout=LOG_FLUSH_INTERVAL)
+            except queue.Empty:
+                if self.file_handler:
+                    self.file_handler.flush_now()
+
+    def handle(self, record):
+        # 丢弃数量最多每LOG_FLUSH_INTERVAL秒汇总一次，避免汇总日志本身刷屏
+        if time.monotonic() - self._last_drop_report >= LOG_FLUSH_INTERVAL:
+            self._report_dropped()
+        super().handle(record)
+
+    def _report_dropped(self):
+        self._last_drop_report = time.monotonic()
+        dropped = self.queue_handler.take_dropped()
+        if dropped:
+            super().handle(logging.makeLogRecord({
+                "name": "logger", "levelno": logging.WARNING, "levelname": "WARNING",
+                "msg": f"日志队列已满，丢弃了 {dropped} 条日志",
+            }))
+
+    def write_raw(self, text):
+        """把标准输出镜像的原始文本交给写入线程写入日志文件"""
+        self.queue_handler.enqueue(logging.makeLogRecord({
+            "name": "stdout", "levelno": logging.INFO, "levelname": "INFO",
+            "msg": text, "raw": True,
+        }))
+
+    def enqueue_sentinel(self):
+        # 队列满时等待写入线程腾出位置，确保停止标记一定能送达
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        super().stop()
+        self._report_dropped()
+        if self.file_handler:
+            self.file_handler.flush_now()
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def _get_pipeline():
+    """获取并在首次调用时启动日志写入线程"""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                log_level = getattr(logging, LOG_LEVEL.upper(), logging.DEBUG)
+                pipeline = _LogPipeline(log_level)
+                pipeline.start()
+                # 退出时写完队列中剩余的日志
+                atexit.register(shutdown_logging)
+                _pipeline = pipeline
+    return _pipeline
+
+
+def shutdown_logging():
+    """停止日志写入线程，写完队列中剩余的日志并关闭日志文件"""
+    global _pipeline
+    with _pipeline_lock:
+        pipeline, _pipeline = _pipeline, None
+    if pipeline is None:
+        return
+    pipeline.stop()
+    for handler in pipeline.handlers:
+        handler.close()
+
+
 class Logger:
     def __init__(self, filename, stream):
         self.terminal = stream
@@ -31,9 +246,12 @@ class Logger:
                 os.makedirs(log_dir, exist_ok=True)
                 print(f"已创建日志目录: {log_dir}")
                 
-            # 以追加模式打开，避免覆盖现有内容
-            self.log = open(filename, "a", encoding="utf-8", errors="replace")
-            self.log.write("\n\n--- New logging session started ---\n\n")
+            # 文件写入交给日志写入线程，与其他logger共用同一个文件句柄
+            self.log = _get_pipeline() if filename == LOG_FILE else None
+            if self.log is None:
+                print(f"Error opening log file {filename}: 日志写入线程不可用")
+            else:
+                self.log.write_raw("\n\n--- New logging session started ---\n\n")
         except (IOError, OSError) as e:
             # 如果打开文件失败，记录错误并使用空的写入操作
             print(f"Error opening log file {filename}: {e}")
@@ -46,8 +264,8 @@ class Logger:
             censored_message = message  # 直接使用原始消息
             self.terminal.write(censored_message)
             if self.log:
-                self.log.write(censored_message)
-                self.flush()
+                # 只入队，由写入线程批量写入并刷新
+                self.log.write_raw(censored_message)
         except Exception as e:
             # 发生错误时记录到控制台
             self.terminal.write(f"Error writing to log: {e}\n")
@@ -55,16 +273,13 @@ class Logger:
     def flush(self):
         try:
             self.terminal.flush()
-            if self.log:
-                self.log.flush()
         except Exception:
             pass
 
     def close(self):
         try:
             if self.log:
-                self.log.write("\n--- Logging session ended ---\n")
-                self.log.close()
+                self.log.write_raw("\n--- Logging session ended ---\n")
                 self.log = None
         except Exception:
             pass
@@ -93,34 +308,107 @@ def log_uncaught_exceptions(exc_type, exc_value, exc_traceback):
 # 设置全局异常处理器
 sys.excepthook = log_uncaught_exceptions
 
-def cleanup_old_logs(retention_days=7):
-    """清理超过指定天数的旧日志文件
+# 最近修改过的日志可能属于另一个正在运行的实例，暂不压缩或删除
+ACTIVE_LOG_GRACE_SECONDS = 600
+
+_retention_started = False
+
+
+def _compress_log(path):
+    """将旧会话的日志压缩为.gz文件，保留原修改时间以便按时间清理
+
+    Returns:
+        str: 压缩后的文件路径
+    """
+    gz_path = f"{path}.gz"
+    temp_path = f"{gz_path}.tmp"
+    mtime = os.path.getmtime(path)
+    with open(path, "rb") as src, gzip.open(temp_path, "wb") as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.replace(temp_path, gz_path)
+    os.utime(gz_path, (mtime, mtime))
+    os.remove(path)
+    return gz_path
+
+
+def cleanup_old_logs(retention_days=LOG_RETENTION_DAYS, max_total_size=LOG_MAX_TOTAL_SIZE):
+    """整理历史日志：压缩旧会话的日志，删除过期日志，并将总大小控制在上限以内
+    
+    当前会话的日志文件及其轮转备份不受影响。整个过程只扫描一次日志目录。
     
     Args:
         retention_days: 日志保留天数，默认7天
+        max_total_size: 历史日志总大小上限（字节）
     """
+    log = setup_logger("log_retention")
     try:
         now = time.time()
         cutoff = now - (retention_days * 86400)  # 86400秒 = 1天
+        session = os.path.splitext(os.path.basename(LOG_FILE))[0] + "."
+        
+        # 当前会话的文件均以log-<时间>.开头：日志、轮转备份和计时记录
+        entries = []
+        with os.scandir(LOG_DIR) as it:
+            for entry in it:
+                if not entry.name.startswith("log-") or not entry.is_file():
+                    continue
+                if entry.name.startswith(session):
+                    continue
+                if entry.name.endswith(".tmp"):
+                    continue
+                stat = entry.stat()
+                entries.append([entry.path, stat.st_mtime, stat.st_size])
         
-        # 获取所有日志文件
-        log_files = glob.glob(os.path.join(LOG_DIR, "log-*.txt"))
+        kept = []
+        compressed = removed = 0
+        for item in entries:
+            path, mtime, size = item
+            try:
+                if mtime < cutoff:
+                    os.remove(path)
+                    removed += 1
+                    continue
+                if not path.endswith(".gz") and now - mtime > ACTIVE_LOG_GRACE_SECONDS:
+                    item[0] = _compress_log(path)
+                    item[2] = os.path.getsize(item[0])
+                    compressed += 1
+            except OSError as e:
+                log.debug(f"整理日志文件失败 {path}: {e}")
+            kept.append(item)
         
-        for log_file in log_files:
-            # 检查文件修改时间
-            if os.path.getmtime(log_file) < cutoff:
-                try:
-                    os.remove(log_file)
-                    print(f"已删除过期日志: {log_file}")
-                except Exception as e:
-                    print(f"删除日志文件失败 {log_file}: {e}")
+        # 超出总大小上限时从最旧的日志开始删除
+        total = sum(item[2] for item in kept)
+        for path, mtime, size in sorted(kept, key=lambda item: item[1]):
+            if total <= max_total_size:
+                break
+            if now - mtime <= ACTIVE_LOG_GRACE_SECONDS:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError as e:
+                log.debug(f"删除日志文件失败 {path}: {e}")
+        
+        log.debug(f"日志整理完成: 压缩 {compressed} 个，删除 {removed} 个，剩余历史日志 {total / 1024 / 1024:.1f}MB")
     except Exception as e:
-        print(f"清理旧日志文件时出错: {e}")
+        log.error(f"清理旧日志文件时出错: {e}")
+
+
+def start_log_retention():
+    """在后台线程中整理历史日志，每次启动只执行一次"""
+    global _retention_started
+    if _retention_started:
+        return
+    _retention_started = True
+    threading.Thread(target=cleanup_old_logs, name="LogRetention", daemon=True).start()
+
 
 def setup_logger(name):
     """设置并返回一个命名的logger
     
-    使用统一的日志文件，添加日志轮转功能，实现自动清理过期日志
+    使用统一的日志文件，添加日志轮转功能；过期日志由start_log_retention在后台统一清理。
+    日志经有界队列交给唯一的写入线程，调用线程不会因文件I/O阻塞
 
     Args:
         name: logger的名称
@@ -139,48 +427,8 @@ def setup_logger(name):
     log_level = getattr(logging, LOG_LEVEL.upper(), logging.DEBUG)
     logger.setLevel(log_level)
     
-    # 确保日志目录存在
-    os.makedirs(LOG_DIR, exist_ok=True)
-    
-    # 清理过期日志文件
-    cleanup_old_logs(LOG_RETENTION_DAYS)
-    
-    # 创建主日志文件的轮转处理器
-    try:
-        # 确保主日志文件目录存在
-        log_file_dir = os.path.dirname(LOG_FILE)
-        if log_file_dir and not os.path.exists(log_file_dir):
-            os.makedirs(log_file_dir, exist_ok=True)
-            print(f"已创建主日志目录: {log_file_dir}")
-        
-        # 使用RotatingFileHandler实现日志轮转
-        main_file_handler = RotatingFileHandler(
-            LOG_FILE,
-            maxBytes=LOG_MAX_SIZE,
-            backupCount=LOG_BACKUP_COUNT,
-            encoding="utf-8"
-        )
-        main_file_handler.setLevel(log_level)
-    except (IOError, OSError) as e:
-        print(f"无法创建主日志文件处理器: {e}")
-        main_file_handler = None
-    
-    # 创建控制台处理器
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)  # 控制台只显示INFO以上级别
-    
-    # 创建更详细的格式器，包括模块名、文件名和行号
-    formatter = URLCensorFormatter('%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s')
-    
-    # 设置处理器的格式化器
-    console_handler.setFormatter(formatter)
-    if main_file_handler:
-        main_file_handler.setFormatter(formatter)
-    
-    # 添加处理器到logger
-    logger.addHandler(console_handler)
-    if main_file_handler:
-        logger.addHandler(main_file_handler)
+    # 所有logger共用同一个队列处理器，文件写入在单独的线程中进行
+    logger.addHandler(_get_pipeline().queue_handler)
     
     # 确保异常可以被正确记录
     logger.propagate = True
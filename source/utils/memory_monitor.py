@@ -0,0 +1,221 @@
+import os
+import threading
+import tracemalloc
+
+from config.config import (
+    MEMORY_STAGES, MEMORY_SAMPLE_INTERVAL, MEMORY_SNAPSHOT_STEP, MEMORY_TRACE_FRAMES, MEMORY_TOP_SITES
+)
+from utils.logger import setup_logger
+from utils.tracing import add_span_listener, remove_span_listener
+
+# 初始化logger
+logger = setup_logger("memory_monitor")
+
+# 程序源码根目录，用于缩短分配位置中的文件路径
+_SOURCE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 快照中排除tracemalloc自身和导入机制的分配
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+)
+
+_MB = 1024 * 1024
+# 增长小于该值的分配位置不列出，避免被零散的小分配淹没
+_MIN_SITE_BYTES = 64 * 1024
+
+
+def _site_label(frame):
+    filename = os.path.abspath(frame.filename)
+    if filename.startswith(_SOURCE_ROOT):
+        filename = os.path.relpath(filename, _SOURCE_ROOT)
+    else:
+        filename = os.path.basename(filename)
+    return f"{filename}:{frame.lineno}"
+
+
+def _take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+
+class _StageMemory:
+    """一个阶段的内存统计"""
+
+    def __init__(self, span, traced, rss, snapshot):
+        self.span = span
+        self.start_traced = traced
+        self.start_rss = rss
+        self.peak_traced = traced
+        self.peak_rss = rss
+        self.start_snapshot = snapshot
+        self.peak_snapshot = None
+        self.snapshot_level = traced  # 最近一次快照时的Python分配量
+
+
+class MemoryMonitor:
+    """阶段内存统计
+
+    监听MEMORY_STAGES中的计时阶段（哈希校验、解压等），阶段进行期间由辅助线程
+    每隔MEMORY_SAMPLE_INTERVAL秒记录tracemalloc的分配峰值（两次采样之间的短暂峰值也能记录到）和进程RSS；
+    Python分配量明显增长时抓取分配快照，阶段结束时与开始时的快照比较得出主要分配位置。
+    结果写入日志，同时作为附加信息写入该阶段的追踪记录。
+
+    tracemalloc和RSS都是进程级的，并行进行的阶段会互相计入对方的峰值。
+    tracemalloc会明显增加内存和CPU开销，因此默认关闭，仅在排查内存问题时开启。
+    """
+
+    def __init__(self, stages=MEMORY_STAGES, interval=MEMORY_SAMPLE_INTERVAL, top=MEMORY_TOP_SITES):
+        """初始化内存统计
+
+        Args:
+            stages: 需要统计的阶段名称
+            interval: 采样间隔（秒）
+            top: 每个阶段输出的分配位置条数
+        """
+        self.stages = tuple(stages)
+        self.interval = interval
+        self.top = top
+        self._lock = threading.Lock()
+        self._active = {}  # 阶段id -> _StageMemory
+        self._process = None
+        self._owns_tracemalloc = False
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_TRACE_FRAMES)
+            self._owns_tracemalloc = True
+        try:
+            import psutil  # 按需导入，避免拖慢启动
+            self._process = psutil.Process()
+        except Exception as e:
+            logger.warning(f"无法获取进程信息，内存统计将不包含RSS: {e}")
+            self._process = None
+        self._stop_event.clear()
+        add_span_listener(self._on_span_event)
+        self._thread = threading.Thread(target=self._run, name="MemoryMonitor", daemon=True)
+        self._thread.start()
+        logger.info(f"内存统计已开启，统计阶段: {', '.join(self.stages)}")
+
+    def stop(self):
+        if not self.is_running:
+            return
+        remove_span_listener(self._on_span_event)
+        self._stop_event.set()
+        self._thread.join(1)
+        self._thread = None
+        with self._lock:
+            self._active.clear()
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+            self._owns_tracemalloc = False
+        logger.info("内存统计已关闭")
+
+    def _rss(self):
+        if self._process is None:
+            return 0
+        try:
+            return self._process.memory_info().rss
+        except Exception:
+            return 0
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            if self._active:
+                self._sample()
+
+    def _sample(self):
+        """记录自上次采样以来的分配峰值和当前RSS，计入所有进行中的阶段"""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                return
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            rss = self._rss()
+            snapshot = None
+            for stage in self._active.values():
+                stage.peak_traced = max(stage.peak_traced, peak)
+                stage.peak_rss = max(stage.peak_rss, rss)
+                if current >= stage.snapshot_level + MEMORY_SNAPSHOT_STEP:
+                    if snapshot is None:
+                        snapshot = _take_snapshot()
+                    stage.peak_snapshot = snapshot
+                    stage.snapshot_level = current
+
+    def _on_span_event(self, event, span):
+        if span.name not in self.stages:
+            return
+        if event == "start":
+            self._sample()
+            with self._lock:
+                if not tracemalloc.is_tracing():
+                    return
+                stage = _StageMemory(span, tracemalloc.get_traced_memory()[0], self._rss(), _take_snapshot())
+                self._active[span.id] = stage
+            return
+
+        self._sample()
+        with self._lock:
+            stage = self._active.pop(span.id, None)
+        if stage is not None:
+            self._report(stage)
+
+    def _top_sites(self, stage):
+        """比较开始时与峰值附近的快照，列出增长最多的分配位置"""
+        snapshot = stage.peak_snapshot or _take_snapshot()
+        sites = []
+        for stat in snapshot.compare_to(stage.start_snapshot, "lineno")[:self.top]:
+            if stat.size_diff < _MIN_SITE_BYTES:
+                break
+            sites.append({
+                "site": _site_label(stat.traceback[0]),
+                "mb": round(stat.size_diff / _MB, 2),
+                "count": stat.count_diff,
+            })
+        return sites
+
+    def _report(self, stage):
+        """将阶段的内存统计写入日志和追踪记录"""
+        span = stage.span
+        sites = self._top_sites(stage)
+        metrics = {
+            "mem_peak_mb": round((stage.peak_traced - stage.start_traced) / _MB, 2),
+            "mem_traced_peak_mb": round(stage.peak_traced / _MB, 2),
+        }
+        if self._process is not None:
+            metrics["mem_rss_start_mb"] = round(stage.start_rss / _MB, 2)
+            metrics["mem_rss_peak_mb"] = round(stage.peak_rss / _MB, 2)
+        metrics["mem_top_sites"] = sites
+        span.set(**metrics)
+
+        lines = [
+            f"内存统计 [{span.name}] {span.game or '-'}: "
+            f"Python分配峰值 +{metrics['mem_peak_mb']:.1f} MB（总计 {metrics['mem_traced_peak_mb']:.1f} MB）"
+        ]
+        if self._process is not None:
+            lines[0] += f"，RSS峰值 {metrics['mem_rss_peak_mb']:.1f} MB（开始时 {metrics['mem_rss_start_mb']:.1f} MB）"
+        for rank, site in enumerate(sites, 1):
+            lines.append(f"  {rank}. {site['site']} +{site['mb']:.1f} MB（{site['count']:+d} 块）")
+        logger.info("\n".join(lines))
+
+
+_monitor = None
+
+
+def get_memory_monitor():
+    """获取进程内唯一的内存统计实例
+
+    Returns:
+        MemoryMonitor: 内存统计实例
+    """
+    global _monitor
+    if _monitor is None:
+        _monitor = MemoryMonitor()
+    return _monitor
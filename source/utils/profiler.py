@@ -0,0 +1,230 @@
+import os
+import sys
+import time
+import marshal
+import threading
+from collections import Counter
+
+from config.config import (
+    LOG_FILE, PROFILE_SAMPLE_INTERVAL, PROFILE_MAX_DURATION, PROFILE_TARGETS
+)
+from utils.logger import setup_logger
+from utils.tracing import add_span_listener, remove_span_listener
+
+# 初始化logger
+logger = setup_logger("profiler")
+
+
+def _frame_key(code):
+    """pstats使用的函数标识 (文件名, 定义行号, 函数名)"""
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+def _frame_label(key):
+    filename, lineno, name = key
+    return f"{os.path.basename(filename)}:{lineno}:{name}"
+
+
+class SamplingProfiler:
+    """采样式性能分析器
+
+    在辅助线程中每隔interval秒通过sys._current_frames()记录所有线程（包括QThread工作线程）的Python调用栈，
+    不需要在各线程中单独启用cProfile，对被分析流程的影响也较小。
+    结果可写出为pstats格式的.prof文件（可用snakeviz等工具查看）和火焰图使用的折叠调用栈文件。
+    """
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL, max_duration=PROFILE_MAX_DURATION):
+        """初始化采样分析器
+
+        Args:
+            interval: 采样间隔（秒）
+            max_duration: 最长采样时间（秒）
+        """
+        self.interval = interval
+        self.max_duration = max_duration
+        self.stacks = Counter()  # (线程名, 外层函数..., 内层函数) -> 采样次数
+        self.sample_count = 0
+        self.started_at = 0.0
+        self.elapsed = 0.0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running:
+            return
+        self.stacks.clear()
+        self.sample_count = 0
+        self.started_at = time.perf_counter()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="SamplingProfiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止采样，可以在任意线程中调用"""
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(2)
+        self._thread = None
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        deadline = self.started_at + self.max_duration
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                keys = []
+                while frame is not None:
+                    keys.append(_frame_key(frame.f_code))
+                    frame = frame.f_back
+                keys.reverse()
+                self.stacks[(names.get(ident, f"Thread-{ident}"),) + tuple(keys)] += 1
+            self.sample_count += 1
+            self.elapsed = time.perf_counter() - self.started_at
+            if time.perf_counter() >= deadline:
+                logger.warning(f"性能分析已达到最长时间 {self.max_duration} 秒，自动停止采样")
+                break
+
+    def _seconds_per_sample(self):
+        # 采样线程可能被GIL等因素延迟，按实际耗时折算每次采样代表的时间
+        if self.sample_count and self.elapsed:
+            return self.elapsed / self.sample_count
+        return self.interval
+
+    def write_collapsed(self, path):
+        """写出折叠调用栈文件（flamegraph.pl、speedscope等工具可直接读取）
+
+        每行格式为"线程;外层函数;...;内层函数 采样次数"。
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                thread_name, keys = stack[0], stack[1:]
+                frames = [thread_name.replace(";", ":").replace(" ", "_")]
+                frames.extend(_frame_label(key) for key in keys)
+                f.write(f"{';'.join(frames)} {count}\n")
+
+    def write_pstats(self, path):
+        """写出pstats格式的.prof文件
+
+        调用次数记为函数出现在调用栈中的采样次数，耗时按采样次数折算，可用pstats或snakeviz查看。
+        """
+        seconds = self._seconds_per_sample()
+        self_samples = Counter()
+        total_samples = Counter()
+        callers = {}
+        for stack, count in self.stacks.items():
+            keys = stack[1:]
+            if not keys:
+                continue
+            self_samples[keys[-1]] += count
+            # 递归调用在同一调用栈中只计一次累计时间
+            for key in set(keys):
+                total_samples[key] += count
+            seen_edges = set()
+            for caller, callee in zip(keys, keys[1:]):
+                if (caller, callee) in seen_edges:
+                    continue
+                seen_edges.add((caller, callee))
+                edge = callers.setdefault(callee, {}).get(caller, (0, 0, 0.0, 0.0))
+                callers[callee][caller] = (
+                    edge[0] + count, edge[1] + count, edge[2], edge[3] + count * seconds
+                )
+
+        stats = {}
+        for key, total in total_samples.items():
+            stats[key] = (
+                total, total, self_samples[key] * seconds, total * seconds, callers.get(key, {})
+            )
+        with open(path, "wb") as f:
+            marshal.dump(stats, f)
+
+
+class ProfileSession:
+    """分析下一次安装、校验或目录识别
+
+    启动后监听计时阶段，PROFILE_TARGETS中的阶段开始时开始采样，该阶段结束时停止并将结果写入日志目录，
+    文件名以本次会话的日志文件名开头，与日志一起按保留策略清理。
+    """
+
+    def __init__(self, targets=PROFILE_TARGETS, on_finished=None):
+        """初始化分析会话
+
+        Args:
+            targets: 触发分析的阶段名称
+            on_finished: 写出结果后调用的函数，参数为(阶段名称, 输出文件路径列表)，在结束阶段的线程中调用
+        """
+        self.targets = tuple(targets)
+        self.on_finished = on_finished
+        self.profiler = SamplingProfiler()
+        self.span = None
+        self._lock = threading.Lock()
+        self._armed = False
+
+    @property
+    def is_armed(self):
+        return self._armed
+
+    def arm(self):
+        """等待下一个目标阶段开始"""
+        with self._lock:
+            if self._armed:
+                return
+            self._armed = True
+            self.span = None
+        add_span_listener(self._on_span_event)
+        logger.info(f"性能分析已就绪，将分析下一次: {', '.join(self.targets)}")
+
+    def disarm(self):
+        """取消分析；正在采样时丢弃结果"""
+        with self._lock:
+            was_running = self.span is not None
+            self._armed = False
+            self.span = None
+        remove_span_listener(self._on_span_event)
+        if was_running:
+            self.profiler.stop()
+        logger.info("性能分析已取消")
+
+    def _on_span_event(self, event, span):
+        with self._lock:
+            if not self._armed:
+                return
+            if event == "start" and self.span is None and span.name in self.targets:
+                self.span = span
+                self.profiler.start()
+                logger.info(f"开始性能分析: {span.name}")
+                return
+            if event != "end" or span is not self.span:
+                return
+            self._armed = False
+        remove_span_listener(self._on_span_event)
+        self.profiler.stop()
+        paths = self._write_results(span)
+        if self.on_finished is not None and paths:
+            self.on_finished(span.name, paths)
+
+    def _write_results(self, span):
+        """将结果写入日志目录
+
+        Returns:
+            list: 写出的文件路径
+        """
+        stem = os.path.splitext(LOG_FILE)[0]
+        base = f"{stem}.profile-{span.name}-{time.strftime('%H%M%S')}"
+        paths = [f"{base}.prof", f"{base}.collapsed"]
+        try:
+            self.profiler.write_pstats(paths[0])
+            self.profiler.write_collapsed(paths[1])
+        except (IOError, OSError) as e:
+            logger.error(f"写出性能分析结果失败: {e}")
+            return []
+        logger.info(
+            f"性能分析完成: {span.name}，耗时 {self.profiler.elapsed:.1f} 秒，"
+            f"采样 {self.profiler.sample_count} 次，结果: {', '.join(paths)}"
+        )
+        return paths
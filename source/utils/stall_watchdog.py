@@ -0,0 +1,213 @@
+import os
+import sys
+import time
+import threading
+import traceback
+
+from PySide6.QtCore import QObject, Qt, QTimer
+
+from config.config import (
+    STALL_HEARTBEAT_INTERVAL, STALL_THRESHOLD, STALL_SAMPLE_INTERVAL, STALL_REPORT_INTERVAL
+)
+from utils.logger import setup_logger
+
+# 初始化logger
+logger = setup_logger("stall_watchdog")
+
+# 事件循环延迟分布的分桶上限（毫秒）
+LATENCY_BUCKETS = (5, 16, 33, 50, 100, 250, 500, 1000, 2000, 5000)
+# 卡顿排行输出的条数
+TOP_OFFENDERS = 10
+
+# 程序源码根目录，用于在调用栈中定位本程序的代码
+_SOURCE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _bucket_label(index):
+    if index == 0:
+        return f"<{LATENCY_BUCKETS[0]}ms"
+    if index == len(LATENCY_BUCKETS):
+        return f">={LATENCY_BUCKETS[-1]}ms"
+    return f"{LATENCY_BUCKETS[index - 1]}-{LATENCY_BUCKETS[index]}ms"
+
+
+def _offender_key(stack):
+    """取调用栈中最内层的本程序代码位置作为卡顿位置
+
+    Args:
+        stack: traceback.extract_stack返回的调用栈
+
+    Returns:
+        str: "文件:行号 函数名"
+    """
+    for frame in reversed(stack):
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(_SOURCE_ROOT) and "site-packages" not in filename:
+            return f"{os.path.relpath(filename, _SOURCE_ROOT)}:{frame.lineno} {frame.name}"
+    # 打包环境中可能无法按路径区分，使用最内层的调用位置
+    if stack:
+        frame = stack[-1]
+        return f"{os.path.basename(frame.filename)}:{frame.lineno} {frame.name}"
+    return "未知位置"
+
+
+class StallWatchdog(QObject):
+    """界面卡顿检测器
+
+    UI线程中的心跳定时器每隔STALL_HEARTBEAT_INTERVAL毫秒记录一次时间，按实际间隔统计事件循环延迟分布；
+    辅助线程发现心跳超过STALL_THRESHOLD毫秒没有更新时，抓取主线程当前的Python调用栈，
+    卡顿持续期间每隔STALL_SAMPLE_INTERVAL毫秒再采样一次。心跳恢复后按调用栈中的位置累计卡顿次数和时长，
+    定期输出延迟分布和卡顿排行，便于找出最需要移出UI线程的代码。
+    """
+
+    def __init__(self, parent=None, interval=STALL_HEARTBEAT_INTERVAL, threshold=STALL_THRESHOLD,
+                 sample_interval=STALL_SAMPLE_INTERVAL, report_interval=STALL_REPORT_INTERVAL):
+        """初始化卡顿检测器
+
+        Args:
+            parent: 父对象
+            interval: 心跳间隔（毫秒）
+            threshold: 视为卡顿的时长（毫秒）
+            sample_interval: 卡顿持续期间的采样间隔（毫秒）
+            report_interval: 输出统计的间隔（秒）
+        """
+        super().__init__(parent)
+        self.interval = interval
+        self.threshold = threshold
+        self.sample_interval = sample_interval
+        self.report_interval = report_interval
+
+        self._timer = QTimer(self)
+        self._timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self._timer.timeout.connect(self._on_heartbeat)
+
+        self._lock = threading.Lock()
+        self._last_beat = None
+        self._samples = []  # 当前卡顿期间采集的(卡顿时长, 调用栈)
+        self._main_ident = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self._histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        self._offenders = {}  # 卡顿位置 -> {"count", "total_ms", "max_ms", "stack"}
+        self._last_report = 0.0
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """开始检测，需要在UI线程中调用"""
+        if self.is_running:
+            return
+        self._main_ident = threading.get_ident()
+        with self._lock:
+            self._last_beat = time.perf_counter()
+            self._samples = []
+        self._last_report = time.perf_counter()
+        self._stop_event.clear()
+        self._timer.start(self.interval)
+        self._thread = threading.Thread(target=self._watch, name="StallWatchdog", daemon=True)
+        self._thread.start()
+        logger.debug(f"界面卡顿检测已启动，阈值 {self.threshold} ms")
+
+    def stop(self):
+        """停止检测并输出统计结果"""
+        if not self.is_running:
+            return
+        self._timer.stop()
+        self._stop_event.set()
+        self._thread.join(1)
+        self._thread = None
+        self.log_report()
+        logger.debug("界面卡顿检测已停止")
+
+    def _on_heartbeat(self):
+        now = time.perf_counter()
+        with self._lock:
+            last = self._last_beat
+            self._last_beat = now
+            samples = self._samples
+            self._samples = []
+        if last is None:
+            return
+
+        elapsed_ms = (now - last) * 1000
+        latency_ms = max(0.0, elapsed_ms - self.interval)
+        index = 0
+        while index < len(LATENCY_BUCKETS) and latency_ms >= LATENCY_BUCKETS[index]:
+            index += 1
+        self._histogram[index] += 1
+
+        if samples:
+            self._record_stall(elapsed_ms, samples)
+        if now - self._last_report >= self.report_interval:
+            self.log_report()
+
+    def _record_stall(self, duration_ms, samples):
+        """心跳恢复后记录一次卡顿，按第一次采样的位置归类"""
+        key = _offender_key(samples[0][1])
+        entry = self._offenders.setdefault(key, {
+            "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+            "stack": "".join(traceback.format_list(samples[0][1])),
+        })
+        entry["count"] += 1
+        entry["total_ms"] += duration_ms
+        entry["max_ms"] = max(entry["max_ms"], duration_ms)
+
+        if len(samples) > 1:
+            # 长时间卡顿时后续采样可能停在不同位置，一并列出
+            locations = ", ".join(f"{stalled:.0f}ms@{_offender_key(stack)}" for stalled, stack in samples[1:])
+            logger.warning(f"界面卡顿 {duration_ms:.0f} ms，位置: {key}，后续采样: {locations}")
+        else:
+            logger.warning(f"界面卡顿 {duration_ms:.0f} ms，位置: {key}")
+
+    def _watch(self):
+        """辅助线程：心跳超时时抓取主线程调用栈"""
+        while not self._stop_event.wait(self.interval / 1000):
+            with self._lock:
+                last = self._last_beat
+                sample_count = len(self._samples)
+            stalled_ms = (time.perf_counter() - last) * 1000
+            if stalled_ms < self.threshold + sample_count * self.sample_interval:
+                continue
+
+            frame = sys._current_frames().get(self._main_ident)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            del frame
+
+            with self._lock:
+                # 心跳可能在抓取调用栈期间恢复，此时丢弃本次采样
+                if self._last_beat is not last:
+                    continue
+                self._samples.append((stalled_ms, stack))
+            if sample_count == 0:
+                logger.warning(
+                    f"界面已 {stalled_ms:.0f} ms 未响应，主线程调用栈:\n"
+                    f"{''.join(traceback.format_list(stack))}"
+                )
+
+    def log_report(self):
+        """输出事件循环延迟分布和卡顿排行"""
+        self._last_report = time.perf_counter()
+        total = sum(self._histogram)
+        if total == 0:
+            return
+        histogram = ", ".join(
+            f"{_bucket_label(index)}: {count}" for index, count in enumerate(self._histogram) if count
+        )
+        lines = [f"事件循环延迟分布（共 {total} 次心跳）: {histogram}"]
+
+        offenders = sorted(self._offenders.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+        if offenders:
+            lines.append("卡顿排行（按总时长）:")
+            for rank, (key, entry) in enumerate(offenders[:TOP_OFFENDERS], 1):
+                lines.append(
+                    f"  {rank}. {key} - {entry['count']} 次, 总计 {entry['total_ms']:.0f} ms, "
+                    f"最长 {entry['max_ms']:.0f} ms"
+                )
+            worst_key, worst = offenders[0]
+            lines.append(f"最严重位置 {worst_key} 的调用栈:\n{worst['stack']}")
+        logger.info("\n".join(lines))
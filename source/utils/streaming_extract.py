@@ -0,0 +1,159 @@
+import os
+import threading
+
+from py7zr.io import Py7zIO, WriterFactory
+
+from utils.extraction_backends import partial_path_for
+from utils.logger import setup_logger
+
+# 初始化logger
+logger = setup_logger("streaming_extract")
+
+
+def _normalize_name(name):
+    return name.replace("\\", "/")
+
+
+class _PartialFileIO(Py7zIO):
+    """将py7zr解压出的数据直接写入目标目录中的.partial文件"""
+
+    def __init__(self, path, factory):
+        self.path = path
+        self._factory = factory
+        self._file = open(path, "wb")
+        self._size = 0
+
+    def write(self, s):
+        # 取消（如解压超时）后立即停止写入，由py7zr将异常抛回解压调用处
+        self._factory.check_cancelled()
+        written = self._file.write(s)
+        self._size += len(s)
+        return written
+
+    def read(self, size=None):
+        return b""
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def flush(self):
+        self._file.flush()
+
+    def size(self):
+        return self._size
+
+    def close(self, sync=False):
+        if self._file.closed:
+            return
+        if sync:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._file.close()
+
+
+class _DiscardIO(Py7zIO):
+    """丢弃不需要的文件内容（同一数据块中的其他文件也会被解压出来）"""
+
+    def write(self, s):
+        return len(s)
+
+    def read(self, size=None):
+        return b""
+
+    def seek(self, offset, whence=0):
+        return 0
+
+    def flush(self):
+        pass
+
+    def size(self):
+        return 0
+
+
+class PartialFileFactory(WriterFactory):
+    """按压缩包内路径将文件写入指定的目标路径
+
+    数据先写入与目标文件同目录的.partial文件（每次解压使用独立的文件名），全部解压完成后
+    再重命名覆盖目标文件，因此不需要系统盘上的临时空间，失败时也不会留下写了一半的目标文件。
+    调用cancel后写入会抛出异常，commit也不再重命名。
+    """
+
+    def __init__(self, destinations):
+        """初始化写入工厂
+
+        Args:
+            destinations: 压缩包内路径 -> 目标文件路径
+        """
+        self.destinations = {_normalize_name(name): path for name, path in destinations.items()}
+        self.writers = {}  # 目标文件路径 -> _PartialFileIO
+        self._cancelled = False
+        # 重命名与取消互斥，cancel返回后不会再替换目标文件
+        self._commit_lock = threading.Lock()
+
+    def cancel(self):
+        """取消解压：之后的写入会抛出异常，commit不再重命名"""
+        with self._commit_lock:
+            self._cancelled = True
+
+    def check_cancelled(self):
+        if self._cancelled:
+            raise RuntimeError("解压已取消")
+
+    def create(self, filename):
+        target = self.destinations.get(_normalize_name(filename))
+        if target is None:
+            return _DiscardIO()
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        writer = _PartialFileIO(partial_path_for(target), self)
+        self.writers[target] = writer
+        return writer
+
+    def commit(self):
+        """将所有.partial文件重命名为目标文件
+
+        Returns:
+            dict: 目标文件路径 -> 文件大小
+        """
+        missing = [path for path in self.destinations.values() if path not in self.writers]
+        if missing:
+            raise FileNotFoundError(f"压缩包中未解压出文件: {', '.join(missing)}")
+        sizes = {}
+        for writer in self.writers.values():
+            writer.close(sync=True)
+        with self._commit_lock:
+            self.check_cancelled()
+            for target, writer in self.writers.items():
+                os.replace(writer.path, target)
+                sizes[target] = writer.size()
+        return sizes
+
+    def discard(self):
+        """关闭并删除所有.partial文件"""
+        for writer in self.writers.values():
+            try:
+                writer.close()
+                if os.path.exists(writer.path):
+                    os.remove(writer.path)
+            except OSError as e:
+                logger.warning(f"删除未完成的解压文件失败: {writer.path} ({e})")
+
+
+def extract_to_targets(archive, destinations, factory=None):
+    """将压缩包中的指定文件直接解压到目标路径
+
+    Args:
+        archive: 已打开的py7zr.SevenZipFile
+        destinations: 压缩包内路径 -> 目标文件路径
+        factory: 写入工厂，传入时可由其他线程调用factory.cancel()取消
+
+    Returns:
+        dict: 目标文件路径 -> 文件大小
+    """
+    if factory is None:
+        factory = PartialFileFactory(destinations)
+    try:
+        archive.extract(targets=list(destinations), factory=factory)
+        return factory.commit()
+    except BaseException:
+        factory.discard()
+        raise
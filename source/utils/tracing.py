@@ -0,0 +1,269 @@
+import os
+import sys
+import json
+import time
+import itertools
+import threading
+
+from config.config import TRACE_ENABLED, TRACE_FILE
+
+# 结束状态
+OUTCOME_OK = "ok"
+OUTCOME_ERROR = "error"
+OUTCOME_CANCELLED = "cancelled"
+
+_ids = itertools.count(1)
+_local = threading.local()
+_write_lock = threading.Lock()
+_trace_file = None
+_listeners = []
+
+
+def _write_event(event):
+    """将一条事件追加到JSONL追踪文件
+
+    每个阶段只在结束时写入一行，写入量很小，直接在结束阶段的线程中完成。
+    """
+    global _trace_file
+    line = json.dumps(event, ensure_ascii=False) + "\n"
+    with _write_lock:
+        try:
+            if _trace_file is None:
+                os.makedirs(os.path.dirname(TRACE_FILE), exist_ok=True)
+                _trace_file = open(TRACE_FILE, "a", encoding="utf-8")
+            _trace_file.write(line)
+            _trace_file.flush()
+        except (IOError, OSError):
+            # 追踪仅用于诊断，写入失败不影响安装流程
+            pass
+
+
+def add_span_listener(listener):
+    """注册阶段开始和结束的监听函数
+
+    Args:
+        listener: 回调函数，参数为(事件, 阶段)，事件为"start"或"end"，在创建或结束阶段的线程中调用
+    """
+    _listeners.append(listener)
+
+
+def remove_span_listener(listener):
+    try:
+        _listeners.remove(listener)
+    except ValueError:
+        pass
+
+
+def _notify(event, span):
+    for listener in list(_listeners):
+        try:
+            listener(event, span)
+        except Exception:
+            # 监听函数只用于诊断，出错不影响被追踪的流程
+            pass
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+class Span:
+    """一个计时阶段
+
+    记录开始时间、耗时、处理的字节数和结束状态，结束时写入追踪文件。
+    可以作为上下文管理器使用（同一线程内自动嵌套），
+    也可以通过start_span创建、在任意线程中调用end()结束（用于跨信号的异步阶段）。
+    """
+
+    def __init__(self, name, game=None, parent=None, **attrs):
+        """初始化计时阶段
+
+        Args:
+            name: 阶段名称，如"download"、"extract"
+            game: 所属游戏版本
+            parent: 父阶段，为None时使用当前线程中正在进行的阶段
+            **attrs: 附加信息
+        """
+        if parent is None:
+            stack = _stack()
+            parent = stack[-1] if stack else None
+        self.name = name
+        self.id = next(_ids)
+        self.parent_id = parent.id if parent is not None else None
+        self.game = game if game is not None else (parent.game if parent is not None else None)
+        self.attrs = attrs
+        self.bytes = 0
+        self.outcome = OUTCOME_OK
+        self.error = ""
+        self.thread = threading.current_thread()
+        self._start_epoch = time.time()
+        self._start = time.perf_counter()
+        self._ended = False
+        _notify("start", self)
+
+    def set(self, **attrs):
+        """添加或更新附加信息"""
+        self.attrs.update(attrs)
+        return self
+
+    def add_bytes(self, count):
+        """累加本阶段处理的字节数"""
+        self.bytes += count
+        return self
+
+    def fail(self, error=""):
+        """标记本阶段失败"""
+        self.outcome = OUTCOME_ERROR
+        self.error = str(error)
+        return self
+
+    def cancel(self):
+        """标记本阶段被取消"""
+        self.outcome = OUTCOME_CANCELLED
+        return self
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+    def end(self, outcome=None):
+        """结束本阶段并写入追踪文件，重复调用只记录第一次
+
+        Args:
+            outcome: 结束状态，为None时保留之前设置的状态
+        """
+        if self._ended:
+            return
+        self._ended = True
+        if outcome is not None:
+            self.outcome = outcome
+        _notify("end", self)
+        if not TRACE_ENABLED:
+            return
+
+        event = {
+            "name": self.name,
+            "id": self.id,
+            "parent": self.parent_id,
+            "game": self.game,
+            "ts": int(self._start_epoch * 1_000_000),
+            "dur": int(self.elapsed * 1_000_000),
+            "pid": os.getpid(),
+            "tid": self.thread.ident,
+            "thread": self.thread.name,
+            "bytes": self.bytes,
+            "outcome": self.outcome,
+        }
+        if self.error:
+            event["error"] = self.error
+        if self.attrs:
+            event["attrs"] = self.attrs
+        _write_event(event)
+
+    def __enter__(self):
+        _stack().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        if exc_type is not None:
+            self.fail(exc_value if exc_value is not None else exc_type.__name__)
+        self.end()
+        return False
+
+
+def trace_span(name, game=None, **attrs):
+    """创建一个在当前线程中自动嵌套的计时阶段，配合with语句使用
+
+    Args:
+        name: 阶段名称
+        game: 所属游戏版本
+        **attrs: 附加信息
+
+    Returns:
+        Span: 计时阶段
+    """
+    return Span(name, game=game, **attrs)
+
+
+def start_span(name, game=None, parent=None, **attrs):
+    """开始一个需要手动结束的计时阶段，不会成为当前线程中后续阶段的父阶段
+
+    Args:
+        name: 阶段名称
+        game: 所属游戏版本
+        parent: 父阶段
+        **attrs: 附加信息
+
+    Returns:
+        Span: 计时阶段，结束时调用end()
+    """
+    return Span(name, game=game, parent=parent, **attrs)
+
+
+def current_span():
+    """获取当前线程中正在进行的阶段"""
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def export_chrome_trace(trace_path=TRACE_FILE, output_path=None):
+    """将JSONL追踪文件转换为Chrome trace / Perfetto可以打开的JSON格式
+
+    带有游戏版本的阶段显示在以游戏命名的泳道中，其余阶段按线程显示。
+
+    Args:
+        trace_path: JSONL追踪文件路径
+        output_path: 输出文件路径，默认为追踪文件同名的.json文件
+
+    Returns:
+        str: 输出文件路径
+    """
+    if output_path is None:
+        output_path = os.path.splitext(trace_path)[0] + ".json"
+
+    events = []
+    lanes = {}
+    with open(trace_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                span = json.loads(line)
+            except ValueError:
+                continue
+            lane = span.get("game") or span.get("thread") or str(span.get("tid"))
+            tid = lanes.setdefault((span["pid"], lane), len(lanes) + 1)
+            args = dict(span.get("attrs") or {})
+            args.update(outcome=span["outcome"], bytes=span["bytes"], thread=span.get("thread"))
+            if span.get("error"):
+                args["error"] = span["error"]
+            if span["bytes"] and span["dur"]:
+                args["MB/s"] = round(span["bytes"] / span["dur"], 2)  # 字节/微秒即MB/s
+            events.append({
+                "name": span["name"],
+                "cat": span.get("game") or "app",
+                "ph": "X",
+                "ts": span["ts"],
+                "dur": span["dur"],
+                "pid": span["pid"],
+                "tid": tid,
+                "args": args,
+            })
+
+    for (pid, lane), tid in lanes.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": lane}})
+
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+    os.replace(temp_path, output_path)
+    return output_path
+
+
+if __name__ == "__main__":
+    # 用法: python -m utils.tracing [追踪文件.jsonl] [输出文件.json]
+    print(export_chrome_trace(*sys.argv[1:3]))
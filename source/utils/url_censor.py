@@ -1,5 +1,8 @@
+import copy
 import re
 
+URL_PROTECTION_TEXT = "***URL protection***"
+
 def censor_url(text):
     """Censors URLs in a given text string, replacing them with a protection message.
     
@@ -30,4 +33,31 @@ def censor_url(text):
     censored = origin_pattern.sub('Origin: ***URL protection***', censored)
     
     return censored
-    ''' 
\ No newline at end of file
+    ''' 
+
+
+def censor_config_urls(config_data):
+    """创建用于日志记录的云端配置副本，隐藏各游戏条目及其增量补丁中的URL
+
+    Args:
+        config_data: 原始配置数据
+
+    Returns:
+        dict: 安全的配置数据副本，原始数据不会被修改；非字典或空配置原样返回
+    """
+    if not config_data or not isinstance(config_data, dict):
+        return config_data
+
+    # 创建深拷贝，避免修改原始数据
+    safe_config = copy.deepcopy(config_data)
+    for entry in safe_config.values():
+        if not isinstance(entry, dict):
+            continue
+        if "url" in entry:
+            entry["url"] = URL_PROTECTION_TEXT
+        # 增量补丁的URL同样需要隐藏
+        if isinstance(entry.get("delta"), list):
+            for delta in entry["delta"]:
+                if isinstance(delta, dict) and "url" in delta:
+                    delta["url"] = URL_PROTECTION_TEXT
+    return safe_config
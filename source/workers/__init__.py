@@ -1,8 +1,17 @@
-from .hash_thread import HashThread
-from .extraction_thread import ExtractionThread
-from .config_fetch_thread import ConfigFetchThread
-from .ip_optimizer import IpOptimizerThread
-from .download import DownloadThread, ProgressWindow
+# 按需导入：访问某个名称时才加载对应模块，启动时不会连带导入全部子模块及其第三方依赖
+import importlib
+
+_EXPORTS = {
+    'HashThread': '.hash_thread',
+    'ExtractionThread': '.extraction_thread',
+    'ConfigFetchThread': '.config_fetch_thread',
+    'IpOptimizerThread': '.ip_optimizer',
+    'DownloadThread': '.download',
+    'ProgressWindow': '.download',
+    'DeltaPatchThread': '.delta_patch_thread',
+    'SegmentDownloader': '.segment_downloader',
+    'ConnectivityProbeThread': '.connectivity_thread',
+}
 
 __all__ = [
     'IpOptimizerThread',
@@ -10,5 +19,18 @@ __all__ = [
     'ExtractionThread',
     'ConfigFetchThread',
     'DownloadThread',
-    'ProgressWindow'
-] 
\ No newline at end of file
+    'ProgressWindow',
+    'DeltaPatchThread',
+    'SegmentDownloader',
+    'ConnectivityProbeThread',
+]
+
+
+def __getattr__(name):
+    # 首次访问时才导入对应模块，之后缓存在包的命名空间中
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
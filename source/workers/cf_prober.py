@@ -0,0 +1,579 @@
+import asyncio
+import ipaddress
+import math
+import os
+import random
+import ssl
+import threading
+import time
+from urllib.parse import urlsplit
+
+from config.config import (
+    UA, CF_PROBE_CONCURRENCY, CF_PROBE_TIMEOUT, CF_PROBE_ATTEMPTS, CF_PROBE_SAMPLES_PER_RANGE,
+    CF_PROBE_BUDGET, CF_PROBE_FINALISTS, CF_PROBE_FINAL_ATTEMPTS,
+    CF_THROUGHPUT_CANDIDATES, CF_THROUGHPUT_BYTES, CF_THROUGHPUT_TIME_BUDGET, CF_GOOD_ENOUGH_RTT_MS
+)
+from utils.logger import setup_logger
+
+# 初始化logger
+logger = setup_logger("cf_prober")
+
+
+def load_cidrs(path):
+    """读取CIDR列表文件
+
+    Args:
+        path: ip.txt或ipv6.txt的路径
+
+    Returns:
+        list: ipaddress网络对象列表，无法解析的行会被跳过
+    """
+    networks = []
+    if not os.path.exists(path):
+        logger.error(f"CIDR列表文件不存在: {path}")
+        return networks
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                networks.append(ipaddress.ip_network(line, strict=False))
+            except ValueError:
+                logger.warning(f"跳过无法解析的CIDR: {line}")
+    return networks
+
+
+def sample_network(network, count, rng=None):
+    """从CIDR段中随机抽取若干个不重复的主机地址
+
+    Args:
+        network: ipaddress网络对象
+        count: 抽取数量
+        rng: 随机数生成器，便于测试时固定结果
+
+    Returns:
+        list: IP地址字符串列表
+    """
+    rng = rng or random
+    # 跳过网络地址和广播地址（单地址网段除外）
+    first = int(network.network_address) + (1 if network.num_addresses > 2 else 0)
+    last = int(network.broadcast_address) - (1 if network.num_addresses > 2 else 0)
+    available = last - first + 1
+    count = min(count, available)
+
+    picked = set()
+    while len(picked) < count:
+        picked.add(first + rng.randrange(available))
+    return [str(ipaddress.ip_address(value)) for value in sorted(picked)]
+
+
+def sample_candidates(networks, per_range=CF_PROBE_SAMPLES_PER_RANGE, rng=None):
+    """从所有CIDR段中抽取候选IP
+
+    Args:
+        networks: ipaddress网络对象列表
+        per_range: 每个CIDR段抽取的数量
+        rng: 随机数生成器
+
+    Returns:
+        list: 候选IP地址字符串列表
+    """
+    candidates = []
+    for network in networks:
+        candidates.extend(sample_network(network, per_range, rng))
+    return candidates
+
+
+class CandidateStats:
+    """单个候选IP的探测统计"""
+
+    def __init__(self, ip):
+        self.ip = ip
+        self.attempts = 0
+        self.failures = 0
+        self.connect_rtts = []  # TCP连接耗时（毫秒）
+        self.tls_rtts = []  # TLS握手耗时（毫秒）
+        self.throughput = None  # 下载测速结果（字节/秒），未测速时为None
+
+    @staticmethod
+    def _percentile(values, percent):
+        if not values:
+            return math.inf
+        ordered = sorted(values)
+        index = max(0, min(len(ordered) - 1, math.ceil(percent / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    @property
+    def samples(self):
+        """每次成功探测的总耗时（TCP连接 + TLS握手）"""
+        if not self.tls_rtts:
+            return list(self.connect_rtts)
+        return [c + t for c, t in zip(self.connect_rtts, self.tls_rtts)]
+
+    @property
+    def loss(self):
+        return self.failures / self.attempts if self.attempts else 1.0
+
+    @property
+    def median(self):
+        return self._percentile(self.samples, 50)
+
+    @property
+    def p90(self):
+        return self._percentile(self.samples, 90)
+
+    def sort_key(self):
+        """排序依据：丢包率优先，其次中位数延迟，最后p90延迟"""
+        return (round(self.loss, 2), self.median, self.p90)
+
+    def to_dict(self):
+        return {
+            "ip": self.ip,
+            "attempts": self.attempts,
+            "loss": round(self.loss, 3),
+            "median_ms": round(self.median, 2) if self.samples else None,
+            "p90_ms": round(self.p90, 2) if self.samples else None,
+            "throughput_mbps": round(self.throughput * 8 / 1e6, 2) if self.throughput is not None else None,
+        }
+
+    def __repr__(self):
+        return f"<CandidateStats {self.ip} loss={self.loss:.2f} median={self.median:.1f}ms p90={self.p90:.1f}ms>"
+
+
+class CloudflareProber:
+    """基于asyncio的Cloudflare IP延迟探测器
+
+    对每个候选IP建立TCP连接并（可选）完成TLS握手，记录耗时，
+    在并发上限内完成所有探测后按丢包率、中位数和p90延迟排序。
+    """
+
+    def __init__(self, hostname, port=443, use_tls=True, concurrency=CF_PROBE_CONCURRENCY,
+                 timeout=CF_PROBE_TIMEOUT, attempts=CF_PROBE_ATTEMPTS, good_enough_ms=CF_GOOD_ENOUGH_RTT_MS,
+                 on_candidate=None):
+        """初始化探测器
+
+        Args:
+            hostname: 原始主机名，用于TLS握手时的SNI
+            port: 探测端口
+            use_tls: 是否在TCP连接后进行TLS握手
+            concurrency: 最大并发连接数
+            timeout: 单次连接/握手超时（秒）
+            attempts: 每个候选IP的探测次数
+            good_enough_ms: 分阶段搜索中出现中位延迟不高于该值的IP时提前结束搜索，0或None表示不提前结束
+            on_candidate: 当前最优延迟刷新时的回调，参数为(ip, 中位延迟毫秒)，在探测线程中调用
+        """
+        self.hostname = hostname
+        self.port = port
+        self.use_tls = use_tls
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.attempts = attempts
+        self.good_enough_ms = good_enough_ms
+        self.on_candidate = on_candidate
+        self._good_enough = None  # 达到提前结束阈值的候选IP
+        self._best_median = math.inf
+        self._loop = None
+        self._main_task = None
+        self._stopped = threading.Event()
+        self.probes_sent = 0
+        self.report = {}
+
+        # 只测量握手耗时，证书校验交给后续的下载流程
+        self._ssl_context = ssl.create_default_context()
+        self._ssl_context.check_hostname = False
+        self._ssl_context.verify_mode = ssl.CERT_NONE
+
+    async def _probe_once(self, stats):
+        """对候选IP进行一次探测"""
+        stats.attempts += 1
+        writer = None
+        completed = False
+        try:
+            start = time.perf_counter()
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(stats.ip, self.port), self.timeout
+            )
+            connect_rtt = (time.perf_counter() - start) * 1000
+
+            tls_rtt = None
+            if self.use_tls:
+                start = time.perf_counter()
+                await asyncio.wait_for(
+                    writer.start_tls(self._ssl_context, server_hostname=self.hostname), self.timeout
+                )
+                tls_rtt = (time.perf_counter() - start) * 1000
+
+            stats.connect_rtts.append(connect_rtt)
+            if tls_rtt is not None:
+                stats.tls_rtts.append(tls_rtt)
+            completed = True
+        except (OSError, asyncio.TimeoutError, ssl.SSLError):
+            stats.failures += 1
+        finally:
+            if writer is not None:
+                writer.close()
+            # 握手未完成（超时或被取消）时底层连接已交给TLS层，wait_closed不会返回，不再等待
+            if writer is not None and completed:
+                try:
+                    await asyncio.wait_for(writer.wait_closed(), self.timeout)
+                except Exception:
+                    pass
+
+    def _on_sample(self, stats):
+        """每次探测成功后刷新当前最优延迟，并检查是否达到提前结束阈值"""
+        median = stats.median
+        if median < self._best_median:
+            self._best_median = median
+            if self.on_candidate:
+                self.on_candidate(stats.ip, median)
+        if self.good_enough_ms and self._good_enough is None and median <= self.good_enough_ms:
+            self._good_enough = stats
+            logger.info(f"候选IP {stats.ip} 的延迟 {median:.1f}ms 已达到提前结束阈值 {self.good_enough_ms}ms")
+
+    async def _probe_candidate(self, stats, semaphore, attempts, stop_when_good_enough=False):
+        for _ in range(attempts):
+            if self._stopped.is_set() or (stop_when_good_enough and self._good_enough is not None):
+                return
+            async with semaphore:
+                self.probes_sent += 1
+                await self._probe_once(stats)
+            if stats.samples:
+                self._on_sample(stats)
+            # 首次探测即失败的IP不再浪费后续探测次数
+            if stats.attempts == 1 and stats.failures == 1:
+                stats.failures = stats.attempts = attempts
+                return
+
+    async def _probe_round(self, ips, attempts, stop_when_good_enough=False):
+        """并发探测一组候选IP
+
+        Args:
+            ips: 候选IP地址字符串列表
+            attempts: 每个IP的探测次数
+            stop_when_good_enough: 出现达到提前结束阈值的IP后是否跳过尚未开始的探测
+
+        Returns:
+            list: 与ips顺序一致的CandidateStats列表
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = [CandidateStats(ip) for ip in ips]
+        try:
+            await asyncio.gather(*(
+                self._probe_candidate(stats, semaphore, attempts, stop_when_good_enough) for stats in results
+            ))
+        except asyncio.CancelledError:
+            self._stopped.set()
+            logger.info("IP探测已被取消，使用已完成的探测结果")
+        return results
+
+    async def probe(self, ips):
+        """并发探测所有候选IP
+
+        Args:
+            ips: 候选IP地址字符串列表
+
+        Returns:
+            list: 按排序依据排好序的CandidateStats列表（不含全部失败的IP）
+        """
+        return self.rank(await self._probe_round(ips, self.attempts))
+
+    async def staged_search(self, networks, initial_samples=CF_PROBE_SAMPLES_PER_RANGE, budget=CF_PROBE_BUDGET,
+                            finalists=CF_PROBE_FINALISTS, final_attempts=CF_PROBE_FINAL_ATTEMPTS, rng=None):
+        """分阶段搜索最优IP（逐次减半）
+
+        每一轮在剩余的CIDR段中各抽取若干地址探测一次，按段内丢包率和中位延迟排序后
+        淘汰较慢的一半，下一轮对保留的段加倍抽样，直到只剩一个段或探测预算用尽。
+        出现延迟不高于good_enough_ms的IP时立即结束搜索。
+        最后对全局最好的若干个候选IP进行多次复测，以稳定性排序。
+
+        Args:
+            networks: ipaddress网络对象列表
+            initial_samples: 首轮每个CIDR段抽取的地址数量
+            budget: 总探测次数预算（含复测）
+            finalists: 进入复测的候选IP数量
+            final_attempts: 复测时每个IP的探测次数
+            rng: 随机数生成器
+
+        Returns:
+            list: 排好序的CandidateStats列表
+        """
+        ranges = list(networks)
+        per_range = initial_samples
+        search_budget = budget - finalists * final_attempts
+        seen = {}
+        owner = {}
+        self.report["rounds"] = []
+
+        while ranges and not self._stopped.is_set() and self._good_enough is None:
+            remaining = search_budget - self.probes_sent
+            if remaining <= 0:
+                break
+            per_range = max(1, min(per_range, remaining // len(ranges)))
+
+            ips = []
+            for network in ranges:
+                for ip in sample_network(network, per_range, rng):
+                    if ip not in seen:
+                        owner[ip] = network
+                        ips.append(ip)
+            for stats in await self._probe_round(ips, 1, stop_when_good_enough=True):
+                seen[stats.ip] = stats
+
+            # 以段内全部已探测地址的丢包率和中位延迟为该段打分
+            scored = []
+            for network in ranges:
+                members = [stats for ip, stats in seen.items() if owner[ip] == network and stats.attempts]
+                successes = [stats.median for stats in members if stats.samples]
+                if successes:
+                    loss = 1 - len(successes) / len(members)
+                    scored.append((round(loss, 2), CandidateStats._percentile(successes, 50), network))
+            scored.sort(key=lambda item: (item[0], item[1]))
+
+            self.report["rounds"].append({
+                "ranges": len(ranges),
+                "per_range": per_range,
+                "alive_ranges": len(scored),
+                "probes_sent": self.probes_sent,
+            })
+            logger.debug(f"第 {len(self.report['rounds'])} 轮: 探测段 {len(ranges)} 个，每段 {per_range} 个地址，可用段 {len(scored)} 个")
+
+            if len(scored) <= 1:
+                break
+            ranges = [item[2] for item in scored[:math.ceil(len(scored) / 2)]]
+            per_range *= 2
+
+        if self._good_enough is not None:
+            self.report["early_stop"] = {
+                "ip": self._good_enough.ip,
+                "median_ms": round(self._good_enough.median, 2),
+                "threshold_ms": self.good_enough_ms,
+            }
+
+        ranked = self.rank(seen.values())
+        if self._stopped.is_set() or not ranked:
+            return ranked
+
+        # 对最好的若干候选IP复测，排除偶然的低延迟
+        finalist_stats = await self._probe_round([stats.ip for stats in ranked[:finalists]], final_attempts)
+        return self.rank(finalist_stats) or ranked
+
+    async def _measure_throughput(self, stats, url, max_bytes, time_limit):
+        """通过候选IP对真实下载地址发起一次有界的Range请求，测量下载速度
+
+        连接直接指向候选IP，TLS的SNI和HTTP的Host头仍使用原始主机名，
+        与后续通过hosts指向该IP后的实际下载路径一致。
+
+        Args:
+            stats: 候选IP的CandidateStats
+            url: 真实的补丁下载地址
+            max_bytes: 最多下载的字节数
+            time_limit: 本次测速的时间上限（秒）
+
+        Returns:
+            dict: 测速记录，包含ip、bytes、seconds、throughput_mbps和error
+        """
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        record = {"ip": stats.ip, "bytes": 0, "seconds": 0.0, "throughput_mbps": None, "error": None}
+
+        writer = None
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + time_limit
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(
+                    stats.ip, self.port,
+                    ssl=self._ssl_context if self.use_tls else None,
+                    server_hostname=self.hostname if self.use_tls else None,
+                ),
+                min(self.timeout * 3, time_limit)
+            )
+            request = (
+                f"GET {path} HTTP/1.1\r\n"
+                f"Host: {parts.netloc}\r\n"
+                f"User-Agent: {UA}\r\n"
+                f"Range: bytes=0-{max_bytes - 1}\r\n"
+                f"Accept-Encoding: identity\r\n"
+                f"Connection: close\r\n\r\n"
+            )
+            writer.write(request.encode("latin-1"))
+            await writer.drain()
+
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), max(0.1, deadline - loop.time()))
+            status_line = head.split(b"\r\n", 1)[0].decode("latin-1", "replace")
+            status_parts = status_line.split()
+            status = int(status_parts[1]) if len(status_parts) > 1 and status_parts[1].isdigit() else 0
+            if status not in (200, 206):
+                raise ValueError(f"HTTP状态码异常: {status_line}")
+
+            # 从收到响应头开始计时，排除建连和首字节等待对速度的影响
+            received = 0
+            start = time.perf_counter()
+            while received < max_bytes and not self._stopped.is_set():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    chunk = await asyncio.wait_for(reader.read(256 * 1024), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if not chunk:
+                    break
+                received += len(chunk)
+            elapsed = time.perf_counter() - start
+
+            record["bytes"] = received
+            record["seconds"] = round(elapsed, 3)
+            if received and elapsed > 0:
+                stats.throughput = received / elapsed
+                record["throughput_mbps"] = round(stats.throughput * 8 / 1e6, 2)
+            else:
+                record["error"] = "未收到数据"
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ssl.SSLError, ValueError) as e:
+            record["error"] = str(e) or e.__class__.__name__
+        finally:
+            if writer is not None:
+                writer.close()
+                try:
+                    await asyncio.wait_for(writer.wait_closed(), self.timeout)
+                except Exception:
+                    pass
+        return record
+
+    async def select_by_throughput(self, ranked, url, top_k=CF_THROUGHPUT_CANDIDATES,
+                                   max_bytes=CF_THROUGHPUT_BYTES, time_budget=CF_THROUGHPUT_TIME_BUDGET):
+        """对延迟最低的若干候选IP逐个测速，按实测下载速度重新选择
+
+        测速依次进行，避免多个测速连接互相争抢带宽；总时间预算平均分配给每个候选IP。
+        所有候选IP都测速失败时保持原有的延迟排序。
+
+        Args:
+            ranked: 按延迟排好序的CandidateStats列表
+            url: 真实的补丁下载地址
+            top_k: 参与测速的候选IP数量
+            max_bytes: 每个IP最多下载的字节数
+            time_budget: 测速总时间预算（秒）
+
+        Returns:
+            list: 测速成功的IP按速度从高到低排在前面，其余保持延迟排序
+        """
+        candidates = ranked[:top_k]
+        if len(candidates) < 2 or not url:
+            return ranked
+
+        records = []
+        budget_end = time.perf_counter() + time_budget
+        for index, stats in enumerate(candidates):
+            if self._stopped.is_set():
+                break
+            remaining = budget_end - time.perf_counter()
+            if remaining <= 0:
+                break
+            time_limit = remaining / (len(candidates) - index)
+            try:
+                record = await self._measure_throughput(stats, url, max_bytes, time_limit)
+            except asyncio.CancelledError:
+                self._stopped.set()
+                logger.info("下载测速已被取消，使用已完成的测速结果")
+                break
+            records.append(record)
+            logger.debug(f"下载测速: {record}")
+
+        self.report["throughput"] = records
+        measured = sorted(
+            (stats for stats in candidates if stats.throughput),
+            key=lambda stats: stats.throughput, reverse=True
+        )
+        if not measured:
+            logger.warning("所有候选IP下载测速均失败，按延迟结果选择")
+            return ranked
+        return measured + [stats for stats in ranked if stats not in measured]
+
+    async def _staged_with_throughput(self, networks, url, rng=None):
+        ranked = await self.staged_search(networks, rng=rng)
+        # 提前结束时已经找到足够好的IP，不再花时间测速
+        if self._stopped.is_set() or not url or "early_stop" in self.report:
+            return ranked
+        return await self.select_by_throughput(ranked, url)
+
+    @staticmethod
+    def rank(results):
+        """过滤掉全部失败的候选IP并排序"""
+        alive = [stats for stats in results if stats.samples]
+        return sorted(alive, key=lambda stats: stats.sort_key())
+
+    def _run_sync(self, coro):
+        """在独立的事件循环中执行协程，供工作线程调用
+
+        不会清除停止标记：开始执行前就已调用stop()时探测会立即结束，复用探测器前需先调用reset()。
+        """
+        self._good_enough = None
+        self._best_median = math.inf
+        self.probes_sent = 0
+        self.report = {}
+        start = time.perf_counter()
+
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._main_task = self._loop.create_task(coro)
+            ranked = self._loop.run_until_complete(self._main_task)
+        except asyncio.CancelledError:
+            ranked = []
+        finally:
+            self._loop.close()
+            self._loop = None
+            self._main_task = None
+
+        elapsed = time.perf_counter() - start
+        self.report.update({"probes_sent": self.probes_sent, "elapsed_s": round(elapsed, 2)})
+        logger.info(f"IP探测完成，耗时 {elapsed:.1f} 秒，共探测 {self.probes_sent} 次，可用IP {len(ranked)} 个")
+        return ranked
+
+    def run(self, ips):
+        """同步探测给定的候选IP
+
+        Args:
+            ips: 候选IP地址字符串列表
+
+        Returns:
+            list: 排好序的CandidateStats列表
+        """
+        logger.info(f"开始探测 {len(ips)} 个候选IP，并发 {self.concurrency}，每个IP {self.attempts} 次")
+        return self._run_sync(self.probe(ips))
+
+    def run_staged(self, networks, rng=None, url=None):
+        """同步执行分阶段搜索，提供下载地址时再对延迟最低的候选IP进行下载测速
+
+        Args:
+            networks: ipaddress网络对象列表
+            rng: 随机数生成器
+            url: 真实的补丁下载地址，为None时只按延迟排序
+
+        Returns:
+            list: 排好序的CandidateStats列表
+        """
+        logger.info(f"开始分阶段搜索，CIDR段 {len(networks)} 个，探测预算 {CF_PROBE_BUDGET} 次")
+        return self._run_sync(self._staged_with_throughput(networks, url, rng=rng))
+
+    @property
+    def is_stopped(self):
+        """探测是否被手动停止"""
+        return self._stopped.is_set()
+
+    def reset(self):
+        """清除停止标记，使已停止的探测器可以再次执行探测"""
+        self._stopped.clear()
+
+    def stop(self):
+        """从其他线程停止正在进行的探测"""
+        self._stopped.set()
+        loop, task = self._loop, self._main_task
+        if loop is not None and task is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                pass
@@ -1,11 +1,11 @@
 import json
-import requests
 import webbrowser
 from PySide6.QtCore import QThread, Signal
 from PySide6.QtWidgets import QMessageBox
 import sys
 from utils.logger import setup_logger
-from utils.url_censor import censor_url
+from utils.url_censor import censor_url, censor_config_urls
+from utils.tracing import trace_span
 
 # 初始化logger
 logger = setup_logger("config_fetch")
@@ -20,6 +20,12 @@ class ConfigFetchThread(QThread):
         self.debug_mode = debug_mode
 
     def run(self):
+        with trace_span("config_fetch") as span:
+            self._fetch(span)
+
+    def _fetch(self, span):
+        import requests  # 按需导入，避免拖慢启动
+
         try:
             if self.debug_mode:
                 logger.debug("--- Starting to fetch cloud config ---")
@@ -28,6 +34,7 @@ class ConfigFetchThread(QThread):
                 logger.debug(f"DEBUG: Using Headers: {self.headers}")
 
             response = requests.get(self.url, headers=self.headers, timeout=10)
+            span.add_bytes(len(response.content)).set(status=response.status_code)
 
             if self.debug_mode:
                 logger.debug(f"DEBUG: Response Status Code: {response.status_code}")
@@ -46,9 +53,11 @@ class ConfigFetchThread(QThread):
             # 检查是否是要求更新的错误信息 - 使用Unicode编码的更新提示文本
             update_required_msg = "\u8bf7\u4f7f\u7528\u6700\u65b0\u7248\u672c\u7684FraiseMoe2-Next\u8fdb\u884c\u4e0b\u8f7d"
             if isinstance(config_data, str) and config_data == update_required_msg:
+                span.fail("update_required")
                 self.finished.emit(None, "update_required")
                 return
             elif isinstance(config_data, dict) and config_data.get("message") == update_required_msg:
+                span.fail("update_required")
                 self.finished.emit(None, "update_required")
                 return
 
@@ -56,16 +65,19 @@ class ConfigFetchThread(QThread):
             required_keys = [f"vol.{i+1}.data" for i in range(4)] + ["after.data"]
             missing_keys = [key for key in required_keys if key not in config_data]
             if missing_keys:
+                span.fail(f"missing_keys:{','.join(missing_keys)}")
                 self.finished.emit(None, f"missing_keys:{','.join(missing_keys)}")
                 return
 
             self.finished.emit(config_data, "")
         except requests.exceptions.RequestException as e:
+            span.fail(e)
             error_msg = "访问云端配置失败，请检查网络状况或稍后再试。"
             if self.debug_mode:
                 error_msg += f"\n详细错误: {e}"
             self.finished.emit(None, error_msg)
         except (ValueError, json.JSONDecodeError) as e:
+            span.fail(e)
             error_msg = "访问云端配置失败，请检查网络状况或稍后再试。"
             if self.debug_mode:
                 error_msg += f"\nJSON解析失败: {e}"
@@ -83,17 +95,4 @@ class ConfigFetchThread(QThread):
         Returns:
             dict: 安全的配置数据副本
         """
-        if not config_data or not isinstance(config_data, dict):
-            return config_data
-            
-        # 创建深拷贝，避免修改原始数据
-        import copy
-        safe_config = copy.deepcopy(config_data)
-        
-        # 隐藏敏感URL
-        for key in safe_config:
-            if isinstance(safe_config[key], dict) and "url" in safe_config[key]:
-                # 完全隐藏URL
-                safe_config[key]["url"] = "***URL protection***"
-        
-        return safe_config 
\ No newline at end of file
+        return censor_config_urls(config_data)
\ No newline at end of file
@@ -0,0 +1,118 @@
+import socket
+import ssl
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from PySide6.QtCore import QThread, Signal
+
+from config.config import (
+    CONNECTIVITY_TIMEOUT, IPV4_TEST_ENDPOINTS, IPV6_TEST_URL, IPV6_ADDRESS_URL
+)
+from utils.ip_cache import get_local_prefix
+from utils.logger import setup_logger
+
+# 初始化logger
+logger = setup_logger("connectivity_thread")
+
+
+def get_local_network_key():
+    """获取本机IPv4和IPv6出站网段组成的标识，用于判断网络环境是否变化
+
+    只通过UDP connect查询路由表，不会实际发送数据包，可以在UI线程中调用。
+
+    Returns:
+        str: 网络标识
+    """
+    return f"{get_local_prefix(socket.AF_INET)}|{get_local_prefix(socket.AF_INET6)}"
+
+
+class ConnectivityProbeThread(QThread):
+    """在后台并行检测IPv4和IPv6连通性的线程"""
+    finished = Signal(dict)  # 检测结果
+
+    def __init__(self, detailed=False, timeout=CONNECTIVITY_TIMEOUT, parent=None):
+        """初始化检测线程
+
+        Args:
+            detailed: 是否在IPv6可用时额外获取公网IPv6地址
+            timeout: 单项检测的超时时间（秒）
+            parent: 父对象
+        """
+        super().__init__(parent)
+        self.detailed = detailed
+        self.timeout = timeout
+
+    def _probe_ipv4(self):
+        """依次尝试与IPv4端点建立TCP连接
+
+        Returns:
+            dict: 包含available、elapsed和error的检测结果
+        """
+        last_error = ""
+        for host, port in IPV4_TEST_ENDPOINTS:
+            start = time.perf_counter()
+            try:
+                with socket.create_connection((host, port), timeout=self.timeout):
+                    return {"available": True, "elapsed": time.perf_counter() - start, "error": ""}
+            except OSError as e:
+                last_error = f"{host}:{port} {e}"
+        return {"available": False, "elapsed": 0.0, "error": last_error}
+
+    def _probe_ipv6(self):
+        """请求只能通过IPv6访问的测试资源
+
+        Returns:
+            dict: 包含available、elapsed、bytes和error的检测结果
+        """
+        request = urllib.request.Request(IPV6_TEST_URL)
+        request.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)')
+        request.add_header('Accept', 'image/webp,image/apng,image/*,*/*;q=0.8')
+        context = ssl._create_unverified_context()
+
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout, context=context) as response:
+                data = response.read()
+                elapsed = time.perf_counter() - start
+                if response.status == 200 and data:
+                    return {"available": True, "elapsed": elapsed, "bytes": len(data), "error": ""}
+                return {"available": False, "elapsed": elapsed, "bytes": len(data), "error": f"状态码 {response.status}"}
+        except Exception as e:
+            return {"available": False, "elapsed": 0.0, "bytes": 0, "error": str(e)}
+
+    def _get_ipv6_address(self):
+        """获取公网IPv6地址
+
+        Returns:
+            str: IPv6地址，失败时返回空字符串
+        """
+        try:
+            with urllib.request.urlopen(IPV6_ADDRESS_URL, timeout=self.timeout) as response:
+                return response.read().decode("utf-8", "replace").strip()
+        except Exception as e:
+            logger.debug(f"获取公网IPv6地址失败: {e}")
+            return ""
+
+    def run(self):
+        network_key = get_local_network_key()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            ipv4_future = executor.submit(self._probe_ipv4)
+            ipv6_future = executor.submit(self._probe_ipv6)
+            ipv4, ipv6 = ipv4_future.result(), ipv6_future.result()
+
+        if self.detailed and ipv6["available"]:
+            ipv6["address"] = self._get_ipv6_address()
+
+        result = {
+            "ipv4": ipv4,
+            "ipv6": ipv6,
+            "network_key": network_key,
+            "timestamp": time.time(),
+            "detailed": self.detailed,
+        }
+        logger.info(
+            f"连通性检测完成: IPv4 {'可用' if ipv4['available'] else '不可用'}, "
+            f"IPv6 {'可用' if ipv6['available'] else '不可用'}"
+        )
+        self.finished.emit(result)
@@ -0,0 +1,133 @@
+import os
+import hashlib
+from PySide6.QtCore import QThread, Signal
+from config.config import DELTA_MAX_BASE_SIZE
+from utils.logger import setup_logger
+
+# 初始化logger
+logger = setup_logger("delta_patch_thread")
+
+# 支持的增量补丁格式
+DELTA_FORMATS = ("zstd", "bsdiff")
+
+
+class DeltaPatchThread(QThread):
+    """增量补丁应用线程
+
+    以游戏目录中已安装的补丁文件为基准应用增量文件，生成新版本补丁文件，
+    校验新哈希值后再原子替换已安装的文件。
+    """
+    finished = Signal(bool, str, str)  # success, error_message, game_version
+    progress = Signal(int, str)  # 进度百分比和状态信息
+
+    def __init__(self, delta_path, installed_file, delta_format, target_hash, game_version, parent=None):
+        """初始化增量补丁应用线程
+
+        Args:
+            delta_path: 已下载的增量文件路径
+            installed_file: 游戏目录中已安装的旧版本补丁文件路径
+            delta_format: 增量格式，zstd（--patch-from）或bsdiff
+            target_hash: 应用增量后文件应有的SHA-256哈希值
+            game_version: 游戏版本名称
+            parent: 父对象
+        """
+        super().__init__(parent)
+        self.delta_path = delta_path
+        self.installed_file = installed_file
+        self.delta_format = delta_format
+        self.target_hash = target_hash
+        self.game_version = game_version
+
+    def _apply_zstd(self, output_path):
+        """应用zstd --patch-from生成的增量文件
+
+        Args:
+            output_path: 新文件输出路径
+        """
+        import mmap
+        import zstandard
+
+        # --patch-from以旧文件的原始内容作为字典，窗口大小需覆盖整个旧文件；
+        # 字典需整体驻留内存，超过上限时报错，由下载管理器改为下载完整补丁
+        base_size = os.path.getsize(self.installed_file)
+        if base_size > DELTA_MAX_BASE_SIZE:
+            raise RuntimeError(
+                f"已安装的补丁文件过大（{base_size} 字节），超过增量补丁基准大小上限 {DELTA_MAX_BASE_SIZE} 字节"
+            )
+        # 通过内存映射传入，避免先读成bytes再复制进字典造成双倍内存占用
+        with open(self.installed_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as base:
+            dict_data = zstandard.ZstdCompressionDict(base, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+        dctx = zstandard.ZstdDecompressor(dict_data=dict_data, max_window_size=2 ** 31)
+        with open(self.delta_path, "rb") as ifh, open(output_path, "wb") as ofh:
+            dctx.copy_stream(ifh, ofh, read_size=1024 * 1024, write_size=4 * 1024 * 1024)
+
+    def _apply_bsdiff(self, output_path):
+        """应用bsdiff格式的增量文件
+
+        Args:
+            output_path: 新文件输出路径
+        """
+        try:
+            import bsdiff4
+        except ImportError:
+            raise RuntimeError("当前环境未安装bsdiff4，无法应用bsdiff格式的增量补丁")
+        bsdiff4.file_patch(self.installed_file, output_path, self.delta_path)
+
+    def _calculate_hash(self, file_path):
+        """分块计算文件的SHA-256哈希值
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            str: 十六进制哈希值
+        """
+        hash_obj = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            while True:
+                chunk = f.read(16 * 1024 * 1024)
+                if not chunk:
+                    break
+                hash_obj.update(chunk)
+        return hash_obj.hexdigest()
+
+    def run(self):
+        output_path = self.installed_file + ".delta.tmp"
+        try:
+            logger.info(f"开始应用 {self.game_version} 的增量补丁，格式: {self.delta_format}")
+            self.progress.emit(0, f"正在应用 {self.game_version} 的增量补丁...")
+
+            if self.delta_format not in DELTA_FORMATS:
+                raise ValueError(f"不支持的增量补丁格式: {self.delta_format}")
+            if not os.path.exists(self.installed_file):
+                raise FileNotFoundError(f"未找到已安装的补丁文件: {self.installed_file}")
+
+            self.progress.emit(10, f"正在生成 {self.game_version} 的新版本补丁文件...\n(在此过程中可能会卡顿或无响应，请不要关闭软件)")
+            if self.delta_format == "zstd":
+                self._apply_zstd(output_path)
+            else:
+                self._apply_bsdiff(output_path)
+
+            if self.isInterruptionRequested():
+                raise InterruptedError("操作已取消")
+
+            self.progress.emit(70, f"正在校验 {self.game_version} 的新版本补丁文件...")
+            file_hash = self._calculate_hash(output_path)
+            if file_hash != self.target_hash:
+                logger.error(f"增量补丁结果哈希不匹配: 预期 {self.target_hash}, 实际 {file_hash}")
+                raise ValueError("应用增量补丁后的文件哈希值不匹配")
+
+            # 校验通过后原子替换旧文件
+            os.replace(output_path, self.installed_file)
+            logger.info(f"{self.game_version} 增量补丁应用完成")
+
+            self.progress.emit(100, f"{self.game_version} 增量补丁应用完成")
+            self.finished.emit(True, "", self.game_version)
+        except Exception as e:
+            logger.error(f"应用 {self.game_version} 的增量补丁失败: {e}")
+            if os.path.exists(output_path):
+                try:
+                    os.remove(output_path)
+                except OSError:
+                    pass
+            self.finished.emit(False, f"\n增量补丁应用失败\n\n【错误信息】：{e}\n", self.game_version)
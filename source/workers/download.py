@@ -7,7 +7,9 @@ from PySide6 import QtCore, QtWidgets
 from PySide6.QtCore import (Qt, Signal, QThread, QTimer)
 from PySide6.QtWidgets import (QLabel, QProgressBar, QVBoxLayout, QDialog, QHBoxLayout)
 from utils import resource_path
-from config.config import APP_NAME, UA
+from config.config import APP_NAME, DEFAULT_FILE_ALLOCATION, SEGMENT_CONNECTIONS_PER_IP
+from .segment_downloader import SegmentDownloader, build_download_headers
+from utils.tracing import trace_span
 import signal
 import ctypes
 import time
@@ -44,8 +46,13 @@ class DownloadThread(QThread):
         self._is_running = True
         self._is_paused = False
         self.threads = []
+        self.segment_downloader = None
 
     def stop(self):
+        if self.segment_downloader:
+            self._is_running = False
+            self.segment_downloader.stop()
+            return
         if self.process and self.process.poll() is None:
             self._is_running = False
             try:
@@ -78,6 +85,13 @@ class DownloadThread(QThread):
                 
     def pause(self):
         """暂停下载进程"""
+        if self.segment_downloader:
+            if not self._is_paused:
+                self.segment_downloader.pause()
+                self._is_paused = True
+                print("多IP分段下载已暂停")
+                return True
+            return False
         if not self._is_paused and self.process and self.process.poll() is None:
             try:
                 if sys.platform == 'win32':
@@ -110,6 +124,13 @@ class DownloadThread(QThread):
                 
     def resume(self):
         """恢复下载进程"""
+        if self.segment_downloader:
+            if self._is_paused:
+                self.segment_downloader.resume()
+                self._is_paused = False
+                print("多IP分段下载已恢复")
+                return True
+            return False
         if self._is_paused and self.process and self.process.poll() is None:
             try:
                 if sys.platform == 'win32':
@@ -138,9 +159,90 @@ class DownloadThread(QThread):
         """返回当前下载是否处于暂停状态"""
         return self._is_paused
 
+    def _get_segment_ips(self):
+        """获取可用于多IP分段下载的优选IP列表
+
+        Returns:
+            list: 优选IP列表，未优选或优选的不是当前域名时为空
+        """
+        download_manager = getattr(self.parent(), 'download_manager', None)
+        if download_manager is None or not hasattr(download_manager, 'cloudflare_optimizer'):
+            return []
+        return download_manager.cloudflare_optimizer.get_candidate_ips(urlparse(self.url).hostname)
+
+    @staticmethod
+    def _format_speed(speed):
+        for unit in ("B", "KiB", "MiB", "GiB"):
+            if speed < 1024 or unit == "GiB":
+                return f"{speed:.1f}{unit}/s"
+            speed /= 1024
+
+    @staticmethod
+    def _format_eta(seconds):
+        seconds = int(seconds)
+        if seconds >= 3600:
+            return f"{seconds // 3600}h{seconds % 3600 // 60}m"
+        if seconds >= 60:
+            return f"{seconds // 60}m{seconds % 60}s"
+        return f"{seconds}s"
+
+    def _run_segmented(self, ips, thread_count):
+        """使用多个优选IP进行分段下载
+
+        Args:
+            ips: 优选IP列表
+            thread_count: 下载线程设置对应的总连接数
+
+        Returns:
+            tuple: (是否成功, 错误信息)
+        """
+        last_update_time = 0
+
+        def on_progress(downloaded, total, speed, connections, healthy_ips):
+            nonlocal last_update_time
+            current_time = time.time()
+            if current_time - last_update_time < 0.2 or not total:
+                return
+            last_update_time = current_time
+            eta = self._format_eta((total - downloaded) / speed) if speed > 0 else "-"
+            self.progress.emit({
+                "game": self.game_version,
+                "percent": min(99, int(downloaded * 100 / total)),
+                "threads": f"{connections} ({healthy_ips}个IP)",
+                "speed": self._format_speed(speed),
+                "eta": eta
+            })
+
+        connections_per_ip = max(1, min(SEGMENT_CONNECTIONS_PER_IP, thread_count // len(ips)))
+        print(f"使用 {len(ips)} 个优选IP进行分段下载: {', '.join(ips)}，每个IP {connections_per_ip} 个连接")
+        # 与aria2c下载保持一致，不校验证书
+        self.segment_downloader = SegmentDownloader(
+            self.url, self._7z_path, ips,
+            connections_per_ip=connections_per_ip,
+            progress_callback=on_progress,
+            verify_certificate=False
+        )
+        with trace_span("download_segmented", ips=len(ips), connections_per_ip=connections_per_ip) as span:
+            try:
+                success, error = self.segment_downloader.run()
+                span.add_bytes(self.segment_downloader.downloaded)
+                if not success:
+                    span.fail(error)
+                return success, error
+            finally:
+                span.set(degraded_ips=sum(1 for ip in self.segment_downloader.report.get("ips", []) if ip["degraded"]))
+                print(f"多IP分段下载报告: {self.segment_downloader.report}")
+                self.segment_downloader = None
+                self._is_paused = False
+
     def run(self):
+        with trace_span("download", game=self.game_version) as span:
+            self._download(span)
+
+    def _download(self, span):
         try:
             if not self._is_running:
+                span.cancel()
                 self.finished.emit(False, "下载已手动停止。")
                 return
 
@@ -149,7 +251,7 @@ class DownloadThread(QThread):
             file_name = os.path.basename(self._7z_path)
 
             parsed_url = urlparse(self.url)
-            referer = f"{parsed_url.scheme}://{parsed_url.netloc}/"
+            headers = build_download_headers(self.url)
 
             command = [
                 aria2c_path,
@@ -157,9 +259,11 @@ class DownloadThread(QThread):
             
             # 获取主窗口的下载管理器对象
             thread_count = 64 # 默认值
+            file_allocation = DEFAULT_FILE_ALLOCATION
             if hasattr(self.parent(), 'download_manager'):
-                # 从下载管理器获取线程数设置
+                # 从下载管理器获取线程数和文件预分配设置
                 thread_count = self.parent().download_manager.get_download_thread_count()
+                file_allocation = self.parent().download_manager.get_file_allocation_mode()
 
             # 检查是否启用IPv6支持
             ipv6_enabled = False
@@ -168,23 +272,40 @@ class DownloadThread(QThread):
 
             # 打印IPv6状态
             print(f"IPv6支持状态: {ipv6_enabled}")
+
+            # 有多个优选IP时，把分段分散到这些IP上下载，单个IP失效时由其余IP接管
+            segment_ips = self._get_segment_ips()
+            if len(segment_ips) >= 2:
+                success, error = self._run_segmented(segment_ips, thread_count)
+                if not self._is_running:
+                    span.cancel()
+                    self.finished.emit(False, "下载已手动停止。")
+                    return
+                if success:
+                    span.set(method="segmented").add_bytes(os.path.getsize(self._7z_path))
+                    self.progress.emit({
+                        "game": self.game_version,
+                        "percent": 100,
+                        "threads": "N/A",
+                        "speed": "N/A",
+                        "eta": "完成"
+                    })
+                    self.finished.emit(True, "")
+                    return
+                print(f"多IP分段下载失败，改用aria2c下载: {error}")
             
             # 将所有的优化参数应用于每个下载任务
             command.extend([
                 '--dir', download_dir,
                 '--out', file_name,
-                '--user-agent', UA,
-                '--referer', referer,
-                '--header', f'Origin: {referer.rstrip("/")}',
-                '--header', 'Accept: */*',
-                '--header', 'Accept-Language: zh-CN,zh;q=0.9,en;q=0.8',
-                '--header', 'Accept-Encoding: gzip, deflate, br',
-                '--header', 'Cache-Control: no-cache',
-                '--header', 'Pragma: no-cache',
-                '--header', 'DNT: 1',
-                '--header', 'Sec-Fetch-Dest: empty',
-                '--header', 'Sec-Fetch-Mode: cors',
-                '--header', 'Sec-Fetch-Site: same-origin',
+                '--user-agent', headers["User-Agent"],
+                '--referer', headers["Referer"],
+            ])
+            # 其余请求头与多IP分段下载共用同一套
+            for name, value in headers.items():
+                if name not in ("User-Agent", "Referer"):
+                    command.extend(['--header', f'{name}: {value}'])
+            command.extend([
                 '--http-accept-gzip=true',
                 '--console-log-level=notice',
                 '--summary-interval=1',
@@ -199,7 +320,7 @@ class DownloadThread(QThread):
                 f'--max-connection-per-server={thread_count}', # 使用动态的线程数
                 '--min-split-size=1M', # 减小最小分片大小
                 '--optimize-concurrent-downloads=true', # 优化并发下载
-                '--file-allocation=none', # 禁用文件预分配加快开始
+                f'--file-allocation={file_allocation}', # 文件预分配模式，预分配可减少机械硬盘上的碎片
                 '--async-dns=true', # 使用异步DNS
             ])
 
@@ -210,6 +331,13 @@ class DownloadThread(QThread):
             else:
                 print("已启用IPv6支持")
 
+            # 优选IP通过本地DNS解析器固定时，让aria2c向其查询下载域名
+            if hasattr(self.parent(), 'download_manager'):
+                dns_server = self.parent().download_manager.get_dns_server_for(parsed_url.hostname)
+                if dns_server:
+                    command.append(f'--async-dns-server={dns_server}')
+                    print(f"使用本地DNS解析器固定优选IP: {dns_server}")
+
             # 证书验证现在总是需要，因为我们依赖hosts文件
             command.append('--check-certificate=false')
             
@@ -218,6 +346,7 @@ class DownloadThread(QThread):
             # 打印将要执行的命令，用于调试
             print(f"即将执行的 Aria2c 命令: {' '.join(command)}")
 
+            span.set(method="aria2c", threads=thread_count)
             creation_flags = subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
             self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8', errors='replace', creationflags=creation_flags)
 
@@ -266,10 +395,13 @@ class DownloadThread(QThread):
 
             if not self._is_running:
                 # 如果是手动停止的
+                span.cancel()
                 self.finished.emit(False, "下载已手动停止。")
                 return
 
             if return_code == 0:
+                if os.path.exists(self._7z_path):
+                    span.add_bytes(os.path.getsize(self._7z_path))
                 self.progress.emit({
                     "game": self.game_version,
                     "percent": 100,
@@ -280,9 +412,11 @@ class DownloadThread(QThread):
                 self.finished.emit(True, "")
             else:
                 error_message = f"\nAria2c下载失败，退出码: {return_code}\n\n--- Aria2c 输出 ---\n{''.join(full_output)}\n---------------------\n"
+                span.fail(f"aria2c退出码: {return_code}")
                 self.finished.emit(False, error_message)
 
         except Exception as e:
+            span.fail(e)
             if self._is_running:
                 self.finished.emit(False, f"\n下载时发生未知错误\n\n【错误信息】: {e}\n")
 
@@ -1,12 +1,14 @@
 import os
 import hashlib
-import py7zr
 import tempfile
 import traceback
 import time # Added for time.time()
 from PySide6.QtCore import QThread, Signal
 from PySide6.QtWidgets import QApplication
+from utils.archive_index import get_archive_index
+from utils.extraction_backends import get_extraction_backend, run_with_fallback
 from utils.logger import setup_logger
+from utils.tracing import trace_span
 
 # 初始化logger
 logger = setup_logger("hash_thread")
@@ -31,9 +33,15 @@ class HashThread(QThread):
         self.plugin_hash = plugin_hash
         self.installed_status = installed_status.copy()
         self.main_window = main_window
+        # 预检查时记录的实际文件哈希值，用于匹配增量补丁的基准版本
+        self.file_hashes = {}
         
     def run(self):
         """运行线程"""
+        with trace_span(f"hash_{self.mode}", games=len(self.install_paths)) as span:
+            self._run(span)
+
+    def _run(self, span):
         debug_mode = False
         
         # 设置超时限制（分钟）
@@ -77,24 +85,27 @@ class HashThread(QThread):
                         # 当没有预期哈希值时，保持当前状态不变
                         continue
                         
-                    # 分块读取，避免大文件一次性读取内存
-                    hash_obj = hashlib.sha256()
-                    with open(install_path, "rb") as f:
-                        while True:
-                            if self.isInterruptionRequested():
-                                break
-                            # 检查超时
-                            if check_timeout():
-                                logger.error(f"哈希计算超时，强制终止")
-                                result["passed"] = False
-                                result["game"] = game_version
-                                result["message"] = f"\n{game_version} 哈希计算超时，已超过 {timeout_minutes} 分钟。\n\n请考虑跳过哈希校验或稍后再试。\n"
-                                break
-                            chunk = f.read(1024 * 1024)
-                            if not chunk:
-                                break
-                            hash_obj.update(chunk)
+                    with trace_span("hash_file", game=game_version) as file_span:
+                        # 分块读取，避免大文件一次性读取内存
+                        hash_obj = hashlib.sha256()
+                        with open(install_path, "rb") as f:
+                            while True:
+                                if self.isInterruptionRequested():
+                                    break
+                                # 检查超时
+                                if check_timeout():
+                                    logger.error(f"哈希计算超时，强制终止")
+                                    result["passed"] = False
+                                    result["game"] = game_version
+                                    result["message"] = f"\n{game_version} 哈希计算超时，已超过 {timeout_minutes} 分钟。\n\n请考虑跳过哈希校验或稍后再试。\n"
+                                    break
+                                chunk = f.read(1024 * 1024)
+                                if not chunk:
+                                    break
+                                hash_obj.update(chunk)
+                                file_span.add_bytes(len(chunk))
                     file_hash = hash_obj.hexdigest()
+                    self.file_hashes[game_version] = file_hash
                     
                     if debug_mode:
                         logger.debug(f"DEBUG: 哈希预检查 - {game_version}")
@@ -116,6 +127,8 @@ class HashThread(QThread):
                     if debug_mode:
                         logger.debug(f"DEBUG: 哈希预检查异常 - {game_version}: {str(e)}")
             
+            if self.isInterruptionRequested():
+                span.cancel()
             self.pre_finished.emit(status_copy)
         
         elif self.mode == "after":
@@ -158,36 +171,38 @@ class HashThread(QThread):
                     chunk_size = min(256 * 1024 * 1024, max(16 * 1024 * 1024, file_size // 20))
                     logger.debug(f"使用块大小: {chunk_size // (1024 * 1024)}MB")
                     
-                    # 分块读取，避免大文件一次性读取内存
-                    hash_obj = hashlib.sha256()
-                    bytes_read = 0
-                    start_time = time.time()
-                    last_progress_time = start_time
-                    with open(install_path, "rb") as f:
-                        while True:
-                            if self.isInterruptionRequested():
-                                break
-                            # 检查超时
-                            if check_timeout():
-                                logger.error(f"哈希计算超时，强制终止")
-                                result["passed"] = False
-                                result["game"] = game_version
-                                result["message"] = f"\n{game_version} 哈希计算超时，已超过 {timeout_minutes} 分钟。\n\n请考虑跳过哈希校验或稍后再试。\n"
-                                break
-                            chunk = f.read(chunk_size)
-                            if not chunk:
-                                break
-                            bytes_read += len(chunk)
-                            hash_obj.update(chunk)
+                    with trace_span("hash_file", game=game_version) as file_span:
+                        # 分块读取，避免大文件一次性读取内存
+                        hash_obj = hashlib.sha256()
+                        bytes_read = 0
+                        start_time = time.time()
+                        last_progress_time = start_time
+                        with open(install_path, "rb") as f:
+                            while True:
+                                if self.isInterruptionRequested():
+                                    break
+                                # 检查超时
+                                if check_timeout():
+                                    logger.error(f"哈希计算超时，强制终止")
+                                    result["passed"] = False
+                                    result["game"] = game_version
+                                    result["message"] = f"\n{game_version} 哈希计算超时，已超过 {timeout_minutes} 分钟。\n\n请考虑跳过哈希校验或稍后再试。\n"
+                                    break
+                                chunk = f.read(chunk_size)
+                                if not chunk:
+                                    break
+                                bytes_read += len(chunk)
+                                hash_obj.update(chunk)
+                                file_span.add_bytes(len(chunk))
                             
-                            # 每秒更新一次进度
-                            current_time = time.time()
-                            if current_time - last_progress_time >= 1.0:
-                                progress = bytes_read / file_size * 100
-                                elapsed = current_time - start_time
-                                speed = bytes_read / (elapsed if elapsed > 0 else 1) / (1024 * 1024)  # MB/s
-                                logger.debug(f"哈希计算进度: {progress:.1f}% - 已处理: {bytes_read/(1024*1024):.1f}MB/{file_size/(1024*1024):.1f}MB - 速度: {speed:.1f}MB/s")
-                                last_progress_time = current_time
+                                # 每秒更新一次进度
+                                current_time = time.time()
+                                if current_time - last_progress_time >= 1.0:
+                                    progress = bytes_read / file_size * 100
+                                    elapsed = current_time - start_time
+                                    speed = bytes_read / (elapsed if elapsed > 0 else 1) / (1024 * 1024)  # MB/s
+                                    logger.debug(f"哈希计算进度: {progress:.1f}% - 已处理: {bytes_read/(1024*1024):.1f}MB/{file_size/(1024*1024):.1f}MB - 速度: {speed:.1f}MB/s")
+                                    last_progress_time = current_time
                                 
                     # 计算最终的哈希值
                     file_hash = hash_obj.hexdigest()
@@ -229,6 +244,10 @@ class HashThread(QThread):
                         logger.debug(f"DEBUG: 哈希后检查异常 - {game_version}: {str(e)}")
                     break
             
+            if self.isInterruptionRequested():
+                span.cancel()
+            elif not result["passed"]:
+                span.fail(result["message"].strip())
             self.after_finished.emit(result)
 
 
@@ -259,6 +278,10 @@ class OfflineHashVerifyThread(QThread):
             
     def run(self):
         """运行线程"""
+        with trace_span("hash_offline", game=self.game_version):
+            self._verify()
+
+    def _verify(self):
         debug_mode = False
         
         # 设置超时限制（分钟）
@@ -347,187 +370,181 @@ class OfflineHashVerifyThread(QThread):
                         self.finished.emit(False, f"未知的游戏版本: {self.game_version}", "")
                         return
                         
-                    with py7zr.SevenZipFile(self.file_path, mode="r") as archive:
-                        # 获取压缩包内文件列表
-                        file_list = archive.getnames()
+                    # 使用共享的压缩包目录索引查找目标文件，同一压缩包只解析一次文件头
+                    index = get_archive_index(self.file_path)
+                    if debug_mode:
+                        logger.debug(f"DEBUG: 压缩包内文件列表: {index.names}")
+                        
+                    # 查找目标文件（匹配结果在读取索引时已预先计算）
+                    target_file_in_archive = index.find_member(target_filename)
+                    backend = get_extraction_backend()
+                    patch_file = None
+                    
+                    if not target_file_in_archive:
                         if debug_mode:
-                            logger.debug(f"DEBUG: 压缩包内文件列表: {file_list}")
-                            
-                        # 查找目标文件
-                        target_file_in_archive = None
-                        for file_path in file_list:
-                            if target_filename in file_path:
-                                target_file_in_archive = file_path
+                            logger.warning(f"DEBUG: 在压缩包中未找到目标文件: {target_filename}")
+                        # 尝试查找可能的替代文件
+                        target_file_in_archive = index.find_alternative_patch()
+                        if target_file_in_archive and debug_mode:
+                            logger.debug(f"DEBUG: 找到可能的替代文件: {target_file_in_archive}")
+                    
+                    if not target_file_in_archive:
+                        # 如果找不到任何替代文件，解压全部文件
+                        if debug_mode:
+                            logger.debug(f"DEBUG: 未找到任何替代文件，解压全部文件")
+                        run_with_fallback(backend, "extract_all", self.file_path, temp_dir)
+                        
+                        # 尝试在解压后的目录中查找目标文件
+                        for root, dirs, files in os.walk(temp_dir):
+                            for file in files:
+                                if file.endswith('.xp3') or file.endswith('.int'):
+                                    patch_file = os.path.join(root, file)
+                                    if debug_mode:
+                                        logger.debug(f"DEBUG: 找到可能的补丁文件: {patch_file}")
+                                    break
+                            if patch_file:
                                 break
                         
-                        if not target_file_in_archive:
+                        if not patch_file:
                             if debug_mode:
-                                logger.warning(f"DEBUG: 在压缩包中未找到目标文件: {target_filename}")
+                                logger.warning(f"DEBUG: 未找到解压后的补丁文件")
+                            self.progress.emit(100)
+                            self.finished.emit(False, "未找到解压后的补丁文件", "")
+                            return
+                    else:
+                        # 只解压目标文件
+                        if debug_mode:
+                            logger.debug(f"DEBUG: 解压目标文件: {target_file_in_archive}")
+                        patch_file = os.path.join(temp_dir, target_file_in_archive)
+                        run_with_fallback(
+                            backend, "extract_members", self.file_path, {target_file_in_archive: patch_file}
+                        )
+                    
+                    # 发送进度信号 - 50%
+                    self.progress.emit(50)
+                    
+                    # 如果还没有设置patch_file，尝试查找
+                    if not patch_file:
+                        if "Vol.1" in self.game_version:
+                            patch_file = os.path.join(temp_dir, "vol.1", "adultsonly.xp3")
+                        elif "Vol.2" in self.game_version:
+                            patch_file = os.path.join(temp_dir, "vol.2", "adultsonly.xp3")
+                        elif "Vol.3" in self.game_version:
+                            patch_file = os.path.join(temp_dir, "vol.3", "update00.int")
+                        elif "Vol.4" in self.game_version:
+                            patch_file = os.path.join(temp_dir, "vol.4", "vol4adult.xp3")
+                        elif "After" in self.game_version:
+                            patch_file = os.path.join(temp_dir, "after", "afteradult.xp3")
+                    
+                    if not os.path.exists(patch_file):
+                        if debug_mode:
+                            logger.warning(f"DEBUG: 未找到解压后的补丁文件: {patch_file}")
                             # 尝试查找可能的替代文件
                             alternative_files = []
-                            for file_path in file_list:
-                                if file_path.endswith('.xp3') or file_path.endswith('.int'):
-                                    alternative_files.append(file_path)
-                            
+                            for root, dirs, files in os.walk(temp_dir):
+                                for file in files:
+                                    if file.endswith('.xp3') or file.endswith('.int'):
+                                        alternative_files.append(os.path.join(root, file))
                             if alternative_files:
-                                if debug_mode:
-                                    logger.debug(f"DEBUG: 找到可能的替代文件: {alternative_files}")
-                                target_file_in_archive = alternative_files[0]
+                                logger.debug(f"DEBUG: 找到可能的替代文件: {alternative_files}")
+                                patch_file = alternative_files[0]
                             else:
-                                # 如果找不到任何替代文件，解压全部文件
-                                if debug_mode:
-                                    logger.debug(f"DEBUG: 未找到任何替代文件，解压全部文件")
-                                archive.extractall(path=temp_dir)
-                                
-                                # 尝试在解压后的目录中查找目标文件
+                                # 检查解压目录结构
+                                logger.debug(f"DEBUG: 检查解压目录结构:")
                                 for root, dirs, files in os.walk(temp_dir):
-                                    for file in files:
-                                        if file.endswith('.xp3') or file.endswith('.int'):
-                                            patch_file = os.path.join(root, file)
-                                            if debug_mode:
-                                                logger.debug(f"DEBUG: 找到可能的补丁文件: {patch_file}")
-                                            break
-                                    if patch_file:
-                                        break
-                                
-                                if not patch_file:
-                                    if debug_mode:
-                                        logger.warning(f"DEBUG: 未找到解压后的补丁文件")
-                                    self.progress.emit(100)
-                                    self.finished.emit(False, "未找到解压后的补丁文件", "")
-                                    return
-                        else:
-                            # 只解压目标文件
-                            if debug_mode:
-                                logger.debug(f"DEBUG: 解压目标文件: {target_file_in_archive}")
-                            archive.extract(path=temp_dir, targets=[target_file_in_archive])
-                            patch_file = os.path.join(temp_dir, target_file_in_archive)
-                        
-                        # 发送进度信号 - 50%
-                        self.progress.emit(50)
-                        
-                        # 如果还没有设置patch_file，尝试查找
-                        if not 'patch_file' in locals():
-                            if "Vol.1" in self.game_version:
-                                patch_file = os.path.join(temp_dir, "vol.1", "adultsonly.xp3")
-                            elif "Vol.2" in self.game_version:
-                                patch_file = os.path.join(temp_dir, "vol.2", "adultsonly.xp3")
-                            elif "Vol.3" in self.game_version:
-                                patch_file = os.path.join(temp_dir, "vol.3", "update00.int")
-                            elif "Vol.4" in self.game_version:
-                                patch_file = os.path.join(temp_dir, "vol.4", "vol4adult.xp3")
-                            elif "After" in self.game_version:
-                                patch_file = os.path.join(temp_dir, "after", "afteradult.xp3")
+                                    logger.debug(f"DEBUG: 目录: {root}")
+                                    logger.debug(f"DEBUG: 子目录: {dirs}")
+                                    logger.debug(f"DEBUG: 文件: {files}")
                         
                         if not os.path.exists(patch_file):
-                            if debug_mode:
-                                logger.warning(f"DEBUG: 未找到解压后的补丁文件: {patch_file}")
-                                # 尝试查找可能的替代文件
-                                alternative_files = []
-                                for root, dirs, files in os.walk(temp_dir):
-                                    for file in files:
-                                        if file.endswith('.xp3') or file.endswith('.int'):
-                                            alternative_files.append(os.path.join(root, file))
-                                if alternative_files:
-                                    logger.debug(f"DEBUG: 找到可能的替代文件: {alternative_files}")
-                                    patch_file = alternative_files[0]
-                                else:
-                                    # 检查解压目录结构
-                                    logger.debug(f"DEBUG: 检查解压目录结构:")
-                                    for root, dirs, files in os.walk(temp_dir):
-                                        logger.debug(f"DEBUG: 目录: {root}")
-                                        logger.debug(f"DEBUG: 子目录: {dirs}")
-                                        logger.debug(f"DEBUG: 文件: {files}")
-                            
-                            if not os.path.exists(patch_file):
-                                self.progress.emit(100)
-                                self.finished.emit(False, f"未找到解压后的补丁文件", "")
-                                return
+                            self.progress.emit(100)
+                            self.finished.emit(False, f"未找到解压后的补丁文件", "")
+                            return
+                    
+                    # 发送进度信号 - 70%
+                    self.progress.emit(70)
+                    
+                    if debug_mode:
+                        logger.debug(f"DEBUG: 找到解压后的补丁文件: {patch_file}")
                         
-                        # 发送进度信号 - 70%
-                        self.progress.emit(70)
+                    # 计算补丁文件哈希值
+                    try:
+                        # 读取文件内容并计算哈希值，同时更新进度
+                        file_size = os.path.getsize(patch_file)
                         
+                        # 根据文件大小动态调整块大小
+                        # 文件越大，块越大，最大256MB
+                        chunk_size = min(256 * 1024 * 1024, max(16 * 1024 * 1024, file_size // 20))
                         if debug_mode:
-                            logger.debug(f"DEBUG: 找到解压后的补丁文件: {patch_file}")
+                            logger.debug(f"DEBUG: 文件大小: {file_size} 字节, 使用块大小: {chunk_size // (1024 * 1024)}MB")
                             
-                        # 计算补丁文件哈希值
-                        try:
-                            # 读取文件内容并计算哈希值，同时更新进度
-                            file_size = os.path.getsize(patch_file)
+                        hash_obj = hashlib.sha256()
+                        
+                        with open(patch_file, "rb") as f:
+                            bytes_read = 0
+                            start_time = time.time()
+                            last_progress_time = start_time
                             
-                            # 根据文件大小动态调整块大小
-                            # 文件越大，块越大，最大256MB
-                            chunk_size = min(256 * 1024 * 1024, max(16 * 1024 * 1024, file_size // 20))
-                            if debug_mode:
-                                logger.debug(f"DEBUG: 文件大小: {file_size} 字节, 使用块大小: {chunk_size // (1024 * 1024)}MB")
+                            while True:
+                                if self.isInterruptionRequested():
+                                    break
+                                # 检查超时
+                                if check_timeout():
+                                    logger.error(f"哈希计算超时，强制终止")
+                                    self.progress.emit(100)
+                                    self.finished.emit(
+                                        False, 
+                                        f"{self.game_version} 哈希计算超时，已超过 {timeout_minutes} 分钟。请考虑跳过哈希校验或稍后再试。", 
+                                        ""
+                                    )
+                                    return
+                                chunk = f.read(chunk_size)
+                                if not chunk:
+                                    break
+                                hash_obj.update(chunk)
+                                bytes_read += len(chunk)
                                 
-                            hash_obj = hashlib.sha256()
-                            
-                            with open(patch_file, "rb") as f:
-                                bytes_read = 0
-                                start_time = time.time()
-                                last_progress_time = start_time
+                                # 计算进度 (70-95%)
+                                progress = 70 + int(25 * bytes_read / file_size)
+                                self.progress.emit(min(95, progress))
                                 
-                                while True:
-                                    if self.isInterruptionRequested():
-                                        break
-                                    # 检查超时
-                                    if check_timeout():
-                                        logger.error(f"哈希计算超时，强制终止")
-                                        self.progress.emit(100)
-                                        self.finished.emit(
-                                            False, 
-                                            f"{self.game_version} 哈希计算超时，已超过 {timeout_minutes} 分钟。请考虑跳过哈希校验或稍后再试。", 
-                                            ""
-                                        )
-                                        return
-                                    chunk = f.read(chunk_size)
-                                    if not chunk:
-                                        break
-                                    hash_obj.update(chunk)
-                                    bytes_read += len(chunk)
-                                    
-                                    # 计算进度 (70-95%)
-                                    progress = 70 + int(25 * bytes_read / file_size)
-                                    self.progress.emit(min(95, progress))
-                                    
-                                    # 每秒更新一次日志进度
-                                    current_time = time.time()
-                                    if debug_mode and current_time - last_progress_time >= 1.0:
-                                        elapsed = current_time - start_time
-                                        speed = bytes_read / (elapsed if elapsed > 0 else 1) / (1024 * 1024)  # MB/s
-                                        percent = bytes_read / file_size * 100
-                                        logger.debug(f"DEBUG: 哈希计算进度 - {percent:.1f}% - 已处理: {bytes_read/(1024*1024):.1f}MB/{file_size/(1024*1024):.1f}MB - 速度: {speed:.1f}MB/s")
-                                        last_progress_time = current_time
-                            
-                            # 记录总用时
-                            if debug_mode:
-                                total_time = time.time() - start_time
-                                logger.debug(f"DEBUG: 哈希计算完成，耗时: {total_time:.1f}秒，平均速度: {file_size/(total_time*1024*1024):.1f}MB/s")
-                            
-                            file_hash = hash_obj.hexdigest()
-                            
-                            # 比较哈希值
-                            result = file_hash.lower() == expected_hash.lower()
-                            
-                            # 发送进度信号 - 100%
-                            self.progress.emit(100)
+                                # 每秒更新一次日志进度
+                                current_time = time.time()
+                                if debug_mode and current_time - last_progress_time >= 1.0:
+                                    elapsed = current_time - start_time
+                                    speed = bytes_read / (elapsed if elapsed > 0 else 1) / (1024 * 1024)  # MB/s
+                                    percent = bytes_read / file_size * 100
+                                    logger.debug(f"DEBUG: 哈希计算进度 - {percent:.1f}% - 已处理: {bytes_read/(1024*1024):.1f}MB/{file_size/(1024*1024):.1f}MB - 速度: {speed:.1f}MB/s")
+                                    last_progress_time = current_time
+                        
+                        # 记录总用时
+                        if debug_mode:
+                            total_time = time.time() - start_time
+                            logger.debug(f"DEBUG: 哈希计算完成，耗时: {total_time:.1f}秒，平均速度: {file_size/(total_time*1024*1024):.1f}MB/s")
+                        
+                        file_hash = hash_obj.hexdigest()
+                        
+                        # 比较哈希值
+                        result = file_hash.lower() == expected_hash.lower()
+                        
+                        # 发送进度信号 - 100%
+                        self.progress.emit(100)
+                        
+                        if debug_mode:
+                            logger.debug(f"DEBUG: 补丁文件 {patch_file} 哈希值验证: {'成功' if result else '失败'}")
+                            logger.debug(f"DEBUG: 预期哈希值: {expected_hash}")
+                            logger.debug(f"DEBUG: 实际哈希值: {file_hash}")
                             
-                            if debug_mode:
-                                logger.debug(f"DEBUG: 补丁文件 {patch_file} 哈希值验证: {'成功' if result else '失败'}")
-                                logger.debug(f"DEBUG: 预期哈希值: {expected_hash}")
-                                logger.debug(f"DEBUG: 实际哈希值: {file_hash}")
-                                
-                            # 将验证结果和解压后的文件路径传递回去
-                            # 注意：由于使用了临时目录，此路径在函数返回后将不再有效
-                            # 但这里返回的路径只是用于标识验证成功，实际安装时会重新解压
-                            self.finished.emit(result, "" if result else "补丁文件哈希验证失败，文件可能已损坏或被篡改", patch_file if result else "")
-                        except Exception as e:
-                            if debug_mode:
-                                logger.error(f"DEBUG: 计算补丁文件哈希值失败: {e}")
-                                logger.error(f"DEBUG: 错误类型: {type(e).__name__}")
-                            self.progress.emit(100)
-                            self.finished.emit(False, f"计算补丁文件哈希值失败: {str(e)}", "")
+                        # 将验证结果和解压后的文件路径传递回去
+                        # 注意：由于使用了临时目录，此路径在函数返回后将不再有效
+                        # 但这里返回的路径只是用于标识验证成功，实际安装时会重新解压
+                        self.finished.emit(result, "" if result else "补丁文件哈希验证失败，文件可能已损坏或被篡改", patch_file if result else "")
+                    except Exception as e:
+                        if debug_mode:
+                            logger.error(f"DEBUG: 计算补丁文件哈希值失败: {e}")
+                            logger.error(f"DEBUG: 错误类型: {type(e).__name__}")
+                        self.progress.emit(100)
+                        self.finished.emit(False, f"计算补丁文件哈希值失败: {str(e)}", "")
                 except Exception as e:
                     if debug_mode:
                         logger.error(f"DEBUG: 解压补丁文件失败: {e}")
@@ -1,28 +1,84 @@
-import os
-import re
-import subprocess
-import sys
-import time
 from urllib.parse import urlparse
 
 from PySide6.QtCore import QThread, Signal
+from config.config import IP_CACHE_RUNNERS_UP, IP_CACHE_DEGRADE_FACTOR, IP_CACHE_MAX_LOSS, CF_GOOD_ENOUGH_RTT_MS
 from utils import resource_path
+from utils.ip_cache import IpResultCache, get_network_fingerprint
 from utils.logger import setup_logger
-from utils.url_censor import censor_url
+from utils.tracing import trace_span
+from .cf_prober import CloudflareProber, load_cidrs
 
 # 初始化logger
 logger = setup_logger("ip_optimizer")
 
 class IpOptimizer:
-    def __init__(self):
-        self.process = None
+    def __init__(self, good_enough_ms=CF_GOOD_ENOUGH_RTT_MS, on_candidate=None):
+        """初始化IP优选器
 
-    def get_optimal_ip(self, url: str) -> str | None:
+        Args:
+            good_enough_ms: 提前结束搜索的延迟阈值（毫秒），0表示不提前结束
+            on_candidate: 当前最优延迟刷新时的回调，参数为(ip, 中位延迟毫秒)
+        """
+        self.good_enough_ms = good_enough_ms
+        self.on_candidate = on_candidate
+        self.prober = None
+        self.last_results = []
+        self.report = {}
+        self._stopped = False
+        self.cache = IpResultCache()
+
+    def _reprobe_cached(self, entry, hostname, port, is_https, family):
+        """复测缓存中的最优IP和备选IP，未劣化时直接复用
+
+        缓存中的IP按写入时的优先顺序（下载测速结果）排列，复测后按该顺序选择第一个未劣化的IP。
+
+        Args:
+            entry: 缓存条目
+            hostname: 主机名
+            port: 端口
+            is_https: 是否进行TLS握手
+            family: 日志中显示的地址族名称
+
+        Returns:
+            str: 可复用的IP，缓存IP已劣化时返回None
+        """
+        logger.info(f"找到{family}优选缓存，复测缓存的 {len(entry['ips'])} 个IP")
+        self.prober = CloudflareProber(hostname, port=port, use_tls=is_https)
+        results = self.prober.run(entry["ips"])
+        if not results:
+            logger.info(f"缓存的{family}地址均不可用，重新进行完整优选")
+            return None
+
+        by_ip = {stats.ip: stats for stats in results}
+        medians = entry.get("medians") or {}
+        for ip in entry["ips"]:
+            stats = by_ip.get(ip)
+            if stats is None:
+                continue
+            cached_median = medians.get(ip) or entry.get("median_ms") or stats.median
+            if stats.loss > IP_CACHE_MAX_LOSS or stats.median > cached_median * IP_CACHE_DEGRADE_FACTOR:
+                logger.info(
+                    f"缓存的{family}地址 {ip} 已劣化（中位延迟 {stats.median:.1f}ms，缓存时 {cached_median:.1f}ms，"
+                    f"丢包率 {stats.loss:.0%}）"
+                )
+                continue
+
+            self.last_results = [stats] + [other for other in results if other is not stats]
+            self.report = {"family": family, "hostname": hostname, "cached": True, "selected": stats.ip}
+            logger.info(f"复用缓存的{family}地址: {stats.ip}（中位延迟 {stats.median:.1f}ms）")
+            return stats.ip
+
+        logger.info(f"缓存的{family}地址均已劣化，重新进行完整优选")
+        return None
+
+    def _optimize(self, url: str, cidr_file: str, family: str) -> str | None:
         """
-        使用 CloudflareSpeedTest 工具获取给定 URL 的最优 Cloudflare IP。
+        在进程内并发探测CIDR列表中的候选IP，再对延迟最低的几个IP进行下载测速，返回实测速度最快的IP。
 
         Args:
             url: 需要进行优选的下载链接。
+            cidr_file: CIDR列表文件（ip.txt或data/ipv6.txt）。
+            family: 日志中显示的地址族名称。
 
         Returns:
             最优的 IP 地址字符串，如果找不到则返回 None。
@@ -31,307 +87,101 @@ class IpOptimizer:
             # 解析URL，获取协议和主机名
             parsed_url = urlparse(url)
             protocol = parsed_url.scheme
-            hostname = parsed_url.netloc
-            
-            # 如果是HTTPS，可能需要特殊处理
+            hostname = parsed_url.hostname
             is_https = protocol.lower() == 'https'
-            
-            logger.info(f"协议: {protocol}, 主机名: {hostname}, 是否HTTPS: {is_https}")
-            
-            cst_path = resource_path("cfst.exe")
-            if not os.path.exists(cst_path):
-                logger.error(f"错误: cfst.exe 未在资源路径中找到。")
+            port = parsed_url.port or (443 if is_https else 80)
+
+            logger.info(f"{family}优选 - 协议: {protocol}, 主机名: {hostname}, 是否HTTPS: {is_https}")
+
+            # 同一网络环境下优先复用之前的优选结果
+            fingerprint = get_network_fingerprint()
+            entry = self.cache.get(hostname, family, fingerprint)
+            if entry:
+                cached_ip = self._reprobe_cached(entry, hostname, port, is_https, family)
+                if cached_ip:
+                    return cached_ip
+                if self.prober.is_stopped or self._stopped:
+                    return None
+                self.cache.invalidate(hostname, family, fingerprint)
+
+            networks = load_cidrs(resource_path(cidr_file))
+            if not networks:
+                logger.error(f"错误: 未能从 {cidr_file} 读取到可用的CIDR。")
                 return None
 
-            ip_txt_path = resource_path("ip.txt")
-            
-            # 隐藏敏感URL
-            safe_url = "***URL protection***"
-            
-            command = [
-                cst_path,
-                "-n", "1000",     # 延迟测速线程数
-                "-p", "1",       # 显示结果数量
-                "-url", url,
-                "-f", ip_txt_path,
-                "-dd",           # 禁用下载测速
-                "-o"," "         # 不写入结果文件
-            ]
-            
-            # 创建用于显示的安全命令副本
-            safe_command = command.copy()
-            for i, arg in enumerate(safe_command):
-                if arg == url:
-                    safe_command[i] = safe_url
-
-            creation_flags = subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
-            
-            logger.info("--- CloudflareSpeedTest 开始执行 ---")
-            logger.info(f"执行命令: {' '.join(safe_command)}")
-            
-            self.process = subprocess.Popen(
-                command,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                encoding='utf-8',
-                errors='replace',
-                creationflags=creation_flags,
-                bufsize=0
-            )
+            if self._stopped:
+                return None
 
-            # 匹配格式: IP地址在行首，后面跟着一些数字和文本
-            ip_pattern = re.compile(r'^(\d+\.\d+\.\d+\.\d+)\s+.*')
-            
-            found_header = False
-            found_completion = False
+            logger.info(f"--- {family} IP探测开始，CIDR段 {len(networks)} 个 ---")
 
-            stdout = self.process.stdout
-            if not stdout:
-                logger.error("错误: 无法获取子进程的输出流。")
+            # 分阶段搜索：逐轮淘汰较慢的CIDR段，把探测预算集中在表现好的段上；
+            # 之后用真实下载地址对延迟最低的几个IP测速，按实测速度决定最终结果
+            self.prober = CloudflareProber(
+                hostname, port=port, use_tls=is_https,
+                good_enough_ms=self.good_enough_ms, on_candidate=self.on_candidate
+            )
+            self.last_results = self.prober.run_staged(networks, url=url)
+
+            self.report = {
+                "family": family,
+                "hostname": hostname,
+                "cached": False,
+                "search": self.prober.report,
+                "candidates": [stats.to_dict() for stats in self.last_results[:5]],
+                "selected": self.last_results[0].ip if self.last_results else None,
+            }
+            logger.debug(f"{family}优选报告: {self.report}")
+
+            logger.info(f"--- {family} IP探测结束 ---")
+            if not self.last_results:
+                logger.warning(f"未找到可用的{family}地址")
                 return None
 
-            optimal_ip = None
-            timeout_counter = 0
-            max_timeout = 300  # 超时时间5分钟
-
-            while True:
-                if self.process.poll() is not None:
-                    break
-                try:
-                    ready = True
-                    try:
-                        line = stdout.readline()
-                    except:
-                        ready = False
-                        
-                    if not ready or not line:
-                        timeout_counter += 1
-                        if timeout_counter > max_timeout:
-                            logger.warning("超时: CloudflareSpeedTest 响应超时")
-                            break
-                        time.sleep(1)
-                        continue
-                    
-                    timeout_counter = 0
-                    
-                    # 处理输出行，隐藏可能包含的URL
-                    # 临时禁用URL隐藏
-                    # cleaned_line = censor_url(line.strip())
-                    cleaned_line = line.strip()  # 直接使用原始输出
-                    if cleaned_line:
-                        logger.debug(cleaned_line)
-                        
-                        if "IP 地址" in cleaned_line and "平均延迟" in cleaned_line:
-                            logger.info("检测到IP结果表头，准备获取IP地址...")
-                            found_header = True
-                            continue
-                        
-                        if "完整测速结果已写入" in cleaned_line or "按下 回车键 或 Ctrl+C 退出" in cleaned_line:
-                            logger.info("检测到测速完成信息")
-                            found_completion = True
-                            
-                            if optimal_ip:
-                                break
-                        
-                        if found_header:
-                            match = ip_pattern.search(cleaned_line)
-                            if match and not optimal_ip:
-                                optimal_ip = match.group(1)
-                                logger.info(f"找到最优 IP: {optimal_ip}")
-                                break
-                            
-                except Exception as e:
-                    logger.error(f"读取输出时发生错误: {e}")
-                    break
-            
-            if self.process and self.process.poll() is None:
-                try:
-                    if self.process.stdin and not self.process.stdin.closed:
-                        logger.debug("发送退出信号...")
-                        self.process.stdin.write('\n')
-                        self.process.stdin.flush()
-                except:
-                    pass
-            
-            self.stop()
-            
-            logger.info("--- CloudflareSpeedTest 执行结束 ---")
+            optimal_ip = self.last_results[0].ip
+            logger.info(f"找到最优 {family}: {optimal_ip}")
+
+            # 被中途停止时结果不完整，不写入缓存
+            if not self.prober.is_stopped and not self._stopped:
+                cached = self.last_results[:1 + IP_CACHE_RUNNERS_UP]
+                self.cache.put(
+                    hostname, family, fingerprint, [stats.ip for stats in cached], cached[0].median,
+                    medians={stats.ip: stats.median for stats in cached}
+                )
             return optimal_ip
 
         except Exception as e:
-            logger.error(f"执行 CloudflareSpeedTest 时发生错误: {e}")
+            logger.error(f"执行{family} IP探测时发生错误: {e}")
             return None
 
-    def get_optimal_ipv6(self, url: str) -> str | None:
+    def get_optimal_ip(self, url: str) -> str | None:
         """
-        使用 CloudflareSpeedTest 工具获取给定 URL 的最优 Cloudflare IPv6 地址。
+        获取给定 URL 的最优 Cloudflare IP。
 
         Args:
             url: 需要进行优选的下载链接。
 
         Returns:
-            最优的 IPv6 地址字符串，如果找不到则返回 None。
+            最优的 IP 地址字符串，如果找不到则返回 None。
         """
-        try:
-            # 解析URL，获取协议和主机名
-            parsed_url = urlparse(url)
-            protocol = parsed_url.scheme
-            hostname = parsed_url.netloc
-            
-            # 如果是HTTPS，可能需要特殊处理
-            is_https = protocol.lower() == 'https'
-            
-            logger.info(f"IPv6优选 - 协议: {protocol}, 主机名: {hostname}, 是否HTTPS: {is_https}")
-            
-            cst_path = resource_path("cfst.exe")
-            if not os.path.exists(cst_path):
-                logger.error(f"错误: cfst.exe 未在资源路径中找到。")
-                return None
-
-            ipv6_txt_path = resource_path("data/ipv6.txt")
-            if not os.path.exists(ipv6_txt_path):
-                logger.error(f"错误: ipv6.txt 未在资源路径中找到。")
-                return None
-            
-            # 隐藏敏感URL
-            safe_url = "***URL protection***"
-            
-            command = [
-                cst_path,
-                "-n", "1000",     # 延迟测速线程数
-                "-p", "1",       # 显示结果数量
-                "-url", url,
-                "-f", ipv6_txt_path,
-                "-dd",           # 禁用下载测速
-                "-o", " "        # 不写入结果文件
-            ]
-            
-            # 创建用于显示的安全命令副本
-            safe_command = command.copy()
-            for i, arg in enumerate(safe_command):
-                if arg == url:
-                    safe_command[i] = safe_url
-
-            creation_flags = subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
-            
-            logger.info("--- CloudflareSpeedTest IPv6 开始执行 ---")
-            logger.info(f"执行命令: {' '.join(safe_command)}")
-            
-            self.process = subprocess.Popen(
-                command,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                encoding='utf-8',
-                errors='replace',
-                creationflags=creation_flags,
-                bufsize=0
-            )
-
-            # IPv6格式可能有多种表示形式
-            ipv6_pattern = re.compile(r'^([0-9a-fA-F:]+)\s+.*')
-            
-            found_header = False
-            found_completion = False
+        return self._optimize(url, "ip.txt", "IPv4")
 
-            stdout = self.process.stdout
-            if not stdout:
-                logger.error("错误: 无法获取子进程的输出流。")
-                return None
+    def get_optimal_ipv6(self, url: str) -> str | None:
+        """
+        获取给定 URL 的最优 Cloudflare IPv6 地址。
 
-            optimal_ipv6 = None
-            timeout_counter = 0
-            max_timeout = 300  # 超时时间5分钟
-
-            while True:
-                if self.process.poll() is not None:
-                    break
-                try:
-                    ready = True
-                    try:
-                        line = stdout.readline()
-                    except:
-                        ready = False
-                        
-                    if not ready or not line:
-                        timeout_counter += 1
-                        if timeout_counter > max_timeout:
-                            logger.warning("超时: CloudflareSpeedTest IPv6 响应超时")
-                            break
-                        time.sleep(1)
-                        continue
-                    
-                    timeout_counter = 0
-                    
-                    # 处理输出行，隐藏可能包含的URL
-                    # 临时禁用URL隐藏
-                    # cleaned_line = censor_url(line.strip())
-                    cleaned_line = line.strip()  # 直接使用原始输出
-                    if cleaned_line:
-                        logger.debug(cleaned_line)
-                        
-                        if "IP 地址" in cleaned_line and "平均延迟" in cleaned_line:
-                            logger.info("检测到IPv6结果表头，准备获取IPv6地址...")
-                            found_header = True
-                            continue
-                        
-                        if "完整测速结果已写入" in cleaned_line or "按下 回车键 或 Ctrl+C 退出" in cleaned_line:
-                            logger.info("检测到IPv6测速完成信息")
-                            found_completion = True
-                            
-                            if optimal_ipv6:
-                                break
-                        
-                        if found_header:
-                            match = ipv6_pattern.search(cleaned_line)
-                            if match and not optimal_ipv6:
-                                optimal_ipv6 = match.group(1)
-                                logger.info(f"找到最优 IPv6: {optimal_ipv6}")
-                                break
-                            
-                except Exception as e:
-                    logger.error(f"读取输出时发生错误: {e}")
-                    break
-            
-            if self.process and self.process.poll() is None:
-                try:
-                    if self.process.stdin and not self.process.stdin.closed:
-                        logger.debug("发送退出信号...")
-                        self.process.stdin.write('\n')
-                        self.process.stdin.flush()
-                except:
-                    pass
-            
-            self.stop()
-            
-            logger.info("--- CloudflareSpeedTest IPv6 执行结束 ---")
-            return optimal_ipv6
+        Args:
+            url: 需要进行优选的下载链接。
 
-        except Exception as e:
-            logger.error(f"执行 CloudflareSpeedTest IPv6 时发生错误: {e}")
-            return None
+        Returns:
+            最优的 IPv6 地址字符串，如果找不到则返回 None。
+        """
+        return self._optimize(url, "data/ipv6.txt", "IPv6")
 
     def stop(self):
-        if self.process and self.process.poll() is None:
-            logger.info("正在终止 CloudflareSpeedTest 进程...")
-            try:
-                if self.process.stdin and not self.process.stdin.closed:
-                    self.process.stdin.write('\n')
-                    self.process.stdin.flush()
-                    self.process.stdin.close()
-            except:
-                pass
-            
-            try:
-                self.process.terminate()
-                self.process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self.process.kill()
-                self.process.wait()
-            logger.info("CloudflareSpeedTest 进程已终止。")
+        self._stopped = True
+        if self.prober:
+            logger.info("正在停止IP探测...")
+            self.prober.stop()
 
 
 class IpOptimizerThread(QThread):
@@ -341,18 +191,27 @@ class IpOptimizerThread(QThread):
     本类仅负责IP优化相关功能
     """
     finished = Signal(str)
+    candidate_found = Signal(str, float)  # 搜索过程中当前最优的IP及其中位延迟（毫秒）
 
-    def __init__(self, url, parent=None, use_ipv6=False):
+    def __init__(self, url, parent=None, use_ipv6=False, good_enough_ms=CF_GOOD_ENOUGH_RTT_MS):
         super().__init__(parent)
         self.url = url
-        self.optimizer = IpOptimizer()
+        self.optimizer = IpOptimizer(good_enough_ms=good_enough_ms, on_candidate=self.candidate_found.emit)
         self.use_ipv6 = use_ipv6
 
     def run(self):
-        if self.use_ipv6:
-            optimal_ip = self.optimizer.get_optimal_ipv6(self.url)
-        else:
-            optimal_ip = self.optimizer.get_optimal_ip(self.url)
+        with trace_span("ip_probe", family="IPv6" if self.use_ipv6 else "IPv4") as span:
+            if self.use_ipv6:
+                optimal_ip = self.optimizer.get_optimal_ipv6(self.url)
+            else:
+                optimal_ip = self.optimizer.get_optimal_ip(self.url)
+            report = self.optimizer.report or {}
+            span.set(cached=report.get("cached", False),
+                     early_stop=(report.get("search") or {}).get("early_stop", False))
+            if self.optimizer._stopped:
+                span.cancel()
+            elif not optimal_ip:
+                span.fail("未找到合适的IP")
         self.finished.emit(optimal_ip if optimal_ip else "")
 
     def stop(self):
@@ -0,0 +1,382 @@
+import http.client
+import queue
+import socket
+import ssl
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+from config.config import (
+    UA, SEGMENT_SIZE, SEGMENT_CONNECTIONS_PER_IP, SEGMENT_TIMEOUT,
+    SEGMENT_IP_MAX_FAILURES, SEGMENT_IP_SLOW_RATIO
+)
+from utils.logger import setup_logger
+
+# 初始化logger
+logger = setup_logger("segment_downloader")
+
+# 连续多少次测速低于阈值才判定IP劣化，避免瞬时抖动误判
+SLOW_CHECKS_BEFORE_DEGRADE = 3
+
+
+def build_download_headers(url):
+    """构造下载请求头，aria2c下载与多IP分段下载共用
+
+    Args:
+        url: 下载地址
+
+    Returns:
+        dict: 请求头名称 -> 值，按发送顺序排列
+    """
+    parts = urlsplit(url)
+    referer = f"{parts.scheme}://{parts.netloc}/"
+    return {
+        "User-Agent": UA,
+        "Referer": referer,
+        "Origin": referer.rstrip("/"),
+        "Accept": "*/*",
+        "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+        "Accept-Encoding": "gzip, deflate, br",
+        "Cache-Control": "no-cache",
+        "Pragma": "no-cache",
+        "DNT": "1",
+        "Sec-Fetch-Dest": "empty",
+        "Sec-Fetch-Mode": "cors",
+        "Sec-Fetch-Site": "same-origin",
+    }
+
+
+class _PinnedHTTPConnection(http.client.HTTPConnection):
+    """直接连接到指定IP的HTTP连接，Host头仍使用原始主机名"""
+
+    def __init__(self, ip, hostname, port, timeout):
+        super().__init__(hostname, port, timeout=timeout)
+        self._ip = ip
+
+    def connect(self):
+        self.sock = socket.create_connection((self._ip, self.port), self.timeout)
+
+
+class _PinnedHTTPSConnection(http.client.HTTPSConnection):
+    """直接连接到指定IP的HTTPS连接，TLS的SNI和Host头仍使用原始主机名"""
+
+    def __init__(self, ip, hostname, port, timeout, context):
+        super().__init__(hostname, port, timeout=timeout, context=context)
+        self._ip = ip
+
+    def connect(self):
+        sock = socket.create_connection((self._ip, self.port), self.timeout)
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+
+class _IpState:
+    """单个IP在下载过程中的状态"""
+
+    def __init__(self, ip):
+        self.ip = ip
+        self.failures = 0  # 连续失败次数
+        self.total_failures = 0
+        self.bytes = 0
+        self.window_bytes = 0  # 上次测速以来收到的字节数
+        self.slow_checks = 0
+        self.degraded = False
+        self.reason = ""
+
+    def to_dict(self):
+        return {
+            "ip": self.ip,
+            "bytes": self.bytes,
+            "failures": self.total_failures,
+            "degraded": self.degraded,
+            "reason": self.reason,
+        }
+
+
+class SegmentDownloader:
+    """多IP分段下载器
+
+    将文件按固定大小切分为若干Range分段，分配给多个优选IP上的连接并发下载。
+    每个连接直接连向对应IP，但SNI和Host头使用原始主机名。
+    某个IP连续失败或速度明显低于其他IP时停止使用该IP，
+    它正在下载的分段会从已收到的位置起重新排队，由其余IP继续完成。
+    """
+
+    def __init__(self, url, output_path, ips, connections_per_ip=SEGMENT_CONNECTIONS_PER_IP,
+                 segment_size=SEGMENT_SIZE, timeout=SEGMENT_TIMEOUT, progress_callback=None,
+                 verify_certificate=True):
+        """初始化分段下载器
+
+        Args:
+            url: 下载地址
+            output_path: 文件保存路径
+            ips: 优选IP列表，按优先顺序排列
+            connections_per_ip: 每个IP的并发连接数
+            segment_size: 分段大小（字节）
+            timeout: 连接和读取超时（秒）
+            progress_callback: 进度回调，参数为(已下载字节, 总字节, 速度字节/秒, 活动连接数, 可用IP数)
+            verify_certificate: 是否校验服务器证书
+        """
+        parts = urlsplit(url)
+        self.url = url
+        self.hostname = parts.hostname
+        self.use_tls = parts.scheme.lower() == "https"
+        self.port = parts.port or (443 if self.use_tls else 80)
+        self.path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.output_path = output_path
+        self.connections_per_ip = max(1, connections_per_ip)
+        self.segment_size = segment_size
+        self.timeout = timeout
+        self.progress_callback = progress_callback
+        self.headers = build_download_headers(url)
+        # Range请求必须拿到未压缩的原始字节，才能按偏移写入文件
+        self.headers["Accept-Encoding"] = "identity"
+
+        self.states = [_IpState(ip) for ip in dict.fromkeys(ips)]
+        self.total_size = 0
+        self.downloaded = 0
+        self.report = {}
+
+        self._segments = queue.Queue()
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._stopped = threading.Event()
+        self._running = threading.Event()  # 清除时表示暂停
+        self._running.set()
+        self._pause_count = 0
+        self._active_connections = 0
+        self._error = ""
+
+        self._ssl_context = ssl.create_default_context()
+        if not verify_certificate:
+            self._ssl_context.check_hostname = False
+            self._ssl_context.verify_mode = ssl.CERT_NONE
+
+    def _connect(self, ip):
+        if self.use_tls:
+            return _PinnedHTTPSConnection(ip, self.hostname, self.port, self.timeout, self._ssl_context)
+        return _PinnedHTTPConnection(ip, self.hostname, self.port, self.timeout)
+
+    def _request(self, conn, start, end):
+        """在已有连接上发送Range请求，返回响应对象"""
+        headers = dict(self.headers)
+        headers["Range"] = f"bytes={start}-{end}"
+        conn.request("GET", self.path, headers=headers)
+        response = conn.getresponse()
+        if response.status != 206:
+            response.read()
+            raise http.client.HTTPException(f"HTTP状态码异常: {response.status} {response.reason}")
+        return response
+
+    def _fetch_size(self):
+        """依次通过各IP发送单字节Range请求获取文件大小，同时确认服务器支持分段下载
+
+        Returns:
+            int: 文件大小（字节）
+        """
+        last_error = None
+        for state in self.states:
+            conn = self._connect(state.ip)
+            try:
+                response = self._request(conn, 0, 0)
+                response.read()
+                total = response.getheader("Content-Range", "").rsplit("/", 1)[-1]
+                if total.isdigit():
+                    return int(total)
+                last_error = "服务器未返回文件总大小"
+            except (OSError, http.client.HTTPException) as e:
+                last_error = e
+                state.failures += 1
+                state.total_failures += 1
+            finally:
+                conn.close()
+        raise RuntimeError(f"无法获取文件大小: {last_error}")
+
+    def _healthy_states(self):
+        return [state for state in self.states if not state.degraded]
+
+    def _degrade(self, state, reason):
+        """停止使用某个IP，至少保留一个可用IP"""
+        with self._lock:
+            if state.degraded:
+                return
+            others = [other for other in self.states if other is not state and not other.degraded]
+            if not others and reason != "连续失败":
+                return
+            state.degraded = True
+            state.reason = reason
+        logger.warning(f"IP {state.ip} 已劣化（{reason}），其分段将转由其他IP下载")
+        if not self._healthy_states():
+            self._error = f"所有优选IP均不可用，最后失败的IP: {state.ip}"
+            self._done.set()
+
+    def _worker(self, state):
+        """单个下载连接：不断领取分段并写入文件对应位置"""
+        conn = None
+        with self._lock:
+            self._active_connections += 1
+        try:
+            with open(self.output_path, "r+b") as f:
+                while not self._done.is_set() and not self._stopped.is_set() and not state.degraded:
+                    try:
+                        start, end = self._segments.get(timeout=0.5)
+                    except queue.Empty:
+                        continue
+
+                    position = start
+                    pause_count = self._pause_count
+                    try:
+                        if conn is None:
+                            conn = self._connect(state.ip)
+                        response = self._request(conn, start, end)
+                        f.seek(start)
+                        while position <= end:
+                            self._running.wait()
+                            if self._stopped.is_set() or state.degraded:
+                                break
+                            chunk = response.read(min(256 * 1024, end - position + 1))
+                            if not chunk:
+                                raise http.client.IncompleteRead(b"", end - position + 1)
+                            f.write(chunk)
+                            position += len(chunk)
+                            with self._lock:
+                                self.downloaded += len(chunk)
+                                state.bytes += len(chunk)
+                                state.window_bytes += len(chunk)
+
+                        if position <= end:
+                            # 被停止或IP已劣化，剩余部分交给其他连接
+                            self._segments.put((position, end))
+                            conn.close()
+                            conn = None
+                            continue
+
+                        state.failures = 0
+                        with self._lock:
+                            if self.downloaded >= self.total_size:
+                                self._done.set()
+                    except (OSError, http.client.HTTPException) as e:
+                        self._segments.put((position, end))
+                        if conn is not None:
+                            conn.close()
+                            conn = None
+                        # 暂停期间连接超时不计入失败
+                        if pause_count != self._pause_count:
+                            continue
+                        state.failures += 1
+                        state.total_failures += 1
+                        logger.debug(f"IP {state.ip} 下载分段 {position}-{end} 失败: {e}")
+                        if state.failures >= SEGMENT_IP_MAX_FAILURES:
+                            self._degrade(state, "连续失败")
+        except OSError as e:
+            self._error = f"写入文件失败: {e}"
+            self._done.set()
+        finally:
+            if conn is not None:
+                conn.close()
+            with self._lock:
+                self._active_connections -= 1
+
+    def _check_speeds(self, interval):
+        """按最近一段时间的速度比较各IP，持续明显慢于其他IP的判定为劣化"""
+        healthy = self._healthy_states()
+        with self._lock:
+            speeds = {state.ip: state.window_bytes / interval for state in healthy}
+            for state in healthy:
+                state.window_bytes = 0
+        if len(healthy) < 2 or self._segments.empty():
+            return
+
+        for state in healthy:
+            others = [speed for ip, speed in speeds.items() if ip != state.ip]
+            reference = statistics.median(others)
+            if reference > 0 and speeds[state.ip] < reference * SEGMENT_IP_SLOW_RATIO:
+                state.slow_checks += 1
+                if state.slow_checks >= SLOW_CHECKS_BEFORE_DEGRADE:
+                    self._degrade(state, f"速度过低（{speeds[state.ip] / 1024:.0f}KB/s）")
+            else:
+                state.slow_checks = 0
+
+    def run(self):
+        """执行下载，阻塞直到完成、失败或被停止
+
+        Returns:
+            tuple: (是否成功, 错误信息)
+        """
+        start_time = time.perf_counter()
+        try:
+            self.total_size = self._fetch_size()
+        except RuntimeError as e:
+            return False, str(e)
+
+        with open(self.output_path, "wb") as f:
+            f.truncate(self.total_size)
+        for start in range(0, self.total_size, self.segment_size):
+            self._segments.put((start, min(start + self.segment_size, self.total_size) - 1))
+        if self.total_size == 0:
+            self._done.set()
+
+        logger.info(
+            f"开始多IP分段下载: {len(self.states)} 个IP，每个IP {self.connections_per_ip} 个连接，"
+            f"文件大小 {self.total_size} 字节"
+        )
+        workers = []
+        for state in self.states:
+            for _ in range(self.connections_per_ip):
+                worker = threading.Thread(target=self._worker, args=(state,), daemon=True)
+                worker.start()
+                workers.append(worker)
+
+        interval = 1.0
+        last_downloaded = 0
+        while not self._done.wait(interval):
+            if self._stopped.is_set():
+                break
+            if not self._running.is_set():
+                continue
+            speed = (self.downloaded - last_downloaded) / interval
+            last_downloaded = self.downloaded
+            self._check_speeds(interval)
+            if self.progress_callback:
+                self.progress_callback(
+                    self.downloaded, self.total_size, speed,
+                    self._active_connections, len(self._healthy_states())
+                )
+
+        self._stopped.set()
+        self._running.set()
+        for worker in workers:
+            worker.join(self.timeout)
+
+        elapsed = time.perf_counter() - start_time
+        self.report = {
+            "total_bytes": self.total_size,
+            "elapsed_s": round(elapsed, 2),
+            "ips": [state.to_dict() for state in self.states],
+        }
+        logger.debug(f"多IP分段下载报告: {self.report}")
+
+        if self.total_size and self.downloaded >= self.total_size and not self._error:
+            logger.info(f"多IP分段下载完成，耗时 {elapsed:.1f} 秒")
+            return True, ""
+        return False, self._error or "下载已停止"
+
+    def pause(self):
+        self._pause_count += 1
+        self._running.clear()
+
+    def resume(self):
+        # 暂停期间的数据不参与测速
+        with self._lock:
+            for state in self.states:
+                state.window_bytes = 0
+                state.slow_checks = 0
+        self._pause_count += 1
+        self._running.set()
+
+    def is_paused(self):
+        return not self._running.is_set()
+
+    def stop(self):
+        self._stopped.set()
+        self._running.set()